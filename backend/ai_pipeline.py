@@ -0,0 +1,93 @@
+"""
+Shared asyncio event loop and bounded thread pool for the AI report pipeline
+"""
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, Optional
+
+
+# Pipeline tuning (see example.env)
+AI_PIPELINE_THREADS = int(os.getenv('AI_PIPELINE_THREADS', '8'))
+AI_LLM_CONCURRENCY = int(os.getenv('AI_LLM_CONCURRENCY', '16'))
+AI_PIPELINE_TIMEOUT = float(os.getenv('AI_PIPELINE_TIMEOUT', '120'))
+
+_STREAM_END = object()
+
+
+class AIPipelineRunner:
+    """Runs all AI pipeline coroutines on one background event loop
+
+    LLM calls are awaited on the loop, so any number of in-flight calls share a single
+    thread; blocking work (DB queries, chart rendering) goes to a bounded thread pool.
+    """
+
+    def __init__(self, threads: int = AI_PIPELINE_THREADS, llm_concurrency: int = AI_LLM_CONCURRENCY):
+        self.threads = threads
+        self.llm_concurrency = llm_concurrency
+        self._loop = None
+        self._executor = None
+        self._llm_semaphore = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='ai-pipeline')
+                loop.set_default_executor(self._executor)
+                threading.Thread(target=loop.run_forever, name='ai-pipeline-loop', daemon=True).start()
+                self._loop = loop
+                print(f"🔄 AI pipeline loop started ({self.threads} threads, {self.llm_concurrency} concurrent LLM calls)")
+            return self._loop
+
+    @property
+    def llm_slots(self) -> asyncio.Semaphore:
+        """Semaphore bounding concurrent LLM calls; only use from coroutines on the loop"""
+        if self._llm_semaphore is None:
+            self._llm_semaphore = asyncio.Semaphore(self.llm_concurrency)
+        return self._llm_semaphore
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = AI_PIPELINE_TIMEOUT) -> Any:
+        """Run a coroutine on the pipeline loop and block the calling (request) thread for its result"""
+        loop = self._ensure_started()
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        try:
+            return future.result(timeout=timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def iterate(self, agen: AsyncIterator) -> Iterator:
+        """Drive an async generator on the pipeline loop, yielding its items synchronously"""
+        loop = self._ensure_started()
+        try:
+            while True:
+                item = asyncio.run_coroutine_threadsafe(self._next_item(agen), loop).result(timeout=AI_PIPELINE_TIMEOUT)
+                if item is _STREAM_END:
+                    break
+                yield item
+        finally:
+            # Client disconnected or stream finished: close the generator on its own loop
+            asyncio.run_coroutine_threadsafe(agen.aclose(), loop).result(timeout=AI_PIPELINE_TIMEOUT)
+
+    @staticmethod
+    async def _next_item(agen: AsyncIterator):
+        try:
+            return await agen.__anext__()
+        except StopAsyncIteration:
+            return _STREAM_END
+
+    async def to_thread(self, func: Callable, *args, app=None) -> Any:
+        """Run blocking work in the pipeline thread pool, inside the Flask app context if given"""
+        def call():
+            if app is None:
+                return func(*args)
+            with app.app_context():
+                return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+
+# Global instance
+ai_pipeline = AIPipelineRunner()
@@ -3,9 +3,12 @@ AI Report Generator Service using LangChain, Groq, and RAG
 """
 import os
 import json
+import asyncio
+import threading
+import httpx
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, AsyncIterator
 import chromadb
 from chromadb.config import Settings
 from langchain_groq import ChatGroq
@@ -14,8 +17,14 @@ from langchain_community.vectorstores import Chroma
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
-from sqlalchemy import text
+from sqlalchemy import text, create_engine
 from models import db, WorkOrder, WorkOrderStatus, ManufacturingOrder, User, WorkCenter
+from chart_templates import chart_template_renderer
+from chart_sandbox import chart_sandbox, ChartSandboxError
+from ai_pipeline import ai_pipeline
+from sql_guard import guarded_query_executor, GuardedResult, SQLGuardError
+from read_replicas import replica_router
+from flask import current_app
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -24,6 +33,49 @@ load_dotenv()
 # Initialize Groq API from environment variable
 GROQ_API_KEY = os.getenv('GROQ_API_KEY')
 
+# Keep-alive connection pool shared by all LLM calls
+AI_LLM_MAX_CONNECTIONS = int(os.getenv('AI_LLM_MAX_CONNECTIONS', '20'))
+AI_LLM_TIMEOUT = float(os.getenv('AI_LLM_TIMEOUT', '60'))
+
+# Run the canned fallback query and its template chart while the analysis LLM call is in flight
+AI_SPECULATIVE_FALLBACK = os.getenv('AI_SPECULATIVE_FALLBACK', 'true').lower() in ('1', 'true', 'yes')
+
+# Optional connection string for a read-only database role used by AI-generated SQL
+AI_SQL_DATABASE_URL = os.getenv('AI_SQL_DATABASE_URL')
+
+
+def _partial_json_string(text: str, key: str) -> Optional[str]:
+    """Decode the (possibly unfinished) string value of `key` from a streamed JSON object"""
+    marker = text.find(f'"{key}"')
+    if marker == -1:
+        return None
+    colon = text.find(":", marker + len(key) + 2)
+    if colon == -1:
+        return None
+    start = text.find('"', colon)
+    if start == -1:
+        return None
+    
+    # Walk to the closing quote, or to the end of what has streamed so far
+    i = start + 1
+    while i < len(text):
+        if text[i] == "\\":
+            i += 2
+            continue
+        if text[i] == '"':
+            break
+        i += 1
+    raw = text[start + 1:min(i, len(text))]
+    
+    # Drop a trailing escape that has not fully arrived yet
+    backslash = raw.rfind("\\")
+    if backslash != -1 and len(raw) - backslash < 6 and raw[backslash + 1:backslash + 2] in ("u", ""):
+        raw = raw[:backslash]
+    try:
+        return json.loads(f'"{raw}"')
+    except json.JSONDecodeError:
+        return None
+
 
 class AIReportGenerator:
     def __init__(self):
@@ -31,10 +83,17 @@ class AIReportGenerator:
         self.embeddings = None  # Initialize lazily
         self.vector_store = None
         self.knowledge_base = ""
+        self._init_lock = threading.Lock()
+        self._sandbox_warmup = None
+        self._readonly_engine = None
         print("🤖 AI Report Generator initialized (lazy loading mode)")
         
     def _ensure_llm_initialized(self):
         """Initialize LLM lazily when first needed"""
+        with self._init_lock:
+            self._initialize_llm()
+    
+    def _initialize_llm(self):
         if self.llm is None:
             try:
                 if not GROQ_API_KEY:
@@ -43,17 +102,34 @@ class AIReportGenerator:
                 print("🔄 Initializing Groq LLM...")
                 print(f"🔑 Using API key: {GROQ_API_KEY[:10]}...{GROQ_API_KEY[-4:]}")
                 
+                limits = httpx.Limits(
+                    max_connections=AI_LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=AI_LLM_MAX_CONNECTIONS
+                )
                 self.llm = ChatGroq(
                     temperature=0.1,
                     groq_api_key=GROQ_API_KEY,
-                    model_name="llama-3.1-8b-instant"
+                    model_name="llama-3.1-8b-instant",
+                    timeout=AI_LLM_TIMEOUT,
+                    http_client=httpx.Client(limits=limits, timeout=AI_LLM_TIMEOUT),
+                    http_async_client=httpx.AsyncClient(limits=limits, timeout=AI_LLM_TIMEOUT)
                 )
-                self.knowledge_base = self._create_simple_knowledge_base()
+                self._ensure_knowledge_base()
                 print("✅ LLM initialized successfully")
             except Exception as e:
                 print(f"❌ Error initializing LLM: {e}")
                 raise e
     
+    def _ensure_knowledge_base(self):
+        """Load the knowledge base used as prompt context"""
+        if not self.knowledge_base:
+            self.knowledge_base = self._create_simple_knowledge_base()
+    
+    async def _llm_ainvoke(self, messages):
+        """Call the LLM on the pipeline loop, bounded by the shared concurrency limit"""
+        async with ai_pipeline.llm_slots:
+            return await self.llm.ainvoke(messages)
+    
     def _create_knowledge_documents(self) -> List[Document]:
         """Create knowledge base documents"""
         documents = []
@@ -204,7 +280,34 @@ class AIReportGenerator:
     def _create_simple_knowledge_base(self) -> str:
         """Create simple string-based knowledge base"""
         return """
-        Manufacturing System Database Schema:
+        Analytics Tables (PREFER THESE for reports, trends and aggregates):
+        They are refreshed from the operational tables every minute and do not compete with shop-floor writes.
+        
+        Fact Work Order Completions (fact_work_order_completions): one row per completed work order
+        - work_order_id, manufacturing_order_id, product_name
+        - user_id: Worker who completed it (join dim_users), can be NULL
+        - work_center_id: Work center used (join dim_work_centers), can be NULL
+        - date_key: Completion day as yyyymmdd integer (join dim_date)
+        - completed_at: Completion timestamp
+        - estimated_minutes, actual_minutes, estimated_cost, actual_cost
+        - quality_check: Boolean, on_time: Boolean (completed before the order deadline)
+        
+        Fact Stock Movements (fact_stock_movements): one row per stock movement
+        - stock_movement_id, component_id (join dim_components), date_key (join dim_date), created_at
+        - movement_type: 'IN', 'OUT', 'ADJUSTMENT'
+        - quantity, signed_quantity (+IN / -OUT, NULL for ADJUSTMENT), unit_cost, movement_value, reference
+        
+        Dimensions:
+        - dim_date: date_key, date, year, quarter, month, week, day_of_week (1 = Monday)
+        - dim_users: user_id, full_name, email, department, role
+        - dim_work_centers: work_center_id, name, cost_per_hour, capacity, efficiency
+        - dim_components: component_id, name, supplier, unit_cost, reorder_level
+        
+        Example: completions per day for a user
+        SELECT d.date, COUNT(*) AS completed FROM fact_work_order_completions f
+        JOIN dim_date d ON d.date_key = f.date_key WHERE f.user_id = 1 GROUP BY d.date ORDER BY d.date
+        
+        Manufacturing System Database Schema (operational tables - use for current status and details):
         
         Work Orders Table (work_orders):
         - id: Primary key
@@ -250,34 +353,39 @@ class AIReportGenerator:
         - Pie charts for proportions (go.Pie)
         """
     
-    def query_database(self, query: str, user_id: int = None, start_date: datetime = None, end_date: datetime = None) -> List[Dict[str, Any]]:
-        """Execute database query with optional filters"""
+    def _query_engine(self, user_id: int = None):
+        """Engine for AI queries: a dedicated read-only database role if configured, else the
+        read replica (unless the user just wrote), else the app engine"""
+        if AI_SQL_DATABASE_URL:
+            if self._readonly_engine is None:
+                self._readonly_engine = create_engine(AI_SQL_DATABASE_URL, pool_pre_ping=True)
+            return self._readonly_engine
+        replica = replica_router.replica_engine()
+        if replica is not None and not replica_router.is_sticky(user_id):
+            return replica
+        return db.engine
+    
+    def run_report_query(self, query: str, user_id: int = None) -> GuardedResult:
+        """Run AI-generated SQL through the guard: SELECT-only, allowed tables, row limit and timeout"""
         try:
-            with db.engine.connect() as conn:
-                result = conn.execute(text(query))
-                columns = result.keys()
-                rows = result.fetchall()
-                
-                # Convert to list of dictionaries
-                data = []
-                for row in rows:
-                    row_dict = {}
-                    for i, col in enumerate(columns):
-                        value = row[i]
-                        # Handle datetime objects
-                        if isinstance(value, datetime):
-                            row_dict[col] = value.isoformat()
-                        else:
-                            row_dict[col] = value
-                    data.append(row_dict)
-                
-                return data
+            return guarded_query_executor.execute(self._query_engine(user_id), query)
+        except SQLGuardError as e:
+            print(f"Rejected AI query: {e}")
+            return GuardedResult([], [], False, guarded_query_executor.row_limit, error=str(e))
         except Exception as e:
             print(f"Database query error: {e}")
-            return []
+            return GuardedResult([], [], False, guarded_query_executor.row_limit, error="the database returned an error")
+    
+    def query_database(self, query: str, user_id: int = None, start_date: datetime = None, end_date: datetime = None) -> List[Dict[str, Any]]:
+        """Execute database query with optional filters"""
+        return self.run_report_query(query, user_id).rows
     
     def generate_chart_code(self, chart_type: str, data: List[Dict], user_prompt: str) -> str:
         """Generate Plotly chart code based on user requirements"""
+        return ai_pipeline.run(self.agenerate_chart_code(chart_type, data, user_prompt))
+    
+    async def agenerate_chart_code(self, chart_type: str, data: List[Dict], user_prompt: str) -> str:
+        """Generate Plotly chart code based on user requirements (async)"""
         
         prompt_template = ChatPromptTemplate.from_messages([
             ("system", """You are an expert data visualization specialist. Generate Python code using Plotly that creates the requested chart.
@@ -305,8 +413,8 @@ class AIReportGenerator:
         data_sample = data[:3] if data else [{"example": "No data available"}]
         
         try:
-            self._ensure_llm_initialized()
-            response = self.llm.invoke(
+            await ai_pipeline.to_thread(self._ensure_llm_initialized)
+            response = await self._llm_ainvoke(
                 prompt_template.format_messages(
                     data_sample=str(data_sample),
                     chart_type=chart_type,
@@ -353,34 +461,10 @@ fig.to_json()
 """
     
     def execute_chart_code(self, code: str, data: List[Dict]) -> str:
-        """Safely execute chart generation code"""
+        """Execute chart generation code in the sandboxed worker pool"""
         try:
-            # Create execution environment
-            exec_globals = {
-                'go': go,
-                'data': data,
-                'datetime': datetime,
-                'timedelta': timedelta,
-                'json': json
-            }
-            
-            # Execute the code
-            exec(code, exec_globals)
-            
-            # The code should create 'fig' variable and call fig.to_json()
-            if 'fig' in exec_globals:
-                return exec_globals['fig'].to_json()
-            else:
-                # If no fig variable, create a simple chart
-                fallback_fig = go.Figure()
-                fallback_fig.add_annotation(
-                    text="Chart generation error",
-                    x=0.5, y=0.5,
-                    showarrow=False
-                )
-                return fallback_fig.to_json()
-                
-        except Exception as e:
+            return chart_sandbox.run(code, data)
+        except ChartSandboxError as e:
             print(f"Chart execution error: {e}")
             # Return error chart
             error_fig = go.Figure()
@@ -391,8 +475,85 @@ fig.to_json()
             )
             return error_fig.to_json()
     
-    def process_user_query(self, user_query: str, user_id: int, time_period: str = "all") -> Dict[str, Any]:
-        """Process user query and generate report with visualization"""
+    def build_chart(self, chart_type: str, data: List[Dict], user_prompt: str, title: str = "") -> tuple:
+        """Build chart JSON, using a template renderer when one fits and the LLM otherwise
+
+        Returns (chart_json, generated_code); generated_code is None when a template was used.
+        """
+        return ai_pipeline.run(self.abuild_chart(chart_type, data, user_prompt, title))
+    
+    async def abuild_chart(self, chart_type: str, data: List[Dict], user_prompt: str, title: str = "") -> tuple:
+        """Async version of build_chart; rendering and sandbox execution run in the pipeline thread pool"""
+        chart_json = await ai_pipeline.to_thread(chart_template_renderer.render, chart_type, data, title)
+        if chart_json is not None:
+            return chart_json, None
+        
+        # No template fits this result shape - ask the LLM to write the chart code
+        chart_code = await self.agenerate_chart_code(chart_type, data, user_prompt)
+        return await ai_pipeline.to_thread(self.execute_chart_code, chart_code, data), chart_code
+    
+    async def _prepare_analysis(self, user_query: str, user_id: int, time_period: str):
+        """Prepare everything the analysis LLM call needs
+
+        The chart sandbox warm-up is started in the background and keeps going while the
+        analysis call is in flight. The knowledge base is loaded with the LLM client, under
+        the same lock.
+        """
+        if self._sandbox_warmup is None:
+            self._sandbox_warmup = asyncio.ensure_future(ai_pipeline.to_thread(chart_sandbox.start))
+        await ai_pipeline.to_thread(self._ensure_llm_initialized)
+        return self._build_analysis_messages(user_query, user_id, time_period)
+    
+    def _speculate(self, user_query: str, user_id: int, app=None):
+        """Start the fallback analysis's query and template chart; returns (analysis, task) or None
+
+        Runs while the analysis LLM call is in flight. Its result is only used when the analysis
+        settles on the same query - the LLM response could not be parsed - so that answer is
+        ready as soon as the LLM returns.
+        """
+        if not AI_SPECULATIVE_FALLBACK:
+            return None
+        analysis = self._fallback_analysis(user_query, user_id)
+        
+        async def run():
+            result = await ai_pipeline.to_thread(self.run_report_query, analysis["sql_query"], user_id, app=app)
+            chart_json = await ai_pipeline.to_thread(
+                chart_template_renderer.render, analysis["chart_type"], result.rows, self._chart_title(analysis))
+            return result, chart_json
+        
+        task = asyncio.ensure_future(run())
+        # A discarded speculation must not log "exception was never retrieved"
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        return analysis, task
+    
+    async def _speculative_result(self, speculation, analysis: Dict[str, str]):
+        """(result, chart_json) from the speculation if the analysis uses its query, else None"""
+        if speculation is None:
+            return None
+        speculated, task = speculation
+        if speculated["sql_query"] != analysis["sql_query"]:
+            task.cancel()
+            return None
+        try:
+            return await task
+        except Exception:
+            return None
+    
+    async def _query_and_chart(self, analysis: Dict[str, str], user_query: str, user_id: int, speculation, app=None):
+        """Run the analysis SQL (or reuse the speculative run) -> (result, chart_json, chart_code)"""
+        speculative = await self._speculative_result(speculation, analysis)
+        if speculative is None:
+            result = await ai_pipeline.to_thread(self.run_report_query, analysis["sql_query"], user_id, app=app)
+            chart_json = None
+        else:
+            result, chart_json = speculative
+        if chart_json is not None:
+            return result, chart_json, None
+        chart_json, chart_code = await self.abuild_chart(analysis["chart_type"], result.rows, user_query, self._chart_title(analysis))
+        return result, chart_json, chart_code
+    
+    def _build_analysis_messages(self, user_query: str, user_id: int, time_period: str = "all"):
+        """Build the SQL/chart analysis prompt; returns (messages, start_date, end_date)"""
         
         # Calculate date range based on time period
         end_date = datetime.now()
@@ -413,11 +574,13 @@ fig.to_json()
         context = getattr(self, 'knowledge_base', '') or ""
         
         # Generate SQL query and chart type
+        # The explanation comes first so a streamed response can show it before the SQL is complete
         analysis_prompt = ChatPromptTemplate.from_messages([
             ("system", """You are a manufacturing data analyst. Based on the user query, generate:
-            1. A SQL query to extract the needed data
-            2. The appropriate chart type
-            3. A brief explanation
+            1. A brief explanation
+            2. A short chart title (at most 8 words)
+            3. The appropriate chart type
+            4. A SQL query to extract the needed data
             
             CONTEXT FROM KNOWLEDGE BASE:
             {context}
@@ -427,7 +590,9 @@ fig.to_json()
             TIME FILTER SQL: {time_context}
             
             IMPORTANT GUIDELINES:
-            - Use exact table names: work_orders, manufacturing_orders, users, work_centers, components
+            - Prefer the analytics tables for aggregates and trends: fact_work_order_completions, fact_stock_movements,
+              dim_date, dim_users, dim_work_centers, dim_components
+            - Operational table names: work_orders, manufacturing_orders, users, work_centers, components
             - Use correct enum names: 'COMPLETED', 'PENDING', 'STARTED', 'PAUSED' for work orders
             - Manufacturing order statuses: 'PLANNED', 'IN_PROGRESS', 'DONE', 'CANCELED'
             - Handle NULL values with COALESCE() or IS NOT NULL checks
@@ -440,48 +605,66 @@ fig.to_json()
             
             Return your response in this JSON format:
             {{
-                "sql_query": "SELECT ...",
+                "explanation": "Brief explanation of what this shows",
+                "title": "Short chart title",
                 "chart_type": "bar|line|pie|scatter|histogram",
-                "explanation": "Brief explanation of what this shows"
+                "sql_query": "SELECT ..."
             }}"""),
             ("human", "User query: {user_query}")
         ])
         
+        messages = analysis_prompt.format_messages(
+            context=context,
+            user_id=user_id,
+            time_period=time_period,
+            time_context=time_context,
+            user_query=user_query
+        )
+        return messages, start_date, end_date
+    
+    @staticmethod
+    def _chart_title(analysis: Dict[str, str]) -> str:
+        """The analysis's short chart title (the explanation is too long for one); empty lets the chart name itself"""
+        return str(analysis.get("title") or "").strip()[:80]
+    
+    def _parse_analysis(self, response_text: str, user_query: str, user_id: int) -> Dict[str, str]:
+        """Extract the analysis JSON from the LLM response, falling back to canned queries"""
+        response_text = response_text.strip()
+        
+        # Try to extract JSON from response
+        if "{" in response_text and "}" in response_text:
+            json_start = response_text.find("{")
+            json_end = response_text.rfind("}") + 1
+            json_str = response_text[json_start:json_end]
+            
+            try:
+                return json.loads(json_str)
+            except json.JSONDecodeError:
+                pass
+        
+        # Fallback analysis
+        return self._fallback_analysis(user_query, user_id)
+    
+    def process_user_query(self, user_query: str, user_id: int, time_period: str = "all") -> Dict[str, Any]:
+        """Process user query and generate report with visualization"""
+        return ai_pipeline.run(self.aprocess_user_query(
+            user_query, user_id, time_period, app=current_app._get_current_object()
+        ))
+    
+    async def aprocess_user_query(self, user_query: str, user_id: int, time_period: str = "all", app=None) -> Dict[str, Any]:
+        """Async pipeline behind process_user_query: analysis -> SQL -> chart"""
+        speculation = None
         try:
-            self._ensure_llm_initialized()
-            response = self.llm.invoke(
-                analysis_prompt.format_messages(
-                    context=context,
-                    user_id=user_id,
-                    time_period=time_period,
-                    time_context=time_context,
-                    user_query=user_query
-                )
-            )
+            messages, start_date, end_date = await self._prepare_analysis(user_query, user_id, time_period)
+            speculation = self._speculate(user_query, user_id, app=app)
+            response = await self._llm_ainvoke(messages)
             
             # Parse response
-            response_text = response.content.strip()
-            
-            # Try to extract JSON from response
-            if "{" in response_text and "}" in response_text:
-                json_start = response_text.find("{")
-                json_end = response_text.rfind("}") + 1
-                json_str = response_text[json_start:json_end]
-                
-                try:
-                    analysis = json.loads(json_str)
-                except json.JSONDecodeError:
-                    # Fallback analysis
-                    analysis = self._fallback_analysis(user_query, user_id)
-            else:
-                analysis = self._fallback_analysis(user_query, user_id)
-            
-            # Execute SQL query
-            data = self.query_database(analysis["sql_query"], user_id, start_date, end_date)
+            analysis = self._parse_analysis(response.content, user_query, user_id)
             
-            # Generate chart
-            chart_code = self.generate_chart_code(analysis["chart_type"], data, user_query)
-            chart_json = self.execute_chart_code(chart_code, data)
+            # Execute SQL query and generate chart
+            result, chart_json, chart_code = await self._query_and_chart(analysis, user_query, user_id, speculation, app=app)
+            data = result.rows
             
             return {
                 "success": True,
@@ -492,7 +675,9 @@ fig.to_json()
                 "chart_json": chart_json,  # Keep for backwards compatibility
                 "chart_type": analysis["chart_type"],
                 "sql_query": analysis["sql_query"],
-                "generated_code": chart_code
+                "generated_code": chart_code,
+                "truncated": result.truncated,
+                "notice": result.notice
             }
             
         except Exception as e:
@@ -502,6 +687,83 @@ fig.to_json()
                 "error": str(e),
                 "explanation": "Failed to process query"
             }
+        finally:
+            if speculation is not None:
+                speculation[1].cancel()
+    
+    def stream_user_query(self, user_query: str, user_id: int, time_period: str = "all") -> Iterator[Dict[str, Any]]:
+        """Process a user query stage by stage, yielding an event as each stage completes
+
+        Events, in order: explanation_delta (LLM tokens of the explanation), explanation,
+        sql, data, chart and finally done (the same payload process_user_query returns).
+        An error event ends the stream if a stage fails.
+        """
+        return ai_pipeline.iterate(self.astream_user_query(
+            user_query, user_id, time_period, app=current_app._get_current_object()
+        ))
+    
+    async def astream_user_query(self, user_query: str, user_id: int, time_period: str = "all", app=None) -> AsyncIterator[Dict[str, Any]]:
+        """Async generator behind stream_user_query"""
+        speculation = None
+        try:
+            messages, start_date, end_date = await self._prepare_analysis(user_query, user_id, time_period)
+            speculation = self._speculate(user_query, user_id, app=app)
+            
+            # Stream the analysis and forward the explanation text as it is generated
+            response_text = ""
+            explanation_sent = ""
+            async with ai_pipeline.llm_slots:
+                async for chunk in self.llm.astream(messages):
+                    response_text += chunk.content or ""
+                    partial = _partial_json_string(response_text, "explanation")
+                    if partial is not None and len(partial) > len(explanation_sent):
+                        yield {"event": "explanation_delta", "text": partial[len(explanation_sent):]}
+                        explanation_sent = partial
+            
+            analysis = self._parse_analysis(response_text, user_query, user_id)
+            yield {"event": "explanation", "text": analysis["explanation"]}
+            yield {"event": "sql", "sql_query": analysis["sql_query"], "chart_type": analysis["chart_type"]}
+            
+            speculative = await self._speculative_result(speculation, analysis)
+            if speculative is None:
+                result = await ai_pipeline.to_thread(self.run_report_query, analysis["sql_query"], user_id, app=app)
+                chart_json = None
+            else:
+                result, chart_json = speculative
+            data = result.rows
+            yield {"event": "data", "data": data, "truncated": result.truncated, "notice": result.notice}
+            
+            chart_code = None
+            if chart_json is None:
+                chart_json, chart_code = await self.abuild_chart(analysis["chart_type"], data, user_query, self._chart_title(analysis))
+            yield {"event": "chart", "chart_json": chart_json, "generated_code": chart_code}
+            
+            yield {
+                "event": "done",
+                "success": True,
+                "response": analysis["explanation"],
+                "explanation": analysis["explanation"],
+                "data": data,
+                "chart_data": chart_json,
+                "chart_json": chart_json,
+                "chart_type": analysis["chart_type"],
+                "sql_query": analysis["sql_query"],
+                "generated_code": chart_code,
+                "truncated": result.truncated,
+                "notice": result.notice
+            }
+            
+        except Exception as e:
+            print(f"Query streaming error: {e}")
+            yield {
+                "event": "error",
+                "success": False,
+                "error": str(e),
+                "explanation": "Failed to process query"
+            }
+        finally:
+            if speculation is not None:
+                speculation[1].cancel()
     
     def _fallback_analysis(self, user_query: str, user_id: int) -> Dict[str, str]:
         """Fallback analysis when AI parsing fails"""
@@ -519,7 +781,8 @@ fig.to_json()
                 LIMIT 30
                 """,
                 "chart_type": "line",
-                "explanation": "Shows daily work order completion trend for the last 30 days"
+                "explanation": "Shows daily work order completion trend for the last 30 days",
+                "title": "Work Orders Completed per Day"
             }
         elif "cost" in query_lower:
             return {
@@ -532,7 +795,8 @@ fig.to_json()
                 LIMIT 20
                 """,
                 "chart_type": "bar",
-                "explanation": "Shows work orders by cost (actual or estimated)"
+                "explanation": "Shows work orders by cost (actual or estimated)",
+                "title": "Work Order Costs"
             }
         elif "manufacturing" in query_lower or "orders" in query_lower:
             return {
@@ -547,7 +811,8 @@ fig.to_json()
                 LIMIT 20
                 """,
                 "chart_type": "bar",
-                "explanation": "Shows recent manufacturing orders by product and quantity"
+                "explanation": "Shows recent manufacturing orders by product and quantity",
+                "title": "Recent Manufacturing Orders"
             }
         else:
             return {
@@ -557,7 +822,8 @@ fig.to_json()
                 GROUP BY status
                 """,
                 "chart_type": "pie",
-                "explanation": "Shows distribution of all work order statuses"
+                "explanation": "Shows distribution of all work order statuses",
+                "title": "Work Orders by Status"
             }
 
 # Global instance
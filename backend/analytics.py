@@ -0,0 +1,254 @@
+"""
+Incremental refresh of the analytics star schema from the OLTP tables
+"""
+import os
+import time
+import threading
+from datetime import datetime, timedelta
+from typing import List, Dict, Any
+from sqlalchemy import exists
+from sqlalchemy.dialects import postgresql, sqlite
+from read_replicas import use_primary
+from models import (db, User, WorkCenter, Component, WorkOrder, WorkOrderStatus, ManufacturingOrder,
+                    StockMovement, DimDate, DimUser, DimWorkCenter, DimComponent,
+                    FactWorkOrderCompletion, FactStockMovement, AnalyticsRefreshState)
+
+
+# Seconds between refreshes of `flask refresh-analytics --watch` (see example.env)
+ANALYTICS_REFRESH_INTERVAL = int(os.getenv('ANALYTICS_REFRESH_INTERVAL', '60'))
+ANALYTICS_BATCH_SIZE = int(os.getenv('ANALYTICS_BATCH_SIZE', '1000'))
+
+# Re-read rows slightly behind the watermark so late commits are not missed
+COMPLETION_OVERLAP = timedelta(minutes=5)
+
+
+def date_key(value) -> int:
+    return value.year * 10000 + value.month * 100 + value.day
+
+
+def _upsert(model, rows: List[Dict[str, Any]], key: str):
+    """Bulk INSERT ... ON CONFLICT DO UPDATE for PostgreSQL and SQLite"""
+    if not rows:
+        return
+    dialect = db.session.get_bind().dialect.name
+    insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+    for start in range(0, len(rows), ANALYTICS_BATCH_SIZE):
+        statement = insert(model.__table__).values(rows[start:start + ANALYTICS_BATCH_SIZE])
+        updates = {column.name: statement.excluded[column.name]
+                   for column in model.__table__.columns if column.name != key}
+        db.session.execute(statement.on_conflict_do_update(index_elements=[key], set_=updates))
+
+
+class AnalyticsRefresher:
+    """Keeps the fact and dimension tables up to date with the OLTP tables
+
+    Refreshes run outside request handling (`flask refresh-analytics`, or with --watch
+    as a background worker), so reports and AI queries read whatever the last refresh wrote
+    and never take write locks on the operational tables themselves.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def _state(self, name: str) -> AnalyticsRefreshState:
+        state = db.session.get(AnalyticsRefreshState, name)
+        if state is None:
+            state = AnalyticsRefreshState(name=name)
+            db.session.add(state)
+        return state
+
+    def _refresh_dimensions(self):
+        """Dimensions are small, so they are re-synced in full each time"""
+        _upsert(DimUser, [{
+            'user_id': user_id,
+            'full_name': f"{first_name or ''} {last_name or ''}".strip(),
+            'email': email,
+            'department': department,
+            'role': role.value if role else None
+        } for user_id, first_name, last_name, email, department, role in db.session.query(
+            User.id, User.first_name, User.last_name, User.email, User.department, User.role
+        )], 'user_id')
+
+        _upsert(DimWorkCenter, [{
+            'work_center_id': wc_id, 'name': name, 'cost_per_hour': cost_per_hour,
+            'capacity': capacity, 'efficiency': efficiency
+        } for wc_id, name, cost_per_hour, capacity, efficiency in db.session.query(
+            WorkCenter.id, WorkCenter.name, WorkCenter.cost_per_hour, WorkCenter.capacity, WorkCenter.efficiency
+        )], 'work_center_id')
+
+        _upsert(DimComponent, [{
+            'component_id': component_id, 'name': name, 'supplier': supplier,
+            'unit_cost': unit_cost, 'reorder_level': reorder_level
+        } for component_id, name, supplier, unit_cost, reorder_level in db.session.query(
+            Component.id, Component.name, Component.supplier, Component.unit_cost, Component.reorder_level
+        )], 'component_id')
+
+    def _refresh_dates(self, days):
+        days = set(days)
+        if not days:
+            return
+        _upsert(DimDate, [{
+            'date_key': date_key(day),
+            'date': day,
+            'year': day.year,
+            'quarter': (day.month - 1) // 3 + 1,
+            'month': day.month,
+            'week': day.isocalendar()[1],
+            'day_of_week': day.isoweekday()
+        } for day in days], 'date_key')
+
+    def _refresh_work_order_completions(self, full: bool) -> int:
+        """Facts for completed work orders
+
+        Work orders changed since the watermark (by updated_at) are re-read whatever their
+        status, so later edits update their fact and reopened ones lose it; facts of deleted
+        work orders are dropped. Order details (product, deadline) are taken as of the work
+        order's last change.
+        """
+        state = self._state('fact_work_order_completions')
+        query = db.session.query(
+            WorkOrder.id, WorkOrder.manufacturing_order_id, ManufacturingOrder.product_name,
+            WorkOrder.assigned_user_id, WorkOrder.work_center_id, WorkOrder.completed_at,
+            WorkOrder.duration_minutes, WorkOrder.actual_duration_minutes, WorkOrder.estimated_cost,
+            WorkOrder.actual_cost, WorkOrder.quality_check, ManufacturingOrder.deadline,
+            WorkOrder.status, WorkOrder.updated_at
+        ).outerjoin(ManufacturingOrder, WorkOrder.manufacturing_order_id == ManufacturingOrder.id)
+        incremental = not full and state.watermark_at is not None
+        if full:
+            db.session.query(FactWorkOrderCompletion).delete()
+        if incremental:
+            query = query.filter(WorkOrder.updated_at >= state.watermark_at - COMPLETION_OVERLAP)
+        else:
+            query = query.filter(WorkOrder.status == WorkOrderStatus.COMPLETED)
+
+        rows, reopened, latest = [], [], state.watermark_at
+        for (wo_id, mo_id, product_name, user_id, wc_id, completed_at, estimated, actual,
+             estimated_cost, actual_cost, quality_check, deadline, status, updated_at) in \
+                query.yield_per(ANALYTICS_BATCH_SIZE):
+            if updated_at is not None and (latest is None or updated_at > latest):
+                latest = updated_at
+            if status != WorkOrderStatus.COMPLETED or completed_at is None:
+                reopened.append(wo_id)
+                continue
+            rows.append({
+                'work_order_id': wo_id,
+                'manufacturing_order_id': mo_id,
+                'product_name': product_name,
+                'user_id': user_id,
+                'work_center_id': wc_id,
+                'date_key': date_key(completed_at),
+                'completed_at': completed_at,
+                'estimated_minutes': estimated,
+                'actual_minutes': actual,
+                'estimated_cost': estimated_cost,
+                'actual_cost': actual_cost,
+                'quality_check': quality_check,
+                'on_time': completed_at <= deadline if deadline else None
+            })
+
+        self._refresh_dates(row['completed_at'].date() for row in rows)
+        _upsert(FactWorkOrderCompletion, rows, 'work_order_id')
+        for start in range(0, len(reopened), ANALYTICS_BATCH_SIZE):
+            db.session.query(FactWorkOrderCompletion).filter(
+                FactWorkOrderCompletion.work_order_id.in_(reopened[start:start + ANALYTICS_BATCH_SIZE])
+            ).delete(synchronize_session=False)
+        if incremental:
+            # Deleted work orders leave no updated_at behind; an anti-join on the primary key finds them
+            db.session.query(FactWorkOrderCompletion).filter(
+                ~exists().where(WorkOrder.id == FactWorkOrderCompletion.work_order_id)
+            ).delete(synchronize_session=False)
+        state.watermark_at = latest
+        state.refreshed_at = datetime.utcnow()
+        return len(rows)
+
+    def _refresh_stock_movements(self, full: bool) -> int:
+        """Facts for stock movements, read by created_at with the same overlap as work orders
+
+        Ids are handed out when a row is inserted, not when it commits, so a lower id can
+        become visible after a higher one; the overlap window re-reads those and the upsert
+        on stock_movement_id keeps re-read rows from being counted twice.
+        """
+        state = self._state('fact_stock_movements')
+        query = db.session.query(
+            StockMovement.id, StockMovement.component_id, StockMovement.created_at,
+            StockMovement.movement_type, StockMovement.quantity, StockMovement.reference, Component.unit_cost
+        ).outerjoin(Component, StockMovement.component_id == Component.id)
+        if full:
+            db.session.query(FactStockMovement).delete()
+        elif state.watermark_at is not None:
+            query = query.filter(StockMovement.created_at >= state.watermark_at - COMPLETION_OVERLAP)
+
+        rows = []
+        for movement_id, component_id, created_at, movement_type, quantity, reference, unit_cost in \
+                query.order_by(StockMovement.id).yield_per(ANALYTICS_BATCH_SIZE):
+            movement_type = (movement_type or '').upper()
+            created_at = created_at or datetime.utcnow()
+            if movement_type == 'IN':
+                signed_quantity = quantity
+            elif movement_type == 'OUT':
+                signed_quantity = -quantity
+            else:
+                signed_quantity = None  # ADJUSTMENT rows record an absolute level, not a delta
+            rows.append({
+                'stock_movement_id': movement_id,
+                'component_id': component_id,
+                'date_key': date_key(created_at),
+                'created_at': created_at,
+                'movement_type': movement_type,
+                'quantity': quantity,
+                'signed_quantity': signed_quantity,
+                'unit_cost': unit_cost,
+                'movement_value': signed_quantity * unit_cost if signed_quantity is not None and unit_cost else None,
+                'reference': reference
+            })
+
+        self._refresh_dates(row['created_at'].date() for row in rows)
+        _upsert(FactStockMovement, rows, 'stock_movement_id')
+        if rows:
+            latest = max(row['created_at'] for row in rows)
+            if state.watermark_at is None or latest > state.watermark_at:
+                state.watermark_at = latest
+        state.refreshed_at = datetime.utcnow()
+        return len(rows)
+
+    def refresh(self, full: bool = False) -> Dict[str, int]:
+        """Bring the analytics tables up to date; full=True rebuilds the fact tables"""
+        with self._lock:
+            try:
+                # Watermarks must be read where the facts are written, not from a lagging replica
+                use_primary(db.session)
+                self._refresh_dimensions()
+                counts = {
+                    'work_order_completions': self._refresh_work_order_completions(full),
+                    'stock_movements': self._refresh_stock_movements(full)
+                }
+                db.session.commit()
+                return counts
+            except Exception:
+                db.session.rollback()
+                raise
+
+    def refreshed_at(self):
+        """When the fact tables were last brought up to date (None before the first refresh)"""
+        return db.session.query(db.func.min(AnalyticsRefreshState.refreshed_at)).scalar()
+
+    def run_forever(self, interval: int = ANALYTICS_REFRESH_INTERVAL):
+        """Refresh every interval seconds in the foreground (`flask refresh-analytics --watch`)"""
+        print(f"📈 Refreshing analytics every {interval}s")
+        try:
+            while True:
+                started = time.monotonic()
+                try:
+                    counts = self.refresh()
+                    if any(counts.values()):
+                        print(f"✅ Analytics refreshed: {counts}")
+                except Exception as e:
+                    # Reports keep serving the previous refresh's data
+                    print(f"⚠️  Analytics refresh failed: {e}")
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            pass
+
+
+# Global instance
+analytics_refresher = AnalyticsRefresher()
@@ -0,0 +1,311 @@
+"""
+Short-lived access tokens, rotating refresh tokens and an in-memory revocation cache
+"""
+import os
+import math
+import time
+import uuid
+import hashlib
+import secrets
+import calendar
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, Tuple
+import jwt
+from models import db, User, UserRole, RefreshToken, RevokedToken
+
+
+# Token tuning (see example.env)
+ACCESS_TOKEN_EXPIRES_MINUTES = int(os.getenv('ACCESS_TOKEN_EXPIRES_MINUTES', '15'))
+REFRESH_TOKEN_EXPIRES_DAYS = int(os.getenv('REFRESH_TOKEN_EXPIRES_DAYS', '14'))
+AUTH_REVOCATION_SYNC_SECONDS = float(os.getenv('AUTH_REVOCATION_SYNC_SECONDS', '5'))
+AUTH_BLOOM_CAPACITY = int(os.getenv('AUTH_BLOOM_CAPACITY', '100000'))
+
+PURGE_INTERVAL_SECONDS = 60
+REFRESH_REUSE_GRACE_SECONDS = 10
+
+
+class TokenRevokedError(jwt.InvalidTokenError):
+    pass
+
+
+class InactiveUserError(jwt.InvalidTokenError):
+    pass
+
+
+class RefreshTokenError(Exception):
+    pass
+
+
+def _epoch(value: datetime) -> float:
+    """Naive UTC datetime to epoch seconds, keeping the microseconds"""
+    return calendar.timegm(value.utctimetuple()) + value.microsecond / 1e6
+
+
+def hash_refresh_token(raw_token: str) -> str:
+    return hashlib.sha256(raw_token.encode()).hexdigest()
+
+
+class BloomFilter:
+    """Fixed-size bloom filter over strings (double hashing on one blake2b digest)"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(1, capacity)
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationCache:
+    """Revoked access tokens held in memory, each entry dropped once no token it covers can still be valid
+
+    Almost every check is for a token that was never revoked: the bloom filter answers those
+    without touching the TTL set, which only confirms the (rare) positives.
+    """
+
+    def __init__(self, capacity: int = AUTH_BLOOM_CAPACITY):
+        self.capacity = capacity
+        self._bloom = BloomFilter(capacity)
+        self._jtis: Dict[str, float] = {}  # jti -> expiry (epoch seconds)
+        self._users: Dict[int, Tuple[float, float]] = {}  # user_id -> (not_before, expiry)
+        self._lock = threading.Lock()
+
+    def add_jti(self, jti: str, expires_at: float):
+        with self._lock:
+            self._jtis[jti] = expires_at
+            self._bloom.add(jti)
+
+    def add_user(self, user_id: int, not_before: float, expires_at: float):
+        with self._lock:
+            current = self._users.get(user_id)
+            if current is None or current[0] < not_before:
+                self._users[user_id] = (not_before, expires_at)
+
+    def is_revoked(self, jti: str, user_id: int, issued_at: float) -> bool:
+        now = time.time()
+        if jti in self._bloom and self._jtis.get(jti, 0) > now:
+            return True
+        user_entry = self._users.get(user_id)
+        return user_entry is not None and issued_at < user_entry[0] and user_entry[1] > now
+
+    def purge(self):
+        """Drop expired entries; the bloom filter can't delete, so it is rebuilt"""
+        now = time.time()
+        with self._lock:
+            self._jtis = {jti: expiry for jti, expiry in self._jtis.items() if expiry > now}
+            self._users = {user_id: entry for user_id, entry in self._users.items() if entry[1] > now}
+            bloom = BloomFilter(max(self.capacity, len(self._jtis) * 2))
+            for jti in self._jtis:
+                bloom.add(jti)
+            self._bloom = bloom
+
+
+class AuthenticatedUser:
+    """The user an access token was issued to
+
+    id, role and is_active come straight from the token claims; any other attribute loads
+    the User row on first use, so most requests never query the users table.
+    """
+
+    def __init__(self, claims: Dict[str, Any]):
+        object.__setattr__(self, 'id', claims['user_id'])
+        object.__setattr__(self, 'role', UserRole(claims['role']))
+        object.__setattr__(self, 'is_active', claims['active'])
+        object.__setattr__(self, 'claims', claims)
+        object.__setattr__(self, '_user', None)
+
+    def _load(self) -> User:
+        if self._user is None:
+            user = db.session.get(User, self.id)
+            if user is None:
+                raise TokenRevokedError('User not found')
+            object.__setattr__(self, '_user', user)
+        return self._user
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+
+class TokenService:
+    """Issues and checks tokens; revocations are shared between workers via the revoked_tokens table"""
+
+    def __init__(self):
+        self.app = None
+        self.cache = RevocationCache()
+        self._last_sync_at = None
+        self._sync_thread = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+
+    @property
+    def _secret(self) -> str:
+        return self.app.config['SECRET_KEY']
+
+    # Issuing
+
+    def issue_access_token(self, user: User) -> str:
+        now = datetime.utcnow()
+        return jwt.encode({
+            'user_id': user.id,
+            'role': user.role.value,
+            'active': bool(user.is_active),
+            'type': 'access',
+            'jti': uuid.uuid4().hex,
+            'iat': _epoch(now),  # Sub-second, so a revocation in the same second still applies
+            'exp': now + timedelta(minutes=ACCESS_TOKEN_EXPIRES_MINUTES)
+        }, self._secret, algorithm='HS256')
+
+    def _new_refresh_token(self, user_id: int) -> Tuple[str, RefreshToken]:
+        raw_token = secrets.token_urlsafe(48)
+        record = RefreshToken(
+            user_id=user_id,
+            token_hash=hash_refresh_token(raw_token),
+            expires_at=datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRES_DAYS)
+        )
+        db.session.add(record)
+        return raw_token, record
+
+    def issue_tokens(self, user: User) -> Dict[str, Any]:
+        """Access + refresh token pair for a freshly authenticated user"""
+        raw_token, _ = self._new_refresh_token(user.id)
+        db.session.commit()
+        return {
+            'token': self.issue_access_token(user),
+            'refresh_token': raw_token,
+            'expires_in': ACCESS_TOKEN_EXPIRES_MINUTES * 60
+        }
+
+    def rotate_refresh_token(self, raw_token: str) -> Dict[str, Any]:
+        """Exchange a refresh token for a new pair; the old refresh token stops working"""
+        record = RefreshToken.query.filter_by(token_hash=hash_refresh_token(raw_token or '')).first()
+        if record is None:
+            raise RefreshTokenError('Invalid refresh token')
+        if record.revoked_at is not None:
+            # A token rotated out a while ago came back: assume it was stolen and end every
+            # session. Inside the grace window it is more likely two tabs refreshing at once.
+            if record.replaced_by_id is not None and \
+                    datetime.utcnow() - record.revoked_at > timedelta(seconds=REFRESH_REUSE_GRACE_SECONDS):
+                self.revoke_user(record.user_id)
+                db.session.commit()
+            raise RefreshTokenError('Refresh token has been revoked')
+        if record.expires_at < datetime.utcnow():
+            raise RefreshTokenError('Refresh token has expired')
+
+        user = db.session.get(User, record.user_id)
+        if user is None or not user.is_active:
+            raise RefreshTokenError('Account is disabled')
+
+        new_raw_token, new_record = self._new_refresh_token(user.id)
+        db.session.flush()
+        record.revoked_at = datetime.utcnow()
+        record.replaced_by_id = new_record.id
+        db.session.commit()
+        return {
+            'token': self.issue_access_token(user),
+            'refresh_token': new_raw_token,
+            'expires_in': ACCESS_TOKEN_EXPIRES_MINUTES * 60,
+            'user': user.to_dict()
+        }
+
+    # Revoking (callers commit)
+
+    def revoke_access_token(self, claims: Dict[str, Any]):
+        expires_at = datetime.utcfromtimestamp(claims['exp'])
+        db.session.add(RevokedToken(jti=claims['jti'], expires_at=expires_at))
+        self.cache.add_jti(claims['jti'], claims['exp'])
+
+    def revoke_refresh_token(self, raw_token: str, user_id: int):
+        RefreshToken.query.filter_by(
+            token_hash=hash_refresh_token(raw_token), user_id=user_id, revoked_at=None
+        ).update({'revoked_at': datetime.utcnow()}, synchronize_session=False)
+
+    def revoke_user(self, user_id: int):
+        """Invalidate every access and refresh token issued to the user so far"""
+        now = datetime.utcnow()
+        expires_at = now + timedelta(minutes=ACCESS_TOKEN_EXPIRES_MINUTES)
+        db.session.add(RevokedToken(user_id=user_id, not_before=now, expires_at=expires_at))
+        RefreshToken.query.filter_by(user_id=user_id, revoked_at=None).update(
+            {'revoked_at': now}, synchronize_session=False)
+        self.cache.add_user(user_id, _epoch(now), _epoch(expires_at))
+
+    # Checking
+
+    def authenticate(self, token: str) -> AuthenticatedUser:
+        """Validate an access token without touching the database"""
+        self._ensure_sync_started()
+        claims = jwt.decode(token, self._secret, algorithms=['HS256'],
+                            options={'require': ['exp', 'iat', 'jti', 'user_id', 'role']})
+        if claims.get('type') != 'access':
+            raise jwt.InvalidTokenError('Not an access token')
+        if not claims.get('active'):
+            raise InactiveUserError('Account is disabled')
+        if self.cache.is_revoked(claims['jti'], claims['user_id'], claims['iat']):
+            raise TokenRevokedError('Token has been revoked')
+        return AuthenticatedUser(claims)
+
+    # Cross-worker sync
+
+    def sync(self):
+        """Load revocations recorded by any worker since the last sync"""
+        started = datetime.utcnow()
+        query = RevokedToken.query.filter(RevokedToken.expires_at > started)
+        if self._last_sync_at is not None:
+            # Overlap the previous window so rows committed late by another worker aren't skipped
+            query = query.filter(RevokedToken.created_at >= self._last_sync_at - timedelta(
+                seconds=AUTH_REVOCATION_SYNC_SECONDS * 2))
+        for row in query:
+            if row.jti:
+                self.cache.add_jti(row.jti, _epoch(row.expires_at))
+            elif row.user_id is not None and row.not_before is not None:
+                self.cache.add_user(row.user_id, _epoch(row.not_before), _epoch(row.expires_at))
+        self._last_sync_at = started
+        db.session.rollback()
+
+    def _ensure_sync_started(self):
+        if self._sync_thread is not None:
+            return
+        with self._lock:
+            if self._sync_thread is not None:
+                return
+            # First sync runs inline so tokens revoked before this worker started are caught
+            self.sync()
+            self._sync_thread = threading.Thread(target=self._sync_loop, name='auth-revocation-sync', daemon=True)
+            self._sync_thread.start()
+
+    def _sync_loop(self):
+        last_purge = time.monotonic()
+        while True:
+            time.sleep(AUTH_REVOCATION_SYNC_SECONDS)
+            with self.app.app_context():
+                try:
+                    self.sync()
+                    if time.monotonic() - last_purge > PURGE_INTERVAL_SECONDS:
+                        self.cache.purge()
+                        RevokedToken.query.filter(RevokedToken.expires_at < datetime.utcnow()).delete()
+                        db.session.commit()
+                        last_purge = time.monotonic()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"⚠️  Token revocation sync failed: {e}")
+
+
+# Global instance
+token_service = TokenService()
@@ -0,0 +1,249 @@
+"""
+Avatar uploads: streamed to disk, resized to WebP thumbnails in a worker pool, stored by content hash
+"""
+import os
+import re
+import base64
+import hashlib
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterable, Iterator, Optional, Tuple
+
+try:
+    import PIL.Image
+except ImportError:
+    PIL = None
+
+
+# Avatar tuning (see example.env)
+AVATAR_STORAGE_DIR = os.path.abspath(os.getenv('AVATAR_STORAGE_DIR', os.path.join('instance', 'avatars')))
+AVATAR_SIZES = tuple(sorted({int(size) for size in os.getenv('AVATAR_SIZES', '64,128,256').split(',') if size.strip()}))
+AVATAR_DEFAULT_SIZE = int(os.getenv('AVATAR_DEFAULT_SIZE', '128'))
+AVATAR_MAX_BYTES = int(os.getenv('AVATAR_MAX_BYTES', str(10 * 1024 * 1024)))
+AVATAR_MAX_PIXELS = int(os.getenv('AVATAR_MAX_PIXELS', str(40 * 1000 * 1000)))
+AVATAR_WEBP_QUALITY = int(os.getenv('AVATAR_WEBP_QUALITY', '80'))
+AVATAR_WORKERS = int(os.getenv('AVATAR_WORKERS', '1'))
+AVATAR_PROCESS_TIMEOUT = float(os.getenv('AVATAR_PROCESS_TIMEOUT', '30'))
+
+AVATAR_URL_PREFIX = '/api/profile/avatars'
+CHUNK_SIZE = 64 * 1024
+
+# Magic bytes of the formats accepted as uploads
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+DIGEST_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+FILENAME_PATTERN = re.compile(r'^(\d+\.webp|original\.(png|jpg|gif|webp))$')
+
+
+class AvatarError(Exception):
+    """The upload is not an acceptable avatar image"""
+
+
+def detect_format(head: bytes) -> Optional[str]:
+    for signature, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def _make_thumbnails(source_path: str, target_dir: str, sizes: Tuple[int, ...], quality: int,
+                     max_pixels: int) -> Tuple[int, ...]:
+    """Worker process: centre-crop the image to squares and write one WebP per size"""
+    from PIL import Image, ImageOps
+    with Image.open(source_path) as image:
+        if image.width * image.height > max_pixels:
+            raise AvatarError(f'Image is too large ({image.width}x{image.height})')
+        # Lets JPEG decode at a reduced scale instead of inflating the full-size image
+        image.draft('RGB', (sizes[-1], sizes[-1]))
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        os.makedirs(target_dir, exist_ok=True)
+        # Largest first, then each smaller size from the previous one: cheaper than resampling the original
+        thumbnail = image
+        for size in reversed(sizes):
+            thumbnail = ImageOps.fit(thumbnail, (size, size), Image.LANCZOS)
+            path = os.path.join(target_dir, f"{size}.webp")
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            thumbnail.save(temp_path, 'WEBP', quality=quality, method=4)
+            os.replace(temp_path, path)
+    return sizes
+
+
+class AvatarStore:
+    """Stores avatars under the SHA-256 of the uploaded bytes, so identical uploads share one set of files
+
+    Uploads are copied to disk in chunks while being hashed; decoding and resizing untrusted
+    images happens in a separate worker process. Without Pillow the original is stored as-is.
+    """
+
+    def __init__(self, storage_dir: str = AVATAR_STORAGE_DIR, sizes: Tuple[int, ...] = AVATAR_SIZES,
+                 workers: int = AVATAR_WORKERS):
+        self.storage_dir = storage_dir
+        self.sizes = sizes
+        self.default_size = AVATAR_DEFAULT_SIZE if AVATAR_DEFAULT_SIZE in sizes else sizes[len(sizes) // 2]
+        self.workers = max(1, workers)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._warned = False
+
+    # Paths and URLs
+
+    def _digest_dir(self, digest: str) -> str:
+        return os.path.join(self.storage_dir, digest[:2], digest)
+
+    def file_path(self, digest: str, filename: str) -> Optional[str]:
+        """Path of a stored avatar file, or None if the name is invalid or it doesn't exist"""
+        if not DIGEST_PATTERN.match(digest) or not FILENAME_PATTERN.match(filename):
+            return None
+        path = os.path.join(self._digest_dir(digest), filename)
+        return path if os.path.isfile(path) else None
+
+    def url(self, digest: str, size: Optional[int] = None) -> str:
+        return f"{AVATAR_URL_PREFIX}/{digest}/{size or self.default_size}.webp"
+
+    def _stored_url(self, digest: str) -> Optional[str]:
+        directory = self._digest_dir(digest)
+        if all(os.path.exists(os.path.join(directory, f"{size}.webp")) for size in self.sizes):
+            return self.url(digest)
+        for extension in ('png', 'jpg', 'gif', 'webp'):
+            if os.path.exists(os.path.join(directory, f"original.{extension}")):
+                return f"{AVATAR_URL_PREFIX}/{digest}/original.{extension}"
+        return None
+
+    # Worker pool
+
+    def _context(self):
+        # Fork workers from a clean server process rather than the (threaded) app
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('forkserver')
+            context.set_forkserver_preload(['PIL.Image'])
+            return context
+        return multiprocessing.get_context('spawn')
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=self._context())
+                print(f"🖼️  Avatar thumbnail pool started with {self.workers} workers")
+            return self._pool
+
+    def _reset_pool(self, broken: ProcessPoolExecutor, terminate: bool = False):
+        with self._pool_lock:
+            if self._pool is broken:
+                self._pool = None
+        if terminate:
+            # shutdown() leaves running tasks alone; a hung worker has to be stopped
+            for process in list((broken._processes or {}).values()):
+                process.terminate()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    # Saving
+
+    def _spool(self, chunks: Iterable[bytes]) -> Tuple[str, str, str]:
+        """Copy chunks to a temp file while hashing; returns (temp path, digest, format)"""
+        temp_dir = os.path.join(self.storage_dir, 'tmp')
+        os.makedirs(temp_dir, exist_ok=True)
+        hasher = hashlib.sha256()
+        size = 0
+        head = b''
+        fd, temp_path = tempfile.mkstemp(dir=temp_dir, suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as output:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if size > AVATAR_MAX_BYTES:
+                        raise AvatarError(f'Avatar must be smaller than {AVATAR_MAX_BYTES // (1024 * 1024)} MB')
+                    if len(head) < 16:
+                        head += chunk[:16]
+                    hasher.update(chunk)
+                    output.write(chunk)
+            image_format = detect_format(head)
+            if size == 0 or image_format is None:
+                raise AvatarError('Invalid image. Please upload PNG, JPG, GIF or WebP')
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return temp_path, hasher.hexdigest(), image_format
+
+    def _store(self, temp_path: str, digest: str, image_format: str) -> str:
+        directory = self._digest_dir(digest)
+        if PIL is None:
+            if not self._warned:
+                print("⚠️  Pillow is not installed: avatars are stored without resizing")
+                self._warned = True
+            os.makedirs(directory, exist_ok=True)
+            os.replace(temp_path, os.path.join(directory, f"original.{image_format}"))
+            return f"{AVATAR_URL_PREFIX}/{digest}/original.{image_format}"
+
+        pool = self._get_pool()
+        try:
+            pool.submit(_make_thumbnails, temp_path, directory, self.sizes, AVATAR_WEBP_QUALITY,
+                        AVATAR_MAX_PIXELS).result(timeout=AVATAR_PROCESS_TIMEOUT)
+        except BrokenProcessPool:
+            self._reset_pool(pool)
+            raise AvatarError('Could not process the image')
+        except FutureTimeoutError:
+            print(f"Avatar processing took longer than {AVATAR_PROCESS_TIMEOUT}s; restarting the pool")
+            self._reset_pool(pool, terminate=True)
+            raise AvatarError('Could not process the image')
+        except AvatarError:
+            raise
+        except Exception as e:
+            print(f"Avatar processing error: {e}")
+            raise AvatarError('Could not read the image')
+        return self.url(digest)
+
+    def save_chunks(self, chunks: Iterable[bytes]) -> str:
+        """Store an uploaded image and return the URL of its default-size avatar"""
+        temp_path, digest, image_format = self._spool(chunks)
+        try:
+            existing = self._stored_url(digest)
+            if existing:
+                return existing
+            return self._store(temp_path, digest, image_format)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def save_file(self, stream) -> str:
+        return self.save_chunks(iter(lambda: stream.read(CHUNK_SIZE), b''))
+
+    def save_data_url(self, data_url: str) -> str:
+        """Store a base64 data: URL, decoding it a chunk at a time"""
+        header, _, encoded = data_url.partition(',')
+        if not header.startswith('data:image') or ';base64' not in header:
+            raise AvatarError('Avatar must be a base64 image data URL')
+        encoded = ''.join(encoded.split())
+        if len(encoded) * 3 // 4 > AVATAR_MAX_BYTES:
+            raise AvatarError(f'Avatar must be smaller than {AVATAR_MAX_BYTES // (1024 * 1024)} MB')
+        return self.save_chunks(self._decode_chunks(encoded))
+
+    @staticmethod
+    def _decode_chunks(encoded: str) -> Iterator[bytes]:
+        step = CHUNK_SIZE // 3 * 4  # Whole base64 quanta so every slice decodes on its own
+        try:
+            for start in range(0, len(encoded), step):
+                yield base64.b64decode(encoded[start:start + step], validate=True)
+        except ValueError:
+            raise AvatarError('Avatar is not valid base64')
+
+
+# Global instance
+avatar_store = AvatarStore()
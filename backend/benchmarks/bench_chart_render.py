@@ -0,0 +1,74 @@
+"""
+Benchmark: chart image rendering for PDF export
+
+Compares rendering every chart inline (the old behaviour) with the render worker pool,
+cold and with a warm content-hash cache.
+
+Usage (from backend/):
+    python benchmarks/bench_chart_render.py --charts 20 --distinct 10 --workers 1,2,4
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import plotly.graph_objects as go
+import plotly.io as pio
+from chart_render import ChartImageRenderer
+
+
+def make_charts(count, distinct):
+    charts = []
+    for i in range(count):
+        seed = i % distinct
+        fig = go.Figure(data=go.Bar(x=[f'Operator {j}' for j in range(20)], y=[(j * seed) % 17 for j in range(20)]))
+        fig.update_layout(title=f'Work orders by user #{seed}')
+        charts.append(fig.to_json())
+    return charts
+
+
+def render_inline(charts):
+    for chart_json in charts:
+        fig = pio.from_json(chart_json)
+        pio.to_image(fig, format='png', width=600, height=400)
+
+
+def timed(label, func, count):
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed:>8.2f} s   {count / elapsed:>8.1f} charts/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--charts', type=int, default=20, help='Charts in the exported chat')
+    parser.add_argument('--distinct', type=int, default=10, help='How many of them are different')
+    parser.add_argument('--workers', default='1,2,4', help='Comma separated pool sizes to try')
+    args = parser.parse_args()
+
+    charts = make_charts(args.charts, args.distinct)
+    print(f"{args.charts} charts ({args.distinct} distinct)\n")
+    timed('inline pio.to_image', lambda: render_inline(charts), args.charts)
+
+    for workers in [int(w) for w in args.workers.split(',')]:
+        cache_dir = tempfile.mkdtemp(prefix='chart_cache_')
+        renderer = ChartImageRenderer(workers=workers, cache_dir=cache_dir)
+        try:
+            # Warm the pool so Kaleido start-up is not counted against the first export
+            renderer.render(make_charts(1, 1)[0], width=100, height=100)
+            timed(f'pool cold ({workers} workers)', lambda: renderer.render_many(charts), args.charts)
+            timed(f'pool warm ({workers} workers)', lambda: renderer.render_many(charts), args.charts)
+            renderer._memory.clear()
+            timed(f'disk cache ({workers} workers)', lambda: renderer.render_many(charts), args.charts)
+        finally:
+            renderer.shutdown()
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark: chart code throughput for concurrent chat requests
+
+Compares the old in-thread exec with the sandboxed process pool at several pool sizes.
+
+Usage (from backend/):
+    python benchmarks/bench_chart_sandbox.py --requests 200 --concurrency 16 --workers 1,2,4,8
+"""
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import plotly.graph_objects as go
+from chart_sandbox import ChartSandbox
+
+CHART_CODE = """
+import plotly.graph_objects as go
+fig = go.Figure(data=go.Bar(x=[row['name'] for row in data], y=[row['value'] for row in data]))
+fig.update_layout(title='Work orders by user')
+fig.to_json()
+"""
+
+SAMPLE_DATA = [{'name': f'Operator {i}', 'value': i * 3} for i in range(50)]
+
+
+def run_in_thread(code, data):
+    exec_globals = {'go': go, 'data': data}
+    exec(code, exec_globals)
+    return exec_globals['fig'].to_json()
+
+
+def measure(label, func, requests, concurrency):
+    latencies = []
+
+    def one_request(_):
+        started = time.perf_counter()
+        func(CHART_CODE, SAMPLE_DATA)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one_request, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    print(f"{label:<24} {requests / elapsed:>10.1f} req/s   p50 {p50:>8.1f} ms   p95 {p95:>8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--workers', default='1,2,4,8', help='Comma separated pool sizes to try')
+    args = parser.parse_args()
+
+    print(f"{args.requests} chart requests, {args.concurrency} concurrent clients\n")
+    measure('in-thread exec', run_in_thread, args.requests, args.concurrency)
+
+    for workers in [int(w) for w in args.workers.split(',')]:
+        sandbox = ChartSandbox(workers=workers)
+        sandbox.start()
+        try:
+            measure(f'sandbox ({workers} workers)', sandbox.run, args.requests, args.concurrency)
+        finally:
+            sandbox.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark: CPU cost per MB vs bytes saved for each response encoding and level
+
+Payloads mirror the big responses: the manufacturing order listing (nested work orders),
+Plotly chart JSON as returned by the AI chat, and the chat's NDJSON stream, which is
+compressed with a flush after every event (the streaming path) as well as in one shot.
+
+Usage (from backend/):
+    python benchmarks/bench_compression.py --orders 2000 --repeat 5
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compression import StreamEncoder, compress, available_encodings
+
+LEVELS = {'gzip': (1, 6, 9), 'br': (1, 4, 6, 11), 'zstd': (1, 3, 9, 19)}
+
+
+def order_listing(orders):
+    rng = random.Random(7)
+    now = datetime(2025, 1, 1, 8, 0, 0)
+    listing = []
+    for i in range(orders):
+        order_id = f"MO-{i + 1:05d}"
+        listing.append({
+            'id': order_id, 'product_name': f'Product {i % 50}', 'quantity': rng.randint(1, 100),
+            'deadline': (now + timedelta(days=rng.randint(1, 90))).isoformat(),
+            'status': rng.choice(['Planned', 'In Progress', 'Done']), 'bom_id': rng.randint(1, 500),
+            'bom_name': f'BOM {rng.randint(1, 500)}', 'priority': rng.choice(['Low', 'Medium', 'High']),
+            'notes': '', 'progress': rng.choice([0, 33.33333333333333, 66.66666666666666, 100.0]),
+            'started_at': None, 'completed_at': None, 'created_at': (now + timedelta(minutes=i)).isoformat(),
+            'work_orders': [{
+                'id': i * 3 + step, 'name': f'Step {step + 1}', 'description': None,
+                'duration_minutes': rng.randint(10, 240), 'actual_duration_minutes': None,
+                'status': rng.choice(['Pending', 'Started', 'Completed']), 'manufacturing_order_id': order_id,
+                'work_center_id': rng.randint(1, 10), 'work_center_name': f'Center {rng.randint(1, 10)}',
+                'assigned_user_id': rng.randint(1, 20), 'assigned_user_name': f'Op{rng.randint(1, 20)} Erator',
+                'sequence': step + 1, 'assigned_to': 'Unassigned', 'started_at': None, 'completed_at': None,
+                'paused_at': None, 'estimated_cost': round(rng.uniform(5, 500), 2),
+                'actual_cost': round(rng.uniform(5, 500), 2), 'notes': None, 'issues': None, 'quality_check': False
+            } for step in range(3)]
+        })
+    return json.dumps(listing, sort_keys=True, separators=(',', ':')).encode()
+
+
+def chart_json(points):
+    rng = random.Random(11)
+    try:
+        import plotly.graph_objects as go
+        fig = go.Figure(data=go.Bar(x=[f'Work center {i}' for i in range(points)],
+                                    y=[round(rng.uniform(0, 1000), 2) for _ in range(points)]))
+        fig.update_layout(title='Completed work orders by work center')
+        return fig.to_json().encode()
+    except ImportError:
+        return json.dumps({'data': [{'type': 'bar', 'x': [f'Work center {i}' for i in range(points)],
+                                     'y': [round(rng.uniform(0, 1000), 2) for _ in range(points)]}]}).encode()
+
+
+def chat_stream(events):
+    rng = random.Random(3)
+    lines = [json.dumps({'event': 'status', 'stage': stage}) + '\n'
+             for stage in ('generating_sql', 'running_query', 'rendering_chart')]
+    for i in range(events):
+        lines.append(json.dumps({'event': 'rows', 'rows': [{'work_center': f'Center {rng.randint(1, 10)}',
+                                                            'completed': rng.randint(0, 500)} for _ in range(20)]}) + '\n')
+    return [line.encode() for line in lines]
+
+
+def measure(func, repeat):
+    samples = []
+    output = None
+    for _ in range(repeat):
+        started = time.process_time()
+        output = func()
+        samples.append(time.process_time() - started)
+    return statistics.median(samples), output
+
+
+def streamed(chunks, encoding, level):
+    encoder = StreamEncoder(encoding, level)
+    return b''.join(encoder.compress(chunk) + encoder.flush() for chunk in chunks) + encoder.finish()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=2000, help='Orders in the listing payload')
+    parser.add_argument('--chart-points', type=int, default=500)
+    parser.add_argument('--stream-events', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    stream = chat_stream(args.stream_events)
+    payloads = [
+        ('order listing', order_listing(args.orders), None),
+        ('chart JSON', chart_json(args.chart_points), None),
+        ('chat NDJSON', b''.join(stream), None),
+        ('chat NDJSON, flushed', b''.join(stream), stream),
+    ]
+    encodings = available_encodings()
+    print(f"Encodings available: {', '.join(encodings)} (install brotli / zstandard for the others)\n")
+    print(f"{'payload':<22} {'encoding':<9} {'level':>5} {'ratio':>7} {'saved KB':>9} "
+          f"{'CPU ms/MB':>10} {'KB saved/CPU ms':>16}")
+    for label, data, chunks in payloads:
+        size_mb = len(data) / (1024 * 1024)
+        print(f"{label:<22} {'identity':<9} {'':>5} {1:>7.1f} {0:>9.0f} {0:>10.1f} {'':>16}  ({len(data) / 1024:.0f} KB)")
+        for encoding in encodings:
+            for level in LEVELS[encoding]:
+                if chunks is None:
+                    seconds, output = measure(lambda: compress(data, encoding, level), args.repeat)
+                else:
+                    seconds, output = measure(lambda: streamed(chunks, encoding, level), args.repeat)
+                saved_kb = (len(data) - len(output)) / 1024
+                cpu_ms = max(seconds * 1000, 1e-6)
+                print(f"{'':<22} {encoding:<9} {level:>5} {len(data) / len(output):>7.1f} {saved_kb:>9.0f} "
+                      f"{cpu_ms / size_mb:>10.1f} {saved_kb / cpu_ms:>16.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark: OTP email throughput, connection-per-message vs the pooled outbox sender
+
+Runs against the local aiosmtpd sink (benchmarks/smtp_sink.py) and a throwaway SQLite
+outbox. Also reports how long the request path spends enqueueing.
+
+Usage (from backend/):
+    python benchmarks/bench_email_outbox.py --emails 500 --threads 1,2,4 --delay-ms 5
+"""
+import os
+import sys
+import time
+import smtplib
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+PORT = 8026
+
+# The outbox reads its SMTP settings at import time
+os.environ.update({
+    'SMTP_SERVER': '127.0.0.1',
+    'SMTP_PORT': str(PORT),
+    'SMTP_STARTTLS': 'false',
+    'EMAIL_USER': 'bench@example.com',
+    'EMAIL_PASSWORD': 'bench'
+})
+
+from flask import Flask
+from models import db, EmailOutbox
+from email_outbox import EmailOutboxSender, SMTPConnectionPool, build_message
+from utils import build_otp_email, OTP_EMAIL_SUBJECT
+from smtp_sink import start_sink
+
+
+def connection_per_message(count):
+    """What utils.send_otp_email used to do inside the request"""
+    for i in range(count):
+        server = smtplib.SMTP('127.0.0.1', PORT)
+        server.login('bench@example.com', 'bench')
+        msg = build_message('bench@example.com', f'user{i}@example.com', OTP_EMAIL_SUBJECT, build_otp_email('123456'))
+        server.sendmail('bench@example.com', f'user{i}@example.com', msg.as_string())
+        server.quit()
+
+
+def outbox(app, sink, count, threads):
+    sender = EmailOutboxSender(threads=threads, pool=SMTPConnectionPool(threads))
+    sender.init_app(app)
+    with app.app_context():
+        EmailOutbox.query.delete()
+        db.session.commit()
+        enqueue_times = []
+        for i in range(count):
+            started = time.perf_counter()
+            db.session.add(EmailOutbox(recipient=f'user{i}@example.com', subject=OTP_EMAIL_SUBJECT,
+                                       html_body=build_otp_email('123456'), status='pending', attempts=0))
+            db.session.commit()
+            enqueue_times.append(time.perf_counter() - started)
+
+    received_before = sink.count
+    started = time.perf_counter()
+    sender.start()
+    while sink.count - received_before < count:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    sender.stop()
+
+    enqueue_times.sort()
+    return elapsed, enqueue_times[len(enqueue_times) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--emails', type=int, default=500)
+    parser.add_argument('--threads', default='1,2,4', help='Comma separated sender thread counts to try')
+    parser.add_argument('--delay-ms', type=float, default=5, help='Simulated provider latency per message')
+    args = parser.parse_args()
+
+    controller, sink = start_sink(port=PORT, delay=args.delay_ms / 1000)
+    database = os.path.join(tempfile.mkdtemp(prefix='outbox_bench_'), 'outbox.db')
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{database}'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+
+    try:
+        print(f"{args.emails} emails, {args.delay_ms:g} ms simulated provider latency\n")
+        started = time.perf_counter()
+        connection_per_message(args.emails)
+        elapsed = time.perf_counter() - started
+        print(f"{'connection per message':<28} {args.emails / elapsed:>8.1f} emails/s   "
+              f"request blocked {elapsed / args.emails * 1000:>7.2f} ms/email")
+
+        for threads in [int(t) for t in args.threads.split(',')]:
+            elapsed, enqueue_ms = outbox(app, sink, args.emails, threads)
+            print(f"{f'outbox ({threads} senders)':<28} {args.emails / elapsed:>8.1f} emails/s   "
+                  f"request blocked {enqueue_ms:>7.2f} ms/email (enqueue p50)")
+    finally:
+        controller.stop()
+
+
+if __name__ == '__main__':
+    main()
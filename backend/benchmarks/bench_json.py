@@ -0,0 +1,130 @@
+"""
+Benchmark: manufacturing order and BOM listings, to_dict() + jsonify vs column tuples + orjson
+
+Seeds a throwaway SQLite database, then times building and encoding the listing responses
+both ways (also checking the bodies are byte-identical). The encode column isolates the
+JSON encoder from the query/dict-building work.
+
+Usage (from backend/):
+    python benchmarks/bench_json.py --orders 10000 --work-orders 3 --repeat 5
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from models import (db, User, UserRole, WorkCenter, Component, BillOfMaterial, BOMComponent,
+                    ManufacturingOrder, OrderStatus, WorkOrder, WorkOrderStatus)
+from serialization import (FastJSONProvider, encode, json_response, manufacturing_order_rows,
+                           bom_rows)
+
+
+def seed(orders, work_orders_per_order, boms, lines_per_bom):
+    rng = random.Random(42)
+    now = datetime(2025, 1, 1, 8, 0, 0)
+    users = [User(email=f'op{i}@example.com', password_hash='x', first_name=f'Op{i}', last_name='Erator',
+                  role=UserRole.OPERATOR) for i in range(20)]
+    centers = [WorkCenter(name=f'Center {i}', cost_per_hour=20 + i) for i in range(10)]
+    components = [Component(name=f'Part {i}', quantity_on_hand=rng.randint(0, 5000),
+                            unit_cost=round(rng.uniform(0.1, 50), 2)) for i in range(200)]
+    db.session.add_all(users + centers + components)
+    db.session.flush()
+
+    bom_ids = []
+    for i in range(boms):
+        bom = BillOfMaterial(name=f'BOM {i}', description='Benchmark BOM', created_at=now)
+        db.session.add(bom)
+        db.session.flush()
+        bom_ids.append(bom.id)
+        for component in rng.sample(components, lines_per_bom):
+            db.session.add(BOMComponent(bom_id=bom.id, component_id=component.id,
+                                        quantity_required=rng.randint(1, 10)))
+
+    statuses = list(OrderStatus)
+    wo_statuses = list(WorkOrderStatus)
+    for i in range(orders):
+        order_id = f"MO-{i + 1:05d}"
+        db.session.add(ManufacturingOrder(
+            id=order_id, product_name=f'Product {i % 50}', quantity=rng.randint(1, 100),
+            deadline=now + timedelta(days=rng.randint(1, 90)), status=rng.choice(statuses),
+            bom_id=rng.choice(bom_ids), priority=rng.choice(['Low', 'Medium', 'High']),
+            notes='', created_at=now + timedelta(minutes=i)
+        ))
+        for sequence in range(work_orders_per_order):
+            status = rng.choice(wo_statuses)
+            db.session.add(WorkOrder(
+                name=f'Step {sequence + 1}', manufacturing_order_id=order_id, duration_minutes=rng.randint(10, 240),
+                status=status, sequence=sequence + 1, work_center_id=rng.choice(centers).id,
+                assigned_user_id=rng.choice(users).id,
+                started_at=now + timedelta(hours=i % 100) if status != WorkOrderStatus.PENDING else None,
+                estimated_cost=round(rng.uniform(5, 500), 2), actual_cost=round(rng.uniform(5, 500), 2)
+            ))
+        if i % 1000 == 999:
+            db.session.flush()
+    db.session.commit()
+
+
+def timed(func, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        db.session.expire_all()
+        started = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=10000)
+    parser.add_argument('--work-orders', type=int, default=3, help='Work orders per manufacturing order')
+    parser.add_argument('--boms', type=int, default=500)
+    parser.add_argument('--lines', type=int, default=10, help='Component lines per BOM')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_json_')
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.json = FastJSONProvider(app)
+    db.init_app(app)
+    stdlib = DefaultJSONProvider(app)
+
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        seed(args.orders, args.work_orders, args.boms, args.lines)
+        print(f"Seeded {args.orders} orders x {args.work_orders} work orders and {args.boms} BOMs x "
+              f"{args.lines} lines in {time.perf_counter() - started:.1f}s\n")
+
+        listings = [
+            ('manufacturing orders',
+             lambda: [order.to_dict() for order in ManufacturingOrder.query.all()], manufacturing_order_rows),
+            ('BOMs', lambda: [bom.to_dict() for bom in BillOfMaterial.query.all()], bom_rows),
+        ]
+        print(f"{'listing':<22} {'path':<26} {'total ms':>9} {'encode ms':>10} {'bytes':>11}")
+        with app.test_request_context():
+            for label, old_rows, new_rows in listings:
+                old_ms, old_body = timed(lambda: stdlib.response(old_rows()).get_data(), args.repeat)
+                new_ms, new_body = timed(lambda: json_response(new_rows()).get_data(), args.repeat)
+                old_data, new_data = old_rows(), new_rows()
+                old_encode_ms, _ = timed(lambda: stdlib.response(old_data).get_data(), args.repeat)
+                new_encode_ms, _ = timed(lambda: encode(new_data, native=True), args.repeat)
+                print(f"{label:<22} {'to_dict + jsonify':<26} {old_ms:>9.1f} {old_encode_ms:>10.1f} {len(old_body):>11}")
+                print(f"{'':<22} {'column tuples + orjson':<26} {new_ms:>9.1f} {new_encode_ms:>10.1f} {len(new_body):>11}")
+                print(f"{'':<22} {'speedup':<26} {old_ms / new_ms:>8.1f}x {old_encode_ms / new_encode_ms:>9.1f}x "
+                      f"{'identical' if old_body == new_body else 'DIFFERENT':>11}")
+
+
+if __name__ == '__main__':
+    main()
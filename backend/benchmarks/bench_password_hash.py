@@ -0,0 +1,71 @@
+"""
+Benchmark: login (password verify) throughput at different hash settings
+
+For each werkzeug method spec, reports single-thread verifies/s (= logins/s per core) and
+the throughput of a burst of concurrent logins through the bounded hashing pool.
+
+Usage (from backend/):
+    python benchmarks/bench_password_hash.py --logins 200 --concurrency 64 \\
+        --methods pbkdf2:sha256:600000,pbkdf2:sha256:260000,scrypt:32768:8:1,scrypt:16384:8:1
+"""
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash, check_password_hash
+from password_hashing import PasswordHasher
+
+PASSWORD = 'correct horse battery staple'
+
+
+def per_core(stored, seconds):
+    count = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        check_password_hash(stored, PASSWORD)
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+def burst(hasher, stored, logins, concurrency):
+    latencies = []
+
+    def one_login(_):
+        started = time.perf_counter()
+        hasher.verify(stored, PASSWORD)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one_login, range(logins)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return logins / elapsed, latencies[int(len(latencies) * 0.95) - 1] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--methods', default='pbkdf2:sha256:600000,pbkdf2:sha256:260000,scrypt:32768:8:1,scrypt:16384:8:1')
+    parser.add_argument('--logins', type=int, default=200, help='Logins in the simulated burst')
+    parser.add_argument('--concurrency', type=int, default=64, help='Concurrent request threads in the burst')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Hashing pool size')
+    parser.add_argument('--seconds', type=float, default=2, help='Measuring time for the per-core figure')
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, pool of {args.workers}, burst of {args.logins} logins from "
+          f"{args.concurrency} threads\n")
+    print(f"{'method':<24} {'logins/s/core':>14} {'burst logins/s':>15} {'burst p95':>12}")
+    for method in args.methods.split(','):
+        stored = generate_password_hash(PASSWORD, method)
+        hasher = PasswordHasher(method=method, workers=args.workers, max_pending=args.logins)
+        rate = per_core(stored, args.seconds)
+        throughput, p95 = burst(hasher, stored, args.logins, args.concurrency)
+        print(f"{method:<24} {rate:>14.1f} {throughput:>15.1f} {p95:>10.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""
+Benchmark: Gunicorn worker models on the I/O-bound AI chat vs the CPU-bound listing endpoints
+
+Seeds a throwaway SQLite database, starts a stand-in LLM server that answers chat
+completions after --llm-latency seconds, then runs gunicorn (with gunicorn.conf.py) once per
+worker model and drives each workload with --concurrency clients. The AI chat spends most
+of its time waiting on the LLM, so it rewards many threads or greenlets per worker; the
+order and BOM listings are CPU-bound, so they mostly scale with the number of processes.
+
+Usage (from backend/, needs gunicorn; gevent for the gevent model):
+    python benchmarks/bench_server.py --models sync,gthread,gevent --workers 2 --threads 8 \\
+        --concurrency 32 --duration 15 --llm-latency 0.5
+"""
+import os
+import sys
+import json
+import math
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+ANALYSIS = {
+    'sql_query': "SELECT wc.name AS work_center, COUNT(*) AS completed FROM work_orders wo "
+                 "JOIN work_centers wc ON wc.id = wo.work_center_id WHERE wo.status = 'COMPLETED' "
+                 "GROUP BY wc.name ORDER BY completed DESC",
+    'chart_type': 'bar',
+    'explanation': 'Completed work orders by work center',
+}
+
+WORKLOADS = {
+    'ai_chat': ('POST', '/api/profile/ai-chat', {'query': 'Completed work orders by work center'}),
+    'order_listing': ('GET', '/api/manufacturing-orders', None),
+    'bom_listing': ('GET', '/api/boms', None),
+}
+
+
+def start_llm_stub(latency):
+    """OpenAI-compatible chat completions endpoint that sleeps, then returns a fixed analysis"""
+    body = json.dumps({
+        'id': 'bench', 'object': 'chat.completion', 'created': 0, 'model': 'llama-3.1-8b-instant',
+        'choices': [{'index': 0, 'finish_reason': 'stop',
+                     'message': {'role': 'assistant', 'content': json.dumps(ANALYSIS)}}],
+        'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2},
+    }).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def seed(database_url, orders):
+    os.environ['DATABASE_URL'] = database_url
+    from app import app
+    from models import db
+    from analytics import analytics_refresher
+    from synthetic_data import SyntheticDataGenerator
+    with app.app_context():
+        db.create_all()
+        SyntheticDataGenerator(seed=3, users=20, orders=orders, movements=orders,
+                               anchor=datetime(2025, 1, 1)).run(manifest_path=None)
+        analytics_refresher.refresh(full=True)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(model, args, database_url, llm_url):
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=database_url, GROQ_API_KEY='bench-key', GROQ_API_BASE=llm_url,
+               GUNICORN_BIND=f'127.0.0.1:{port}', GUNICORN_WORKER_CLASS=model, GUNICORN_WORKERS=str(args.workers),
+               GUNICORN_THREADS=str(args.threads if model == 'gthread' else 1),
+               GUNICORN_WORKER_CONNECTIONS=str(args.concurrency * 2), GUNICORN_ACCESS_LOG='',
+               AI_LLM_CONCURRENCY=str(args.concurrency * 2), AI_PIPELINE_THREADS=str(args.threads))
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn'], cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL if not args.verbose else None)
+    base_url = f'http://127.0.0.1:{port}'
+    for _ in range(600):
+        if process.poll() is not None:
+            raise RuntimeError(f'gunicorn ({model}) exited with code {process.returncode}')
+        try:
+            httpx.get(f'{base_url}/api/stock', timeout=1)
+            return process, base_url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'gunicorn ({model}) did not start')
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))]
+
+
+async def drive(base_url, tokens, workload, concurrency, duration):
+    method, path, body = WORKLOADS[workload]
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        # One untimed request per client warms up lazy state (LLM client, sandbox, caches)
+        await asyncio.gather(*[client.request(method, path, json=body, headers={'Authorization': f'Bearer {token}'})
+                               for token in tokens[:concurrency]])
+        deadline = time.monotonic() + duration
+
+        async def loop(token):
+            nonlocal errors
+            headers = {'Authorization': f'Bearer {token}'}
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, path, json=body, headers=headers)
+                    ok = response.status_code == 200
+                    if ok and workload == 'ai_chat':
+                        ok = response.json().get('success') is True  # Pipeline failures come back as 200
+                except httpx.HTTPError:
+                    ok = False
+                latencies.append(time.perf_counter() - started)
+                errors += not ok
+
+        started = time.monotonic()
+        await asyncio.gather(*[loop(tokens[i % len(tokens)]) for i in range(concurrency)])
+        elapsed = time.monotonic() - started
+    latencies.sort()
+    return {
+        'requests': len(latencies), 'errors': errors, 'rps': len(latencies) / elapsed,
+        'p50': percentile(latencies, 0.50) * 1000, 'p95': percentile(latencies, 0.95) * 1000,
+        'p99': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def login_all(base_url, users):
+    tokens = []
+    with httpx.Client(base_url=base_url, timeout=60) as client:
+        for index in range(1, users + 1):
+            response = client.post('/api/auth/login', json={'email': f'loadtest{index}@example.com',
+                                                             'password': 'loadtest123'})
+            response.raise_for_status()
+            tokens.append(response.json()['token'])
+    return tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--models', default='sync,gthread,gevent', help='Comma-separated gunicorn worker classes')
+    parser.add_argument('--workloads', default=','.join(WORKLOADS))
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8, help='Threads per gthread worker')
+    parser.add_argument('--concurrency', type=int, default=32, help='Concurrent clients')
+    parser.add_argument('--duration', type=float, default=15, help='Seconds per workload')
+    parser.add_argument('--llm-latency', type=float, default=0.5, help='Seconds the stand-in LLM takes to answer')
+    parser.add_argument('--orders', type=int, default=2000)
+    parser.add_argument('--verbose', action='store_true', help="Show gunicorn's log")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_server_')
+    database_url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    started = time.perf_counter()
+    seed(database_url, args.orders)
+    print(f"Seeded {args.orders} orders in {time.perf_counter() - started:.1f}s; LLM latency {args.llm_latency}s, "
+          f"{args.workers} workers, {args.concurrency} clients\n")
+    llm_url = start_llm_stub(args.llm_latency)
+
+    print(f"{'model':<10} {'workload':<15} {'requests':>9} {'errors':>7} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for model in args.models.split(','):
+        try:
+            process, base_url = start_gunicorn(model, args, database_url, llm_url)
+        except RuntimeError as e:
+            print(f"{model:<10} skipped: {e}")
+            continue
+        try:
+            tokens = login_all(base_url, 20)
+            for workload in args.workloads.split(','):
+                result = asyncio.run(drive(base_url, tokens, workload, args.concurrency, args.duration))
+                print(f"{model:<10} {workload:<15} {result['requests']:>9} {result['errors']:>7} {result['rps']:>8.1f} "
+                      f"{result['p50']:>9.1f} {result['p95']:>9.1f} {result['p99']:>9.1f}")
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
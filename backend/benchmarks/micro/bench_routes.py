@@ -0,0 +1,51 @@
+"""
+Hot API routes through the Flask test client, including auth and JSON encoding
+"""
+import itertools
+from datetime import datetime, timedelta
+
+from models import db, ManufacturingOrder, BillOfMaterial, WorkOrder, WorkOrderStatus
+
+COMPLETE_ROUNDS = 50
+BENCH_BOM_ID = 1
+
+_order_numbers = itertools.count(1)
+
+
+def bench_dashboard_summary(benchmark, client, auth_headers):
+    response = benchmark(client.get, '/api/dashboard/summary', headers=auth_headers)
+    assert response.status_code == 200
+
+
+def bench_profile_reports(benchmark, client, auth_headers):
+    # 'all': the seeded data is anchored in the past, so relative periods would drift
+    response = benchmark(client.get, '/api/profile/reports?period=all&page=1&limit=20', headers=auth_headers)
+    assert response.status_code == 200
+
+
+def bench_complete_manufacturing_order(benchmark, app, client, auth_headers):
+    def new_order():
+        # Completion is one-way, so every round gets its own order with stock to consume
+        order_id = f"BENCH-{next(_order_numbers):05d}"
+        with app.app_context():
+            bom = db.session.get(BillOfMaterial, BENCH_BOM_ID)
+            for line in bom.bom_components:
+                line.component.quantity_on_hand = 1_000_000
+            db.session.add(ManufacturingOrder(id=order_id, product_name='Benchmark', quantity=5, bom_id=bom.id,
+                                              deadline=datetime.utcnow() + timedelta(days=7)))
+            db.session.add_all([
+                WorkOrder(name=f'Step {sequence}', manufacturing_order_id=order_id, duration_minutes=60,
+                          status=WorkOrderStatus.PENDING, sequence=sequence, work_center_id=1)
+                for sequence in range(1, 4)
+            ])
+            db.session.commit()
+        return (f'/api/manufacturing-orders/{order_id}/complete',), {'headers': auth_headers}
+
+    response = benchmark.pedantic(client.post, setup=new_order, rounds=COMPLETE_ROUNDS)
+    assert response.status_code == 200, response.get_json()
+
+
+def bench_create_stock_movement(benchmark, client, auth_headers):
+    movement = {'component_id': 1, 'movement_type': 'IN', 'quantity': 1, 'reference': 'PO-BENCH'}
+    response = benchmark(client.post, '/api/stock/movements', json=movement, headers=auth_headers)
+    assert response.status_code == 201
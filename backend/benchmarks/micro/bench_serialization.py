@@ -0,0 +1,44 @@
+"""
+Model serialization and AI query row conversion
+"""
+from models import db, ManufacturingOrder, BillOfMaterial
+from ai_service import ai_report_generator
+
+ORDER_LIMIT = 500
+
+REPORT_SQL = """
+SELECT wo.id, wo.name, wo.status, wo.started_at, wo.completed_at, wo.actual_duration_minutes,
+       wo.actual_cost, mo.product_name, wc.name AS work_center
+FROM work_orders wo
+JOIN manufacturing_orders mo ON mo.id = wo.manufacturing_order_id
+LEFT JOIN work_centers wc ON wc.id = wo.work_center_id
+ORDER BY wo.id
+"""
+
+
+def bench_manufacturing_order_to_dict(benchmark, app):
+    def serialize():
+        # A fresh session per round, so lazy loads of BOMs and work orders are included
+        with app.app_context():
+            return [order.to_dict() for order in ManufacturingOrder.query.order_by(ManufacturingOrder.id).limit(ORDER_LIMIT)]
+
+    orders = benchmark(serialize)
+    assert len(orders) == ORDER_LIMIT
+
+
+def bench_bom_to_dict_cost_rollup(benchmark, app):
+    def serialize():
+        with app.app_context():
+            return [bom.to_dict() for bom in BillOfMaterial.query.order_by(BillOfMaterial.id).all()]
+
+    boms = benchmark(serialize)
+    assert boms and all('total_cost' in bom for bom in boms)
+
+
+def bench_query_database_rows(benchmark, app):
+    def run():
+        with app.app_context():
+            return ai_report_generator.query_database(REPORT_SQL)
+
+    rows = benchmark(run)
+    assert rows and set(rows[0]) >= {'id', 'started_at', 'work_center'}
@@ -0,0 +1,73 @@
+"""
+Fixtures for the pytest-benchmark suite: the real app against a seeded in-memory SQLite database
+
+Runs are saved as JSON baselines under benchmarks/micro/baselines/ and compared with
+--benchmark-compare; any benchmark whose median is slower than the baseline by more than
+--regression-threshold percent fails the run.
+
+Usage (from backend/, needs `pip install pytest-benchmark`):
+    python -m pytest benchmarks/micro --benchmark-save=main        # record a baseline
+    python -m pytest benchmarks/micro --benchmark-compare           # compare with the latest one
+    python -m pytest benchmarks/micro --benchmark-compare=0001 --regression-threshold 10
+"""
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+sys.path.insert(0, BACKEND_DIR)
+
+# Must be set before app is imported: create_app reads it at import time
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+from app import app as flask_app
+from models import db
+from analytics import analytics_refresher
+from synthetic_data import SyntheticDataGenerator, SEED_USER_EMAIL, SEED_USER_PASSWORD
+
+
+def pytest_addoption(parser):
+    parser.addoption('--regression-threshold', type=int,
+                     default=int(os.getenv('BENCHMARK_REGRESSION_THRESHOLD', '15')),
+                     help='With --benchmark-compare, fail benchmarks whose median regressed by more than this percent')
+    parser.addoption('--bench-orders', type=int, default=2000, help='Manufacturing orders to seed')
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config):
+    # Runs before pytest-benchmark reads its options, so these become its defaults
+    if config.getoption('benchmark_storage', None) == 'file://./.benchmarks':
+        config.option.benchmark_storage = f'file://{BASELINE_DIR}'
+    if config.getoption('benchmark_compare', None) and not config.getoption('benchmark_compare_fail', None):
+        from pytest_benchmark.utils import parse_compare_fail
+        config.option.benchmark_compare_fail = [
+            parse_compare_fail(f"median:{config.getoption('regression_threshold')}%")
+        ]
+
+
+@pytest.fixture(scope='session')
+def app(pytestconfig):
+    orders = pytestconfig.getoption('bench_orders')
+    with flask_app.app_context():
+        db.create_all()
+        # Fixed anchor so every run (and every machine) benchmarks identical data
+        SyntheticDataGenerator(seed=7, users=10, components=300, boms=100, orders=orders,
+                               movements=orders * 5, anchor=datetime(2025, 1, 1)).run(manifest_path=None)
+        analytics_refresher.refresh(full=True)
+    # No context is held open: each request gets a fresh one (and session), as in production
+    return flask_app
+
+
+@pytest.fixture(scope='session')
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture(scope='session')
+def auth_headers(client):
+    response = client.post('/api/auth/login', json={'email': SEED_USER_EMAIL.format(1), 'password': SEED_USER_PASSWORD})
+    assert response.status_code == 200, response.get_json()
+    return {'Authorization': f"Bearer {response.get_json()['token']}"}
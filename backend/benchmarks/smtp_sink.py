@@ -0,0 +1,71 @@
+"""
+Local SMTP stand-in for testing the email outbox without a real mail server
+
+Accepts any AUTH LOGIN/PLAIN credentials without TLS and counts (optionally prints) every
+message. Point the app at it with SMTP_SERVER=127.0.0.1 SMTP_PORT=8025 SMTP_STARTTLS=false.
+Needs the aiosmtpd package (pip install aiosmtpd); the app itself does not.
+
+Usage (from backend/):
+    python benchmarks/smtp_sink.py --port 8025 --print
+"""
+import time
+import asyncio
+import argparse
+import threading
+from email import message_from_bytes
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+
+
+class SinkHandler:
+    def __init__(self, delay: float = 0.0, echo: bool = False):
+        self.delay = delay
+        self.echo = echo
+        self.count = 0
+        self._lock = threading.Lock()
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.delay:
+            await asyncio.sleep(self.delay)  # Simulate a slow provider
+        with self._lock:
+            self.count += 1
+        if self.echo:
+            msg = message_from_bytes(envelope.content)
+            print(f"📧 #{self.count} {envelope.mail_from} -> {', '.join(envelope.rcpt_tos)}: {msg['Subject']}")
+        return '250 Message accepted for delivery'
+
+
+def accept_any_login(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=True)
+
+
+def start_sink(host: str = '127.0.0.1', port: int = 8025, delay: float = 0.0, echo: bool = False):
+    """Start the sink on a background thread; returns (controller, handler)"""
+    handler = SinkHandler(delay=delay, echo=echo)
+    controller = Controller(handler, hostname=host, port=port,
+                            authenticator=accept_any_login, auth_require_tls=False)
+    controller.start()
+    return controller, handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8025)
+    parser.add_argument('--delay-ms', type=float, default=0, help='Added latency per message')
+    parser.add_argument('--print', dest='echo', action='store_true', help='Print each message received')
+    args = parser.parse_args()
+
+    controller, handler = start_sink(args.host, args.port, args.delay_ms / 1000, args.echo)
+    print(f"📧 SMTP sink listening on {args.host}:{args.port} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        controller.stop()
+        print(f"Received {handler.count} messages")
+
+
+if __name__ == '__main__':
+    main()
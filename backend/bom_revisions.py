@@ -0,0 +1,201 @@
+"""
+BOM revisions stored as deltas on their parent, with lazily materialized line sets
+"""
+import re
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import select
+from models import db, BillOfMaterial, BOMComponent, BOMRevision, BOMRevisionLine, Component
+
+# component_id -> (quantity_required, notes)
+Lines = Dict[int, Tuple[int, Optional[str]]]
+
+
+class RevisionError(ValueError):
+    pass
+
+
+def next_version(version: Optional[str]) -> str:
+    """'1.0' -> '1.1', '2.9' -> '2.10', 'A' -> 'A.1'"""
+    match = re.match(r'^(.*?)(\d+)$', version or '')
+    if not match:
+        return f"{version or '1'}.1"
+    return f"{match.group(1)}{int(match.group(2)) + 1}"
+
+
+def diff_lines(base: Lines, target: Lines) -> Dict[int, Optional[Tuple[int, Optional[str]]]]:
+    """What turns base into target: component_id -> its new line, or None to remove it"""
+    delta = {component_id: line for component_id, line in target.items() if base.get(component_id) != line}
+    delta.update({component_id: None for component_id in base if component_id not in target})
+    return delta
+
+
+class BOMRevisionStore:
+    """Creates and loads BOM revisions
+
+    A revision stores only the lines that differ from its parent (a NULL quantity removes
+    one), so revising a 500-line BOM writes a handful of rows. Its full line set is built
+    the first time it is needed, by applying deltas from the nearest materialized ancestor,
+    and saved in lines_cache; revisions never change, so the cache never goes stale.
+    """
+
+    def latest(self, bom_id: int) -> Optional[BOMRevision]:
+        return (BOMRevision.query.filter_by(bom_id=bom_id)
+                .order_by(BOMRevision.revision_number.desc()).first())
+
+    def get(self, bom_id: int, revision_number: int) -> Optional[BOMRevision]:
+        return BOMRevision.query.filter_by(bom_id=bom_id, revision_number=revision_number).first()
+
+    def working_lines(self, bom_id: int) -> Lines:
+        """The BOM's current, editable lines (bom_components)"""
+        return {component_id: (quantity, notes) for component_id, quantity, notes in db.session.execute(
+            select(BOMComponent.component_id, BOMComponent.quantity_required, BOMComponent.notes)
+            .where(BOMComponent.bom_id == bom_id))}
+
+    def lines(self, revision: BOMRevision) -> Lines:
+        """The revision's full line set; the first call materializes it (saved on the next commit)"""
+        if revision.lines_cache is not None:
+            return {int(component_id): (line[0], line[1]) for component_id, line in revision.lines_cache.items()}
+
+        # Walk up to the nearest materialized ancestor (or the root) without loading any lines
+        parents = {revision_id: (parent_id, cached) for revision_id, parent_id, cached in db.session.execute(
+            select(BOMRevision.id, BOMRevision.parent_id, BOMRevision.lines_cache.isnot(None))
+            .where(BOMRevision.bom_id == revision.bom_id))}
+        chain, current = [revision.id], parents[revision.id][0]
+        while current is not None and not parents[current][1]:
+            chain.append(current)
+            current = parents[current][0]
+        lines = self.lines(db.session.get(BOMRevision, current)) if current is not None else {}
+
+        deltas: Dict[int, List[Tuple[int, Optional[int], Optional[str]]]] = {}
+        for revision_id, component_id, quantity, notes in db.session.execute(
+                select(BOMRevisionLine.revision_id, BOMRevisionLine.component_id,
+                       BOMRevisionLine.quantity_required, BOMRevisionLine.notes)
+                .where(BOMRevisionLine.revision_id.in_(chain))):
+            deltas.setdefault(revision_id, []).append((component_id, quantity, notes))
+        for revision_id in reversed(chain):
+            for component_id, quantity, notes in deltas.get(revision_id, []):
+                if quantity is None:
+                    lines.pop(component_id, None)
+                else:
+                    lines[component_id] = (quantity, notes)
+
+        revision.lines_cache = {str(component_id): list(line) for component_id, line in lines.items()}
+        return lines
+
+    def _apply_changes(self, lines: Lines, changes: Iterable[Dict[str, Any]]) -> Lines:
+        changes = list(changes)
+        try:
+            component_ids = {int(change['component_id']) for change in changes}
+        except (KeyError, TypeError, ValueError):
+            raise RevisionError('Every change needs a component_id')
+        known = set(db.session.execute(select(Component.id).where(Component.id.in_(component_ids))).scalars())
+        if component_ids - known:
+            raise RevisionError(f"Unknown components: {sorted(component_ids - known)}")
+
+        lines = dict(lines)
+        for change in changes:
+            component_id = int(change['component_id'])
+            if change.get('remove'):
+                if lines.pop(component_id, None) is None:
+                    raise RevisionError(f"Component {component_id} is not on the BOM")
+                continue
+            quantity = change.get('quantity_required')
+            if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+                raise RevisionError(f"quantity_required for component {component_id} must be a whole number of at least 1")
+            notes = change['notes'] if 'notes' in change else lines.get(component_id, (None, None))[1]
+            lines[component_id] = (quantity, notes)
+        return lines
+
+    def _sync_working_lines(self, bom: BillOfMaterial, working: Lines, target: Lines):
+        """Make bom_components match target, touching only the rows that differ"""
+        delta = diff_lines(working, target)
+        if not delta:
+            return
+        existing = {line.component_id: line for line in BOMComponent.query.filter(
+            BOMComponent.bom_id == bom.id, BOMComponent.component_id.in_(list(delta)))}
+        for component_id, line in delta.items():
+            row = existing.get(component_id)
+            if line is None:
+                db.session.delete(row)
+            elif row is None:
+                db.session.add(BOMComponent(bom_id=bom.id, component_id=component_id,
+                                            quantity_required=line[0], notes=line[1]))
+            else:
+                row.quantity_required, row.notes = line
+
+    def create(self, bom: BillOfMaterial, changes: Optional[Iterable[Dict[str, Any]]] = None,
+               parent: Optional[BOMRevision] = None, version: Optional[str] = None, notes: Optional[str] = None,
+               user_id: Optional[int] = None) -> BOMRevision:
+        """Record a revision of the BOM: its current lines plus changes, on top of parent (default: latest)
+
+        Revising from an older parent starts from that revision's lines instead, which
+        also resets the BOM's current lines (a revert). Without changes, the current lines
+        are recorded if they differ from the latest revision (e.g. after an import);
+        otherwise the latest revision is returned as is.
+        """
+        latest = self.latest(bom.id)
+        parent = parent or latest
+        base = self.lines(parent) if parent is not None else {}
+        working = self.working_lines(bom.id)
+        target = dict(working if parent is latest else base)
+        if changes is not None:
+            target = self._apply_changes(target, changes)
+
+        delta = diff_lines(base, target)
+        if parent is not None and not delta:
+            if changes is not None:
+                raise RevisionError('The changes leave the BOM as it is')
+            if parent is latest:
+                return latest
+        self._sync_working_lines(bom, working, target)
+
+        revision = BOMRevision(
+            bom_id=bom.id,
+            revision_number=latest.revision_number + 1 if latest else 1,
+            parent_id=parent.id if parent is not None else None,
+            version=version or (next_version(bom.version) if latest else bom.version or '1.0'),
+            notes=notes,
+            created_by=user_id,
+            created_at=datetime.utcnow()
+        )
+        revision.delta_lines = [BOMRevisionLine(component_id=component_id,
+                                                quantity_required=line[0] if line else None,
+                                                notes=line[1] if line else None)
+                                for component_id, line in delta.items()]
+        bom.version = revision.version
+        db.session.add(revision)
+        db.session.flush()
+        return revision
+
+    def ensure_current(self, bom: BillOfMaterial, user_id: Optional[int] = None) -> BOMRevision:
+        """The revision matching the BOM's current lines, recorded first if they changed"""
+        return self.create(bom, user_id=user_id)
+
+    def for_order(self, order, user_id: Optional[int] = None) -> BOMRevision:
+        """The revision an order is pinned to (orders from before revisions get pinned now)"""
+        if order.bom_revision is None:
+            order.bom_revision = self.ensure_current(order.bill_of_material, user_id)
+        return order.bom_revision
+
+    def describe_lines(self, lines: Lines) -> List[Dict[str, Any]]:
+        """Lines with component names and costs, shaped like BOMComponent.to_dict() (without its row id)"""
+        components = {component_id: (name, unit_cost) for component_id, name, unit_cost in db.session.execute(
+            select(Component.id, Component.name, Component.unit_cost).where(Component.id.in_(list(lines))))}
+        result = []
+        for component_id in sorted(lines):
+            quantity, notes = lines[component_id]
+            name, unit_cost = components.get(component_id, (None, None))
+            result.append({
+                'component_id': component_id,
+                'component_name': name,
+                'quantity_required': quantity,
+                'unit_cost': unit_cost,
+                'total_cost': unit_cost * quantity if unit_cost else 0,
+                'notes': notes
+            })
+        return result
+
+
+# Global instance
+bom_revisions = BOMRevisionStore()
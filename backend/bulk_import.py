@@ -0,0 +1,419 @@
+"""
+Bulk component and BOM import from CSV/XLSX with batched upserts and per-row errors
+"""
+import io
+import os
+import csv
+import shutil
+import tempfile
+from datetime import datetime
+from typing import Any, Callable, Dict, IO, Iterator, List, Optional, Set, Tuple
+from sqlalchemy import select, func, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from read_replicas import use_primary
+from collection_versions import collection_versions
+from where_used import where_used, WhereUsedError
+from bom_revisions import bom_revisions
+from models import db, Component, BillOfMaterial, BOMComponent, StockMovement
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+
+# Import tuning (see example.env)
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '1000'))
+IMPORT_MAX_ERRORS = int(os.getenv('IMPORT_MAX_ERRORS', '1000'))  # Reported; the rest are only counted
+IMPORT_SPOOL_MAX_MEMORY_MB = int(os.getenv('IMPORT_SPOOL_MAX_MEMORY_MB', '16'))  # Larger XLSX uploads spill to disk
+
+IMPORT_KINDS = ('components', 'boms')
+DEFAULT_BOM_VERSION = '1.0'
+
+
+class ImportFormatError(Exception):
+    """The file as a whole can't be imported (unreadable, unknown format, missing columns)"""
+    pass
+
+
+class RowError(ValueError):
+    def __init__(self, field: Optional[str], message: str):
+        super().__init__(message)
+        self.field = field
+
+
+def _header(value) -> str:
+    return str(value or '').strip().lower().replace(' ', '_')
+
+
+def read_rows(stream: IO[bytes], file_format: str) -> Tuple[List[str], Iterator[Tuple[int, Dict[str, Any]]]]:
+    """Column names and an iterator of (row number, row); rows are read as they are consumed"""
+    if file_format == 'csv':
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        reader = csv.reader(text)
+        columns = [_header(name) for name in next(reader, [])]
+
+        def csv_rows():
+            for values in reader:
+                if any(value.strip() for value in values):
+                    yield reader.line_num, dict(zip(columns, values))
+        return columns, csv_rows()
+
+    if file_format == 'xlsx':
+        if openpyxl is None:
+            raise ImportFormatError('XLSX import needs openpyxl (pip install openpyxl); CSV works without it')
+        spool = None
+        if not (hasattr(stream, 'seekable') and stream.seekable()):
+            # XLSX is a zip archive read from its end; a raw request body can only be read forwards
+            spool = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_MAX_MEMORY_MB * 1024 * 1024)
+            shutil.copyfileobj(stream, spool)
+            spool.seek(0)
+            stream = spool
+        try:
+            workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+        except Exception as e:
+            if spool is not None:
+                spool.close()
+            raise ImportFormatError(f"Not a readable XLSX file: {e}")
+        sheet_rows = workbook.active.iter_rows(values_only=True)
+        columns = [_header(name) for name in next(sheet_rows, ())]
+
+        def xlsx_rows():
+            try:
+                for number, values in enumerate(sheet_rows, start=2):
+                    if any(value not in (None, '') for value in values):
+                        yield number, dict(zip(columns, values))
+            finally:
+                workbook.close()
+                if spool is not None:
+                    spool.close()
+        return columns, xlsx_rows()
+
+    raise ImportFormatError(f"Unsupported format '{file_format}' (use csv or xlsx)")
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str] = None) -> str:
+    name = (filename or '').lower()
+    if name.endswith('.xlsx') or 'spreadsheetml' in (content_type or ''):
+        return 'xlsx'
+    return 'csv'
+
+
+def _text(row, field, required=False, max_length=None) -> Optional[str]:
+    value = row.get(field)
+    value = str(value).strip() if value is not None else ''
+    if not value:
+        if required:
+            raise RowError(field, f"{field} is required")
+        return None
+    if max_length and len(value) > max_length:
+        raise RowError(field, f"{field} is longer than {max_length} characters")
+    return value
+
+
+def _number(row, field, kind: Callable, required=False, minimum=0) -> Optional[Any]:
+    value = row.get(field)
+    if value is None or str(value).strip() == '':
+        if required:
+            raise RowError(field, f"{field} is required")
+        return None
+    try:
+        number = float(str(value).strip())
+        if kind is int:
+            if not number.is_integer():
+                raise ValueError
+            number = int(number)
+    except ValueError:
+        raise RowError(field, f"{field} must be {'a whole number' if kind is int else 'a number'}, got '{value}'")
+    if number < minimum:
+        raise RowError(field, f"{field} must be at least {minimum}")
+    return number
+
+
+class ImportResult:
+    def __init__(self, kind: str, dry_run: bool):
+        self.kind = kind
+        self.dry_run = dry_run
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.deleted = 0
+        self.stock_movements = 0
+        self.error_count = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    def error(self, row: int, field: Optional[str], message: str):
+        self.error_count += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({'row': row, 'field': field, 'message': message})
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {
+            'kind': self.kind,
+            'dry_run': self.dry_run,
+            'rows': self.rows,
+            'imported': self.rows - self.error_count,
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'error_count': self.error_count,
+            'errors': sorted(self.errors, key=lambda error: error['row'])  # Reference errors come per batch
+        }
+        if self.kind == 'components':
+            result['stock_movements'] = self.stock_movements
+        else:
+            result['lines_deleted'] = self.deleted
+        return result
+
+
+class BulkImporter:
+    """Imports components or BOMs from a spreadsheet in batches
+
+    Rows are read incrementally and validated one by one; invalid rows are reported with
+    their row number and skipped, the rest are written in batches of IMPORT_BATCH_SIZE
+    with INSERT ... ON CONFLICT DO UPDATE. References (component names on BOM lines,
+    existing rows to update) are resolved once per batch with set lookups. The whole
+    import is one transaction, so a database error leaves nothing half-imported.
+
+    Components are keyed by name and BOMs by (name, version); a BOM line by its BOM and
+    component. Empty cells leave an existing row's value unchanged.
+    """
+
+    def _insert(self):
+        return postgresql.insert if db.session.get_bind().dialect.name == 'postgresql' else sqlite.insert
+
+    def run(self, kind: str, stream: IO[bytes], file_format: str = 'csv', dry_run: bool = False,
+            replace_lines: bool = False, user_id: Optional[int] = None) -> Dict[str, Any]:
+        if kind not in IMPORT_KINDS:
+            raise ImportFormatError(f"Unknown import '{kind}' (use {' or '.join(IMPORT_KINDS)})")
+        columns, rows = read_rows(stream, file_format)
+        required = {'components': ('name',), 'boms': ('bom_name', 'component_name', 'quantity_required')}[kind]
+        missing = [column for column in required if column not in columns]
+        if missing:
+            raise ImportFormatError(f"Missing column{'s' if len(missing) > 1 else ''}: {', '.join(missing)}")
+
+        result = ImportResult(kind, dry_run)
+        use_primary(db.session)
+        try:
+            if kind == 'components':
+                repriced, changed_boms = self._import_components(rows, set(columns), result), set()
+                tables = ['components']
+            else:
+                repriced, changed_boms = set(), self._import_boms(rows, result, replace_lines)
+                tables = ['bills_of_material', 'bom_components']
+            if dry_run:
+                db.session.rollback()
+            else:
+                # Bulk statements bypass the session's change tracking, so bump the ETags
+                # and clear the affected BOM costs by hand
+                collection_versions.bump(db.session.connection(), tables)
+                where_used.invalidate(db.session.connection(), repriced, changed_boms)
+                self._record_revisions(changed_boms, user_id)
+                db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return result.to_dict()
+
+    @staticmethod
+    def _record_revisions(bom_ids: Set[int], user_id: Optional[int]):
+        """Record the imported lines as a revision of each BOM, so new orders pin what was imported
+
+        The BOM keeps its version: (name, version) is how the next import finds it again.
+        """
+        for bom in BillOfMaterial.query.filter(BillOfMaterial.id.in_(bom_ids)).order_by(BillOfMaterial.id):
+            bom_revisions.create(bom, version=bom.version, notes='Imported', user_id=user_id)
+
+    def _batches(self, rows, result: ImportResult, parse: Callable, key: Callable):
+        """Parsed rows in batches; invalid and duplicate rows become errors"""
+        seen: Dict[Any, int] = {}
+        batch = []
+        for number, row in rows:
+            result.rows += 1
+            try:
+                parsed = parse(row)
+            except RowError as e:
+                result.error(number, e.field, str(e))
+                continue
+            row_key = key(parsed)
+            if row_key in seen:
+                result.error(number, None, f"Duplicate of row {seen[row_key]}")
+                continue
+            seen[row_key] = number
+            parsed['_row'] = number
+            batch.append(parsed)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    # Components
+
+    @staticmethod
+    def _parse_component(row) -> Dict[str, Any]:
+        return {
+            'name': _text(row, 'name', required=True, max_length=100),
+            'quantity_on_hand': _number(row, 'quantity_on_hand', int),
+            'unit_cost': _number(row, 'unit_cost', float),
+            'supplier': _text(row, 'supplier', max_length=100),
+            'reorder_level': _number(row, 'reorder_level', int)
+        }
+
+    def _import_components(self, rows, columns: Set[str], result: ImportResult) -> Set[int]:
+        """Upsert components; returns the ids of existing ones whose unit cost changed"""
+        table = Component.__table__
+        repriced = set()
+        defaults = {'quantity_on_hand': 0, 'unit_cost': 0.0, 'supplier': '', 'reorder_level': 10}
+        updatable = [column for column in defaults if column in columns]
+        for batch in self._batches(rows, result, self._parse_component, key=lambda parsed: parsed['name']):
+            names = [parsed['name'] for parsed in batch]
+            existing = {row.name: row for row in db.session.execute(select(
+                Component.id, Component.name, *[table.c[column] for column in defaults]
+            ).where(Component.name.in_(names)))}
+
+            values = []
+            for parsed in batch:
+                # Empty cells keep an existing row's value (NOT NULL is checked before ON CONFLICT) or get the default
+                current = existing.get(parsed['name'])
+                values.append({'name': parsed['name'], **{
+                    column: parsed[column] if parsed[column] is not None else getattr(current, column, default)
+                    for column, default in defaults.items()}})
+            statement = self._insert()(table).values(values)
+            if updatable:
+                statement = statement.on_conflict_do_update(
+                    index_elements=['name'], set_={column: statement.excluded[column] for column in updatable})
+            else:
+                statement = statement.on_conflict_do_nothing(index_elements=['name'])
+            db.session.execute(statement)
+            result.inserted += len(batch) - len(existing)
+            result.updated += len(existing)
+
+            ids = dict(db.session.execute(select(Component.name, Component.id).where(Component.name.in_(names))).all())
+            now = datetime.utcnow()
+            movements = []
+            for parsed in batch:
+                current = existing.get(parsed['name'])
+                if current is not None and parsed['unit_cost'] is not None and parsed['unit_cost'] != current.unit_cost:
+                    repriced.add(current.id)
+                new_quantity = parsed['quantity_on_hand']
+                if current is None and new_quantity:
+                    movements.append({'component_id': ids[parsed['name']], 'movement_type': 'IN', 'quantity': new_quantity,
+                                      'reference': f"Initial stock for {parsed['name']}"[:50], 'created_at': now})
+                elif current is not None and new_quantity is not None and new_quantity != current.quantity_on_hand:
+                    old_quantity = current.quantity_on_hand
+                    movements.append({'component_id': current.id, 'movement_type': 'IN' if new_quantity > old_quantity else 'OUT',
+                                      'quantity': abs(new_quantity - old_quantity),
+                                      'reference': f"Import adjustment: {old_quantity} → {new_quantity}"[:50],
+                                      'created_at': now})
+            if movements:
+                db.session.execute(StockMovement.__table__.insert(), movements)
+                result.stock_movements += len(movements)
+        return repriced
+
+    # BOMs
+
+    @staticmethod
+    def _parse_bom_line(row) -> Dict[str, Any]:
+        return {
+            'bom_name': _text(row, 'bom_name', required=True, max_length=100),
+            'bom_version': _text(row, 'bom_version', max_length=20) or DEFAULT_BOM_VERSION,
+            'bom_description': _text(row, 'bom_description'),
+            'component_name': _text(row, 'component_name', required=True, max_length=100),
+            'quantity_required': _number(row, 'quantity_required', int, required=True, minimum=1),
+            'notes': _text(row, 'notes')
+        }
+
+    def _import_boms(self, rows, result: ImportResult, replace_lines: bool) -> Set[int]:
+        """Upsert BOMs and their lines; returns the ids of the BOMs that had lines written
+
+        A BOM whose imported lines would make it use the component it builds gets its
+        previous lines back, and each of its rows is reported as an error.
+        """
+        boms, lines = BillOfMaterial.__table__, BOMComponent.__table__
+        known_boms: Dict[Tuple[str, str], int] = {}
+        imported_lines: Dict[int, Set[int]] = {}
+        # Per BOM: its lines before the import, the rows written to it and what they did
+        previous_lines: Dict[int, List[Dict[str, Any]]] = {}
+        bom_rows: Dict[int, List[int]] = {}
+        bom_counts: Dict[int, Dict[str, int]] = {}
+        key = lambda parsed: (parsed['bom_name'], parsed['bom_version'], parsed['component_name'])
+        for batch in self._batches(rows, result, self._parse_bom_line, key=key):
+            component_ids = dict(db.session.execute(select(Component.name, Component.id).where(
+                Component.name.in_({parsed['component_name'] for parsed in batch}))).all())
+            valid = []
+            for parsed in batch:
+                if parsed['component_name'] in component_ids:
+                    valid.append(parsed)
+                else:
+                    result.error(parsed['_row'], 'component_name', f"Unknown component '{parsed['component_name']}'")
+
+            headers = {}
+            for parsed in valid:
+                bom_key = (parsed['bom_name'], parsed['bom_version'])
+                if bom_key not in known_boms and (bom_key not in headers or parsed['bom_description']):
+                    headers[bom_key] = parsed['bom_description']
+            if headers:
+                statement = self._insert()(boms).values([
+                    {'name': name, 'version': version, 'description': description or '', 'active': True,
+                     'created_at': datetime.utcnow()} for (name, version), description in headers.items()])
+                db.session.execute(statement.on_conflict_do_update(
+                    index_elements=['name', 'version'],
+                    set_={'description': func.coalesce(func.nullif(statement.excluded.description, ''), boms.c.description)}))
+                for bom_id, name, version in db.session.execute(
+                        select(BillOfMaterial.id, BillOfMaterial.name, BillOfMaterial.version).where(
+                            tuple_(BillOfMaterial.name, BillOfMaterial.version).in_(list(headers)))):
+                    known_boms[(name, version)] = bom_id
+
+            values = [{
+                'bom_id': known_boms[(parsed['bom_name'], parsed['bom_version'])],
+                'component_id': component_ids[parsed['component_name']],
+                'quantity_required': parsed['quantity_required'],
+                'notes': parsed['notes']
+            } for parsed in valid]
+            if not values:
+                continue
+            pairs = [(value['bom_id'], value['component_id']) for value in values]
+            first_seen = {bom_id for bom_id, _ in pairs} - previous_lines.keys()
+            for bom_id in first_seen:
+                previous_lines[bom_id] = []
+            for line in db.session.execute(select(lines).where(lines.c.bom_id.in_(first_seen))).mappings():
+                previous_lines[line['bom_id']].append(dict(line))
+            existing = set(db.session.execute(select(lines.c.bom_id, lines.c.component_id).where(
+                tuple_(lines.c.bom_id, lines.c.component_id).in_(pairs))).all())
+            statement = self._insert()(lines).values(values)
+            db.session.execute(statement.on_conflict_do_update(
+                index_elements=['bom_id', 'component_id'],
+                set_={'quantity_required': statement.excluded.quantity_required,
+                      'notes': func.coalesce(statement.excluded.notes, lines.c.notes)}))
+            for parsed, (bom_id, component_id) in zip(valid, pairs):
+                counts = bom_counts.setdefault(bom_id, {'inserted': 0, 'updated': 0, 'deleted': 0})
+                counts['updated' if (bom_id, component_id) in existing else 'inserted'] += 1
+                bom_rows.setdefault(bom_id, []).append(parsed['_row'])
+                imported_lines.setdefault(bom_id, set()).add(component_id)
+
+        if replace_lines:
+            # Lines of the imported BOMs that the file no longer lists
+            for bom_id, component_ids in imported_lines.items():
+                bom_counts[bom_id]['deleted'] = db.session.execute(lines.delete().where(
+                    lines.c.bom_id == bom_id, lines.c.component_id.notin_(component_ids))).rowcount
+
+        for bom in BillOfMaterial.query.filter(BillOfMaterial.id.in_(list(imported_lines)),
+                                               BillOfMaterial.component_id.isnot(None)).order_by(BillOfMaterial.id):
+            try:
+                where_used.check_cycles(bom)
+            except WhereUsedError as e:
+                db.session.execute(lines.delete().where(lines.c.bom_id == bom.id))
+                if previous_lines[bom.id]:
+                    db.session.execute(lines.insert(), previous_lines[bom.id])
+                for number in bom_rows.pop(bom.id):
+                    result.error(number, 'component_name', str(e))
+                del imported_lines[bom.id], bom_counts[bom.id]
+        for counts in bom_counts.values():
+            result.inserted += counts['inserted']
+            result.updated += counts['updated']
+            result.deleted += counts['deleted']
+        return set(imported_lines)
+
+
+# Global instance
+bulk_importer = BulkImporter()
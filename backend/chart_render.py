@@ -0,0 +1,176 @@
+"""
+Cached, parallel rendering of Plotly chart JSON to PNG for PDF export
+"""
+import os
+import json
+import hashlib
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional
+
+
+# Render tuning (see example.env)
+CHART_RENDER_WORKERS = int(os.getenv('CHART_RENDER_WORKERS', '2'))
+CHART_RENDER_TIMEOUT = float(os.getenv('CHART_RENDER_TIMEOUT', '30'))
+CHART_CACHE_DIR = os.getenv('CHART_CACHE_DIR', os.path.join('instance', 'chart_cache'))
+CHART_CACHE_MEMORY_ITEMS = int(os.getenv('CHART_CACHE_MEMORY_ITEMS', '256'))
+
+
+def _init_render_worker():
+    """Start Kaleido once per worker so later renders reuse the running browser process"""
+    import plotly.graph_objects as go
+    import plotly.io as pio
+    try:
+        pio.to_image(go.Figure(), format='png', width=10, height=10)
+    except Exception as e:
+        # Keep the worker alive; each render will report the error for its own chart
+        print(f"⚠️  Chart render worker could not start Kaleido: {e}")
+
+
+def _render_png(chart_json: str, width: int, height: int) -> bytes:
+    import plotly.graph_objects as go
+    import plotly.io as pio
+    chart_data = json.loads(chart_json)
+    fig = go.Figure(data=chart_data.get('data', []), layout=chart_data.get('layout', {}))
+    return pio.to_image(fig, format='png', width=width, height=height)
+
+
+class ChartImageRenderer:
+    """Renders charts in a persistent Kaleido worker pool behind a memory LRU + disk cache
+
+    Images are keyed by a hash of the chart content and size, so the same chart is only
+    rendered once no matter how many times a chat is exported.
+    """
+
+    def __init__(self, workers: int = CHART_RENDER_WORKERS, cache_dir: str = CHART_CACHE_DIR,
+                 memory_items: int = CHART_CACHE_MEMORY_ITEMS):
+        self.workers = max(1, workers)
+        self.cache_dir = cache_dir
+        self.memory_items = memory_items
+        self._memory = OrderedDict()
+        self._memory_lock = threading.Lock()
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    @staticmethod
+    def cache_key(chart_json: str, width: int, height: int) -> str:
+        try:
+            # Canonicalize so key order and whitespace differences hit the same entry
+            canonical = json.dumps(json.loads(chart_json), sort_keys=True, separators=(',', ':'))
+        except (TypeError, ValueError):
+            canonical = chart_json
+        return hashlib.sha256(f"{width}x{height}:{canonical}".encode()).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.png")
+
+    def _cache_get(self, key: str) -> Optional[bytes]:
+        with self._memory_lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                image = f.read()
+            self._remember(key, image)
+            return image
+        return None
+
+    def _remember(self, key: str, image: bytes):
+        with self._memory_lock:
+            self._memory[key] = image
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def _cache_put(self, key: str, image: bytes):
+        self._remember(key, image)
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so concurrent readers never see a partial file
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(image)
+        os.replace(temp_path, path)
+
+    def _context(self):
+        # Fork render workers from a clean server process rather than the (threaded) app
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('forkserver')
+            context.set_forkserver_preload(['plotly.graph_objects'])
+            return context
+        return multiprocessing.get_context('spawn')
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=self._context(),
+                                                 initializer=_init_render_worker)
+                print(f"🖼️  Chart render pool started with {self.workers} workers")
+            return self._pool
+
+    def render_many(self, chart_jsons: List[str], width: int = 600, height: int = 400) -> List[Optional[bytes]]:
+        """Render a batch of charts to PNG bytes in parallel; failed charts come back as None"""
+        images = [None] * len(chart_jsons)
+        pending = {}
+        for index, chart_json in enumerate(chart_jsons):
+            if not chart_json:
+                continue
+            key = self.cache_key(chart_json, width, height)
+            cached = self._cache_get(key)
+            if cached is not None:
+                images[index] = cached
+            else:
+                pending.setdefault(key, []).append(index)
+
+        if pending:
+            pool = self._get_pool()
+            futures = {key: pool.submit(_render_png, chart_jsons[indexes[0]], width, height)
+                       for key, indexes in pending.items()}
+            for key, future in futures.items():
+                try:
+                    image = future.result(timeout=CHART_RENDER_TIMEOUT)
+                except BrokenProcessPool as e:
+                    # A worker died (e.g. Kaleido crashed); start a fresh pool on the next export
+                    print(f"Error creating chart image: {e}")
+                    self._reset_pool(pool)
+                    continue
+                except FutureTimeoutError:
+                    # A hung render would hold its worker forever; the rest of this batch fails with it
+                    print(f"Chart image took longer than {CHART_RENDER_TIMEOUT}s; restarting the render pool")
+                    self._reset_pool(pool, terminate=True)
+                    continue
+                except Exception as e:
+                    print(f"Error creating chart image: {e}")
+                    continue
+                self._cache_put(key, image)
+                for index in pending[key]:
+                    images[index] = image
+        return images
+
+    def _reset_pool(self, broken: ProcessPoolExecutor, terminate: bool = False):
+        with self._pool_lock:
+            if self._pool is broken:
+                self._pool = None
+        if terminate:
+            # shutdown() leaves running tasks alone; a hung worker has to be stopped
+            for process in list((broken._processes or {}).values()):
+                process.terminate()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def render(self, chart_json: str, width: int = 600, height: int = 400) -> Optional[bytes]:
+        return self.render_many([chart_json], width, height)[0]
+
+    def shutdown(self):
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+# Global instance
+chart_image_renderer = ChartImageRenderer()
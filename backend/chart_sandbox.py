@@ -0,0 +1,276 @@
+"""
+Sandboxed process pool for executing LLM-generated Plotly chart code
+"""
+import os
+import ast
+import math
+import json
+import types
+import signal
+import builtins
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, CancelledError, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Tuple
+from weakref import WeakSet
+
+try:
+    import resource  # Not available on Windows
+except ImportError:
+    resource = None
+
+
+# Pool tuning (see example.env)
+SANDBOX_WORKERS = int(os.getenv('CHART_SANDBOX_WORKERS', str(min(4, os.cpu_count() or 1))))
+SANDBOX_TIMEOUT_SECONDS = float(os.getenv('CHART_SANDBOX_TIMEOUT', '5'))
+SANDBOX_MEMORY_MB = int(os.getenv('CHART_SANDBOX_MEMORY_MB', '1024'))
+
+# Modules chart code is allowed to import
+ALLOWED_IMPORTS = {'plotly', 'math', 'json', 'datetime', 'collections', 'statistics', 'itertools', 'functools', 'decimal'}
+
+SAFE_BUILTINS = [
+    'abs', 'all', 'any', 'bool', 'dict', 'enumerate', 'filter', 'float', 'format', 'frozenset',
+    'int', 'isinstance', 'len', 'list', 'map', 'max', 'min', 'print', 'range', 'reversed',
+    'round', 'set', 'sorted', 'str', 'sum', 'tuple', 'zip', 'None', 'True', 'False',
+    'Exception', 'ValueError', 'TypeError', 'KeyError', 'IndexError', 'ZeroDivisionError',
+]
+
+# Attributes that lead from generators, frames and tracebacks back to real module globals
+BLOCKED_ATTRIBUTES = {
+    'gi_frame', 'gi_code', 'gi_yieldfrom', 'cr_frame', 'cr_code', 'cr_await', 'ag_frame', 'ag_code', 'ag_await',
+    'f_back', 'f_globals', 'f_locals', 'f_builtins', 'f_code', 'tb_frame', 'tb_next',
+}
+
+
+class ChartSandboxError(Exception):
+    """Raised when chart code exceeds its limits or breaks the sandbox"""
+    pass
+
+
+def _raise_time_limit(signum, frame):
+    raise ChartSandboxError("Chart code exceeded its time limit")
+
+
+def check_chart_code(code: str):
+    """Reject code that reaches for private or dunder attributes, names or strings
+
+    Almost every way out of restricted builtins (obj.__class__, func.__globals__,
+    gen.gi_frame.f_back.f_globals, '{0.__init__}'.format(...)) goes through one of these.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        raise ChartSandboxError(f"Chart code is not valid Python: {e.msg} (line {e.lineno})")
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute) and (node.attr.startswith('_') or node.attr in BLOCKED_ATTRIBUTES):
+            raise ChartSandboxError(f"Attribute '{node.attr}' is not allowed in chart code")
+        if isinstance(node, ast.Name) and node.id.startswith('__'):
+            raise ChartSandboxError(f"Name '{node.id}' is not allowed in chart code")
+        if isinstance(node, ast.ImportFrom) and any(alias.name.startswith('_') for alias in node.names):
+            raise ChartSandboxError("Importing private names is not allowed in chart code")
+        if isinstance(node, ast.Constant) and isinstance(node.value, str) and '__' in node.value:
+            raise ChartSandboxError("Strings containing '__' are not allowed in chart code")
+
+
+class _ModuleProxy:
+    """Read-only view of an allowed module: public attributes only, and no route to other modules"""
+    __slots__ = ('_module',)
+
+    def __init__(self, module: types.ModuleType):
+        object.__setattr__(self, '_module', module)
+
+    def __getattribute__(self, name: str):
+        if name.startswith('_'):
+            raise AttributeError(f"'{name}' is not available in chart code")
+        value = getattr(object.__getattribute__(self, '_module'), name)
+        if isinstance(value, types.ModuleType):
+            # e.g. plotly.graph_objects is fine, statistics.sys is not
+            return _proxy_module(value)
+        return value
+
+    def __setattr__(self, name: str, value):
+        raise AttributeError("Modules are read-only in chart code")
+
+    def __repr__(self):
+        return f"<module '{object.__getattribute__(self, '_module').__name__}'>"
+
+
+def _proxy_module(module: types.ModuleType) -> _ModuleProxy:
+    if module.__name__.split('.')[0] not in ALLOWED_IMPORTS:
+        raise AttributeError(f"Module '{module.__name__}' is not available in chart code")
+    return _ModuleProxy(module)
+
+
+def _restricted_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level != 0 or name.split('.')[0] not in ALLOWED_IMPORTS:
+        raise ImportError(f"Import of '{name}' is not allowed in chart code")
+    # Submodules named in fromlist are read through the proxy, which checks them too
+    return _proxy_module(builtins.__import__(name, globals, locals, fromlist, level))
+
+
+def _build_restricted_builtins() -> Dict[str, Any]:
+    safe = {name: getattr(builtins, name) for name in SAFE_BUILTINS}
+    safe['__import__'] = _restricted_import
+    return safe
+
+
+def _init_worker(memory_mb: int):
+    """Worker initializer: apply the memory rlimit and pre-import plotly"""
+    if resource is not None and memory_mb > 0:
+        limit = memory_mb * 1024 * 1024
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+    if hasattr(signal, 'SIGXCPU'):
+        signal.signal(signal.SIGXCPU, _raise_time_limit)
+    if hasattr(signal, 'SIGALRM'):
+        signal.signal(signal.SIGALRM, _raise_time_limit)
+
+    # Warm up plotly so the first chart does not pay the import/validator cost
+    import plotly.graph_objects as go
+    go.Figure(data=go.Bar(x=[1], y=[1])).to_json()
+
+
+def _warm_up() -> int:
+    return os.getpid()
+
+
+def _run_chart_code(code: str, data: List[Dict], time_limit: float) -> Tuple[bool, str]:
+    """Execute chart code inside a worker process; returns (ok, figure_json_or_error)"""
+    import plotly.graph_objects as go
+
+    cpu_limit_set = False
+    if resource is not None:
+        # RLIMIT_CPU is cumulative for the process, so grant this task its share on top of what was used
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        cpu_budget = int(math.ceil(usage.ru_utime + usage.ru_stime + time_limit))
+        if hard == resource.RLIM_INFINITY or cpu_budget < hard:
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_budget, hard))
+            cpu_limit_set = True
+    if hasattr(signal, 'setitimer'):
+        signal.setitimer(signal.ITIMER_REAL, time_limit)
+
+    try:
+        check_chart_code(code)
+        exec_globals = {
+            '__builtins__': _build_restricted_builtins(),
+            'go': _ModuleProxy(go),
+            'data': data,
+            'datetime': datetime,
+            'timedelta': timedelta,
+            'json': _ModuleProxy(json)
+        }
+        exec(code, exec_globals)
+
+        fig = exec_globals.get('fig')
+        if fig is None or not hasattr(fig, 'to_json'):
+            return False, "Chart code did not create a 'fig' figure"
+        return True, fig.to_json()
+    except MemoryError:
+        return False, "Chart code exceeded its memory limit"
+    except Exception as e:
+        return False, str(e)
+    finally:
+        if hasattr(signal, 'setitimer'):
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        if cpu_limit_set:
+            # Raising the soft limit back to RLIM_INFINITY fails whenever hard is finite
+            resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+class ChartSandbox:
+    """Pre-forked pool of warm worker processes that run chart code with limits"""
+
+    def __init__(self, workers: int = SANDBOX_WORKERS, timeout: float = SANDBOX_TIMEOUT_SECONDS,
+                 memory_mb: int = SANDBOX_MEMORY_MB):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self._pool = None
+        self._lock = threading.Lock()
+        # Pools torn down because one chart timed out; the others' charts are retried
+        self._reset_pools = WeakSet()
+
+    def _context(self):
+        methods = multiprocessing.get_all_start_methods()
+        if 'forkserver' in methods:
+            context = multiprocessing.get_context('forkserver')
+            context.set_forkserver_preload(['plotly.graph_objects'])
+            return context
+        return multiprocessing.get_context('spawn')
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=self._context(),
+                    initializer=_init_worker,
+                    initargs=(self.memory_mb,)
+                )
+                # Start every worker now instead of on the first chart requests
+                for future in [self._pool.submit(_warm_up) for _ in range(self.workers)]:
+                    future.result()
+                print(f"📊 Chart sandbox started with {self.workers} workers")
+            return self._pool
+
+    def _reset_pool(self, pool: ProcessPoolExecutor):
+        """Tear down a pool whose worker is stuck or dead; the next call starts a fresh one"""
+        with self._lock:
+            if self._pool is not pool:
+                return
+            self._pool = None
+            self._reset_pools.add(pool)
+        for process in list((getattr(pool, '_processes', None) or {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def start(self):
+        """Start the pool eagerly (e.g. at app startup)"""
+        self._get_pool()
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def run(self, code: str, data: List[Dict]) -> str:
+        """Run chart code in the pool and return the figure JSON
+
+        Raises ChartSandboxError if the code fails, times out or kills its worker. A pool
+        can't lose a single worker without failing every chart in it, so charts caught in a
+        pool reset caused by another chart's timeout are retried once on the new pool.
+        """
+        for attempt in range(2):
+            pool = self._get_pool()
+            try:
+                future = pool.submit(_run_chart_code, code, data, self.timeout)
+                # The worker enforces the limit itself; the extra second only covers a wedged worker
+                ok, result = future.result(timeout=self.timeout + 1)
+                break
+            except FutureTimeoutError:
+                self._reset_pool(pool)
+                raise ChartSandboxError("Chart code exceeded its time limit")
+            except (BrokenProcessPool, CancelledError, RuntimeError) as e:
+                # RuntimeError: submit() on a pool another thread has just shut down
+                bystander = pool in self._reset_pools
+                self._reset_pool(pool)
+                if bystander and attempt == 0:
+                    continue
+                if isinstance(e, BrokenProcessPool):
+                    raise ChartSandboxError("Chart worker crashed while running chart code")
+                raise ChartSandboxError("Chart sandbox was restarting; try again")
+
+        if not ok:
+            raise ChartSandboxError(result)
+        return result
+
+
+# Global instance
+chart_sandbox = ChartSandbox()
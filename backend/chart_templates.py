@@ -0,0 +1,157 @@
+"""
+Deterministic Plotly chart templates for AI report results
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+import plotly.graph_objects as go
+
+
+NUMERIC_TYPES = (int, float, Decimal)
+
+# Columns that usually identify a row rather than measure something
+ID_COLUMN_NAMES = {'id', 'user_id', 'assigned_user_id', 'work_center_id', 'component_id', 'bom_id'}
+
+# Category label for NULL values
+NULL_LABEL = '(none)'
+
+
+def _is_temporal(value) -> bool:
+    """Check whether a value is a date/datetime or an ISO formatted date string"""
+    if isinstance(value, (date, datetime)):
+        return True
+    if isinstance(value, str) and len(value) >= 10 and value[4] == '-' and value[7] == '-':
+        try:
+            datetime.fromisoformat(value.replace('Z', '+00:00'))
+            return True
+        except ValueError:
+            return False
+    return False
+
+
+class ChartTemplateRenderer:
+    """Builds common chart types directly from query results, without the LLM"""
+
+    SUPPORTED_TYPES = ('bar', 'column', 'line', 'pie', 'scatter', 'histogram')
+
+    def infer_schema(self, data: List[Dict[str, Any]]) -> Dict[str, str]:
+        """Classify each result column as 'numeric', 'temporal' or 'categorical'"""
+        schema = {}
+        if not data:
+            return schema
+
+        for column in data[0].keys():
+            sample = next((row[column] for row in data if row.get(column) is not None), None)
+            if isinstance(sample, bool):
+                schema[column] = 'categorical'
+            elif isinstance(sample, NUMERIC_TYPES):
+                schema[column] = 'numeric'
+            elif _is_temporal(sample):
+                schema[column] = 'temporal'
+            else:
+                schema[column] = 'categorical'
+        return schema
+
+    def pick_axes(self, schema: Dict[str, str]) -> Tuple[Optional[str], List[str]]:
+        """Pick the x column and the y columns from the inferred schema"""
+        temporal = [col for col, kind in schema.items() if kind == 'temporal']
+        categorical = [col for col, kind in schema.items() if kind == 'categorical']
+        numeric = [col for col, kind in schema.items() if kind == 'numeric']
+
+        # Prefer measures over identifiers for the y axis
+        measures = [col for col in numeric if col.lower() not in ID_COLUMN_NAMES] or numeric
+
+        if temporal:
+            x_column = temporal[0]
+        elif categorical:
+            x_column = categorical[0]
+        elif len(measures) > 1:
+            x_column = measures[0]
+        else:
+            x_column = None
+
+        y_columns = [col for col in measures if col != x_column]
+        return x_column, y_columns
+
+    def _columns(self, data: List[Dict[str, Any]], schema: Dict[str, str]) -> Dict[str, np.ndarray]:
+        """Column arrays: numeric columns as float64 with NULL as NaN, the others as object arrays
+
+        Everything after this one pass over the rows works on whole columns. Plotly takes the
+        arrays without checking each value and writes numeric ones as typed arrays (base64
+        "bdata", NaN for NULL), which plotly.js decodes.
+        """
+        columns = {}
+        for key, kind in schema.items():
+            values = [row.get(key) for row in data]
+            # Decimal converts through __float__ and None becomes NaN
+            columns[key] = np.array(values, dtype=float) if kind == 'numeric' else np.array(values, dtype=object)
+        return columns
+
+    @staticmethod
+    def _labels(column: np.ndarray) -> np.ndarray:
+        return np.where(np.equal(column, None), NULL_LABEL, column.astype(str))
+
+    @staticmethod
+    def _sort_order(column: np.ndarray, kind: str) -> np.ndarray:
+        """Row order by x, NULLs last (NaN already sorts last)"""
+        if kind == 'numeric':
+            return np.argsort(column, kind='stable')
+        missing = np.equal(column, None)
+        # ISO dates sort correctly as text
+        return np.lexsort((np.where(missing, '', column).astype(str), missing))
+
+    def render(self, chart_type: str, data: List[Dict[str, Any]], title: str = '') -> Optional[str]:
+        """Render a chart to Plotly JSON, or return None if no template fits the data"""
+        chart_type = (chart_type or '').lower()
+        if chart_type not in self.SUPPORTED_TYPES or not data:
+            return None
+
+        schema = self.infer_schema(data)
+        x_column, y_columns = self.pick_axes(schema)
+        columns = self._columns(data, schema)
+
+        fig = None
+        if chart_type in ('bar', 'column'):
+            if x_column is None or not y_columns:
+                return None
+            x_values = self._labels(columns[x_column]) if schema[x_column] == 'categorical' else columns[x_column]
+            fig = go.Figure(data=[go.Bar(x=x_values, y=columns[col], name=col) for col in y_columns])
+            if len(y_columns) > 1:
+                fig.update_layout(barmode='group')
+        elif chart_type == 'line':
+            if x_column is None or not y_columns:
+                return None
+            order = self._sort_order(columns[x_column], schema[x_column])
+            fig = go.Figure(data=[
+                go.Scatter(x=columns[x_column][order], y=columns[col][order], mode='lines+markers', name=col)
+                for col in y_columns
+            ])
+        elif chart_type == 'pie':
+            if x_column is None or not y_columns:
+                return None
+            fig = go.Figure(data=go.Pie(labels=self._labels(columns[x_column]), values=columns[y_columns[0]]))
+        elif chart_type == 'scatter':
+            numeric = [col for col, kind in schema.items() if kind == 'numeric']
+            if len(numeric) < 2:
+                return None
+            x_column, y_columns = numeric[0], [numeric[1]]
+            fig = go.Figure(data=go.Scatter(x=columns[x_column], y=columns[y_columns[0]], mode='markers'))
+        elif chart_type == 'histogram':
+            if not y_columns:
+                return None
+            x_column, y_columns = y_columns[0], []
+            fig = go.Figure(data=go.Histogram(x=columns[x_column]))
+
+        fig.update_layout(title=title or f"{chart_type.title()} Chart")
+        if x_column:
+            fig.update_xaxes(title=x_column.replace('_', ' ').title())
+        if y_columns:
+            fig.update_yaxes(title=y_columns[0].replace('_', ' ').title())
+        elif chart_type == 'histogram':
+            fig.update_yaxes(title='Count')
+        return fig.to_json()
+
+
+# Global instance
+chart_template_renderer = ChartTemplateRenderer()
@@ -0,0 +1,161 @@
+"""
+Server-side AI chat history with compressed, content-addressed payload storage
+"""
+import os
+import gzip
+import json
+import hashlib
+from typing import List, Dict, Any, Optional, Iterable
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, ChatTurn, ChatBlob
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# History storage tuning (see example.env)
+CHAT_HISTORY_COMPRESSION = os.getenv('CHAT_HISTORY_COMPRESSION', 'zstd' if zstandard else 'gzip')
+CHAT_BLOB_MIN_BYTES = int(os.getenv('CHAT_BLOB_MIN_BYTES', '512'))
+CHAT_HISTORY_PAGE_SIZE = int(os.getenv('CHAT_HISTORY_PAGE_SIZE', '20'))
+CHAT_HISTORY_MAX_PAGE_SIZE = 100
+
+
+def _compress(raw: bytes):
+    if len(raw) < CHAT_BLOB_MIN_BYTES:
+        return 'identity', raw
+    if CHAT_HISTORY_COMPRESSION == 'zstd' and zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=3).compress(raw)
+    return 'gzip', gzip.compress(raw, compresslevel=6)
+
+
+def _decompress(encoding: str, data: bytes) -> bytes:
+    if encoding == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('zstandard is required to read zstd-compressed chat history')
+        return zstandard.ZstdDecompressor().decompress(data)
+    if encoding == 'gzip':
+        return gzip.decompress(data)
+    return data
+
+
+class ChatHistoryStore:
+    """Persists chat turns; result rows and chart specs are stored once per distinct content"""
+
+    def _put_blob(self, raw: Optional[bytes]) -> Optional[str]:
+        if not raw:
+            return None
+        digest = hashlib.sha256(raw).hexdigest()
+        encoding, data = _compress(raw)
+        dialect = db.session.get_bind().dialect.name
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        db.session.execute(insert(ChatBlob.__table__).values(
+            hash=digest, encoding=encoding, size=len(raw), data=data
+        ).on_conflict_do_nothing(index_elements=['hash']))
+        return digest
+
+    def _load_blobs(self, hashes: Iterable[Optional[str]]) -> Dict[str, str]:
+        hashes = {h for h in hashes if h}
+        if not hashes:
+            return {}
+        return {
+            blob_hash: _decompress(encoding, data).decode()
+            for blob_hash, encoding, data in db.session.query(
+                ChatBlob.hash, ChatBlob.encoding, ChatBlob.data
+            ).filter(ChatBlob.hash.in_(hashes))
+        }
+
+    def record_turn(self, user_id: int, query: str, time_period: str, result: Dict[str, Any]) -> ChatTurn:
+        """Store the outcome of an AI chat query (successful or not) and return the new turn"""
+        data = result.get('data')
+        chart_json = result.get('chart_json')
+        turn = ChatTurn(
+            user_id=user_id,
+            question=query,
+            time_period=time_period,
+            success=bool(result.get('success')),
+            explanation=result.get('explanation'),
+            error=result.get('error'),
+            sql_query=result.get('sql_query'),
+            chart_type=result.get('chart_type'),
+            row_count=len(data) if data is not None else None,
+            truncated=bool(result.get('truncated')),
+            notice=result.get('notice'),
+            data_hash=self._put_blob(json.dumps(data, default=str, separators=(',', ':')).encode()
+                                     if data else None),
+            # Chart specs are already JSON text
+            chart_hash=self._put_blob(chart_json.encode() if chart_json else None)
+        )
+        db.session.add(turn)
+        db.session.commit()
+        return turn
+
+    def _serialize(self, turns: List[ChatTurn], include_payloads: bool) -> List[Dict[str, Any]]:
+        blobs = self._load_blobs(
+            h for turn in turns for h in (turn.data_hash, turn.chart_hash)
+        ) if include_payloads else {}
+        history = []
+        for turn in turns:
+            item = {
+                'id': turn.id,
+                'query': turn.question,
+                'time_period': turn.time_period,
+                'success': turn.success,
+                'explanation': turn.explanation,
+                'error': turn.error,
+                'sql_query': turn.sql_query,
+                'chart_type': turn.chart_type,
+                'row_count': turn.row_count,
+                'truncated': turn.truncated,
+                'notice': turn.notice,
+                'created_at': turn.created_at.isoformat() if turn.created_at else None
+            }
+            if include_payloads:
+                data = blobs.get(turn.data_hash)
+                item['data'] = json.loads(data) if data is not None else []
+                item['chart_json'] = blobs.get(turn.chart_hash)
+            history.append(item)
+        return history
+
+    def history(self, user_id: int, before_id: Optional[int] = None, limit: int = CHAT_HISTORY_PAGE_SIZE,
+                include_payloads: bool = True) -> Dict[str, Any]:
+        """One page of a user's turns, oldest first; pass next_before back to load older turns"""
+        limit = max(1, min(limit, CHAT_HISTORY_MAX_PAGE_SIZE))
+        query = ChatTurn.query.filter_by(user_id=user_id)
+        if before_id is not None:
+            query = query.filter(ChatTurn.id < before_id)
+        turns = query.order_by(ChatTurn.id.desc()).limit(limit + 1).all()
+        has_more = len(turns) > limit
+        turns = list(reversed(turns[:limit]))
+        return {
+            'history': self._serialize(turns, include_payloads),
+            'next_before': turns[0].id if has_more and turns else None
+        }
+
+    def get_turns(self, user_id: int, turn_ids: List[int]) -> List[Dict[str, Any]]:
+        """The given turns (owned by the user) with payloads, in chronological order"""
+        turns = ChatTurn.query.filter(
+            ChatTurn.user_id == user_id, ChatTurn.id.in_(turn_ids)
+        ).order_by(ChatTurn.id).all()
+        return self._serialize(turns, include_payloads=True)
+
+    def export_messages(self, user_id: int, turn_ids: List[int]) -> List[Dict[str, Any]]:
+        """Turns expanded into the user/AI message pairs the PDF exporter expects"""
+        messages = []
+        for turn in self.get_turns(user_id, turn_ids):
+            messages.append({'type': 'user', 'content': turn['query'], 'timestamp': turn['created_at']})
+            messages.append({
+                'type': 'ai',
+                'content': turn['explanation'] if turn['success'] else f"❌ {turn['error'] or turn['explanation']}",
+                'timestamp': turn['created_at'],
+                'success': turn['success'],
+                'sql_query': turn['sql_query'],
+                'data': turn['data'],
+                'chart_json': turn['chart_json']
+            })
+        return messages
+
+
+# Global instance
+chat_history_store = ChatHistoryStore()
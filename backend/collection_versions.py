@@ -0,0 +1,130 @@
+"""
+Per-table change counters and weak ETags for conditional GETs on collection endpoints
+"""
+from functools import wraps
+from typing import Dict, Iterable, Optional, Set, Tuple
+from flask import request, make_response
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, TableVersion
+
+
+# Tables whose writes are counted; a column set limits which updates count (None = any column)
+TRACKED_TABLES: Dict[str, Optional[Set[str]]] = {
+    'components': None,
+    'bills_of_material': None,
+    'bom_components': None,
+    'manufacturing_orders': None,
+    'work_orders': None,
+    'work_centers': None,
+    # Listings only show users' names; logins (last_login) shouldn't invalidate them
+    'users': {'first_name', 'last_name'},
+}
+
+# Tables each collection endpoint reads
+COLLECTIONS: Dict[str, Tuple[str, ...]] = {
+    'stock': ('components',),
+    'boms': ('bills_of_material', 'bom_components', 'components'),
+    'manufacturing_orders': ('manufacturing_orders', 'work_orders', 'bills_of_material', 'work_centers', 'users'),
+    'workcenters': ('work_centers',),
+}
+
+
+def _changed_tables(session: Session) -> Set[str]:
+    tables = set()
+    for obj in list(session.new) + list(session.deleted):
+        if getattr(obj, '__tablename__', None) in TRACKED_TABLES:
+            tables.add(obj.__tablename__)
+    for obj in session.dirty:
+        table = getattr(obj, '__tablename__', None)
+        if table not in TRACKED_TABLES or table in tables:
+            continue
+        columns = TRACKED_TABLES[table]
+        if columns is None:
+            if session.is_modified(obj, include_collections=False):
+                tables.add(table)
+        elif any(inspect(obj).attrs[column].history.has_changes() for column in columns):
+            tables.add(table)
+    return tables
+
+
+class CollectionVersions:
+    """Keeps table_versions in step with writes and turns them into ETags
+
+    Counters are bumped by an upsert in the writing transaction, so a reader never sees
+    new rows under an old version. ORM flushes and bulk statements run through the
+    session are both counted; writes that bypass the session are not.
+    """
+
+    def __init__(self):
+        self._installed = False
+
+    def init_app(self, app):
+        if self._installed:
+            return
+        event.listen(Session, 'after_flush', self._after_flush)
+        event.listen(Session, 'do_orm_execute', self._on_execute)
+        self._installed = True
+
+    def bump(self, connection, tables: Iterable[str]):
+        tables = sorted(set(tables))  # Fixed order so concurrent writers lock rows alike
+        if not tables:
+            return
+        insert = postgresql.insert if connection.dialect.name == 'postgresql' else sqlite.insert
+        statement = insert(TableVersion.__table__).values([
+            {'table_name': table, 'version': 1} for table in tables
+        ])
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=['table_name'],
+            set_={'version': TableVersion.__table__.c.version + 1}
+        ))
+
+    def _after_flush(self, session, flush_context):
+        self.bump(session.connection(), _changed_tables(session))
+
+    def _on_execute(self, orm_execute_state):
+        # Bulk Query.update()/delete() and insert() statements skip the unit of work
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            table = getattr(orm_execute_state.statement, 'table', None)
+            name = getattr(table, 'name', None)
+            if name in TRACKED_TABLES:
+                self.bump(orm_execute_state.session.connection(), [name])
+
+    def versions(self, tables: Iterable[str]) -> Dict[str, int]:
+        rows = db.session.execute(
+            select(TableVersion.table_name, TableVersion.version).where(TableVersion.table_name.in_(list(tables)))
+        )
+        return dict(rows.all())
+
+    def etag(self, collection: str) -> str:
+        tables = COLLECTIONS[collection]
+        versions = self.versions(tables)
+        return f"{collection}-" + '.'.join(str(versions.get(table, 0)) for table in tables)
+
+
+def conditional_collection(collection: str):
+    """Answer If-None-Match with 304 when the collection's tables haven't changed
+
+    The version check happens before the view runs, so an unchanged reload never
+    touches the ORM or the serializer.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            etag = collection_versions.etag(collection)
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated
+    return decorator
+
+
+# Global instance
+collection_versions = CollectionVersions()
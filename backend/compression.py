@@ -0,0 +1,217 @@
+"""
+Negotiated gzip / brotli / zstd response compression, streaming-aware, with precompressed static files
+"""
+import os
+import zlib
+import mimetypes
+from typing import Iterable, Iterator, List, Optional
+from flask import request, send_file, abort
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Compression tuning (see example.env)
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', '1024'))
+COMPRESS_ALGORITHMS = [name.strip() for name in os.getenv('COMPRESS_ALGORITHMS', 'zstd,br,gzip').split(',') if name.strip()]
+COMPRESS_GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', '6'))
+COMPRESS_BROTLI_LEVEL = int(os.getenv('COMPRESS_BROTLI_LEVEL', '4'))
+COMPRESS_ZSTD_LEVEL = int(os.getenv('COMPRESS_ZSTD_LEVEL', '3'))
+
+# Precompressed files are made once, so they use the slowest, smallest settings
+STATIC_LEVELS = {'gzip': 9, 'br': 11, 'zstd': 19}
+STATIC_SUFFIXES = {'gzip': '.gz', 'br': '.br', 'zstd': '.zst'}
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/x-ndjson', 'application/javascript', 'application/xml',
+    'image/svg+xml', 'application/manifest+json', 'application/wasm',
+}
+
+
+def is_compressible(mimetype: Optional[str]) -> bool:
+    return bool(mimetype) and (mimetype.startswith('text/') or mimetype in COMPRESSIBLE_MIMETYPES)
+
+
+def available_encodings() -> List[str]:
+    installed = {'gzip': True, 'br': brotli is not None, 'zstd': zstandard is not None}
+    return [name for name in COMPRESS_ALGORITHMS if installed.get(name)]
+
+
+class StreamEncoder:
+    """Incremental compressor: compress() buffers, flush() emits everything so far, finish() ends the stream"""
+
+    def __init__(self, encoding: str, level: Optional[int] = None):
+        self.encoding = encoding
+        if encoding == 'gzip':
+            self._compressor = zlib.compressobj(COMPRESS_GZIP_LEVEL if level is None else level, zlib.DEFLATED, 31)
+        elif encoding == 'br':
+            self._compressor = brotli.Compressor(quality=COMPRESS_BROTLI_LEVEL if level is None else level)
+        elif encoding == 'zstd':
+            self._compressor = zstandard.ZstdCompressor(
+                level=COMPRESS_ZSTD_LEVEL if level is None else level).compressobj()
+        else:
+            raise ValueError(f'Unsupported encoding: {encoding}')
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == 'br':
+            return self._compressor.process(data)
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        if self.encoding == 'gzip':
+            return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        if self.encoding == 'zstd':
+            return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    encoder = StreamEncoder(encoding, level)
+    return encoder.compress(data) + encoder.finish()
+
+
+def precompress_file(path: str, encodings: Optional[List[str]] = None, min_bytes: int = COMPRESS_MIN_BYTES) -> List[str]:
+    """Write .gz/.br/.zst siblings of a compressible file; returns the encodings written
+
+    Siblings that wouldn't be smaller than the original are skipped (and removed if stale).
+    """
+    if not is_compressible(mimetypes.guess_type(path)[0]) or os.path.getsize(path) < min_bytes:
+        return []
+    with open(path, 'rb') as f:
+        data = f.read()
+    written = []
+    for encoding in encodings or available_encodings():
+        target = path + STATIC_SUFFIXES[encoding]
+        if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+            written.append(encoding)
+            continue
+        compressed = compress(data, encoding, STATIC_LEVELS[encoding])
+        if len(compressed) >= len(data):
+            if os.path.exists(target):
+                os.remove(target)
+            continue
+        temp_path = f"{target}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(compressed)
+        os.replace(temp_path, target)
+        written.append(encoding)
+    return written
+
+
+def precompress_directory(root: str, encodings: Optional[List[str]] = None) -> int:
+    """Precompress every compressible file under root; returns how many files got siblings"""
+    count = 0
+    suffixes = tuple(STATIC_SUFFIXES.values())
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.endswith(suffixes) or filename.endswith('.tmp'):
+                continue
+            if precompress_file(os.path.join(directory, filename), encodings):
+                count += 1
+    return count
+
+
+class ResponseCompressor:
+    """Compresses responses according to the client's Accept-Encoding
+
+    Buffered responses are compressed when they reach COMPRESS_MIN_BYTES; streamed
+    responses (NDJSON chat) are compressed chunk by chunk and flushed after each one, so
+    the client still receives every event as soon as it is produced. Static files are
+    served from precompressed siblings when present instead of being compressed per request.
+    """
+
+    def __init__(self):
+        self.app = None
+
+    def init_app(self, app):
+        self.app = app
+        app.after_request(self._after_request)
+        if app.static_folder:
+            app.view_functions['static'] = self._static_view
+
+    def negotiate(self, encodings: Optional[List[str]] = None) -> Optional[str]:
+        """Best encoding the client accepts; the order of COMPRESS_ALGORITHMS breaks ties"""
+        accept = request.accept_encodings
+        best, best_quality = None, 0
+        for encoding in encodings or available_encodings():
+            quality = accept.quality(encoding)
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def _stream(self, chunks: Iterable, encoder: StreamEncoder) -> Iterator[bytes]:
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                output = encoder.compress(chunk) + encoder.flush()
+                if output:
+                    yield output
+            yield encoder.finish()
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+    def _after_request(self, response):
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or request.method == 'HEAD'
+                or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or 'no-transform' in response.headers.get('Cache-Control', '')
+                or not is_compressible(response.mimetype)):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        if not response.is_streamed and response.calculate_content_length() < COMPRESS_MIN_BYTES:
+            return response
+        encoding = self.negotiate()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self._stream(response.response, StreamEncoder(encoding))
+            response.headers.pop('Content-Length', None)
+        else:
+            response.set_data(compress(response.get_data(), encoding))
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            # A strong ETag names exact bytes, so the compressed body needs its own
+            response.set_etag(f"{etag}-{encoding}")
+        return response
+
+    def _static_view(self, filename):
+        path = safe_join(self.app.static_folder, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        mimetype = mimetypes.guess_type(path)[0]
+        if is_compressible(mimetype):
+            mtime = os.path.getmtime(path)
+            fresh = [encoding for encoding in COMPRESS_ALGORITHMS if encoding in STATIC_SUFFIXES
+                     and os.path.isfile(path + STATIC_SUFFIXES[encoding])
+                     and os.path.getmtime(path + STATIC_SUFFIXES[encoding]) >= mtime]
+            encoding = self.negotiate(fresh) if fresh else None
+            if encoding:
+                response = send_file(path + STATIC_SUFFIXES[encoding], mimetype=mimetype, conditional=True,
+                                     max_age=self.app.get_send_file_max_age(filename))
+                response.headers['Content-Encoding'] = encoding
+                response.vary.add('Accept-Encoding')
+                return response
+        return self.app.send_static_file(filename)
+
+
+# Global instance
+response_compressor = ResponseCompressor()
@@ -0,0 +1,329 @@
+"""
+Email outbox: requests enqueue mail, background threads send it over pooled SMTP connections
+"""
+import os
+import time
+import queue
+import random
+import socket
+import smtplib
+import threading
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from typing import List, Optional
+from models import db, EmailOutbox
+
+
+# Outbox tuning (see example.env)
+EMAIL_SENDER_THREADS = int(os.getenv('EMAIL_SENDER_THREADS', '2'))
+EMAIL_BATCH_SIZE = int(os.getenv('EMAIL_BATCH_SIZE', '50'))
+EMAIL_MAX_ATTEMPTS = int(os.getenv('EMAIL_MAX_ATTEMPTS', '5'))
+EMAIL_RETRY_BASE_SECONDS = float(os.getenv('EMAIL_RETRY_BASE_SECONDS', '30'))
+EMAIL_RETRY_MAX_SECONDS = float(os.getenv('EMAIL_RETRY_MAX_SECONDS', '3600'))
+EMAIL_POLL_INTERVAL = float(os.getenv('EMAIL_POLL_INTERVAL', '5'))
+EMAIL_SEND_TIMEOUT = int(os.getenv('EMAIL_SEND_TIMEOUT', '300'))
+SMTP_TIMEOUT = float(os.getenv('SMTP_TIMEOUT', '10'))
+SMTP_STARTTLS = os.getenv('SMTP_STARTTLS', 'true').lower() != 'false'
+SMTP_POOL_SIZE = int(os.getenv('SMTP_POOL_SIZE', str(EMAIL_SENDER_THREADS)))
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.getenv('SMTP_MAX_MESSAGES_PER_CONNECTION', '100'))
+SMTP_IDLE_CHECK_SECONDS = 60
+
+
+class SMTPConnectionPool:
+    """Keeps authenticated SMTP connections open between sends
+
+    Connections are checked with NOOP after sitting idle, and recycled after a number of
+    messages since many providers cap messages per session.
+    """
+
+    def __init__(self, size: int = SMTP_POOL_SIZE):
+        self.size = max(1, size)
+        self.server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
+        self.port = int(os.getenv('SMTP_PORT', '587'))
+        self.user = os.getenv('EMAIL_USER')
+        self.password = os.getenv('EMAIL_PASSWORD')
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.user and self.password)
+
+    def _connect(self) -> smtplib.SMTP:
+        connection = smtplib.SMTP(self.server, self.port, timeout=SMTP_TIMEOUT)
+        connection.ehlo()
+        if SMTP_STARTTLS:
+            connection.starttls()
+            connection.ehlo()
+        connection.login(self.user, self.password)
+        connection.sent_count = 0
+        connection.last_used = time.monotonic()
+        return connection
+
+    def acquire(self) -> smtplib.SMTP:
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    connection = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                if time.monotonic() - connection.last_used < SMTP_IDLE_CHECK_SECONDS:
+                    return connection
+                try:
+                    if connection.noop()[0] == 250:
+                        return connection
+                except OSError:  # smtplib.SMTPException included
+                    pass
+                self._close(connection)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection: smtplib.SMTP, broken: bool = False):
+        try:
+            if broken or connection.sent_count >= SMTP_MAX_MESSAGES_PER_CONNECTION:
+                self._close(connection)
+            else:
+                connection.last_used = time.monotonic()
+                self._idle.put(connection)
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    def _close(connection: smtplib.SMTP):
+        try:
+            connection.quit()
+        except Exception:
+            connection.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+def build_message(sender: str, recipient: str, subject: str, html_body: str) -> MIMEMultipart:
+    msg = MIMEMultipart()
+    msg['From'] = sender
+    msg['To'] = recipient
+    msg['Subject'] = subject
+    msg.attach(MIMEText(html_body, 'html'))
+    return msg
+
+
+class EmailOutboxSender:
+    """Queues mail in the email_outbox table and delivers it in batches on background threads
+
+    Failed sends are retried with exponential backoff; rows are claimed with a conditional
+    UPDATE (plus SKIP LOCKED on PostgreSQL) so several processes can share one outbox.
+    """
+
+    def __init__(self, threads: int = EMAIL_SENDER_THREADS, pool: Optional[SMTPConnectionPool] = None):
+        self.threads = threads
+        self.pool = pool or SMTPConnectionPool()
+        self.app = None
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._last_maintenance = None
+        self._worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+    def init_app(self, app):
+        self.app = app
+
+    def start(self, threads: Optional[int] = None):
+        """Start the sender threads for this process (no-op if already running)"""
+        with self._lock:
+            if self._threads or self.app is None:
+                return
+            count = self.threads if threads is None else threads
+            self._stop.clear()
+            # Taken here, not in __init__: preloaded Gunicorn workers import this module in the master
+            self._worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+            for index in range(count):
+                thread = threading.Thread(target=self._sender_loop, args=(f"{self._worker_prefix}:{index}",),
+                                          name=f'email-sender-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            if count:
+                print(f"📧 Email sender started ({count} threads, batches of {EMAIL_BATCH_SIZE})")
+
+    def stop(self, timeout: float = 30):
+        self._stop.set()
+        self._wake.set()
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+        self.pool.close_all()
+
+    def enqueue(self, recipient: str, subject: str, html_body: str) -> EmailOutbox:
+        """Add an email to the outbox; delivery happens in the background"""
+        email = EmailOutbox(recipient=recipient, subject=subject, html_body=html_body,
+                            status='pending', attempts=0, next_attempt_at=datetime.utcnow())
+        db.session.add(email)
+        db.session.commit()
+        self.start()
+        self._wake.set()
+        return email
+
+    def send_now(self, recipient: str, subject: str, html_body: str):
+        """Send one email immediately over a pooled connection (used by the email test endpoint)"""
+        connection = self.pool.acquire()
+        broken = True
+        try:
+            connection.sendmail(self.pool.user, recipient,
+                                build_message(self.pool.user, recipient, subject, html_body).as_string())
+            connection.sent_count += 1
+            broken = False
+        finally:
+            self.pool.release(connection, broken=broken)
+
+    def _claim_batch(self, worker: str) -> List[EmailOutbox]:
+        now = datetime.utcnow()
+        query = db.session.query(EmailOutbox.id).filter(
+            EmailOutbox.status == 'pending',
+            EmailOutbox.next_attempt_at <= now
+        ).order_by(EmailOutbox.next_attempt_at, EmailOutbox.id).limit(EMAIL_BATCH_SIZE)
+        if db.session.get_bind().dialect.name == 'postgresql':
+            query = query.with_for_update(skip_locked=True)
+        ids = [row.id for row in query]
+        if not ids:
+            db.session.rollback()
+            return []
+        EmailOutbox.query.filter(EmailOutbox.id.in_(ids), EmailOutbox.status == 'pending').update({
+            'status': 'sending',
+            'locked_by': worker,
+            'locked_at': now
+        }, synchronize_session=False)
+        db.session.commit()
+        # Rows another worker claimed in between are filtered out here
+        return EmailOutbox.query.filter(
+            EmailOutbox.id.in_(ids), EmailOutbox.status == 'sending', EmailOutbox.locked_by == worker
+        ).order_by(EmailOutbox.id).all()
+
+    @staticmethod
+    def _backoff(attempts: int) -> timedelta:
+        delay = min(EMAIL_RETRY_MAX_SECONDS, EMAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+        return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+    def _mark_failed_attempt(self, email: EmailOutbox, error: Exception, permanent: bool = False):
+        email.attempts = (email.attempts or 0) + 1
+        email.last_error = f"{type(error).__name__}: {error}"
+        email.locked_by = None
+        if permanent or email.attempts >= EMAIL_MAX_ATTEMPTS:
+            email.status = 'failed'
+            email.html_body = ''
+            print(f"❌ Email {email.id} to {email.recipient} failed permanently: {email.last_error}")
+        else:
+            email.status = 'pending'
+            email.next_attempt_at = datetime.utcnow() + self._backoff(email.attempts)
+            print(f"⚠️  Email {email.id} to {email.recipient} failed (attempt {email.attempts}), will retry: {error}")
+
+    def _simulate(self, batch: List[EmailOutbox]):
+        """No credentials configured: print the email to the console for development"""
+        for email in batch:
+            print(f"\n{'='*50}")
+            print(f"📧 EMAIL SIMULATION (No credentials configured)")
+            print(f"{'='*50}")
+            print(f"To: {email.recipient}")
+            print(f"Subject: {email.subject}")
+            print(f"💡 To enable actual email sending, set EMAIL_USER and EMAIL_PASSWORD in .env")
+            print(f"{'='*50}\n")
+            self._mark_sent(email)
+
+    @staticmethod
+    def _mark_sent(email: EmailOutbox):
+        email.status = 'sent'
+        email.sent_at = datetime.utcnow()
+        email.locked_by = None
+        # Bodies carry one-time passwords; finished rows keep only the envelope
+        email.html_body = ''
+
+    def _send_batch(self, batch: List[EmailOutbox]):
+        if not self.pool.configured:
+            self._simulate(batch)
+            return
+
+        try:
+            connection = self.pool.acquire()
+        except OSError as e:  # smtplib.SMTPException included
+            # Could not connect or log in: every message in the batch is retried later
+            print(f"❌ SMTP connection failed: {e}")
+            for email in batch:
+                self._mark_failed_attempt(email, e)
+            return
+
+        broken = False
+        try:
+            for index, email in enumerate(batch):
+                try:
+                    msg = build_message(self.pool.user, email.recipient, email.subject, email.html_body)
+                    connection.sendmail(self.pool.user, email.recipient, msg.as_string())
+                    connection.sent_count += 1
+                    self._mark_sent(email)
+                except smtplib.SMTPRecipientsRefused as e:
+                    self._mark_failed_attempt(email, e, permanent=True)
+                except (smtplib.SMTPServerDisconnected, ConnectionError, socket.timeout) as e:
+                    # The connection is gone: retry this one, hand the rest back untouched
+                    broken = True
+                    self._mark_failed_attempt(email, e)
+                    for remaining in batch[index + 1:]:
+                        remaining.status = 'pending'
+                        remaining.locked_by = None
+                    break
+                except smtplib.SMTPResponseException as e:
+                    # 5xx replies will not change on a retry; 4xx ones are temporary
+                    self._mark_failed_attempt(email, e, permanent=e.smtp_code >= 500)
+                except OSError as e:  # Any other smtplib.SMTPException
+                    self._mark_failed_attempt(email, e)
+        finally:
+            self.pool.release(connection, broken=broken)
+
+    def _maintain(self):
+        """Put rows back in the queue whose sender died mid-batch"""
+        now = datetime.utcnow()
+        if self._last_maintenance and now - self._last_maintenance < timedelta(seconds=60):
+            return
+        self._last_maintenance = now
+        EmailOutbox.query.filter(
+            EmailOutbox.status == 'sending',
+            EmailOutbox.locked_at < now - timedelta(seconds=EMAIL_SEND_TIMEOUT)
+        ).update({'status': 'pending', 'locked_by': None}, synchronize_session=False)
+        db.session.commit()
+
+    def _sender_loop(self, worker: str):
+        while not self._stop.is_set():
+            batch = []
+            with self.app.app_context():
+                try:
+                    batch = self._claim_batch(worker)
+                    if batch:
+                        self._send_batch(batch)
+                        db.session.commit()
+                    else:
+                        self._maintain()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"⚠️  Email sender error: {e}")
+            if not batch:
+                self._wake.wait(EMAIL_POLL_INTERVAL)
+                self._wake.clear()
+
+    def run_forever(self, threads: Optional[int] = None):
+        """Run senders in the foreground (the `flask email-sender` command)"""
+        self.start(threads)
+        try:
+            while any(thread.is_alive() for thread in self._threads):
+                self._stop.wait(1)
+        except KeyboardInterrupt:
+            self.stop()
+
+
+# Global instance
+email_outbox = EmailOutboxSender()
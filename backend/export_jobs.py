@@ -0,0 +1,212 @@
+"""
+Database-backed job queue and worker pool for PDF exports
+"""
+import os
+import json
+import uuid
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+from sqlalchemy import func
+from models import db, ExportJob
+from pdf_export import pdf_exporter
+from chat_history import chat_history_store
+
+
+# Export queue tuning (see example.env)
+EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', '2'))
+EXPORT_SPOOL_DIR = os.path.abspath(os.getenv('EXPORT_SPOOL_DIR', os.path.join('instance', 'exports')))
+EXPORT_POLL_INTERVAL = float(os.getenv('EXPORT_POLL_INTERVAL', '2'))
+EXPORT_MAX_ATTEMPTS = int(os.getenv('EXPORT_MAX_ATTEMPTS', '3'))
+EXPORT_JOB_TIMEOUT = int(os.getenv('EXPORT_JOB_TIMEOUT', '600'))
+EXPORT_RETENTION_HOURS = int(os.getenv('EXPORT_RETENTION_HOURS', '24'))
+
+MAINTENANCE_INTERVAL = timedelta(minutes=1)
+
+
+class ExportJobQueue:
+    """Queues PDF exports in the export_jobs table and builds them on background worker threads
+
+    Any number of processes can run workers against the same database: a job is claimed
+    with a conditional UPDATE (plus SKIP LOCKED on PostgreSQL), so each job runs once.
+    """
+
+    def __init__(self, workers: int = EXPORT_WORKERS, spool_dir: str = EXPORT_SPOOL_DIR):
+        self.workers = workers
+        self.spool_dir = spool_dir
+        self.app = None
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._last_maintenance = None
+        self._worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+    def init_app(self, app):
+        self.app = app
+
+    def start(self, workers: Optional[int] = None):
+        """Start the worker threads for this process (no-op if already running)"""
+        with self._lock:
+            if self._threads or self.app is None:
+                return
+            count = self.workers if workers is None else workers
+            self._stop.clear()
+            # Taken here, not in __init__: preloaded Gunicorn workers import this module in the master
+            self._worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+            for index in range(count):
+                thread = threading.Thread(target=self._worker_loop, args=(f"{self._worker_prefix}:{index}",),
+                                          name=f'export-worker-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            if count:
+                print(f"📄 PDF export workers started ({count} threads, spool {self.spool_dir})")
+
+    def stop(self, timeout: float = 30):
+        self._stop.set()
+        self._wake.set()
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+
+    def enqueue(self, user_id: int, user_info: Dict[str, Any], time_period: str = 'all',
+                messages: Optional[List[Dict[str, Any]]] = None, turn_ids: Optional[List[int]] = None) -> ExportJob:
+        """Add an export of either client-supplied messages or stored chat turns; returns straight away"""
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        job = ExportJob(
+            id=uuid.uuid4().hex,
+            user_id=user_id,
+            status='queued',
+            payload=json.dumps({'messages': messages, 'turn_ids': turn_ids, 'user_info': user_info,
+                                'time_period': time_period}),
+            filename=f"AI_Report_Chat_{user_id}_{timestamp}.pdf",
+            attempts=0
+        )
+        db.session.add(job)
+        db.session.commit()
+        self.start()
+        self._wake.set()
+        return job
+
+    def get_job(self, job_id: str, user_id: int) -> Optional[ExportJob]:
+        return ExportJob.query.filter_by(id=job_id, user_id=user_id).first()
+
+    def _claim_next(self, worker: str) -> Optional[str]:
+        # Jobs out of attempts are marked failed by _maintain, never run again
+        query = (ExportJob.query.filter(ExportJob.status == 'queued',
+                                        func.coalesce(ExportJob.attempts, 0) < EXPORT_MAX_ATTEMPTS)
+                 .order_by(ExportJob.created_at))
+        if db.session.get_bind().dialect.name == 'postgresql':
+            query = query.with_for_update(skip_locked=True)
+        candidate = query.with_entities(ExportJob.id).first()
+        if candidate is None:
+            db.session.rollback()
+            return None
+        claimed = ExportJob.query.filter_by(id=candidate.id, status='queued').update({
+            'status': 'running',
+            'locked_by': worker,
+            'started_at': datetime.utcnow(),
+            'attempts': ExportJob.attempts + 1
+        }, synchronize_session=False)
+        db.session.commit()
+        # Another worker claimed it first: report no job so the loop tries again
+        return candidate.id if claimed == 1 else None
+
+    def _process(self, job_id: str):
+        job = db.session.get(ExportJob, job_id)
+        path = os.path.join(self.spool_dir, f"{job.id}.pdf")
+        temp_path = f"{path}.tmp"
+        try:
+            payload = json.loads(job.payload)
+            messages = payload.get('messages')
+            if payload.get('turn_ids'):
+                messages = chat_history_store.export_messages(job.user_id, payload['turn_ids'])
+            os.makedirs(self.spool_dir, exist_ok=True)
+            with open(temp_path, 'wb') as output:
+                pdf_exporter.export_chat_to_pdf(
+                    messages=messages,
+                    user_info=payload['user_info'],
+                    time_period=payload.get('time_period', 'all'),
+                    output=output
+                )
+            os.replace(temp_path, path)
+            job.status = 'completed'
+            job.file_path = path
+            job.file_size = os.path.getsize(path)
+            job.error = None
+            job.payload = None
+            job.completed_at = datetime.utcnow()
+            print(f"📄 Export {job.id} completed ({job.file_size} bytes)")
+        except Exception as e:
+            print(f"❌ Export {job.id} failed (attempt {job.attempts}): {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            job.error = str(e)
+            if (job.attempts or 0) < EXPORT_MAX_ATTEMPTS:
+                job.status = 'queued'
+            else:
+                job.status = 'failed'
+                job.payload = None
+                job.completed_at = datetime.utcnow()
+        db.session.commit()
+
+    def _maintain(self):
+        """Requeue jobs whose worker died, fail jobs out of attempts and delete expired exports"""
+        now = datetime.utcnow()
+        if self._last_maintenance and now - self._last_maintenance < MAINTENANCE_INTERVAL:
+            return
+        self._last_maintenance = now
+
+        # A job that kills or hangs its worker every time would otherwise be requeued forever
+        attempts = func.coalesce(ExportJob.attempts, 0)
+        stale = (ExportJob.status == 'running') & (ExportJob.started_at < now - timedelta(seconds=EXPORT_JOB_TIMEOUT))
+        ExportJob.query.filter(stale | (ExportJob.status == 'queued'), attempts >= EXPORT_MAX_ATTEMPTS).update({
+            'status': 'failed',
+            'locked_by': None,
+            'payload': None,
+            'error': func.coalesce(ExportJob.error, f'Export did not finish after {EXPORT_MAX_ATTEMPTS} attempts'),
+            'completed_at': now
+        }, synchronize_session=False)
+        ExportJob.query.filter(stale).update({'status': 'queued', 'locked_by': None}, synchronize_session=False)
+
+        expired = ExportJob.query.filter(
+            ExportJob.status.in_(['completed', 'failed']),
+            ExportJob.completed_at < now - timedelta(hours=EXPORT_RETENTION_HOURS)
+        ).all()
+        for job in expired:
+            if job.file_path and os.path.exists(job.file_path):
+                os.remove(job.file_path)
+            db.session.delete(job)
+        db.session.commit()
+
+    def _worker_loop(self, worker: str):
+        while not self._stop.is_set():
+            job_id = None
+            with self.app.app_context():
+                try:
+                    job_id = self._claim_next(worker)
+                    if job_id:
+                        self._process(job_id)
+                    else:
+                        self._maintain()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"⚠️  Export worker error: {e}")
+            if not job_id:
+                self._wake.wait(EXPORT_POLL_INTERVAL)
+                self._wake.clear()
+
+    def run_forever(self, workers: Optional[int] = None):
+        """Run workers in the foreground (the `flask export-worker` command)"""
+        self.start(workers)
+        try:
+            while any(thread.is_alive() for thread in self._threads):
+                self._stop.wait(1)
+        except KeyboardInterrupt:
+            self.stop()
+
+
+# Global instance
+export_job_queue = ExportJobQueue()
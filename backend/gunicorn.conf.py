@@ -0,0 +1,100 @@
+"""
+Gunicorn settings for production, tuned from the environment (see example.env)
+
+Run from backend/:  gunicorn            (this file and app:app are picked up automatically)
+"""
+import os
+import threading
+import multiprocessing
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ('1', 'true', 'yes')
+
+
+# Server tuning (see example.env)
+wsgi_app = 'app:app'
+bind = os.getenv('GUNICORN_BIND', f"{os.getenv('FLASK_HOST', '0.0.0.0')}:{os.getenv('FLASK_PORT', '8000')}")
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.getenv('GUNICORN_WORKERS', os.getenv('WEB_CONCURRENCY', str(max(2, multiprocessing.cpu_count())))))
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+# Above AI_PIPELINE_TIMEOUT, so a slow AI report isn't killed before it can time out cleanly
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '150'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '0'))
+# Importing the app once in the master shares the AI libraries' memory between workers
+preload_app = _flag('GUNICORN_PRELOAD', 'true')
+AI_WARMUP = _flag('GUNICORN_AI_WARMUP', 'true')
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-') or None  # Empty disables it
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'info').lower()
+
+if worker_class == 'gevent' and preload_app:
+    # gevent patches the standard library after fork; modules imported before that keep
+    # blocking sockets and locks, so the app has to be imported in each worker instead
+    print("⚠️  GUNICORN_PRELOAD is ignored with gevent workers")
+    preload_app = False
+
+if worker_class == 'gevent':
+    # httpcore imports trio, which binds select.epoll at import time; gevent removes epoll
+    # when it patches the worker, so the LLM's HTTP client has to be imported here, before that
+    import httpcore  # noqa: F401
+
+
+def post_fork(server, worker):
+    """Drop state inherited from the master so each worker opens its own connections"""
+    if worker_class == 'gevent':
+        try:
+            from psycogreen.gevent import patch_psycopg
+            patch_psycopg()  # Make psycopg2 waits yield to other greenlets
+        except ImportError:
+            if not os.getenv('DATABASE_URL', '').startswith('sqlite'):
+                server.log.warning('psycogreen not installed: PostgreSQL queries will block gevent workers')
+    if preload_app:
+        from app import app
+        from models import db
+        with app.app_context():
+            # Sockets shared with the master (or siblings) would interleave on the wire
+            db.engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    """Start the lazy AI stack in the background so the first chat request doesn't pay for it"""
+    if not AI_WARMUP:
+        return
+
+    def warm_up():
+        from ai_service import ai_report_generator
+        from ai_pipeline import ai_pipeline
+        try:
+            ai_report_generator._ensure_llm_initialized()
+            ai_pipeline.run(_noop())
+        except Exception as e:
+            worker.log.warning(f"AI warm-up skipped: {e}")
+
+    threading.Thread(target=warm_up, name='ai-warmup', daemon=True).start()
+
+
+async def _noop():
+    return None
+
+
+def worker_exit(server, worker):
+    """Let queued background work finish before the worker goes away"""
+    from export_jobs import export_job_queue
+    from email_outbox import email_outbox
+    export_job_queue.stop(timeout=graceful_timeout / 2)
+    email_outbox.stop(timeout=graceful_timeout / 2)
+
+
+def when_ready(server):
+    server.log.info(f"✅ Serving app:app on {bind} with {workers} {worker_class} workers "
+                    f"({threads if worker_class == 'gthread' else worker_connections} "
+                    f"{'threads' if worker_class == 'gthread' else 'connections'} each, preload={preload_app})")
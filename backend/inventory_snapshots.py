@@ -0,0 +1,170 @@
+"""
+Daily stock snapshots, point-in-time inventory quantities and valuation
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy import select, func
+from read_replicas import use_primary
+from models import db, Component, StockMovement, StockSnapshot, StockSnapshotLine
+from stock_ledger import stock_ledger
+
+
+# Snapshot tuning (see example.env)
+STOCK_SNAPSHOT_RETENTION_DAYS = int(os.getenv('STOCK_SNAPSHOT_RETENTION_DAYS', '0'))  # 0 keeps every snapshot
+SNAPSHOT_BATCH_SIZE = 1000
+
+# Movements are replayed from slightly before a snapshot, skipping the ones it recorded as
+# visible; a movement still uncommitted for longer than this when the snapshot is taken is lost
+SNAPSHOT_OVERLAP = timedelta(minutes=5)
+
+
+def apply_movement(quantity: int, movement_type: str, amount: int) -> int:
+    """Quantity after one movement; ADJUSTMENT rows carry the new absolute quantity"""
+    movement_type = (movement_type or '').upper()
+    if movement_type == 'IN':
+        return quantity + amount
+    if movement_type == 'OUT':
+        return quantity - amount
+    if movement_type == 'ADJUSTMENT':
+        return amount
+    return quantity
+
+
+class InventorySnapshots:
+    """Answers "what was on hand at time T" without replaying the whole ledger
+
+    A snapshot (taken daily by `flask snapshot-stock`) records every component's quantity
+    and unit cost together with the ids of the recent movements it includes. A point-in-time
+    query starts from the newest snapshot at or before T and replays only the movements
+    after it, so it costs O(components + movements since the snapshot). Before the first
+    snapshot it falls back to replaying the full ledger, archived months included.
+    """
+
+    def take(self) -> Dict[str, Any]:
+        """Record current quantities; a second snapshot on the same day replaces the first"""
+        use_primary(db.session)
+        if db.session.get_bind().dialect.name == 'postgresql':
+            # Quantities and the visible movements must come from one consistent view
+            db.session.connection(execution_options={'isolation_level': 'REPEATABLE READ'})
+        try:
+            taken_at = datetime.utcnow()
+            last_movement_id = db.session.execute(select(func.max(StockMovement.id))).scalar() or 0
+            window_movement_ids = db.session.execute(select(StockMovement.id).where(
+                StockMovement.created_at >= taken_at - SNAPSHOT_OVERLAP)).scalars().all()
+            components = db.session.execute(
+                select(Component.id, Component.quantity_on_hand, Component.unit_cost)).all()
+
+            snapshot = StockSnapshot.query.filter_by(snapshot_date=taken_at.date()).first()
+            if snapshot is None:
+                snapshot = StockSnapshot(snapshot_date=taken_at.date())
+                db.session.add(snapshot)
+            else:
+                StockSnapshotLine.query.filter_by(snapshot_id=snapshot.id).delete()
+            snapshot.taken_at = taken_at
+            snapshot.last_movement_id = last_movement_id
+            snapshot.window_movement_ids = sorted(window_movement_ids)
+            snapshot.component_count = len(components)
+            snapshot.total_value = sum(quantity * (unit_cost or 0) for _, quantity, unit_cost in components)
+            db.session.flush()
+
+            lines = [{'snapshot_id': snapshot.id, 'component_id': component_id, 'quantity_on_hand': quantity,
+                      'unit_cost': unit_cost, 'value': quantity * (unit_cost or 0)}
+                     for component_id, quantity, unit_cost in components]
+            for start in range(0, len(lines), SNAPSHOT_BATCH_SIZE):
+                db.session.execute(StockSnapshotLine.__table__.insert(), lines[start:start + SNAPSHOT_BATCH_SIZE])
+
+            pruned = 0
+            if STOCK_SNAPSHOT_RETENTION_DAYS > 0:
+                pruned = self._prune(taken_at - timedelta(days=STOCK_SNAPSHOT_RETENTION_DAYS))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return {'snapshot_date': snapshot.snapshot_date.isoformat(), 'components': len(components),
+                'total_value': round(snapshot.total_value, 2), 'pruned': pruned}
+
+    def _prune(self, before: datetime) -> int:
+        # Keep the newest snapshot before the cutoff: queries just after it still start there
+        keep = db.session.execute(select(func.max(StockSnapshot.taken_at)).where(StockSnapshot.taken_at < before)).scalar()
+        if keep is None:
+            return 0
+        old_ids = select(StockSnapshot.id).where(StockSnapshot.taken_at < keep)
+        StockSnapshotLine.query.filter(StockSnapshotLine.snapshot_id.in_(old_ids)).delete(synchronize_session=False)
+        return StockSnapshot.query.filter(StockSnapshot.taken_at < keep).delete(synchronize_session=False)
+
+    def quantities_at(self, as_of: datetime, component_id: Optional[int] = None
+                      ) -> Tuple[Dict[int, int], Dict[int, float], Dict[str, Any]]:
+        """Quantities on hand just before as_of, and unit costs as of the snapshot used"""
+        snapshot = (StockSnapshot.query.filter(StockSnapshot.taken_at <= as_of)
+                    .order_by(StockSnapshot.taken_at.desc()).first())
+        quantities, unit_costs = {}, {}
+        start, included, watermark = None, frozenset(), 0
+        if snapshot is not None:
+            lines = select(StockSnapshotLine.component_id, StockSnapshotLine.quantity_on_hand,
+                           StockSnapshotLine.unit_cost).where(StockSnapshotLine.snapshot_id == snapshot.id)
+            if component_id is not None:
+                lines = lines.where(StockSnapshotLine.component_id == component_id)
+            for line_component_id, quantity, unit_cost in db.session.execute(lines):
+                quantities[line_component_id] = quantity
+                unit_costs[line_component_id] = unit_cost
+            start = snapshot.taken_at - SNAPSHOT_OVERLAP
+            if snapshot.window_movement_ids is not None:
+                included = frozenset(snapshot.window_movement_ids)
+            else:
+                watermark = snapshot.last_movement_id  # Taken before visible movements were recorded
+
+        replayed = 0
+        for rows in stock_ledger.iter_rows(component_id=component_id, start=start, end=as_of):
+            for row in rows:
+                if row['id'] in included or row['id'] <= watermark:
+                    continue
+                quantities[row['component_id']] = apply_movement(
+                    quantities.get(row['component_id'], 0), row['movement_type'], row['quantity'])
+                replayed += 1
+
+        info = {
+            'snapshot_date': snapshot.snapshot_date.isoformat() if snapshot else None,
+            'snapshot_taken_at': snapshot.taken_at.isoformat() if snapshot else None,
+            'movements_replayed': replayed
+        }
+        return quantities, unit_costs, info
+
+    def valuation(self, as_of: Optional[datetime] = None, component_id: Optional[int] = None) -> Dict[str, Any]:
+        """Quantity and value per component, now or at a past time"""
+        components = Component.query
+        if component_id is not None:
+            components = components.filter(Component.id == component_id)
+        current = {component.id: component for component in components}
+
+        if as_of is None:
+            quantities = {component.id: component.quantity_on_hand for component in current.values()}
+            unit_costs = {}
+            info = {'snapshot_date': None, 'snapshot_taken_at': None, 'movements_replayed': 0}
+        else:
+            quantities, unit_costs, info = self.quantities_at(as_of, component_id)
+
+        lines = []
+        for line_component_id in sorted(quantities):
+            component = current.get(line_component_id)
+            # Components added after the snapshot are valued at today's cost
+            unit_cost = unit_costs.get(line_component_id, component.unit_cost if component else None) or 0
+            quantity = quantities[line_component_id]
+            lines.append({
+                'component_id': line_component_id,
+                'component_name': component.name if component else None,
+                'quantity_on_hand': quantity,
+                'unit_cost': unit_cost,
+                'value': round(quantity * unit_cost, 2)
+            })
+        return {
+            'as_of': (as_of or datetime.utcnow()).isoformat(),
+            **info,
+            'total_quantity': sum(line['quantity_on_hand'] for line in lines),
+            'total_value': round(sum(line['value'] for line in lines), 2),
+            'components': lines
+        }
+
+
+# Global instance
+inventory_snapshots = InventorySnapshots()
@@ -0,0 +1,85 @@
+"""Add unique natural keys used by bulk imports
+
+Existing duplicates are resolved first, without losing data:
+- components with the same name: all but the oldest are renamed to "<name> (#<id>)"
+- BOMs with the same name and version: likewise renamed to "<name> (#<id>)"
+- the same component twice on one BOM: merged into the oldest line, quantities added up
+
+Every change is printed. To resolve duplicates by hand instead (e.g. to merge two
+components and re-point their stock movements), do so before upgrading; nothing is
+renamed once the duplicates are gone.
+
+Revision ID: a3e9c5b17d40
+Revises: f6b3d8e20a19
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3e9c5b17d40'
+down_revision = 'f6b3d8e20a19'
+branch_labels = None
+depends_on = None
+
+KEYS = (
+    ('uq_components_name', 'components', ['name']),
+    ('uq_bills_of_material_name_version', 'bills_of_material', ['name', 'version']),
+    ('uq_bom_components_bom_id_component_id', 'bom_components', ['bom_id', 'component_id']),
+)
+
+NAME_LENGTH = 100
+
+
+def _duplicates(bind, table, columns):
+    """Rows sharing a key with an older row, oldest first within each key"""
+    key = ', '.join(columns)
+    rows = bind.execute(sa.text(
+        f"SELECT id, {key} FROM {table} WHERE ({key}) IN "
+        f"(SELECT {key} FROM {table} GROUP BY {key} HAVING COUNT(*) > 1) ORDER BY {key}, id")).fetchall()
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(row[1:]), []).append(row)
+    return list(groups.values())
+
+
+def _rename_duplicates(bind, table, columns):
+    for group in _duplicates(bind, table, columns):
+        for row in group[1:]:
+            suffix = f" (#{row.id})"
+            name = row.name[:NAME_LENGTH - len(suffix)] + suffix
+            bind.execute(sa.text(f"UPDATE {table} SET name = :name WHERE id = :id"), {'name': name, 'id': row.id})
+            print(f"⚠️  {table} {row.id}: duplicate name '{row.name}' renamed to '{name}'")
+
+
+def _merge_duplicate_lines(bind):
+    for group in _duplicates(bind, 'bom_components', ['bom_id', 'component_id']):
+        ids = [row.id for row in group]
+        total = bind.execute(sa.text("SELECT SUM(quantity_required) FROM bom_components WHERE id IN :ids")
+                             .bindparams(sa.bindparam('ids', expanding=True)), {'ids': ids}).scalar()
+        bind.execute(sa.text("UPDATE bom_components SET quantity_required = :total WHERE id = :id"),
+                     {'total': total, 'id': ids[0]})
+        bind.execute(sa.text("DELETE FROM bom_components WHERE id IN :ids")
+                     .bindparams(sa.bindparam('ids', expanding=True)), {'ids': ids[1:]})
+        print(f"⚠️  BOM {group[0].bom_id}: {len(ids)} lines for component {group[0].component_id} "
+              f"merged into line {ids[0]} (quantity {total})")
+
+
+def upgrade():
+    bind = op.get_bind()
+    _rename_duplicates(bind, 'components', ['name'])
+    _rename_duplicates(bind, 'bills_of_material', ['name', 'version'])
+    _merge_duplicate_lines(bind)
+
+    for name, table, columns in KEYS:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.create_unique_constraint(name, columns)
+
+
+def downgrade():
+    # Renamed and merged rows stay as they are
+    for name, table, columns in reversed(KEYS):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_constraint(name, type_='unique')
@@ -0,0 +1,60 @@
+"""Add chat history tables (chat_turns, chat_blobs)
+
+Revision ID: a6e4d8b91c23
+Revises: f3a9c1d27b54
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6e4d8b91c23'
+down_revision = 'f3a9c1d27b54'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('chat_blobs',
+    sa.Column('hash', sa.String(length=64), nullable=False),
+    sa.Column('encoding', sa.String(length=10), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=True),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('hash')
+    )
+    op.create_table('chat_turns',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('question', sa.Text(), nullable=False),
+    sa.Column('time_period', sa.String(length=20), nullable=True),
+    sa.Column('success', sa.Boolean(), nullable=True),
+    sa.Column('explanation', sa.Text(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('sql_query', sa.Text(), nullable=True),
+    sa.Column('chart_type', sa.String(length=20), nullable=True),
+    sa.Column('row_count', sa.Integer(), nullable=True),
+    sa.Column('truncated', sa.Boolean(), nullable=True),
+    sa.Column('notice', sa.Text(), nullable=True),
+    sa.Column('data_hash', sa.String(length=64), nullable=True),
+    sa.Column('chart_hash', sa.String(length=64), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['chart_hash'], ['chat_blobs.hash'], ),
+    sa.ForeignKeyConstraint(['data_hash'], ['chat_blobs.hash'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('chat_turns', schema=None) as batch_op:
+        batch_op.create_index('ix_chat_turns_user_id', ['user_id'], unique=False)
+        batch_op.create_index('ix_chat_turns_user_id_id', ['user_id', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('chat_turns', schema=None) as batch_op:
+        batch_op.drop_index('ix_chat_turns_user_id_id')
+        batch_op.drop_index('ix_chat_turns_user_id')
+
+    op.drop_table('chat_turns')
+    op.drop_table('chat_blobs')
@@ -0,0 +1,26 @@
+"""Record the stock movements each snapshot already includes from its replay window
+
+Revision ID: b2d7e9a41f60
+Revises: e4a8c2d17b56
+Create Date: 2026-10-21 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2d7e9a41f60'
+down_revision = 'e4a8c2d17b56'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('stock_snapshots') as batch_op:
+        batch_op.add_column(sa.Column('window_movement_ids', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('stock_snapshots') as batch_op:
+        batch_op.drop_column('window_movement_ids')
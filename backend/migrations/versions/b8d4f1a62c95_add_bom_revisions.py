@@ -0,0 +1,63 @@
+"""Add bom_revisions with delta lines and pin manufacturing orders to a revision
+
+Revision ID: b8d4f1a62c95
+Revises: a3e9c5b17d40
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d4f1a62c95'
+down_revision = 'a3e9c5b17d40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('bom_revisions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('bom_id', sa.Integer(), nullable=False),
+    sa.Column('revision_number', sa.Integer(), nullable=False),
+    sa.Column('parent_id', sa.Integer(), nullable=True),
+    sa.Column('version', sa.String(length=20), nullable=True),
+    sa.Column('notes', sa.Text(), nullable=True),
+    sa.Column('created_by', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('lines_cache', sa.JSON(none_as_null=True), nullable=True),
+    sa.ForeignKeyConstraint(['bom_id'], ['bills_of_material.id'], ),
+    sa.ForeignKeyConstraint(['parent_id'], ['bom_revisions.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('bom_id', 'revision_number', name='uq_bom_revisions_bom_id_revision_number')
+    )
+    op.create_table('bom_revision_lines',
+    sa.Column('revision_id', sa.Integer(), nullable=False),
+    sa.Column('component_id', sa.Integer(), nullable=False),
+    sa.Column('quantity_required', sa.Integer(), nullable=True),
+    sa.Column('notes', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['revision_id'], ['bom_revisions.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('revision_id', 'component_id')
+    )
+    with op.batch_alter_table('manufacturing_orders') as batch_op:
+        batch_op.add_column(sa.Column('bom_revision_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_manufacturing_orders_bom_revision_id', 'bom_revisions',
+                                    ['bom_revision_id'], ['id'])
+
+    # Every existing BOM gets revision 1 with its current lines, and existing orders are pinned to it
+    op.execute("INSERT INTO bom_revisions (bom_id, revision_number, version, notes, created_at) "
+               "SELECT id, 1, version, 'Initial revision', created_at FROM bills_of_material")
+    op.execute("INSERT INTO bom_revision_lines (revision_id, component_id, quantity_required, notes) "
+               "SELECT r.id, c.component_id, c.quantity_required, c.notes FROM bom_components c "
+               "JOIN bom_revisions r ON r.bom_id = c.bom_id")
+    op.execute("UPDATE manufacturing_orders SET bom_revision_id = "
+               "(SELECT r.id FROM bom_revisions r WHERE r.bom_id = manufacturing_orders.bom_id)")
+
+
+def downgrade():
+    with op.batch_alter_table('manufacturing_orders') as batch_op:
+        batch_op.drop_constraint('fk_manufacturing_orders_bom_revision_id', type_='foreignkey')
+        batch_op.drop_column('bom_revision_id')
+    op.drop_table('bom_revision_lines')
+    op.drop_table('bom_revisions')
@@ -0,0 +1,45 @@
+"""Add where-used indexes, the component a BOM builds, and cached BOM costs
+
+Revision ID: c7e2a4f93d18
+Revises: b8d4f1a62c95
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e2a4f93d18'
+down_revision = 'b8d4f1a62c95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('bom_components') as batch_op:
+        batch_op.create_index('ix_bom_components_component_id', ['component_id'], unique=False)
+
+    with op.batch_alter_table('manufacturing_orders') as batch_op:
+        batch_op.create_index('ix_manufacturing_orders_bom_id', ['bom_id'], unique=False)
+
+    # Costs start out uncached and are filled in on first use
+    with op.batch_alter_table('bills_of_material') as batch_op:
+        batch_op.add_column(sa.Column('component_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('cost_cache', sa.Float(), nullable=True))
+        batch_op.create_foreign_key('fk_bills_of_material_component_id', 'components', ['component_id'], ['id'])
+        batch_op.create_index('ix_bills_of_material_component_id', ['component_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('bills_of_material') as batch_op:
+        batch_op.drop_index('ix_bills_of_material_component_id')
+        batch_op.drop_constraint('fk_bills_of_material_component_id', type_='foreignkey')
+        batch_op.drop_column('cost_cache')
+        batch_op.drop_column('component_id')
+
+    with op.batch_alter_table('manufacturing_orders') as batch_op:
+        batch_op.drop_index('ix_manufacturing_orders_bom_id')
+
+    with op.batch_alter_table('bom_components') as batch_op:
+        batch_op.drop_index('ix_bom_components_component_id')
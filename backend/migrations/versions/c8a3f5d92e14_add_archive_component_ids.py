@@ -0,0 +1,26 @@
+"""Record which components each stock movement archive holds
+
+Revision ID: c8a3f5d92e14
+Revises: b2d7e9a41f60
+Create Date: 2026-10-21 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8a3f5d92e14'
+down_revision = 'b2d7e9a41f60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('stock_movement_archives') as batch_op:
+        batch_op.add_column(sa.Column('component_ids', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('stock_movement_archives') as batch_op:
+        batch_op.drop_column('component_ids')
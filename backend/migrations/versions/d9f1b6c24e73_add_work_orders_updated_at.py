@@ -0,0 +1,32 @@
+"""Add work_orders.updated_at so the analytics refresh picks up edits and reopenings
+
+Revision ID: d9f1b6c24e73
+Revises: c7e2a4f93d18
+Create Date: 2026-10-20 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9f1b6c24e73'
+down_revision = 'c7e2a4f93d18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('work_orders') as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_work_orders_updated_at', ['updated_at'], unique=False)
+
+    # Best guess at each work order's last change; completed ones then line up with the
+    # completion watermark the analytics refresh already has
+    op.execute("UPDATE work_orders SET updated_at = COALESCE(completed_at, paused_at, started_at, CURRENT_TIMESTAMP)")
+
+
+def downgrade():
+    with op.batch_alter_table('work_orders') as batch_op:
+        batch_op.drop_index('ix_work_orders_updated_at')
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,113 @@
+"""Partition stock_movements by month and add stock_movement_archives
+
+Revision ID: e1c7a9d35f82
+Revises: d2b8e6f14a57
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from datetime import date
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1c7a9d35f82'
+down_revision = 'd2b8e6f14a57'
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 3
+COLUMNS = 'id, component_id, movement_type, quantity, reference, notes, created_at'
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def upgrade():
+    op.create_table('stock_movement_archives',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('path', sa.String(length=255), nullable=False),
+    sa.Column('row_count', sa.Integer(), nullable=False),
+    sa.Column('min_id', sa.Integer(), nullable=True),
+    sa.Column('max_id', sa.Integer(), nullable=True),
+    sa.Column('size_bytes', sa.BigInteger(), nullable=True),
+    sa.Column('sha256', sa.String(length=64), nullable=True),
+    sa.Column('archived_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_stock_movement_archives_month', 'stock_movement_archives', ['month'])
+
+    bind = op.get_bind()
+    op.execute("UPDATE stock_movements SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+    if bind.dialect.name != 'postgresql':
+        with op.batch_alter_table('stock_movements') as batch_op:
+            batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+    else:
+        # Rebuild as a table range-partitioned on created_at; the partition key has to be
+        # part of the primary key, and the id sequence carries over
+        op.execute("ALTER TABLE stock_movements RENAME TO stock_movements_unpartitioned")
+        op.execute("ALTER INDEX stock_movements_pkey RENAME TO stock_movements_unpartitioned_pkey")
+        op.execute("""
+            CREATE TABLE stock_movements (
+                id INTEGER NOT NULL DEFAULT nextval('stock_movements_id_seq'),
+                component_id INTEGER NOT NULL REFERENCES components (id),
+                movement_type VARCHAR(20) NOT NULL,
+                quantity INTEGER NOT NULL,
+                reference VARCHAR(50),
+                notes TEXT,
+                created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+                CONSTRAINT stock_movements_pkey PRIMARY KEY (id, created_at)
+            ) PARTITION BY RANGE (created_at)
+        """)
+        op.execute("CREATE TABLE stock_movements_default PARTITION OF stock_movements DEFAULT")
+
+        oldest = bind.execute(sa.text("SELECT min(created_at) FROM stock_movements_unpartitioned")).scalar()
+        this_month = date.today().replace(day=1)
+        month = date(oldest.year, oldest.month, 1) if oldest else this_month
+        while month <= _add_months(this_month, MONTHS_AHEAD):
+            op.execute(f"CREATE TABLE stock_movements_p{month:%Y%m} PARTITION OF stock_movements "
+                       f"FOR VALUES FROM ('{month}') TO ('{_add_months(month, 1)}')")
+            month = _add_months(month, 1)
+
+        op.execute(f"INSERT INTO stock_movements ({COLUMNS}) SELECT {COLUMNS} FROM stock_movements_unpartitioned")
+        op.execute("ALTER SEQUENCE stock_movements_id_seq OWNED BY stock_movements.id")
+        op.execute("DROP TABLE stock_movements_unpartitioned")
+
+    op.create_index('ix_stock_movements_component_id_created_at', 'stock_movements', ['component_id', 'created_at'])
+    op.create_index('ix_stock_movements_created_at', 'stock_movements', ['created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_stock_movements_created_at', table_name='stock_movements')
+    op.drop_index('ix_stock_movements_component_id_created_at', table_name='stock_movements')
+
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        with op.batch_alter_table('stock_movements') as batch_op:
+            batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=True)
+    else:
+        # Archived months stay in their Parquet files; only rows still in the database come back
+        op.execute("ALTER TABLE stock_movements RENAME TO stock_movements_partitioned")
+        op.execute("ALTER INDEX stock_movements_pkey RENAME TO stock_movements_partitioned_pkey")
+        op.execute("""
+            CREATE TABLE stock_movements (
+                id INTEGER NOT NULL DEFAULT nextval('stock_movements_id_seq'),
+                component_id INTEGER NOT NULL REFERENCES components (id),
+                movement_type VARCHAR(20) NOT NULL,
+                quantity INTEGER NOT NULL,
+                reference VARCHAR(50),
+                notes TEXT,
+                created_at TIMESTAMP WITHOUT TIME ZONE,
+                CONSTRAINT stock_movements_pkey PRIMARY KEY (id)
+            )
+        """)
+        op.execute(f"INSERT INTO stock_movements ({COLUMNS}) SELECT {COLUMNS} FROM stock_movements_partitioned")
+        op.execute("ALTER SEQUENCE stock_movements_id_seq OWNED BY stock_movements.id")
+        # Dropping the parent drops every partition with it
+        op.execute("DROP TABLE stock_movements_partitioned")
+
+    op.drop_index('ix_stock_movement_archives_month', table_name='stock_movement_archives')
+    op.drop_table('stock_movement_archives')
@@ -0,0 +1,33 @@
+"""Add the BOM cost generation used to cache costs without locking, and index revision lines by component
+
+Revision ID: e4a8c2d17b56
+Revises: d9f1b6c24e73
+Create Date: 2026-10-20 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a8c2d17b56'
+down_revision = 'd9f1b6c24e73'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('bills_of_material') as batch_op:
+        batch_op.add_column(sa.Column('cost_generation', sa.Integer(), nullable=False, server_default='0'))
+
+    # Where-used finds orders pinned to revisions that use a component
+    with op.batch_alter_table('bom_revision_lines') as batch_op:
+        batch_op.create_index('ix_bom_revision_lines_component_id', ['component_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('bom_revision_lines') as batch_op:
+        batch_op.drop_index('ix_bom_revision_lines_component_id')
+
+    with op.batch_alter_table('bills_of_material') as batch_op:
+        batch_op.drop_column('cost_generation')
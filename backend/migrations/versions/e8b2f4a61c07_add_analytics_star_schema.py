@@ -0,0 +1,124 @@
+"""Add analytics star schema (fact and dimension tables)
+
+Revision ID: e8b2f4a61c07
+Revises: c3394addbd62
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b2f4a61c07'
+down_revision = 'c3394addbd62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('dim_date',
+    sa.Column('date_key', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('year', sa.Integer(), nullable=False),
+    sa.Column('quarter', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Integer(), nullable=False),
+    sa.Column('week', sa.Integer(), nullable=False),
+    sa.Column('day_of_week', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('date_key'),
+    sa.UniqueConstraint('date')
+    )
+    op.create_table('dim_users',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('full_name', sa.String(length=101), nullable=True),
+    sa.Column('email', sa.String(length=120), nullable=True),
+    sa.Column('department', sa.String(length=50), nullable=True),
+    sa.Column('role', sa.String(length=20), nullable=True),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_table('dim_work_centers',
+    sa.Column('work_center_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=True),
+    sa.Column('cost_per_hour', sa.Float(), nullable=True),
+    sa.Column('capacity', sa.Integer(), nullable=True),
+    sa.Column('efficiency', sa.Float(), nullable=True),
+    sa.PrimaryKeyConstraint('work_center_id')
+    )
+    op.create_table('dim_components',
+    sa.Column('component_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=True),
+    sa.Column('supplier', sa.String(length=100), nullable=True),
+    sa.Column('unit_cost', sa.Float(), nullable=True),
+    sa.Column('reorder_level', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('component_id')
+    )
+    op.create_table('fact_work_order_completions',
+    sa.Column('work_order_id', sa.Integer(), nullable=False),
+    sa.Column('manufacturing_order_id', sa.String(length=20), nullable=True),
+    sa.Column('product_name', sa.String(length=100), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('work_center_id', sa.Integer(), nullable=True),
+    sa.Column('date_key', sa.Integer(), nullable=True),
+    sa.Column('completed_at', sa.DateTime(), nullable=False),
+    sa.Column('estimated_minutes', sa.Integer(), nullable=True),
+    sa.Column('actual_minutes', sa.Integer(), nullable=True),
+    sa.Column('estimated_cost', sa.Float(), nullable=True),
+    sa.Column('actual_cost', sa.Float(), nullable=True),
+    sa.Column('quality_check', sa.Boolean(), nullable=True),
+    sa.Column('on_time', sa.Boolean(), nullable=True),
+    sa.PrimaryKeyConstraint('work_order_id')
+    )
+    with op.batch_alter_table('fact_work_order_completions', schema=None) as batch_op:
+        batch_op.create_index('ix_fact_work_order_completions_manufacturing_order_id', ['manufacturing_order_id'], unique=False)
+        batch_op.create_index('ix_fact_work_order_completions_user_id', ['user_id'], unique=False)
+        batch_op.create_index('ix_fact_work_order_completions_work_center_id', ['work_center_id'], unique=False)
+        batch_op.create_index('ix_fact_work_order_completions_date_key', ['date_key'], unique=False)
+        batch_op.create_index('ix_fact_work_order_completions_completed_at', ['completed_at'], unique=False)
+
+    op.create_table('fact_stock_movements',
+    sa.Column('stock_movement_id', sa.Integer(), nullable=False),
+    sa.Column('component_id', sa.Integer(), nullable=True),
+    sa.Column('date_key', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('movement_type', sa.String(length=20), nullable=True),
+    sa.Column('quantity', sa.Integer(), nullable=True),
+    sa.Column('signed_quantity', sa.Integer(), nullable=True),
+    sa.Column('unit_cost', sa.Float(), nullable=True),
+    sa.Column('movement_value', sa.Float(), nullable=True),
+    sa.Column('reference', sa.String(length=50), nullable=True),
+    sa.PrimaryKeyConstraint('stock_movement_id')
+    )
+    with op.batch_alter_table('fact_stock_movements', schema=None) as batch_op:
+        batch_op.create_index('ix_fact_stock_movements_component_id', ['component_id'], unique=False)
+        batch_op.create_index('ix_fact_stock_movements_date_key', ['date_key'], unique=False)
+        batch_op.create_index('ix_fact_stock_movements_created_at', ['created_at'], unique=False)
+
+    op.create_table('analytics_refresh_state',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('watermark_at', sa.DateTime(), nullable=True),
+    sa.Column('watermark_id', sa.Integer(), nullable=True),
+    sa.Column('refreshed_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('analytics_refresh_state')
+    with op.batch_alter_table('fact_stock_movements', schema=None) as batch_op:
+        batch_op.drop_index('ix_fact_stock_movements_created_at')
+        batch_op.drop_index('ix_fact_stock_movements_date_key')
+        batch_op.drop_index('ix_fact_stock_movements_component_id')
+
+    op.drop_table('fact_stock_movements')
+    with op.batch_alter_table('fact_work_order_completions', schema=None) as batch_op:
+        batch_op.drop_index('ix_fact_work_order_completions_completed_at')
+        batch_op.drop_index('ix_fact_work_order_completions_date_key')
+        batch_op.drop_index('ix_fact_work_order_completions_work_center_id')
+        batch_op.drop_index('ix_fact_work_order_completions_user_id')
+        batch_op.drop_index('ix_fact_work_order_completions_manufacturing_order_id')
+
+    op.drop_table('fact_work_order_completions')
+    op.drop_table('dim_components')
+    op.drop_table('dim_work_centers')
+    op.drop_table('dim_users')
+    op.drop_table('dim_date')
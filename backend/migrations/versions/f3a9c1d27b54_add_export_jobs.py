@@ -0,0 +1,49 @@
+"""Add export_jobs queue table
+
+Revision ID: f3a9c1d27b54
+Revises: e8b2f4a61c07
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a9c1d27b54'
+down_revision = 'e8b2f4a61c07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('export_jobs',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=True),
+    sa.Column('filename', sa.String(length=255), nullable=True),
+    sa.Column('file_path', sa.String(length=500), nullable=True),
+    sa.Column('file_size', sa.Integer(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=True),
+    sa.Column('locked_by', sa.String(length=100), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('completed_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('export_jobs', schema=None) as batch_op:
+        batch_op.create_index('ix_export_jobs_user_id', ['user_id'], unique=False)
+        batch_op.create_index('ix_export_jobs_status', ['status'], unique=False)
+        batch_op.create_index('ix_export_jobs_created_at', ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('export_jobs', schema=None) as batch_op:
+        batch_op.drop_index('ix_export_jobs_created_at')
+        batch_op.drop_index('ix_export_jobs_status')
+        batch_op.drop_index('ix_export_jobs_user_id')
+
+    op.drop_table('export_jobs')
@@ -0,0 +1,45 @@
+"""Add stock_snapshots and stock_snapshot_lines
+
+Revision ID: f6b3d8e20a19
+Revises: e1c7a9d35f82
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6b3d8e20a19'
+down_revision = 'e1c7a9d35f82'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stock_snapshots',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('snapshot_date', sa.Date(), nullable=False),
+    sa.Column('taken_at', sa.DateTime(), nullable=False),
+    sa.Column('last_movement_id', sa.Integer(), nullable=False),
+    sa.Column('component_count', sa.Integer(), nullable=True),
+    sa.Column('total_value', sa.Float(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('snapshot_date')
+    )
+    op.create_index('ix_stock_snapshots_taken_at', 'stock_snapshots', ['taken_at'])
+    op.create_table('stock_snapshot_lines',
+    sa.Column('snapshot_id', sa.Integer(), nullable=False),
+    sa.Column('component_id', sa.Integer(), nullable=False),
+    sa.Column('quantity_on_hand', sa.Integer(), nullable=False),
+    sa.Column('unit_cost', sa.Float(), nullable=True),
+    sa.Column('value', sa.Float(), nullable=True),
+    sa.ForeignKeyConstraint(['snapshot_id'], ['stock_snapshots.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('snapshot_id', 'component_id')
+    )
+
+
+def downgrade():
+    op.drop_table('stock_snapshot_lines')
+    op.drop_index('ix_stock_snapshots_taken_at', table_name='stock_snapshots')
+    op.drop_table('stock_snapshots')
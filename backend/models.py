@@ -1,11 +1,12 @@
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from password_hashing import password_hasher
+from read_replicas import RoutingSession
 from datetime import datetime, timedelta
 import enum
 import random
 import string
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class UserRole(enum.Enum):
     MANAGER = "Manager"
@@ -66,10 +67,14 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        """True when the stored hash predates the configured PASSWORD_HASH_METHOD"""
+        return password_hasher.needs_rehash(self.password_hash)
     
     def to_dict(self):
         return {
@@ -97,6 +102,9 @@ class Component(db.Model):
     supplier = db.Column(db.String(100))
     reorder_level = db.Column(db.Integer, default=10)  # Add missing reorder_level column
     
+    # Natural key for bulk imports (INSERT ... ON CONFLICT)
+    __table_args__ = (db.UniqueConstraint('name', name='uq_components_name'),)
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -144,9 +152,19 @@ class BillOfMaterial(db.Model):
     version = db.Column(db.String(20), default='1.0')
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # The component this BOM builds, when its output is a sub-assembly used on other BOMs
+    component_id = db.Column(db.Integer, db.ForeignKey('components.id'), index=True)
+    # Cost with sub-assemblies costed through their own BOMs; NULL until computed, and
+    # cleared (see where_used.py) when a price or line it depends on changes
+    cost_cache = db.Column(db.Float)
+    # Bumped on every clear; a computed cost is only cached if it is unchanged since the read
+    cost_generation = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relationship to BOM components
-    bom_components = db.relationship('BOMComponent', backref='bill_of_material', cascade='all, delete-orphan')
+    bom_components = db.relationship('BOMComponent', backref='bill_of_material', cascade='all, delete-orphan',
+                                     order_by='BOMComponent.id')
+    
+    __table_args__ = (db.UniqueConstraint('name', 'version', name='uq_bills_of_material_name_version'),)
     
     @property
     def components(self):
@@ -154,9 +172,9 @@ class BillOfMaterial(db.Model):
         return self.bom_components
     
     def to_dict(self):
-        total_cost = sum(comp.component.unit_cost * comp.quantity_required 
-                        for comp in self.bom_components 
-                        if comp.component.unit_cost)
+        from where_used import where_used  # where_used imports the models
+        # Multi-level: sub-assemblies are costed through their own BOMs
+        total_cost = self.cost_cache if self.cost_cache is not None else where_used.rolled_up_costs([self.id])[self.id]
         
         return {
             'id': self.id,
@@ -164,6 +182,7 @@ class BillOfMaterial(db.Model):
             'description': self.description,
             'version': self.version,
             'active': self.active,
+            'component_id': self.component_id,
             'created_at': self.created_at.isoformat(),
             'total_cost': total_cost,
             'components': [comp.to_dict() for comp in self.bom_components] if self.bom_components else []
@@ -174,13 +193,16 @@ class BOMComponent(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     bom_id = db.Column(db.Integer, db.ForeignKey('bills_of_material.id'), nullable=False)
-    component_id = db.Column(db.Integer, db.ForeignKey('components.id'), nullable=False)
+    # Indexed for where-used lookups (which BOMs use a component)
+    component_id = db.Column(db.Integer, db.ForeignKey('components.id'), nullable=False, index=True)
     quantity_required = db.Column(db.Integer, nullable=False)
     notes = db.Column(db.Text)
     
     # Relationships
     component = db.relationship('Component', backref='bom_components')
     
+    __table_args__ = (db.UniqueConstraint('bom_id', 'component_id', name='uq_bom_components_bom_id_component_id'),)
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -192,6 +214,54 @@ class BOMComponent(db.Model):
             'notes': self.notes
         }
 
+class BOMRevision(db.Model):
+    """An immutable revision of a BOM, stored as the lines that changed since its parent
+
+    bom_components holds the BOM's current (editable) lines; a revision records them when
+    an order is built or the BOM is revised. lines_cache is the full line set, filled in
+    the first time the revision is loaded, so later loads are one primary-key read.
+    """
+    __tablename__ = 'bom_revisions'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    bom_id = db.Column(db.Integer, db.ForeignKey('bills_of_material.id'), nullable=False)
+    revision_number = db.Column(db.Integer, nullable=False)
+    parent_id = db.Column(db.Integer, db.ForeignKey('bom_revisions.id'))
+    version = db.Column(db.String(20))
+    notes = db.Column(db.Text)
+    created_by = db.Column(db.Integer)  # users.id
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    lines_cache = db.Column(db.JSON(none_as_null=True))  # {component_id: [quantity_required, notes]}
+    
+    parent = db.relationship('BOMRevision', remote_side=[id])
+    bill_of_material = db.relationship('BillOfMaterial', backref=db.backref(
+        'revisions', cascade='all, delete-orphan', order_by='BOMRevision.revision_number'))
+    delta_lines = db.relationship('BOMRevisionLine', cascade='all, delete-orphan')
+    
+    __table_args__ = (db.UniqueConstraint('bom_id', 'revision_number', name='uq_bom_revisions_bom_id_revision_number'),)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'bom_id': self.bom_id,
+            'revision_number': self.revision_number,
+            'parent_id': self.parent_id,
+            'version': self.version,
+            'notes': self.notes,
+            'created_by': self.created_by,
+            'created_at': self.created_at.isoformat(),
+            'changed_lines': len(self.delta_lines)
+        }
+
+class BOMRevisionLine(db.Model):
+    """A line added, changed or (with quantity_required NULL) removed by a revision"""
+    __tablename__ = 'bom_revision_lines'
+    
+    revision_id = db.Column(db.Integer, db.ForeignKey('bom_revisions.id', ondelete='CASCADE'), primary_key=True)
+    component_id = db.Column(db.Integer, primary_key=True, index=True)  # No FK: history outlives deleted components
+    quantity_required = db.Column(db.Integer)
+    notes = db.Column(db.Text)
+
 class ManufacturingOrder(db.Model):
     __tablename__ = 'manufacturing_orders'
     
@@ -200,7 +270,9 @@ class ManufacturingOrder(db.Model):
     quantity = db.Column(db.Integer, nullable=False)
     deadline = db.Column(db.DateTime, nullable=False)
     status = db.Column(db.Enum(OrderStatus), nullable=False, default=OrderStatus.PLANNED)
-    bom_id = db.Column(db.Integer, db.ForeignKey('bills_of_material.id'), nullable=False)
+    bom_id = db.Column(db.Integer, db.ForeignKey('bills_of_material.id'), nullable=False, index=True)
+    # The BOM lines the order was built with; later BOM edits don't change what it consumes
+    bom_revision_id = db.Column(db.Integer, db.ForeignKey('bom_revisions.id'))
     priority = db.Column(db.String(20), default='Medium')  # Low, Medium, High, Urgent
     notes = db.Column(db.Text)
     started_at = db.Column(db.DateTime)
@@ -209,7 +281,9 @@ class ManufacturingOrder(db.Model):
     
     # Relationships
     bill_of_material = db.relationship('BillOfMaterial', backref='manufacturing_orders')
-    work_orders = db.relationship('WorkOrder', backref='manufacturing_order', cascade='all, delete-orphan')
+    bom_revision = db.relationship('BOMRevision')
+    work_orders = db.relationship('WorkOrder', backref='manufacturing_order', cascade='all, delete-orphan',
+                                  order_by='WorkOrder.id')
     
     def to_dict(self):
         # Calculate progress based on work orders
@@ -225,6 +299,7 @@ class ManufacturingOrder(db.Model):
             'status': self.status.value,
             'bom_id': self.bom_id,
             'bom_name': self.bill_of_material.name if self.bill_of_material else None,
+            'bom_revision_id': self.bom_revision_id,
             'priority': self.priority,
             'notes': self.notes,
             'progress': progress,
@@ -256,6 +331,8 @@ class WorkOrder(db.Model):
     notes = db.Column(db.Text)
     issues = db.Column(db.Text)  # Track any issues or delays
     quality_check = db.Column(db.Boolean, default=False)
+    # Lets the analytics refresh re-read work orders edited, reopened or completed since its last run
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Relationships
     work_center = db.relationship('WorkCenter', backref='work_orders')
@@ -296,11 +373,17 @@ class StockMovement(db.Model):
     quantity = db.Column(db.Integer, nullable=False)
     reference = db.Column(db.String(50))  # MO ID, purchase order, etc.
     notes = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Partition key on PostgreSQL (monthly ranges, primary key (id, created_at)); see stock_ledger
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     
     # Relationship
     component = db.relationship('Component', backref='stock_movements')
     
+    __table_args__ = (
+        db.Index('ix_stock_movements_component_id_created_at', 'component_id', 'created_at'),
+        db.Index('ix_stock_movements_created_at', 'created_at'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -313,6 +396,48 @@ class StockMovement(db.Model):
             'created_at': self.created_at.isoformat()
         }
 
+class StockMovementArchive(db.Model):
+    """A month of stock movements moved out of the database into a Parquet file"""
+    __tablename__ = 'stock_movement_archives'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Date, nullable=False, index=True)
+    path = db.Column(db.String(255), nullable=False)  # Relative to STOCK_ARCHIVE_DIR
+    row_count = db.Column(db.Integer, nullable=False)
+    min_id = db.Column(db.Integer)
+    max_id = db.Column(db.Integer)
+    # Components with rows in the file; component reads skip the files that cannot match
+    component_ids = db.Column(db.JSON(none_as_null=True))
+    size_bytes = db.Column(db.BigInteger)
+    sha256 = db.Column(db.String(64))
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class StockSnapshot(db.Model):
+    """Inventory on hand at the end of a day; point-in-time queries replay movements from here"""
+    __tablename__ = 'stock_snapshots'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    snapshot_date = db.Column(db.Date, nullable=False, unique=True)
+    taken_at = db.Column(db.DateTime, nullable=False, index=True)
+    last_movement_id = db.Column(db.Integer, nullable=False, default=0)
+    # Movements inside the replay window that the quantities already include; ids are not
+    # in commit order, so one below last_movement_id may still have been uncommitted
+    window_movement_ids = db.Column(db.JSON(none_as_null=True))
+    component_count = db.Column(db.Integer)
+    total_value = db.Column(db.Float)
+    
+    lines = db.relationship('StockSnapshotLine', backref='snapshot', cascade='all, delete-orphan')
+
+class StockSnapshotLine(db.Model):
+    """One component's quantity and value in a snapshot"""
+    __tablename__ = 'stock_snapshot_lines'
+    
+    snapshot_id = db.Column(db.Integer, db.ForeignKey('stock_snapshots.id', ondelete='CASCADE'), primary_key=True)
+    component_id = db.Column(db.Integer, primary_key=True)  # No FK: history outlives deleted components
+    quantity_on_hand = db.Column(db.Integer, nullable=False)
+    unit_cost = db.Column(db.Float)
+    value = db.Column(db.Float)
+
 class PasswordReset(db.Model):
     """Track password reset requests and OTPs"""
     __tablename__ = 'password_resets'
@@ -365,4 +490,222 @@ class PasswordReset(db.Model):
             'expires_at': self.expires_at.isoformat(),
             'is_used': self.is_used,
             'created_at': self.created_at.isoformat()
-        }
\ No newline at end of file
+        }
+
+# ===========================================
+# Analytics (star schema) tables
+# Refreshed incrementally from the OLTP tables by analytics.py; read by reports and the AI chat
+# ===========================================
+
+class DimDate(db.Model):
+    """Calendar dimension, one row per day that appears in a fact table"""
+    __tablename__ = 'dim_date'
+    
+    date_key = db.Column(db.Integer, primary_key=True)  # yyyymmdd
+    date = db.Column(db.Date, nullable=False, unique=True)
+    year = db.Column(db.Integer, nullable=False)
+    quarter = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    week = db.Column(db.Integer, nullable=False)  # ISO week number
+    day_of_week = db.Column(db.Integer, nullable=False)  # 1 = Monday
+
+class DimUser(db.Model):
+    __tablename__ = 'dim_users'
+    
+    user_id = db.Column(db.Integer, primary_key=True)
+    full_name = db.Column(db.String(101))
+    email = db.Column(db.String(120))
+    department = db.Column(db.String(50))
+    role = db.Column(db.String(20))
+
+class DimWorkCenter(db.Model):
+    __tablename__ = 'dim_work_centers'
+    
+    work_center_id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100))
+    cost_per_hour = db.Column(db.Float)
+    capacity = db.Column(db.Integer)
+    efficiency = db.Column(db.Float)
+
+class DimComponent(db.Model):
+    __tablename__ = 'dim_components'
+    
+    component_id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100))
+    supplier = db.Column(db.String(100))
+    unit_cost = db.Column(db.Float)
+    reorder_level = db.Column(db.Integer)
+
+class FactWorkOrderCompletion(db.Model):
+    """One row per completed work order"""
+    __tablename__ = 'fact_work_order_completions'
+    
+    work_order_id = db.Column(db.Integer, primary_key=True)
+    manufacturing_order_id = db.Column(db.String(20), index=True)
+    product_name = db.Column(db.String(100))
+    user_id = db.Column(db.Integer, index=True)  # dim_users.user_id
+    work_center_id = db.Column(db.Integer, index=True)  # dim_work_centers.work_center_id
+    date_key = db.Column(db.Integer, index=True)  # dim_date.date_key of completion
+    completed_at = db.Column(db.DateTime, nullable=False, index=True)
+    estimated_minutes = db.Column(db.Integer)
+    actual_minutes = db.Column(db.Integer)
+    estimated_cost = db.Column(db.Float)
+    actual_cost = db.Column(db.Float)
+    quality_check = db.Column(db.Boolean)
+    on_time = db.Column(db.Boolean)  # Completed before the manufacturing order deadline
+
+class FactStockMovement(db.Model):
+    """One row per stock movement"""
+    __tablename__ = 'fact_stock_movements'
+    
+    stock_movement_id = db.Column(db.Integer, primary_key=True)
+    component_id = db.Column(db.Integer, index=True)  # dim_components.component_id
+    date_key = db.Column(db.Integer, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
+    movement_type = db.Column(db.String(20))  # IN, OUT, ADJUSTMENT
+    quantity = db.Column(db.Integer)
+    signed_quantity = db.Column(db.Integer)  # +IN / -OUT; NULL for absolute ADJUSTMENT rows
+    unit_cost = db.Column(db.Float)
+    movement_value = db.Column(db.Float)  # signed_quantity * unit_cost
+    reference = db.Column(db.String(50))
+
+class AnalyticsRefreshState(db.Model):
+    """High-water marks for incremental analytics refreshes"""
+    __tablename__ = 'analytics_refresh_state'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    watermark_at = db.Column(db.DateTime)
+    watermark_id = db.Column(db.Integer)
+    refreshed_at = db.Column(db.DateTime)
+
+class ExportJob(db.Model):
+    """Queued PDF export; the database row is the queue entry"""
+    __tablename__ = 'export_jobs'
+    
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex, also used in the download URL
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, completed, failed
+    payload = db.Column(db.Text)  # JSON export request; cleared once the job finishes
+    filename = db.Column(db.String(255))
+    file_path = db.Column(db.String(500))
+    file_size = db.Column(db.Integer)
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, default=0)
+    locked_by = db.Column(db.String(100))  # worker that claimed the job
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'filename': self.filename,
+            'file_size': self.file_size,
+            'error': self.error,
+            'attempts': self.attempts,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+
+class ChatBlob(db.Model):
+    """Compressed chat payload (result rows or chart spec), stored once per distinct content"""
+    __tablename__ = 'chat_blobs'
+    
+    hash = db.Column(db.String(64), primary_key=True)  # sha256 of the uncompressed JSON
+    encoding = db.Column(db.String(10), nullable=False)  # zstd, gzip or identity
+    size = db.Column(db.Integer)  # uncompressed bytes
+    data = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ChatTurn(db.Model):
+    """One AI chat question and its answer"""
+    __tablename__ = 'chat_turns'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    question = db.Column(db.Text, nullable=False)
+    time_period = db.Column(db.String(20))
+    success = db.Column(db.Boolean, default=False)
+    explanation = db.Column(db.Text)
+    error = db.Column(db.Text)
+    sql_query = db.Column(db.Text)
+    chart_type = db.Column(db.String(20))
+    row_count = db.Column(db.Integer)
+    truncated = db.Column(db.Boolean, default=False)
+    notice = db.Column(db.Text)
+    data_hash = db.Column(db.String(64), db.ForeignKey('chat_blobs.hash'))
+    chart_hash = db.Column(db.String(64), db.ForeignKey('chat_blobs.hash'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.Index('ix_chat_turns_user_id_id', 'user_id', 'id'),)
+
+class EmailOutbox(db.Model):
+    """Outgoing email waiting for (or already through) the background sender"""
+    __tablename__ = 'email_outbox'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    html_body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+    
+    __table_args__ = (db.Index('ix_email_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'recipient': self.recipient,
+            'subject': self.subject,
+            'status': self.status,
+            'attempts': self.attempts,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None
+        }
+
+class RefreshToken(db.Model):
+    """Long-lived refresh token; only a SHA-256 of the token is stored"""
+    __tablename__ = 'refresh_tokens'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    token_hash = db.Column(db.String(64), nullable=False, unique=True)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    revoked_at = db.Column(db.DateTime)
+    replaced_by_id = db.Column(db.Integer)  # Token issued when this one was rotated
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class RevokedToken(db.Model):
+    """Access token revocations, polled by every worker into its in-memory revocation cache
+
+    A row revokes either one access token (jti) or every token a user was issued before
+    not_before (logout everywhere, password reset, deactivation).
+    """
+    __tablename__ = 'revoked_tokens'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(32))
+    user_id = db.Column(db.Integer)
+    not_before = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)  # No access token outlives this
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class TableVersion(db.Model):
+    """Change counter per table, bumped in the same transaction as every write to it
+
+    Collection endpoints derive their ETags from these, so a conditional GET costs one
+    small query instead of loading and serializing the collection.
+    """
+    __tablename__ = 'table_versions'
+    
+    table_name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
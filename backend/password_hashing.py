@@ -0,0 +1,83 @@
+"""
+Configurable password hashing on a bounded worker pool
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+# Hashing tuning (see example.env). Any werkzeug method spec works, e.g.
+# pbkdf2:sha256:600000 or scrypt:32768:8:1
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', '256'))
+PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', '10'))
+
+
+class PasswordHasherBusy(Exception):
+    """Too many hashes queued, or one took longer than PASSWORD_HASH_TIMEOUT; the caller should ask the client to retry"""
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords on a small thread pool
+
+    hashlib's pbkdf2_hmac and scrypt release the GIL, so the pool runs one hash per core in
+    parallel while bounding how many request threads can burn CPU on hashing at once.
+    """
+
+    def __init__(self, method: str = PASSWORD_HASH_METHOD, workers: int = PASSWORD_HASH_WORKERS,
+                 max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.method = method
+        self.workers = max(1, workers)
+        self._pending = threading.BoundedSemaphore(max(1, max_pending))
+        self._executor = None
+        self._lock = threading.Lock()
+        self._method_prefix = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+            return self._executor
+
+    def _run(self, func, *args):
+        if not self._pending.acquire(timeout=PASSWORD_HASH_TIMEOUT):
+            raise PasswordHasherBusy('Password hashing queue is full')
+        try:
+            future = self._get_executor().submit(func, *args)
+        except BaseException:
+            self._pending.release()
+            raise
+        # The slot is freed when the hash is done (or cancelled), not when the caller gives up on it
+        future.add_done_callback(lambda _: self._pending.release())
+        try:
+            return future.result(timeout=PASSWORD_HASH_TIMEOUT)
+        except FutureTimeoutError:
+            future.cancel()  # Only takes effect while it is still queued
+            raise PasswordHasherBusy('Password hashing timed out')
+
+    @property
+    def method_prefix(self) -> str:
+        """The configured method with werkzeug's defaults filled in, as stored in hashes"""
+        if self._method_prefix is None:
+            # Cheapest way to normalize e.g. 'scrypt' to 'scrypt:32768:8:1' is to ask werkzeug
+            self._method_prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return self._method_prefix
+
+    def hash(self, password: str) -> str:
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash: Optional[str], password: Optional[str]) -> bool:
+        if not password_hash or password is None:
+            return False
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash: Optional[str]) -> bool:
+        """True when a stored hash was made with a different method or cost than configured"""
+        return not password_hash or password_hash.split('$', 1)[0] != self.method_prefix
+
+
+# Global instance
+password_hasher = PasswordHasher()
@@ -2,7 +2,6 @@
 PDF Export Service for AI Chat Reports
 """
 import io
-import base64
 from datetime import datetime
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, A4
@@ -11,9 +10,7 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.pdfgen import canvas
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-import json
-import plotly.graph_objects as go
-import plotly.io as pio
+from chart_render import chart_image_renderer
 
 class ChatPDFExporter:
     def __init__(self):
@@ -69,9 +66,9 @@ class ChatPDFExporter:
             spaceAfter=10
         ))
     
-    def export_chat_to_pdf(self, messages, user_info, time_period='all'):
-        """Export chat messages to PDF"""
-        buffer = io.BytesIO()
+    def export_chat_to_pdf(self, messages, user_info, time_period='all', output=None):
+        """Export chat messages to PDF; writes to output (a path or file) if given, else returns the bytes"""
+        buffer = io.BytesIO() if output is None else output
         
         # Create PDF document
         doc = SimpleDocTemplate(
@@ -117,7 +114,10 @@ class ChatPDFExporter:
         story.append(Paragraph("Chat Conversation", self.styles['SectionHeader']))
         story.append(Spacer(1, 10))
         
-        for msg in messages:
+        # Render every chart up front so the cache misses are rendered in parallel
+        chart_images = chart_image_renderer.render_many([msg.get('chart_json') for msg in messages])
+        
+        for msg, chart_image in zip(messages, chart_images):
             # Add timestamp
             timestamp = datetime.fromisoformat(msg['timestamp'].replace('Z', '+00:00'))
             story.append(Paragraph(
@@ -178,6 +178,11 @@ class ChatPDFExporter:
                         
                         story.append(data_table)
             
+            # Add chart image if available
+            if chart_image:
+                story.append(Spacer(1, 10))
+                story.append(Image(io.BytesIO(chart_image), width=6*inch, height=4*inch))
+            
             # Add SQL query if available
             if msg.get('sql_query'):
                 story.append(Paragraph(
@@ -228,6 +233,8 @@ class ChatPDFExporter:
         
         # Build PDF
         doc.build(story)
+        if output is not None:
+            return None
         
         # Get PDF data
         pdf_data = buffer.getvalue()
@@ -236,25 +243,8 @@ class ChatPDFExporter:
         return pdf_data
     
     def create_chart_image(self, chart_json):
-        """Convert Plotly chart JSON to image for PDF inclusion"""
-        try:
-            # Parse the chart JSON
-            chart_data = json.loads(chart_json)
-            
-            # Create Plotly figure
-            fig = go.Figure(data=chart_data['data'], layout=chart_data['layout'])
-            
-            # Convert to image
-            img_bytes = pio.to_image(fig, format='png', width=600, height=400)
-            
-            # Convert to base64 for embedding
-            img_base64 = base64.b64encode(img_bytes).decode()
-            
-            return img_base64
-            
-        except Exception as e:
-            print(f"Error creating chart image: {e}")
-            return None
+        """Convert Plotly chart JSON to PNG bytes for PDF inclusion (cached by chart content)"""
+        return chart_image_renderer.render(chart_json)
 
 # Global instance
 pdf_exporter = ChatPDFExporter()
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""
+Routes read-only requests to a replica database bind, with read-your-writes stickiness
+"""
+import os
+import time
+import threading
+from typing import Dict, Optional
+from flask import g, request, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.orm import Session as SASession
+
+
+# Replica tuning (see example.env)
+DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL')
+READ_YOUR_WRITES_SECONDS = float(os.getenv('READ_YOUR_WRITES_SECONDS', '5'))
+
+REPLICA_BIND = 'replica'
+READ_METHODS = ('GET', 'HEAD')
+# Set on successful writes and echoed back by the frontend, so stickiness holds across workers
+PRIMARY_UNTIL_HEADER = 'X-Primary-Until'
+
+
+class RoutingSession(Session):
+    """Session that reads from the replica bind during read-only requests
+
+    Flushes and INSERT/UPDATE/DELETE statements always go to the primary, and once a
+    session has written, the rest of its reads follow (so it sees its own rows).
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self.info.get('primary') and replica_router.reading_from_replica():
+            if self._flushing or isinstance(clause, UpdateBase):
+                self.info['primary'] = True
+            else:
+                engine = self._db.engines.get(REPLICA_BIND)
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def use_primary(session):
+    """Send the rest of this session's statements to the primary (read-modify-write work)"""
+    session.info['primary'] = True
+
+
+class ReplicaRouter:
+    """Decides per request whether reads may use the replica
+
+    GET and HEAD requests read from the replica unless the user wrote within the last
+    READ_YOUR_WRITES_SECONDS. Writers are remembered in this process and told when their
+    window ends through the X-Primary-Until response header, which the frontend sends back
+    so the next request to any worker honours it.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._recent_writers: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._installed = False
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.app and REPLICA_BIND in self.app.config.get('SQLALCHEMY_BINDS', {}))
+
+    def init_app(self, app):
+        self.app = app
+        if DATABASE_REPLICA_URL:
+            app.config.setdefault('SQLALCHEMY_BINDS', {})[REPLICA_BIND] = DATABASE_REPLICA_URL
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        if not self._installed:
+            # Ahead of collection_versions, whose bump runs on session.connection()
+            event.listen(SASession, 'do_orm_execute', self._on_execute, insert=True)
+            self._installed = True
+
+    def replica_engine(self):
+        from models import db
+        return db.engines[REPLICA_BIND] if self.enabled else None
+
+    def is_sticky(self, user_id: Optional[int]) -> bool:
+        if user_id is None:
+            return False
+        with self._lock:
+            until = self._recent_writers.get(user_id)
+        return until is not None and until > time.time()
+
+    def mark_write(self, user_id: Optional[int]) -> float:
+        until = time.time() + READ_YOUR_WRITES_SECONDS
+        if user_id is not None:
+            with self._lock:
+                self._recent_writers[user_id] = until
+                if len(self._recent_writers) > 10000:
+                    now = time.time()
+                    self._recent_writers = {uid: t for uid, t in self._recent_writers.items() if t > now}
+        return until
+
+    def reading_from_replica(self) -> bool:
+        if not has_request_context() or not g.get('read_replica'):
+            return False
+        # token_required sets g.user_id after the request began, so this is checked lazily
+        return not self.is_sticky(g.get('user_id'))
+
+    def _before_request(self):
+        g.read_replica = self.enabled and request.method in READ_METHODS and not self._header_sticky()
+
+    def _header_sticky(self) -> bool:
+        try:
+            until = float(request.headers.get(PRIMARY_UNTIL_HEADER, 0))
+        except ValueError:
+            return False
+        now = time.time()
+        # Bounded so a client can't pin itself to the primary indefinitely
+        return now < until <= now + READ_YOUR_WRITES_SECONDS + 1
+
+    def _after_request(self, response):
+        if self.enabled and request.method not in READ_METHODS + ('OPTIONS',) and response.status_code < 400:
+            until = self.mark_write(g.get('user_id'))
+            response.headers[PRIMARY_UNTIL_HEADER] = f"{until:.3f}"
+        return response
+
+    def _on_execute(self, orm_execute_state):
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            use_primary(orm_execute_state.session)
+
+
+# Global instance
+replica_router = ReplicaRouter()
@@ -1,9 +1,10 @@
 import os
-import jwt
-from datetime import datetime, timedelta
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify
 from models import db, User, PasswordReset, UserRole
-from utils import send_otp_email
+from utils import send_otp_email, build_otp_email, OTP_EMAIL_SUBJECT, token_required
+from auth_tokens import token_service, RefreshTokenError
+from email_outbox import email_outbox
+from password_hashing import PasswordHasherBusy
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
@@ -47,19 +48,65 @@ def login():
             return jsonify({'message': 'Invalid credentials'}), 401
         
         if user.check_password(password):
-            token = jwt.encode({
-                'user_id': user.id,
-                'exp': datetime.utcnow() + timedelta(hours=24)
-            }, current_app.config['SECRET_KEY'], algorithm="HS256")
+            if not user.is_active:
+                return jsonify({'message': 'Account is disabled'}), 403
             
-            return jsonify({
-                'token': token,
-                'user': user.to_dict()
-            }), 200
+            # Upgrade hashes made with an older method or cost while we have the plaintext
+            if user.password_needs_rehash():
+                try:
+                    user.set_password(password)
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"⚠️  Password rehash failed for user {user.id}: {e}")
+            
+            # Short-lived access token plus a refresh token to renew it
+            tokens = token_service.issue_tokens(user)
+            tokens['user'] = user.to_dict()
+            return jsonify(tokens), 200
         else:
             return jsonify({'message': 'Invalid credentials'}), 401
         
+    except PasswordHasherBusy:
+        return jsonify({'message': 'Too many login attempts in progress, please try again'}), 503, {'Retry-After': '1'}
+    except Exception as e:
+        return jsonify({'message': str(e)}), 400
+
+@auth_bp.route('/refresh', methods=['POST'])
+def refresh():
+    """Exchange a refresh token for a new access token (and a new refresh token)"""
+    try:
+        data = request.get_json() or {}
+        refresh_token = data.get('refresh_token')
+        
+        if not refresh_token:
+            return jsonify({'message': 'Refresh token is required'}), 400
+        
+        return jsonify(token_service.rotate_refresh_token(refresh_token)), 200
+        
+    except RefreshTokenError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 401
     except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 400
+
+@auth_bp.route('/logout', methods=['POST'])
+@token_required
+def logout(current_user):
+    """Revoke the current access token and, if given, the session's refresh token"""
+    try:
+        data = request.get_json(silent=True) or {}
+        
+        token_service.revoke_access_token(current_user.claims)
+        if data.get('refresh_token'):
+            token_service.revoke_refresh_token(data['refresh_token'], current_user.id)
+        db.session.commit()
+        
+        return jsonify({'message': 'Logged out successfully'}), 200
+        
+    except Exception as e:
+        db.session.rollback()
         return jsonify({'message': str(e)}), 400
 
 @auth_bp.route('/forgot-password', methods=['POST'])
@@ -79,7 +126,7 @@ def forgot_password():
         # Create password reset request with OTP
         reset_request = PasswordReset.create_reset_request(email)
         
-        # Send OTP via email
+        # Queue the OTP email; the outbox sender delivers it in the background
         email_sent = send_otp_email(email, reset_request.otp)
         
         # Check if email credentials are configured
@@ -135,9 +182,14 @@ def test_email():
                 'smtp_port': smtp_port
             }), 200
         
-        # Test sending a simple email
+        # Send a test email straight away over a pooled connection (bypassing the outbox)
         test_otp = "123456"  # Test OTP
-        success = send_otp_email(test_email, test_otp)
+        try:
+            email_outbox.send_now(test_email, OTP_EMAIL_SUBJECT, build_otp_email(test_otp))
+            success = True
+        except Exception as email_error:
+            print(f"❌ Test email failed: {str(email_error)}")
+            success = False
         
         return jsonify({
             'status': 'success' if success else 'failed',
@@ -210,8 +262,9 @@ def reset_password():
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
-        # Update password
+        # Update password and sign out every existing session
         user.set_password(new_password)
+        token_service.revoke_user(user.id)
         
         # Mark OTP as used
         reset_request.mark_as_used()
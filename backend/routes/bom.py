@@ -1,15 +1,22 @@
 from flask import Blueprint, request, jsonify
+from sqlalchemy.exc import IntegrityError
 from models import db, BillOfMaterial, BOMComponent, ManufacturingOrder
 from utils import token_required
+from serialization import json_response, bom_rows
+from collection_versions import conditional_collection
+from bom_revisions import bom_revisions
+from where_used import where_used
 
 bom_bp = Blueprint('bom', __name__, url_prefix='/api/boms')
 
 @bom_bp.route('', methods=['GET'])
 @token_required
+@conditional_collection('boms')
 def get_boms(current_user):
     try:
-        boms = BillOfMaterial.query.all()
-        return jsonify([bom.to_dict() for bom in boms]), 200
+        # Built from column tuples rather than ORM objects; same JSON as bom.to_dict()
+        rows = bom_rows()
+        return json_response(rows), 200
     except Exception as e:
         return jsonify({'message': str(e)}), 400
 
@@ -18,10 +25,18 @@ def get_boms(current_user):
 def create_bom(current_user):
     try:
         data = request.get_json()
+        version = data.get('version') or '1.0'
+        if BillOfMaterial.query.filter_by(name=data['name'], version=version).first() is not None:
+            return jsonify({'message': f"BOM '{data['name']}' version {version} already exists"}), 409
+        component_ids = [component_data['component_id'] for component_data in data.get('components', [])]
+        if len(component_ids) != len(set(component_ids)):
+            return jsonify({'message': 'Each component can only appear once on a BOM'}), 400
         
         bom = BillOfMaterial(
             name=data['name'],
-            description=data.get('description', '')
+            version=version,
+            description=data.get('description', ''),
+            component_id=data.get('component_id')  # Set when the BOM builds a sub-assembly
         )
         
         db.session.add(bom)
@@ -35,10 +50,20 @@ def create_bom(current_user):
                 quantity_required=component_data['quantity_required']
             )
             db.session.add(bom_component)
+        where_used.check_cycles(bom)
         
+        # Revision 1: what manufacturing orders built from this BOM get pinned to
+        bom_revisions.ensure_current(bom, current_user.id)
+        where_used.cache_costs([bom.id])
         db.session.commit()
         
         return jsonify(bom.to_dict()), 201
+    except IntegrityError as e:
+        db.session.rollback()
+        # Created concurrently between the check and the commit
+        if BillOfMaterial.query.filter_by(name=data['name'], version=version).first() is not None:
+            return jsonify({'message': f"BOM '{data['name']}' version {version} already exists"}), 409
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': str(e)}), 400
@@ -72,4 +97,79 @@ def delete_bom(current_user, bom_id):
         
     except Exception as e:
         db.session.rollback()
-        return jsonify({'message': str(e)}), 400
\ No newline at end of file
+        return jsonify({'message': str(e)}), 400
+
+
+@bom_bp.route('/<int:bom_id>/cost', methods=['GET'])
+@token_required
+def get_bom_cost(current_user, bom_id):
+    """Cost of one unit, with sub-assemblies costed through their own BOMs"""
+    try:
+        bom = BillOfMaterial.query.get_or_404(bom_id)
+        cached = bom.cost_cache is not None
+        rolled_up_cost = where_used.rolled_up_costs([bom.id])[bom.id]
+        return jsonify({'bom_id': bom_id, 'component_id': bom.component_id,
+                        'rolled_up_cost': rolled_up_cost, 'cached': cached}), 200
+    except Exception as e:
+        return jsonify({'message': str(e)}), 400
+
+
+@bom_bp.route('/<int:bom_id>/revisions', methods=['GET'])
+@token_required
+def get_bom_revisions(current_user, bom_id):
+    try:
+        bom = BillOfMaterial.query.get_or_404(bom_id)
+        return jsonify([revision.to_dict() for revision in bom.revisions]), 200
+    except Exception as e:
+        return jsonify({'message': str(e)}), 400
+
+@bom_bp.route('/<int:bom_id>/revisions/<int:revision_number>', methods=['GET'])
+@token_required
+def get_bom_revision(current_user, bom_id, revision_number):
+    try:
+        revision = bom_revisions.get(bom_id, revision_number)
+        if revision is None:
+            return jsonify({'message': 'Revision not found'}), 404
+        lines = bom_revisions.describe_lines(bom_revisions.lines(revision))
+        # Keep the line set if this was the revision's first load
+        db.session.commit()
+        return jsonify({
+            **revision.to_dict(),
+            'total_cost': sum(line['total_cost'] for line in lines),
+            'components': lines,
+            'changes': [{'component_id': line.component_id, 'quantity_required': line.quantity_required,
+                         'notes': line.notes, 'removed': line.quantity_required is None}
+                        for line in revision.delta_lines]
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 400
+
+@bom_bp.route('/<int:bom_id>/revisions', methods=['POST'])
+@token_required
+def create_bom_revision(current_user, bom_id):
+    """Revise a BOM with only the lines that change:
+    {"changes": [{"component_id": 3, "quantity_required": 4}, {"component_id": 7, "remove": true}],
+     "version": "1.2", "notes": "...", "parent_revision": 2}
+    parent_revision (default: the latest) revises from an older revision, e.g. to revert to it.
+    """
+    try:
+        bom = BillOfMaterial.query.get_or_404(bom_id)
+        data = request.get_json() or {}
+        parent = None
+        if data.get('parent_revision') is not None:
+            parent = bom_revisions.get(bom_id, data['parent_revision'])
+            if parent is None:
+                return jsonify({'message': 'Parent revision not found'}), 404
+        latest = bom_revisions.latest(bom_id)
+        revision = bom_revisions.create(bom, changes=data.get('changes') or None, parent=parent,
+                                        version=data.get('version'), notes=data.get('notes'), user_id=current_user.id)
+        if revision is latest:
+            return jsonify({'message': 'No changes to record'}), 400
+        where_used.check_cycles(bom)
+        where_used.cache_costs([bom.id])
+        db.session.commit()
+        return jsonify(revision.to_dict()), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 400
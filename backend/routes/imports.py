@@ -0,0 +1,30 @@
+from flask import Blueprint, request, jsonify
+from utils import token_required
+from bulk_import import bulk_importer, detect_format, ImportFormatError
+
+imports_bp = Blueprint('imports', __name__, url_prefix='/api/import')
+
+@imports_bp.route('/<kind>', methods=['POST'])
+@token_required
+def import_data(current_user, kind):
+    """Import components or BOM lines from an uploaded CSV/XLSX file (multipart 'file' or the raw body)
+
+    Query parameters: format (csv/xlsx, default from the file name), dry_run, replace_lines (BOMs only)
+    """
+    try:
+        upload = request.files.get('file')
+        stream = upload.stream if upload else request.stream
+        file_format = request.args.get('format') or detect_format(upload.filename if upload else None,
+                                                                  request.content_type)
+        result = bulk_importer.run(
+            kind, stream, file_format,
+            dry_run=request.args.get('dry_run', 'false').lower() == 'true',
+            replace_lines=request.args.get('replace_lines', 'false').lower() == 'true',
+            user_id=current_user.id
+        )
+        # Row errors don't fail the import; the valid rows are in
+        return jsonify(result), 200
+    except ImportFormatError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'message': f'Import failed, nothing was imported: {e}'}), 500
@@ -1,27 +1,30 @@
 from datetime import datetime
 from flask import Blueprint, request, jsonify
 from models import (db, ManufacturingOrder, BillOfMaterial, OrderStatus, 
-                   WorkOrder, WorkOrderStatus, StockMovement)
+                   WorkOrder, WorkOrderStatus, StockMovement, Component)
 from utils import token_required
+from serialization import json_response, manufacturing_order_rows
+from collection_versions import conditional_collection
+from bom_revisions import bom_revisions
 
 manufacturing_orders_bp = Blueprint('manufacturing_orders', __name__, url_prefix='/api/manufacturing-orders')
 
 @manufacturing_orders_bp.route('', methods=['GET'])
 @token_required
+@conditional_collection('manufacturing_orders')
 def get_manufacturing_orders(current_user):
     try:
         status_filter = request.args.get('status')
         
-        query = ManufacturingOrder.query
+        status_enum = None
         if status_filter:
             try:
                 status_enum = OrderStatus(status_filter)
-                query = query.filter(ManufacturingOrder.status == status_enum)
             except ValueError:
                 return jsonify({'message': 'Invalid status filter'}), 400
         
-        orders = query.all()
-        return jsonify([order.to_dict() for order in orders]), 200
+        # Built from column tuples rather than ORM objects; same JSON as order.to_dict()
+        return json_response(manufacturing_order_rows(status_enum)), 200
     except Exception as e:
         return jsonify({'message': str(e)}), 400
 
@@ -42,18 +45,23 @@ def create_manufacturing_order(current_user):
         
         # Validate BOM exists
         bom = BillOfMaterial.query.get_or_404(data['bom_id'])
+        # The order is pinned to the BOM's lines as they are now
+        revision = bom_revisions.ensure_current(bom, current_user.id)
+        lines = bom_revisions.lines(revision)
+        components = {component.id: component for component in
+                      Component.query.filter(Component.id.in_(list(lines)))}
         
         # Check component availability
         required_quantity = data['quantity']
         stock_issues = []
         
-        for bom_component in bom.components:
-            required_for_order = bom_component.quantity_required * required_quantity
-            available = bom_component.component.quantity_on_hand
+        for component_id, (quantity_required, _) in lines.items():
+            required_for_order = quantity_required * required_quantity
+            available = components[component_id].quantity_on_hand
             
             if available < required_for_order:
                 stock_issues.append({
-                    'component': bom_component.component.name,
+                    'component': components[component_id].name,
                     'required': required_for_order,
                     'available': available,
                     'shortage': required_for_order - available
@@ -77,6 +85,7 @@ def create_manufacturing_order(current_user):
             quantity=data['quantity'],
             deadline=datetime.fromisoformat(data['deadline'].replace('Z', '+00:00')),
             bom_id=data['bom_id'],
+            bom_revision_id=revision.id,
             priority=data.get('priority', 'Medium'),
             notes=data.get('notes', '')
         )
@@ -168,8 +177,10 @@ def update_manufacturing_order(current_user, order_id):
             order.quantity = data['quantity']
         if 'deadline' in data:
             order.deadline = datetime.fromisoformat(data['deadline'].replace('Z', '+00:00'))
-        if 'bom_id' in data:
-            order.bom_id = data['bom_id']
+        if 'bom_id' in data and data['bom_id'] != order.bom_id:
+            bom = BillOfMaterial.query.get_or_404(data['bom_id'])
+            order.bom_id = bom.id
+            order.bom_revision = bom_revisions.ensure_current(bom, current_user.id)
         
         db.session.commit()
         
@@ -196,15 +207,22 @@ def complete_manufacturing_order(current_user, order_id):
         if order.status == OrderStatus.DONE:
             return jsonify({'message': 'Manufacturing order is already completed'}), 400
         
-        # Get the BOM and components
-        bom = order.bill_of_material
+        # Get the BOM revision the order was pinned to and its components
+        lines = bom_revisions.lines(bom_revisions.for_order(order, current_user.id))
+        components = {component.id: component for component in
+                      Component.query.filter(Component.id.in_(list(lines)))}
         stock_movements = []
         work_orders_updated = []
         
         # STEP 1: Validate stock availability first
-        for bom_component in bom.components:
-            required_quantity = bom_component.quantity_required * order.quantity
-            component = bom_component.component
+        for component_id, (quantity_required, _) in lines.items():
+            required_quantity = quantity_required * order.quantity
+            component = components.get(component_id)
+            if component is None:
+                return jsonify({
+                    'message': f'Component {component_id} from the BOM revision this order was built with no longer exists',
+                    'component_id': component_id
+                }), 400
             
             if component.quantity_on_hand < required_quantity:
                 return jsonify({
@@ -216,9 +234,9 @@ def complete_manufacturing_order(current_user, order_id):
                 }), 400
         
         # STEP 2: Consume components from stock
-        for bom_component in bom.components:
-            required_quantity = bom_component.quantity_required * order.quantity
-            component = bom_component.component
+        for component_id, (quantity_required, _) in lines.items():
+            required_quantity = quantity_required * order.quantity
+            component = components[component_id]
             
             # Create OUT movement for component consumption
             movement = StockMovement(
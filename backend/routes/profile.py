@@ -1,15 +1,19 @@
-from flask import Blueprint, request, jsonify, send_file
-from werkzeug.security import check_password_hash
+from flask import Blueprint, request, jsonify, send_file, Response, stream_with_context
 from sqlalchemy import func, desc
-from models import db, WorkOrder, WorkOrderStatus, ManufacturingOrder, WorkCenter
+from models import (db, WorkOrder, WorkOrderStatus, ManufacturingOrder, WorkCenter,
+                   FactWorkOrderCompletion, DimWorkCenter, DimDate)
 from utils import token_required
 import os
-import base64
-import uuid
 import io
+import json
 from datetime import datetime, timedelta
 from ai_service import ai_report_generator
-from pdf_export import pdf_exporter
+from export_jobs import export_job_queue
+from chat_history import chat_history_store, CHAT_HISTORY_PAGE_SIZE
+from analytics import analytics_refresher
+from avatars import avatar_store, AvatarError
+
+AVATAR_CACHE_SECONDS = 365 * 24 * 3600
 
 profile_bp = Blueprint('profile', __name__, url_prefix='/api/profile')
 
@@ -37,7 +41,7 @@ def update_profile(current_user):
                 return jsonify({'message': 'Current password is required to change password'}), 400
             
             # Verify current password
-            if not check_password_hash(current_user.password_hash, current_password):
+            if not current_user.check_password(current_password):
                 return jsonify({'message': 'Current password is incorrect'}), 400
             
             # Validate new password
@@ -57,35 +61,11 @@ def update_profile(current_user):
         if 'department' in data:
             current_user.department = data['department']
         
-        # Handle avatar upload (base64 image)
-        if 'avatar' in data and data['avatar']:
+        # Handle avatar upload (base64 image); the multipart /avatar endpoint is preferred
+        if 'avatar' in data and data['avatar'] and data['avatar'].startswith('data:image'):
             try:
-                avatar_data = data['avatar']
-                if avatar_data.startswith('data:image'):
-                    # Extract base64 data
-                    header, encoded = avatar_data.split(',', 1)
-                    
-                    # Create uploads directory if it doesn't exist
-                    upload_dir = os.path.join('static', 'uploads', 'avatars')
-                    os.makedirs(upload_dir, exist_ok=True)
-                    
-                    # Generate unique filename
-                    file_extension = 'jpg'  # Default to jpg
-                    if 'image/png' in header:
-                        file_extension = 'png'
-                    elif 'image/jpeg' in header or 'image/jpg' in header:
-                        file_extension = 'jpg'
-                    
-                    filename = f"{current_user.id}_{uuid.uuid4().hex[:8]}.{file_extension}"
-                    filepath = os.path.join(upload_dir, filename)
-                    
-                    # Save the file
-                    with open(filepath, 'wb') as f:
-                        f.write(base64.b64decode(encoded))
-                    
-                    # Store relative path in database
-                    current_user.avatar = f"/static/uploads/avatars/{filename}"
-            except Exception as avatar_error:
+                current_user.avatar = avatar_store.save_data_url(data['avatar'])
+            except AvatarError as avatar_error:
                 print(f"Avatar upload error: {avatar_error}")
                 # Don't fail the entire request if avatar upload fails
                 pass
@@ -110,26 +90,14 @@ def upload_avatar(current_user):
         if file.filename == '':
             return jsonify({'message': 'No file selected'}), 400
         
-        # Validate file type
-        allowed_extensions = {'png', 'jpg', 'jpeg', 'gif'}
-        file_extension = file.filename.rsplit('.', 1)[1].lower()
-        
-        if file_extension not in allowed_extensions:
-            return jsonify({'message': 'Invalid file type. Please upload PNG, JPG, or GIF'}), 400
-        
-        # Create uploads directory if it doesn't exist
-        upload_dir = os.path.join('static', 'uploads', 'avatars')
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # Generate unique filename
-        filename = f"{current_user.id}_{uuid.uuid4().hex[:8]}.{file_extension}"
-        filepath = os.path.join(upload_dir, filename)
-        
-        # Save the file
-        file.save(filepath)
+        # Streamed to disk and checked by content, so the file name's extension doesn't matter
+        try:
+            avatar_url = avatar_store.save_file(file.stream)
+        except AvatarError as e:
+            return jsonify({'message': str(e)}), 400
         
         # Update user avatar path
-        current_user.avatar = f"/static/uploads/avatars/{filename}"
+        current_user.avatar = avatar_url
         db.session.commit()
         
         return jsonify({
@@ -143,6 +111,16 @@ def upload_avatar(current_user):
         print(f"Avatar upload error: {e}")
         return jsonify({'message': str(e)}), 500
 
+@profile_bp.route('/avatars/<digest>/<filename>', methods=['GET'])
+def get_avatar(digest, filename):
+    """Serve a stored avatar; URLs are content-addressed so the files never change"""
+    path = avatar_store.file_path(digest, filename)
+    if path is None:
+        return jsonify({'message': 'Avatar not found'}), 404
+    response = send_file(path, max_age=AVATAR_CACHE_SECONDS, conditional=True)
+    response.headers['Cache-Control'] = f'public, max-age={AVATAR_CACHE_SECONDS}, immutable'
+    return response
+
 @profile_bp.route('/settings', methods=['GET'])
 @token_required
 def get_user_settings(current_user):
@@ -213,36 +191,26 @@ def get_profile_reports(current_user):
         offset = (page - 1) * limit
         completed_work_orders = completed_work_orders_query.offset(offset).limit(limit).all()
         
-        # Calculate summary statistics for all time (not just current page/period)
-        all_time_query = WorkOrder.query.filter(
-            WorkOrder.assigned_user_id == current_user.id,
-            WorkOrder.status == WorkOrderStatus.COMPLETED
-        )
+        # Summary statistics, work centers and trends come from the analytics tables,
+        # so these aggregates don't compete with shop-floor writes on work_orders. They are
+        # refreshed in the background and may trail the list above by one refresh interval.
+        Fact = FactWorkOrderCompletion
+        
+        def completion_stats(*filters):
+            return db.session.query(
+                func.count(Fact.work_order_id).label('total_completed'),
+                func.sum(Fact.actual_minutes).label('total_duration'),
+                func.avg(Fact.actual_minutes).label('avg_duration'),
+                func.sum(Fact.actual_cost).label('total_cost')
+            ).filter(Fact.user_id == current_user.id, *filters).first()
         
         # Get statistics
-        stats_result = db.session.query(
-            func.count(WorkOrder.id).label('total_completed'),
-            func.sum(WorkOrder.actual_duration_minutes).label('total_duration'),
-            func.avg(WorkOrder.actual_duration_minutes).label('avg_duration'),
-            func.sum(WorkOrder.actual_cost).label('total_cost')
-        ).filter(
-            WorkOrder.assigned_user_id == current_user.id,
-            WorkOrder.status == WorkOrderStatus.COMPLETED
-        ).first()
+        stats_result = completion_stats()
         
         # Get period-specific statistics if not 'all'
         period_stats = None
         if period != 'all':
-            period_stats_result = db.session.query(
-                func.count(WorkOrder.id).label('total_completed'),
-                func.sum(WorkOrder.actual_duration_minutes).label('total_duration'),
-                func.avg(WorkOrder.actual_duration_minutes).label('avg_duration'),
-                func.sum(WorkOrder.actual_cost).label('total_cost')
-            ).filter(
-                WorkOrder.assigned_user_id == current_user.id,
-                WorkOrder.status == WorkOrderStatus.COMPLETED,
-                WorkOrder.completed_at >= start_date
-            ).first()
+            period_stats_result = completion_stats(Fact.completed_at >= start_date)
             
             period_stats = {
                 'total_completed': period_stats_result.total_completed or 0,
@@ -255,38 +223,35 @@ def get_profile_reports(current_user):
         
         # Get recent work centers worked on
         recent_work_centers = db.session.query(
-            WorkOrder.work_center_id,
-            func.count(WorkOrder.id).label('order_count'),
-            func.max(WorkOrder.completed_at).label('last_worked')
-        ).filter(
-            WorkOrder.assigned_user_id == current_user.id,
-            WorkOrder.status == WorkOrderStatus.COMPLETED,
-            WorkOrder.work_center_id.isnot(None)
-        ).group_by(WorkOrder.work_center_id).order_by(desc('last_worked')).limit(5).all()
+            Fact.work_center_id,
+            DimWorkCenter.name.label('work_center_name'),
+            func.count(Fact.work_order_id).label('order_count'),
+            func.max(Fact.completed_at).label('last_worked')
+        ).join(DimWorkCenter, DimWorkCenter.work_center_id == Fact.work_center_id).filter(
+            Fact.user_id == current_user.id
+        ).group_by(Fact.work_center_id, DimWorkCenter.name).order_by(desc('last_worked')).limit(5).all()
         
         # Format work center data
-        work_centers_data = []
-        for wc in recent_work_centers:
-            work_center = WorkCenter.query.get(wc.work_center_id)
-            if work_center:
-                work_centers_data.append({
-                    'work_center_id': wc.work_center_id,
-                    'work_center_name': work_center.name,
-                    'orders_completed': wc.order_count,
-                    'last_worked': wc.last_worked.isoformat() if wc.last_worked else None
-                })
+        work_centers_data = [
+            {
+                'work_center_id': wc.work_center_id,
+                'work_center_name': wc.work_center_name,
+                'orders_completed': wc.order_count,
+                'last_worked': wc.last_worked.isoformat() if wc.last_worked else None
+            }
+            for wc in recent_work_centers
+        ]
         
         # Get productivity trends (last 30 days by day)
         thirty_days_ago = now - timedelta(days=30)
         daily_productivity = db.session.query(
-            func.date(WorkOrder.completed_at).label('date'),
-            func.count(WorkOrder.id).label('orders_completed'),
-            func.sum(WorkOrder.actual_duration_minutes).label('total_minutes')
-        ).filter(
-            WorkOrder.assigned_user_id == current_user.id,
-            WorkOrder.status == WorkOrderStatus.COMPLETED,
-            WorkOrder.completed_at >= thirty_days_ago
-        ).group_by(func.date(WorkOrder.completed_at)).order_by('date').all()
+            DimDate.date.label('date'),
+            func.count(Fact.work_order_id).label('orders_completed'),
+            func.sum(Fact.actual_minutes).label('total_minutes')
+        ).join(DimDate, DimDate.date_key == Fact.date_key).filter(
+            Fact.user_id == current_user.id,
+            Fact.completed_at >= thirty_days_ago
+        ).group_by(DimDate.date).order_by(DimDate.date).all()
         
         productivity_data = [
             {
@@ -312,6 +277,7 @@ def get_profile_reports(current_user):
             work_orders_data.append(work_order_data)
         
         # Prepare response
+        refreshed_at = analytics_refresher.refreshed_at()
         response = {
             'user': {
                 'id': current_user.id,
@@ -328,7 +294,8 @@ def get_profile_reports(current_user):
                     'avg_duration_minutes': round(stats_result.avg_duration or 0, 2),
                     'total_cost': round(stats_result.total_cost or 0, 2)
                 },
-                'period': period_stats
+                'period': period_stats,
+                'refreshed_at': refreshed_at.isoformat() if refreshed_at else None
             },
             'completed_work_orders': {
                 'data': work_orders_data,
@@ -351,6 +318,15 @@ def get_profile_reports(current_user):
         print(f"Profile reports error: {e}")
         return jsonify({'message': f'Failed to generate profile reports: {str(e)}'}), 500
 
+def _record_chat_turn(user_id, user_query, time_period, result):
+    """Save a chat turn to history; the answer is still returned if saving fails"""
+    try:
+        return chat_history_store.record_turn(user_id, user_query, time_period, result).id
+    except Exception as e:
+        db.session.rollback()
+        print(f"⚠️  Failed to save chat turn: {e}")
+        return None
+
 @profile_bp.route('/ai-chat', methods=['POST'])
 @token_required
 def ai_chat_query(current_user):
@@ -383,6 +359,7 @@ def ai_chat_query(current_user):
         result['timestamp'] = datetime.utcnow().isoformat()
         result['query'] = user_query
         result['time_period'] = time_period
+        result['turn_id'] = _record_chat_turn(current_user.id, user_query, time_period, result)
         
         return jsonify(result), 200
         
@@ -394,6 +371,49 @@ def ai_chat_query(current_user):
             'explanation': 'Failed to process AI query'
         }), 500
 
+@profile_bp.route('/ai-chat/stream', methods=['POST'])
+@token_required
+def ai_chat_query_stream(current_user):
+    """Process AI chat query, streaming each stage as newline-delimited JSON"""
+    data = request.get_json()
+    
+    if not data or 'query' not in data:
+        return jsonify({'error': 'Query is required'}), 400
+    
+    user_query = data['query']
+    time_period = data.get('time_period', 'all')
+    user_info = {
+        'id': current_user.id,
+        'name': f"{current_user.first_name or ''} {current_user.last_name or ''}".strip(),
+        'email': current_user.email
+    }
+    
+    print(f"🤖 Streaming AI query: {user_query} for user {current_user.id}")
+    
+    def generate():
+        for event in ai_report_generator.stream_user_query(
+            user_query=user_query,
+            user_id=user_info['id'],
+            time_period=time_period
+        ):
+            if event['event'] == 'done':
+                event['user'] = user_info
+                event['timestamp'] = datetime.utcnow().isoformat()
+                event['query'] = user_query
+                event['time_period'] = time_period
+            if event['event'] in ('done', 'error'):
+                event['turn_id'] = _record_chat_turn(user_info['id'], user_query, time_period, event)
+            yield json.dumps(event, default=str) + '\n'
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Don't let nginx buffer the stream
+        }
+    )
+
 @profile_bp.route('/ai-suggestions', methods=['GET'])
 @token_required
 def get_ai_suggestions(current_user):
@@ -450,15 +470,16 @@ def get_ai_suggestions(current_user):
 @profile_bp.route('/ai-chat/history', methods=['GET'])
 @token_required
 def get_chat_history(current_user):
-    """Get chat history for the user (placeholder - can be implemented with database storage)"""
+    """Get a page of the user's chat history, oldest first (pass next_before as ?before= for older turns)"""
     try:
-        # For now, return empty history
-        # In production, you would store chat history in a database
-        return jsonify({
-            'history': [],
-            'user_id': current_user.id,
-            'message': 'Chat history storage not implemented yet'
-        }), 200
+        before = request.args.get('before', type=int)
+        limit = request.args.get('limit', CHAT_HISTORY_PAGE_SIZE, type=int)
+        include_payloads = request.args.get('payloads', 'true').lower() != 'false'
+        
+        page = chat_history_store.history(current_user.id, before_id=before, limit=limit,
+                                          include_payloads=include_payloads)
+        page['user_id'] = current_user.id
+        return jsonify(page), 200
         
     except Exception as e:
         print(f"Chat history error: {e}")
@@ -467,14 +488,16 @@ def get_chat_history(current_user):
 @profile_bp.route('/ai-chat/export-pdf', methods=['POST'])
 @token_required
 def export_chat_to_pdf(current_user):
-    """Export AI chat conversation to PDF"""
+    """Queue an export of the AI chat conversation to PDF"""
     try:
         data = request.get_json()
         
-        if not data or 'messages' not in data:
-            return jsonify({'error': 'Messages are required'}), 400
+        if not data or not (data.get('turn_ids') or 'messages' in data):
+            return jsonify({'error': 'turn_ids or messages are required'}), 400
         
-        messages = data['messages']
+        # Prefer stored history turns so the client doesn't re-upload charts and result rows
+        turn_ids = [int(turn_id) for turn_id in data.get('turn_ids') or []]
+        messages = None if turn_ids else data['messages']
         time_period = data.get('time_period', 'all')
         
         # Prepare user info for PDF
@@ -486,35 +509,54 @@ def export_chat_to_pdf(current_user):
             'role': current_user.role.value if current_user.role else 'N/A'
         }
         
-        print(f"📄 Generating PDF export for user {current_user.id} with {len(messages)} messages")
-        
-        # Generate PDF
-        pdf_data = pdf_exporter.export_chat_to_pdf(
-            messages=messages,
-            user_info=user_info,
-            time_period=time_period
-        )
-        
-        # Create filename
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"AI_Report_Chat_{current_user.id}_{timestamp}.pdf"
-        
-        # Create file-like object
-        pdf_buffer = io.BytesIO(pdf_data)
-        pdf_buffer.seek(0)
+        job = export_job_queue.enqueue(current_user.id, user_info, time_period, messages=messages, turn_ids=turn_ids)
+        contents = f"{len(turn_ids)} turns" if turn_ids else f"{len(messages)} messages"
+        print(f"📄 Queued PDF export {job.id} for user {current_user.id} with {contents}")
         
-        return send_file(
-            pdf_buffer,
-            as_attachment=True,
-            download_name=filename,
-            mimetype='application/pdf'
-        )
+        return jsonify({
+            'job': job.to_dict(),
+            'status_url': f"/api/profile/ai-chat/exports/{job.id}",
+            'download_url': f"/api/profile/ai-chat/exports/{job.id}/download"
+        }), 202
         
     except Exception as e:
+        db.session.rollback()
         print(f"PDF export error: {e}")
-        import traceback
-        traceback.print_exc()
         return jsonify({
             'error': str(e),
             'message': 'Failed to export chat to PDF'
-        }), 500
\ No newline at end of file
+        }), 500
+
+@profile_bp.route('/ai-chat/exports/<job_id>', methods=['GET'])
+@token_required
+def get_export_status(current_user, job_id):
+    """Get the status of a PDF export job"""
+    try:
+        job = export_job_queue.get_job(job_id, current_user.id)
+        if not job:
+            return jsonify({'error': 'Export not found'}), 404
+        return jsonify({'job': job.to_dict()}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@profile_bp.route('/ai-chat/exports/<job_id>/download', methods=['GET'])
+@token_required
+def download_export(current_user, job_id):
+    """Download a finished PDF export (supports Range requests)"""
+    try:
+        job = export_job_queue.get_job(job_id, current_user.id)
+        if not job:
+            return jsonify({'error': 'Export not found'}), 404
+        if job.status != 'completed' or not job.file_path or not os.path.exists(job.file_path):
+            return jsonify({'error': 'Export is not ready', 'job': job.to_dict()}), 409
+        
+        # conditional=True lets werkzeug answer Range and If-None-Match requests
+        return send_file(
+            job.file_path,
+            as_attachment=True,
+            download_name=job.filename,
+            mimetype='application/pdf',
+            conditional=True
+        )
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
\ No newline at end of file
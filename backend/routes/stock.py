@@ -1,12 +1,20 @@
-from datetime import datetime
-from flask import Blueprint, request, jsonify
+import io
+import csv
+from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from sqlalchemy.exc import IntegrityError
 from models import db, Component, StockMovement
 from utils import token_required
+from collection_versions import conditional_collection
+from stock_ledger import stock_ledger, LEDGER_COLUMNS
+from inventory_snapshots import inventory_snapshots
+from where_used import where_used, WHERE_USED_MAX_DEPTH
 
 stock_bp = Blueprint('stock', __name__, url_prefix='/api/stock')
 
 @stock_bp.route('', methods=['GET'])
 @token_required
+@conditional_collection('stock')
 def get_stock(current_user):
     try:
         components = Component.query.all()
@@ -18,11 +26,70 @@ def get_stock(current_user):
 @token_required
 def get_stock_movements(current_user):
     try:
-        movements = StockMovement.query.order_by(StockMovement.created_at.desc()).limit(100).all()
-        return jsonify([movement.to_dict() for movement in movements]), 200
+        start, end = _movement_range()
+        limit = min(request.args.get('limit', 100, type=int), 1000)
+        component_id = request.args.get('component_id', type=int)
+        # Served from the hot partitions; archived months are read only when the range reaches them
+        movements = stock_ledger.recent(limit=limit, component_id=component_id, start=start, end=end)
+        return jsonify(movements), 200
     except Exception as e:
         return jsonify({'message': str(e)}), 400
 
+@stock_bp.route('/movements/export', methods=['GET'])
+@token_required
+def export_stock_movements(current_user):
+    """Stream the ledger as CSV, oldest first, including archived months"""
+    try:
+        start, end = _movement_range()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    component_id = request.args.get('component_id', type=int)
+    columns = LEDGER_COLUMNS[:2] + ('component_name',) + LEDGER_COLUMNS[2:]
+    
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columns)
+        writer.writeheader()
+        for batch in stock_ledger.iter_movements(component_id=component_id, start=start, end=end):
+            writer.writerows(batch)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename=stock_movements.csv'}
+    )
+
+@stock_bp.route('/valuation', methods=['GET'])
+@token_required
+def get_stock_valuation(current_user):
+    """Quantity and value per component, now or as of a past date/time"""
+    try:
+        as_of = request.args.get('as_of')
+        if as_of:
+            parsed = _parse_datetime(as_of)
+            # A bare date means the stock on hand at the end of that day
+            as_of = parsed + timedelta(days=1) if len(as_of) == 10 else parsed
+        valuation = inventory_snapshots.valuation(as_of=as_of or None,
+                                                  component_id=request.args.get('component_id', type=int))
+        return jsonify(valuation), 200
+    except Exception as e:
+        return jsonify({'message': str(e)}), 400
+
+def _parse_datetime(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+
+def _movement_range():
+    """The from/to query parameters (ISO dates or datetimes, to is exclusive)"""
+    bounds = []
+    for name in ('from', 'to'):
+        value = request.args.get(name)
+        bounds.append(_parse_datetime(value) if value else None)
+    return tuple(bounds)
+
 @stock_bp.route('/movements', methods=['POST'])
 @token_required
 def create_stock_movement(current_user):
@@ -71,6 +138,8 @@ components_bp = Blueprint('components', __name__, url_prefix='/api/components')
 def create_component(current_user):
     try:
         data = request.get_json()
+        if Component.query.filter_by(name=data['name']).first() is not None:
+            return jsonify({'message': f"A component named '{data['name']}' already exists"}), 409
         
         component = Component(
             name=data['name'],
@@ -97,6 +166,10 @@ def create_component(current_user):
         db.session.commit()
         
         return jsonify(component.to_dict()), 201
+    except IntegrityError:
+        # Created concurrently between the check and the commit
+        db.session.rollback()
+        return jsonify({'message': f"A component named '{data['name']}' already exists"}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': str(e)}), 400
@@ -111,7 +184,9 @@ def update_component(current_user, component_id):
         old_quantity = component.quantity_on_hand
         old_price = component.unit_cost
         
-        if 'name' in data:
+        if 'name' in data and data['name'] != component.name:
+            if Component.query.filter(Component.name == data['name'], Component.id != component.id).first() is not None:
+                return jsonify({'message': f"A component named '{data['name']}' already exists"}), 409
             component.name = data['name']
         if 'unit_cost' in data:
             new_price = data['unit_cost']
@@ -151,6 +226,9 @@ def update_component(current_user, component_id):
         db.session.commit()
         
         return jsonify(component.to_dict()), 200
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'message': f"A component named '{data['name']}' already exists"}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': str(e)}), 400
@@ -184,6 +262,25 @@ def update_component_price(current_user, component_id):
         db.session.rollback()
         return jsonify({'message': str(e)}), 400
 
+@components_bp.route('/<int:component_id>/where-used', methods=['GET'])
+@token_required
+def get_component_where_used(current_user, component_id):
+    """BOMs using a component, directly or through sub-assemblies, with their costs and the
+    open orders that still need it. ?max_depth= limits the sub-assembly levels followed;
+    ?orders=false leaves orders out.
+    """
+    try:
+        component = Component.query.get_or_404(component_id)
+        max_depth = max(1, min(request.args.get('max_depth', WHERE_USED_MAX_DEPTH, type=int), WHERE_USED_MAX_DEPTH))
+        include_orders = request.args.get('orders', 'true').lower() != 'false'
+        result = where_used.report(component, max_depth=max_depth, include_orders=include_orders)
+        # Keep BOM costs and revision line sets computed for the first time
+        db.session.commit()
+        return jsonify(result), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 400
+
 @components_bp.route('/<int:component_id>', methods=['DELETE'])
 @token_required
 def delete_component(current_user, component_id):
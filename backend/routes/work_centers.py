@@ -1,9 +1,11 @@
 from flask import Blueprint, request, jsonify
 from models import db, WorkCenter
+from collection_versions import conditional_collection
 
 work_centers_bp = Blueprint('work_centers', __name__, url_prefix='/api/workcenters')
 
 @work_centers_bp.route('', methods=['GET'])
+@conditional_collection('workcenters')
 def get_work_centers():
     try:
         work_centers = WorkCenter.query.filter_by(is_active=True).all()
@@ -0,0 +1,228 @@
+"""
+Fast JSON serialization for API responses: orjson output that matches Flask's stdlib encoder byte for byte
+"""
+import re
+import json
+import enum
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+from models import (db, ManufacturingOrder, BillOfMaterial, BOMComponent, Component, WorkOrder,
+                    WorkOrderStatus, WorkCenter, User, OrderStatus)
+from where_used import where_used
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Characters the stdlib escapes (ensure_ascii) but orjson writes as raw UTF-8
+_UNESCAPED = re.compile('[\x7f-\U0010ffff]')
+
+# orjson writes floats in 1e-10..1e-4 as e.g. 0.00001 where repr() gives 1e-05
+_DECIMAL_SMALL_FLOAT = b'0.0000'
+
+# Flask's handling of dates (HTTP date), Decimal, UUID, dataclasses and Markup
+flask_default = DefaultJSONProvider.default
+
+
+def _escape_char(match) -> str:
+    code = ord(match.group())
+    if code > 0xFFFF:
+        code -= 0x10000
+        return '\\u{0:04x}\\u{1:04x}'.format(0xD800 | (code >> 10), 0xDC00 | (code & 0x3FF))
+    return '\\u{0:04x}'.format(code)
+
+
+def _native_default(o: Any) -> Any:
+    """Stdlib fallback for values the fast path passes natively"""
+    if isinstance(o, datetime):
+        return o.isoformat()
+    if isinstance(o, enum.Enum):
+        return o.value
+    return flask_default(o)
+
+
+def _stdlib_dumps(obj: Any, indent: bool, native: bool) -> bytes:
+    return json.dumps(obj, default=_native_default if native else flask_default, ensure_ascii=True,
+                      sort_keys=True, indent=2 if indent else None,
+                      separators=None if indent else (',', ':')).encode()
+
+
+def encode(obj: Any, indent: bool = False, native: bool = False) -> bytes:
+    """Encode like Flask's jsonify (sorted keys, ASCII only), using orjson when it can match
+
+    native=True writes datetimes as isoformat() and enums as their value, which is what the
+    models' to_dict() methods do by hand; otherwise dates use Flask's HTTP-date format.
+    Non-finite floats are the one difference: orjson writes null where the stdlib writes NaN.
+    """
+    if orjson is None:
+        return _stdlib_dumps(obj, indent, native)
+    option = orjson.OPT_SORT_KEYS
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    if not native:
+        option |= orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+    try:
+        output = orjson.dumps(obj, default=None if native else flask_default, option=option)
+    except TypeError:
+        # Integers beyond 64 bits, non-string keys (the stdlib sorts those numerically) and the like
+        return _stdlib_dumps(obj, indent, native)
+    if _DECIMAL_SMALL_FLOAT in output:
+        return _stdlib_dumps(obj, indent, native)
+    if not output.isascii() or b'\x7f' in output:
+        # Escaping is only needed inside strings, and raw non-ASCII bytes can only occur there
+        output = _UNESCAPED.sub(_escape_char, output.decode()).encode()
+    return output
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes jsonify() responses with orjson"""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return encode(obj).decode()
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(encode(obj, indent=indent) + b'\n', mimetype=self.mimetype)
+
+
+def json_response(obj: Any):
+    """jsonify() for payloads holding raw datetimes and enums (see encode(native=True))"""
+    app = current_app
+    indent = app.json.compact is False or (app.json.compact is None and app.debug)
+    return app.response_class(encode(obj, indent=indent, native=True) + b'\n', mimetype='application/json')
+
+
+# Column-tuple listings: the same dicts as the models' to_dict(), built from plain rows
+
+def _work_orders_by_order(status: Optional[OrderStatus]) -> Dict[str, List[Dict[str, Any]]]:
+    query = db.session.query(
+        WorkOrder.id, WorkOrder.name, WorkOrder.description, WorkOrder.duration_minutes,
+        WorkOrder.actual_duration_minutes, WorkOrder.status, WorkOrder.manufacturing_order_id,
+        WorkOrder.work_center_id, WorkCenter.name, WorkOrder.assigned_user_id, User.id,
+        User.first_name, User.last_name, WorkOrder.sequence, WorkOrder.assigned_to, WorkOrder.started_at,
+        WorkOrder.completed_at, WorkOrder.paused_at, WorkOrder.estimated_cost, WorkOrder.actual_cost,
+        WorkOrder.notes, WorkOrder.issues, WorkOrder.quality_check
+    ).outerjoin(WorkCenter, WorkOrder.work_center_id == WorkCenter.id) \
+     .outerjoin(User, WorkOrder.assigned_user_id == User.id)
+    if status is not None:
+        query = query.join(ManufacturingOrder, WorkOrder.manufacturing_order_id == ManufacturingOrder.id) \
+                     .filter(ManufacturingOrder.status == status)
+
+    by_order = {}
+    for (wo_id, name, description, duration, actual_duration, wo_status, order_id, work_center_id,
+         work_center_name, assigned_user_id, user_id, first_name, last_name, sequence, assigned_to,
+         started_at, completed_at, paused_at, estimated_cost, actual_cost, notes, issues,
+         quality_check) in query.order_by(WorkOrder.id):
+        by_order.setdefault(order_id, []).append({
+            'id': wo_id,
+            'name': name,
+            'description': description,
+            'duration_minutes': duration,
+            'actual_duration_minutes': actual_duration,
+            'status': wo_status,
+            'manufacturing_order_id': order_id,
+            'work_center_id': work_center_id,
+            'work_center_name': work_center_name,
+            'assigned_user_id': assigned_user_id,
+            'assigned_user_name': f"{first_name or ''} {last_name or ''}".strip() if user_id is not None else None,
+            'sequence': sequence,
+            'assigned_to': assigned_to,
+            'started_at': started_at,
+            'completed_at': completed_at,
+            'paused_at': paused_at,
+            'estimated_cost': estimated_cost,
+            'actual_cost': actual_cost,
+            'notes': notes,
+            'issues': issues,
+            'quality_check': quality_check
+        })
+    return by_order
+
+
+def manufacturing_order_rows(status: Optional[OrderStatus] = None) -> List[Dict[str, Any]]:
+    """Every manufacturing order (optionally by status) with nested work orders, as ManufacturingOrder.to_dict()"""
+    query = db.session.query(
+        ManufacturingOrder.id, ManufacturingOrder.product_name, ManufacturingOrder.quantity,
+        ManufacturingOrder.deadline, ManufacturingOrder.status, ManufacturingOrder.bom_id,
+        ManufacturingOrder.bom_revision_id, ManufacturingOrder.priority, ManufacturingOrder.notes, ManufacturingOrder.started_at,
+        ManufacturingOrder.completed_at, ManufacturingOrder.created_at
+    )
+    if status is not None:
+        query = query.filter(ManufacturingOrder.status == status)
+    # Same single-table query as ManufacturingOrder.query.all(), so rows come back in the same order
+    orders = query.all()
+    bom_names = dict(db.session.query(BillOfMaterial.id, BillOfMaterial.name))
+    work_orders = _work_orders_by_order(status)
+
+    result = []
+    for order_id, product_name, quantity, deadline, order_status, bom_id, bom_revision_id, priority, notes, \
+            started_at, completed_at, created_at in orders:
+        order_work_orders = work_orders.get(order_id, [])
+        total = len(order_work_orders)
+        completed = sum(1 for wo in order_work_orders if wo['status'] == WorkOrderStatus.COMPLETED)
+        result.append({
+            'id': order_id,
+            'product_name': product_name,
+            'quantity': quantity,
+            'deadline': deadline,
+            'status': order_status,
+            'bom_id': bom_id,
+            'bom_name': bom_names.get(bom_id),
+            'bom_revision_id': bom_revision_id,
+            'priority': priority,
+            'notes': notes,
+            'progress': (completed / total * 100) if total > 0 else 0,
+            'started_at': started_at,
+            'completed_at': completed_at,
+            'created_at': created_at,
+            'work_orders': order_work_orders
+        })
+    return result
+
+
+def bom_rows() -> List[Dict[str, Any]]:
+    """Every BOM with its component lines and costs, as BillOfMaterial.to_dict()"""
+    lines = {}
+    for line_id, bom_id, component_id, component_name, quantity, unit_cost, notes in db.session.query(
+        BOMComponent.id, BOMComponent.bom_id, BOMComponent.component_id, Component.name,
+        BOMComponent.quantity_required, Component.unit_cost, BOMComponent.notes
+    ).join(Component, BOMComponent.component_id == Component.id).order_by(BOMComponent.id):
+        lines.setdefault(bom_id, []).append({
+            'id': line_id,
+            'component_id': component_id,
+            'component_name': component_name,
+            'quantity_required': quantity,
+            'unit_cost': unit_cost,
+            'total_cost': unit_cost * quantity if unit_cost else 0,
+            'notes': notes
+        })
+
+    boms = db.session.query(
+        BillOfMaterial.id, BillOfMaterial.name, BillOfMaterial.description, BillOfMaterial.version,
+        BillOfMaterial.active, BillOfMaterial.component_id, BillOfMaterial.created_at, BillOfMaterial.cost_cache
+    ).all()
+    # Multi-level costs; only BOMs without a cached cost are computed
+    costs = where_used.rolled_up_costs(bom_id for bom_id, *_, cost_cache in boms if cost_cache is None)
+
+    result = []
+    for bom_id, name, description, version, active, output_component_id, created_at, cost_cache in boms:
+        components = lines.get(bom_id, [])
+        result.append({
+            'id': bom_id,
+            'name': name,
+            'description': description,
+            'version': version,
+            'active': active,
+            'component_id': output_component_id,
+            'created_at': created_at,
+            'total_cost': cost_cache if cost_cache is not None else costs[bom_id],
+            'components': components
+        })
+    return result
@@ -0,0 +1,386 @@
+"""
+Guarded, bounded execution of AI-generated SQL
+"""
+import os
+import re
+import time
+from datetime import date, datetime, time as time_of_day
+from typing import List, Dict, Any, Set
+from sqlalchemy import text
+
+
+# Execution limits (see example.env)
+AI_SQL_ROW_LIMIT = int(os.getenv('AI_SQL_ROW_LIMIT', '1000'))
+AI_SQL_TIMEOUT_MS = int(os.getenv('AI_SQL_TIMEOUT_MS', '5000'))
+AI_SQL_BATCH_SIZE = int(os.getenv('AI_SQL_BATCH_SIZE', '500'))
+
+# Tables the AI is allowed to read
+ALLOWED_TABLES = {
+    'work_orders', 'manufacturing_orders', 'users', 'work_centers', 'components',
+    'stock_movements', 'bills_of_material', 'bom_components', 'products',
+    'fact_work_order_completions', 'fact_stock_movements', 'dim_date', 'dim_users',
+    'dim_work_centers', 'dim_components',
+}
+
+# Identifiers that must never appear in AI SQL, even inside an allowed table
+FORBIDDEN_IDENTIFIERS = {'password_hash', 'otp'}
+
+FORBIDDEN_KEYWORDS = {
+    'insert', 'update', 'delete', 'merge', 'upsert', 'drop', 'alter', 'create', 'truncate',
+    'grant', 'revoke', 'copy', 'into', 'vacuum', 'analyze', 'reindex', 'cluster', 'comment',
+    'call', 'do', 'execute', 'prepare', 'listen', 'notify', 'lock', 'set', 'reset', 'attach',
+    'detach', 'pragma',
+}
+
+FORBIDDEN_FUNCTIONS = {
+    'pg_sleep', 'pg_read_file', 'pg_read_binary_file', 'pg_ls_dir', 'pg_stat_file', 'lo_import',
+    'lo_export', 'dblink', 'set_config', 'pg_terminate_backend', 'pg_cancel_backend',
+    'pg_reload_conf', 'load_extension', 'readfile', 'writefile',
+}
+
+# Functions that serialize whole rows, which would expose every column of a table
+ROW_SERIALIZING_FUNCTIONS = {
+    'row_to_json', 'to_json', 'to_jsonb', 'json_agg', 'jsonb_agg', 'json_object_agg',
+    'jsonb_object_agg', 'hstore', 'json_object',
+}
+
+SYSTEM_CATALOGS = {'pg_catalog', 'information_schema', 'sqlite_master', 'sqlite_schema'}
+
+# Tables with sensitive columns that may only be read column by column
+NO_STAR_TABLES = {'users'}
+
+# Set-returning functions allowed in FROM
+ALLOWED_TABLE_FUNCTIONS = {'generate_series'}
+
+# Words after which an opening parenthesis starts a subquery/expression rather than a function call
+NON_FUNCTION_WORDS = {
+    'select', 'from', 'join', 'where', 'and', 'or', 'not', 'in', 'exists', 'any', 'all', 'as',
+    'on', 'having', 'union', 'intersect', 'except', 'lateral', 'with', 'by', 'then', 'else',
+    'when', 'case', 'is', 'like', 'between', 'some', 'values',
+}
+
+# Functions whose argument syntax uses FROM without reading a table (EXTRACT(YEAR FROM day))
+FROM_ARGUMENT_FUNCTIONS = {'extract', 'substring', 'trim', 'overlay', 'position'}
+
+CLAUSE_KEYWORDS = {
+    'where', 'group', 'order', 'having', 'limit', 'offset', 'union', 'intersect', 'except',
+    'on', 'using', 'join', 'inner', 'left', 'right', 'full', 'outer', 'cross', 'natural',
+    'window', 'fetch', 'for', 'lateral',
+}
+
+TOKEN_RE = re.compile(r"""
+    (?P<string>'(?:[^']|'')*')
+  | (?P<quoted>"(?:[^"]|"")+")
+  | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+  | (?P<number>\d+(?:\.\d+)?)
+  | (?P<symbol>::|<=|>=|<>|!=|\|\||[(),.;*=<>+\-/%])
+  | (?P<space>\s+)
+  | (?P<other>.)
+""", re.VERBOSE | re.DOTALL)
+
+
+class SQLGuardError(Exception):
+    """Raised when AI-generated SQL is rejected by the guard"""
+    pass
+
+
+class GuardedResult:
+    """Rows from a guarded query plus whether they were cut off at the row limit"""
+
+    def __init__(self, rows: List[Dict[str, Any]], columns: List[str], truncated: bool, row_limit: int,
+                 error: str = None):
+        self.rows = rows
+        self.columns = columns
+        self.truncated = truncated
+        self.row_limit = row_limit
+        self.error = error
+
+    @property
+    def notice(self):
+        if self.error:
+            return f"The generated query could not be run: {self.error}"
+        if self.truncated:
+            return f"Showing the first {self.row_limit} rows; the full result was larger and has been truncated."
+        return None
+
+
+def _strip_comments(sql: str) -> str:
+    """Remove -- and /* */ comments, leaving string literals untouched"""
+    out = []
+    i = 0
+    while i < len(sql):
+        if sql[i] == "'":
+            end = i + 1
+            while end < len(sql):
+                if sql[end] == "'" and sql[end + 1:end + 2] == "'":
+                    end += 2
+                elif sql[end] == "'":
+                    break
+                else:
+                    end += 1
+            out.append(sql[i:end + 1])
+            i = end + 1
+        elif sql.startswith('--', i):
+            newline = sql.find('\n', i)
+            i = len(sql) if newline == -1 else newline
+        elif sql.startswith('/*', i):
+            close = sql.find('*/', i + 2)
+            if close == -1:
+                raise SQLGuardError("Unterminated comment in query")
+            out.append(' ')
+            i = close + 2
+        else:
+            out.append(sql[i])
+            i += 1
+    return ''.join(out)
+
+
+def _tokenize(sql: str) -> List[tuple]:
+    tokens = []
+    for match in TOKEN_RE.finditer(sql):
+        kind = match.lastgroup
+        value = match.group()
+        if kind == 'space':
+            continue
+        if kind == 'other':
+            raise SQLGuardError(f"Unexpected character in query: {value!r}")
+        if kind == 'quoted':
+            kind, value = 'word', value[1:-1].replace('""', '"')
+            tokens.append((kind, value, True))
+            continue
+        tokens.append((kind, value, False))
+    return tokens
+
+
+def validate_select(sql: str) -> Set[str]:
+    """Check that `sql` is a single read-only SELECT over allowed tables
+
+    Returns the set of tables it reads. Raises SQLGuardError otherwise.
+    """
+    sql = _strip_comments(sql).strip().rstrip(';').strip()
+    if not sql:
+        raise SQLGuardError("Query is empty")
+    if '$$' in sql:
+        raise SQLGuardError("Dollar-quoted strings are not allowed")
+
+    tokens = _tokenize(sql)
+    if any(kind == 'symbol' and value == ';' for kind, value, _ in tokens):
+        raise SQLGuardError("Only a single statement is allowed")
+
+    first = tokens[0][1].lower()
+    if first not in ('select', 'with'):
+        raise SQLGuardError("Only SELECT queries are allowed")
+
+    cte_names = set()
+    tables = set()
+    # Base tables and their aliases: as a bare value (u, u::text, CAST(users AS text)) they stand for the whole row
+    row_names = set()
+    bare_words = []
+    paren_stack = []
+    star_columns = False
+
+    def word(i):
+        return tokens[i][1].lower() if i < len(tokens) and tokens[i][0] == 'word' else None
+
+    def symbol(i):
+        return tokens[i][1] if i < len(tokens) and tokens[i][0] == 'symbol' else None
+
+    def read_table_refs(i):
+        """Read the comma separated table references after FROM/JOIN starting at token i"""
+        while i < len(tokens):
+            if word(i) == 'lateral':
+                i += 1
+            if symbol(i) == '(':
+                # Derived table: its contents are validated as the main loop walks through them
+                return i
+            name = word(i)
+            if name is None:
+                raise SQLGuardError("Could not parse table reference")
+            if symbol(i + 1) == '.' and word(i + 2) is not None:
+                # schema.table - only the public schema is readable
+                if name != 'public':
+                    raise SQLGuardError(f"Schema '{name}' is not allowed")
+                i += 2
+                name = word(i)
+            if symbol(i + 1) == '(':
+                if name not in ALLOWED_TABLE_FUNCTIONS:
+                    raise SQLGuardError(f"Function '{name}' is not allowed in FROM")
+                # Skip over the (scalar) arguments of the table function
+                depth = 0
+                i += 1
+                while i < len(tokens):
+                    if word(i) == 'select':
+                        raise SQLGuardError(f"Subqueries are not allowed inside '{name}'")
+                    if symbol(i) == '(':
+                        depth += 1
+                    elif symbol(i) == ')':
+                        depth -= 1
+                        if depth == 0:
+                            break
+                    i += 1
+            elif name not in cte_names:
+                if name not in ALLOWED_TABLES:
+                    raise SQLGuardError(f"Table '{name}' is not allowed")
+                tables.add(name)
+                row_names.add(name)
+            base_table = name in tables and symbol(i + 1) != '('
+            i += 1
+            # Optional alias
+            if word(i) == 'as':
+                i += 1
+            if word(i) is not None and word(i) not in CLAUSE_KEYWORDS and word(i) not in NON_FUNCTION_WORDS:
+                if base_table:
+                    row_names.add(word(i))
+                i += 1
+            if symbol(i) == ',':
+                i += 1
+                continue
+            return i
+        return i
+
+    i = 0
+    while i < len(tokens):
+        kind, value, quoted = tokens[i]
+        lowered = value.lower()
+
+        if kind == 'word':
+            if lowered in FORBIDDEN_IDENTIFIERS:
+                raise SQLGuardError(f"Column '{value}' is not allowed")
+            if not quoted and lowered in FORBIDDEN_KEYWORDS:
+                raise SQLGuardError(f"'{value.upper()}' is not allowed in report queries")
+            if lowered in (FORBIDDEN_FUNCTIONS | ROW_SERIALIZING_FUNCTIONS) and symbol(i + 1) == '(':
+                raise SQLGuardError(f"Function '{value}' is not allowed")
+            if lowered in SYSTEM_CATALOGS:
+                raise SQLGuardError(f"'{value}' is not allowed")
+
+            # CTE definitions: WITH [RECURSIVE] name [(columns)] AS (...), name AS (...)
+            previous = word(i - 1)
+            if previous in ('with', 'recursive') or symbol(i - 1) == ',':
+                after = i + 1
+                if symbol(after) == '(':
+                    while after < len(tokens) and symbol(after) != ')':
+                        after += 1
+                    after += 1
+                if word(after) == 'as' and symbol(after + 1) == '(':
+                    cte_names.add(lowered)
+
+            if not quoted and lowered == 'select' and paren_stack:
+                # A query opened inside any parenthesis, ARRAY(SELECT ...) included, reads its FROM as usual
+                paren_stack[-1] = 'select'
+            from_argument = paren_stack and paren_stack[-1] in FROM_ARGUMENT_FUNCTIONS
+            if not quoted and lowered in ('from', 'join') and not from_argument:
+                i = read_table_refs(i + 1)
+                continue
+            if symbol(i + 1) not in ('.', '('):
+                bare_words.append(lowered)
+
+        elif kind == 'symbol' and value == '*' and (word(i - 1) == 'select' or symbol(i - 1) in (',', '.')):
+            star_columns = True
+        elif kind == 'symbol' and value == '(':
+            previous = word(i - 1)
+            is_function = previous is not None and previous not in NON_FUNCTION_WORDS and previous not in CLAUSE_KEYWORDS
+            paren_stack.append(previous if is_function else 'group')
+        elif kind == 'symbol' and value == ')':
+            if not paren_stack:
+                raise SQLGuardError("Unbalanced parentheses in query")
+            paren_stack.pop()
+
+        i += 1
+
+    if paren_stack:
+        raise SQLGuardError("Unbalanced parentheses in query")
+    if not tables:
+        raise SQLGuardError("Query does not read any allowed table")
+    whole_rows = row_names.intersection(bare_words)
+    if whole_rows:
+        raise SQLGuardError(f"'{sorted(whole_rows)[0]}' refers to whole table rows; select its columns instead")
+    if star_columns and tables & NO_STAR_TABLES:
+        raise SQLGuardError("SELECT * is not allowed on the users table; list the columns instead")
+    return tables
+
+
+TEMPORAL_TYPES = (date, datetime, time_of_day)
+
+
+def _temporal_columns(rows, width: int) -> Set[int]:
+    return {index for index in range(width) if any(isinstance(row[index], TEMPORAL_TYPES) for row in rows)}
+
+
+def _convert_batch(rows, columns: List[str], temporal_columns: Set[int]) -> List[Dict[str, Any]]:
+    """Convert a batch of rows to dicts, touching only the columns that hold dates"""
+    if not temporal_columns:
+        return [dict(zip(columns, row)) for row in rows]
+    converted = []
+    for row in rows:
+        values = list(row)
+        for index in temporal_columns:
+            # Untyped expressions (CASE, COALESCE, SQLite) can mix dates with other values
+            if isinstance(values[index], TEMPORAL_TYPES):
+                values[index] = values[index].isoformat()
+        converted.append(dict(zip(columns, values)))
+    return converted
+
+
+class GuardedQueryExecutor:
+    """Runs validated SELECTs read-only, with a row limit and a statement timeout"""
+
+    def __init__(self, row_limit: int = AI_SQL_ROW_LIMIT, timeout_ms: int = AI_SQL_TIMEOUT_MS,
+                 batch_size: int = AI_SQL_BATCH_SIZE):
+        self.row_limit = row_limit
+        self.timeout_ms = timeout_ms
+        self.batch_size = batch_size
+
+    def _bounded_sql(self, sql: str) -> str:
+        """Wrap the query so the database itself stops after row_limit + 1 rows"""
+        sql = _strip_comments(sql).strip().rstrip(';').strip()
+        return f"SELECT * FROM ({sql}) AS guarded_result LIMIT {self.row_limit + 1}"
+
+    def _begin_read_only(self, conn):
+        dialect = conn.dialect.name
+        if dialect == 'postgresql':
+            conn.execute(text("SET TRANSACTION READ ONLY"))
+            conn.execute(text(f"SET LOCAL statement_timeout = {int(self.timeout_ms)}"))
+        elif dialect == 'sqlite':
+            raw = conn.connection.driver_connection
+            raw.execute("PRAGMA query_only = ON")
+            deadline = time.monotonic() + self.timeout_ms / 1000
+            # Returning non-zero from the progress handler aborts the running statement
+            raw.set_progress_handler(lambda: int(time.monotonic() > deadline), 10000)
+
+    def _end_read_only(self, conn):
+        if conn.dialect.name == 'sqlite':
+            raw = conn.connection.driver_connection
+            raw.set_progress_handler(None, 0)
+            raw.execute("PRAGMA query_only = OFF")
+
+    def execute(self, engine, sql: str) -> GuardedResult:
+        """Validate and run `sql`, returning at most row_limit rows"""
+        validate_select(sql)
+
+        with engine.connect() as conn:
+            conn = conn.execution_options(stream_results=True)
+            with conn.begin():
+                self._begin_read_only(conn)
+                try:
+                    result = conn.execute(text(self._bounded_sql(sql)))
+                    columns = list(result.keys())
+
+                    rows = []
+                    temporal_columns = set()
+                    while len(rows) <= self.row_limit:
+                        batch = result.fetchmany(self.batch_size)
+                        if not batch:
+                            break
+                        # A column can be all NULL in one batch and hold dates in the next
+                        temporal_columns |= _temporal_columns(batch, len(columns))
+                        rows.extend(_convert_batch(batch, columns, temporal_columns))
+                    result.close()
+                finally:
+                    self._end_read_only(conn)
+
+        truncated = len(rows) > self.row_limit
+        return GuardedResult(rows[:self.row_limit], columns, truncated, self.row_limit)
+
+
+# Global instance
+guarded_query_executor = GuardedQueryExecutor()
@@ -0,0 +1,331 @@
+"""
+Monthly stock_movements partitions, Parquet archives of old months, and ledger reads spanning both
+"""
+import os
+import hashlib
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional
+from sqlalchemy import select, text, func
+from models import db, Component, StockMovement, StockMovementArchive
+
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:
+    pyarrow = None
+    parquet = None
+
+
+# Stock ledger tuning (see example.env)
+STOCK_ARCHIVE_DIR = os.getenv('STOCK_ARCHIVE_DIR', os.path.join('instance', 'stock_archive'))
+STOCK_ARCHIVE_AFTER_MONTHS = int(os.getenv('STOCK_ARCHIVE_AFTER_MONTHS', '24'))
+STOCK_PARTITION_MONTHS_AHEAD = int(os.getenv('STOCK_PARTITION_MONTHS_AHEAD', '3'))
+STOCK_ARCHIVE_BATCH_SIZE = int(os.getenv('STOCK_ARCHIVE_BATCH_SIZE', '100000'))
+STOCK_ARCHIVE_COMPRESSION = os.getenv('STOCK_ARCHIVE_COMPRESSION', 'zstd')
+
+LEDGER_COLUMNS = ('id', 'component_id', 'movement_type', 'quantity', 'reference', 'notes', 'created_at')
+DEFAULT_PARTITION = 'stock_movements_default'
+
+
+class StockArchiveError(Exception):
+    pass
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"stock_movements_p{month:%Y%m}"
+
+
+def _archive_schema():
+    return pyarrow.schema([
+        ('id', pyarrow.int64()),
+        ('component_id', pyarrow.int64()),
+        ('movement_type', pyarrow.string()),
+        ('quantity', pyarrow.int64()),
+        ('reference', pyarrow.string()),
+        ('notes', pyarrow.string()),
+        ('created_at', pyarrow.timestamp('us')),
+    ])
+
+
+class StockLedger:
+    """Keeps the stock ledger fast as it grows
+
+    On PostgreSQL stock_movements is range-partitioned by month (see the migration), so
+    inserts land in a small hot partition and recent-ledger reads prune to the newest
+    partitions. Months older than STOCK_ARCHIVE_AFTER_MONTHS are written to compressed
+    Parquet files and dropped from the database; ledger and export reads fall through to
+    those files for archived periods. SQLite has no partitions, but archiving still moves
+    old months out with a range DELETE.
+    """
+
+    # Partitions
+
+    def is_partitioned(self, connection) -> bool:
+        if connection.dialect.name != 'postgresql':
+            return False
+        return connection.execute(text(
+            "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = 'stock_movements'"
+        )).first() is not None
+
+    def partitions(self, connection) -> List[date]:
+        """Months that have their own partition, oldest first"""
+        rows = connection.execute(text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = 'stock_movements'"
+        ))
+        months = []
+        for (name,) in rows:
+            if name.startswith('stock_movements_p') and name[-6:].isdigit():
+                months.append(date(int(name[-6:-2]), int(name[-2:]), 1))
+        return sorted(months)
+
+    def ensure_partitions(self, connection=None, since: Optional[date] = None,
+                          months_ahead: int = STOCK_PARTITION_MONTHS_AHEAD) -> List[str]:
+        """Create monthly partitions from `since` (default: this month) to months_ahead ahead
+
+        Rows already caught by the default partition for a new month are moved into it, so
+        this can also be run after data for a month arrived early.
+        """
+        if connection is None:
+            with db.engine.begin() as connection:
+                return self.ensure_partitions(connection, since, months_ahead)
+        if not self.is_partitioned(connection):
+            return []
+        existing = set(self.partitions(connection))
+        month = month_start(since or datetime.utcnow())
+        last = add_months(month_start(datetime.utcnow()), months_ahead)
+        created = []
+        while month <= last:
+            if month not in existing:
+                name, end = partition_name(month), add_months(month, 1)
+                connection.execute(text(
+                    f"CREATE TABLE {name} (LIKE stock_movements INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+                connection.execute(text(
+                    f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= :start AND created_at < :end "
+                    f"RETURNING *) INSERT INTO {name} SELECT * FROM moved"), {'start': month, 'end': end})
+                connection.execute(text(
+                    f"ALTER TABLE stock_movements ATTACH PARTITION {name} FOR VALUES FROM ('{month}') TO ('{end}')"))
+                created.append(name)
+            month = add_months(month, 1)
+        return created
+
+    # Archiving
+
+    def _archive_path(self, month: date, stamp: str) -> str:
+        return os.path.join(f"{month:%Y}", f"stock_movements_{month:%Y%m}_{stamp}.parquet")
+
+    def _months_to_archive(self, connection, cutoff: date) -> List[date]:
+        months = set()
+        if self.is_partitioned(connection):
+            months.update(month for month in self.partitions(connection) if month < cutoff)
+        # Rows outside monthly partitions (SQLite, or the default partition) are found by date
+        oldest = connection.execute(
+            select(func.min(StockMovement.created_at)).where(StockMovement.created_at < cutoff)).scalar()
+        if oldest is not None:
+            month = month_start(oldest)
+            while month < cutoff:
+                months.add(month)
+                month = add_months(month, 1)
+        return sorted(months)
+
+    def _write_parquet(self, connection, month: date, path: str) -> Dict[str, Any]:
+        """Stream a month's rows into a Parquet file; returns row count, id range and component ids"""
+        columns = [getattr(StockMovement, name) for name in LEDGER_COLUMNS]
+        query = (select(*columns)
+                 .where(StockMovement.created_at >= month, StockMovement.created_at < add_months(month, 1))
+                 .order_by(StockMovement.created_at, StockMovement.id))
+        result = connection.execution_options(stream_results=True, yield_per=STOCK_ARCHIVE_BATCH_SIZE).execute(query)
+        schema = _archive_schema()
+        count, min_id, max_id = 0, None, None
+        component_ids = set()
+        writer = None
+        try:
+            for batch in result.partitions(STOCK_ARCHIVE_BATCH_SIZE):
+                if writer is None:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    writer = parquet.ParquetWriter(path, schema, compression=STOCK_ARCHIVE_COMPRESSION)
+                table = pyarrow.Table.from_arrays([pyarrow.array([row[i] for row in batch], type=schema.field(i).type)
+                                                   for i in range(len(LEDGER_COLUMNS))], schema=schema)
+                writer.write_table(table, row_group_size=STOCK_ARCHIVE_BATCH_SIZE)
+                ids = [row[0] for row in batch]
+                batch_min, batch_max = min(ids), max(ids)
+                min_id = batch_min if min_id is None else min(min_id, batch_min)
+                max_id = batch_max if max_id is None else max(max_id, batch_max)
+                component_ids.update(row[1] for row in batch)
+                count += len(batch)
+        finally:
+            if writer is not None:
+                writer.close()
+        return {'row_count': count, 'min_id': min_id, 'max_id': max_id, 'component_ids': sorted(component_ids)}
+
+    def _remove_month(self, connection, month: date, stats: Dict[str, Any], partitioned: bool):
+        end = add_months(month, 1)
+        if partitioned and month in self.partitions(connection):
+            name = partition_name(month)
+            connection.execute(text(f"LOCK TABLE {name} IN ACCESS EXCLUSIVE MODE"))
+            current = connection.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+            if current != stats['row_count']:
+                raise StockArchiveError(f"{name} changed while it was archived ({current} rows now, "
+                                        f"{stats['row_count']} written)")
+            connection.execute(text(f"ALTER TABLE stock_movements DETACH PARTITION {name}"))
+            connection.execute(text(f"DROP TABLE {name}"))
+        else:
+            deleted = connection.execute(StockMovement.__table__.delete().where(
+                StockMovement.created_at >= month, StockMovement.created_at < end,
+                StockMovement.id >= stats['min_id'], StockMovement.id <= stats['max_id']
+            )).rowcount
+            if deleted != stats['row_count']:
+                raise StockArchiveError(f"{month:%Y-%m} changed while it was archived ({deleted} rows deleted, "
+                                        f"{stats['row_count']} written)")
+
+    def archive(self, older_than_months: int = STOCK_ARCHIVE_AFTER_MONTHS, dry_run: bool = False) -> List[Dict[str, Any]]:
+        """Move every month older than the cutoff into Parquet files; returns one entry per month"""
+        if pyarrow is None:
+            raise StockArchiveError('Archiving stock movements needs pyarrow (pip install pyarrow)')
+        from analytics import analytics_refresher
+        # The fact table keeps full history for reports, so it must have every row first
+        analytics_refresher.refresh()
+
+        cutoff = add_months(month_start(datetime.utcnow()), -older_than_months)
+        archived = []
+        with db.engine.connect() as connection:
+            partitioned = self.is_partitioned(connection)
+            months = self._months_to_archive(connection, cutoff)
+        for month in months:
+            if dry_run:
+                archived.append({'month': f"{month:%Y-%m}", 'dry_run': True})
+                continue
+            stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S')
+            relative_path = self._archive_path(month, stamp)
+            path = os.path.join(STOCK_ARCHIVE_DIR, relative_path)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                with db.engine.begin() as connection:
+                    stats = self._write_parquet(connection, month, temp_path)
+                    if stats['row_count'] == 0:
+                        if partitioned and month in self.partitions(connection):
+                            self._remove_month(connection, month, stats, partitioned)
+                        continue
+                    if parquet.ParquetFile(temp_path).metadata.num_rows != stats['row_count']:
+                        raise StockArchiveError(f"Parquet file for {month:%Y-%m} is incomplete")
+                    os.replace(temp_path, path)
+                    self._remove_month(connection, month, stats, partitioned)
+                    with open(path, 'rb') as f:
+                        digest = hashlib.file_digest(f, 'sha256').hexdigest()
+                    connection.execute(StockMovementArchive.__table__.insert().values(
+                        month=month, path=relative_path, row_count=stats['row_count'], min_id=stats['min_id'],
+                        max_id=stats['max_id'], component_ids=stats['component_ids'],
+                        size_bytes=os.path.getsize(path), sha256=digest,
+                        archived_at=datetime.utcnow()))
+            except Exception:
+                for leftover in (temp_path, path):
+                    if os.path.exists(leftover):
+                        os.remove(leftover)
+                raise
+            archived.append({'month': f"{month:%Y-%m}", 'rows': stats['row_count'], 'path': relative_path})
+            print(f"📦 Archived {stats['row_count']} stock movements for {month:%Y-%m} to {relative_path}")
+        return archived
+
+    # Reads
+
+    def _archives(self, start: Optional[datetime], end: Optional[datetime], newest_first: bool,
+                  component_id: Optional[int] = None):
+        """Archives covering [start, end], without the ones that hold no rows for component_id"""
+        query = StockMovementArchive.query
+        if start is not None:
+            query = query.filter(StockMovementArchive.month >= month_start(start))
+        if end is not None:
+            query = query.filter(StockMovementArchive.month <= month_start(end))
+        order = StockMovementArchive.month.desc() if newest_first else StockMovementArchive.month
+        archives = query.order_by(order, StockMovementArchive.id).all()
+        if component_id is None:
+            return archives
+        # Archives written before component ids were recorded have to be opened
+        return [archive for archive in archives
+                if archive.component_ids is None or component_id in archive.component_ids]
+
+    def _read_archive(self, archive, component_id, start, end) -> List[Dict[str, Any]]:
+        if parquet is None:
+            raise StockArchiveError('Reading archived stock movements needs pyarrow (pip install pyarrow)')
+        filters = []
+        if component_id is not None:
+            filters.append(('component_id', '=', component_id))
+        if start is not None:
+            filters.append(('created_at', '>=', start))
+        if end is not None:
+            filters.append(('created_at', '<', end))
+        table = parquet.read_table(os.path.join(STOCK_ARCHIVE_DIR, archive.path), filters=filters or None)
+        return table.to_pylist()
+
+    def _hot_query(self, component_id, start, end):
+        query = select(*[getattr(StockMovement, name) for name in LEDGER_COLUMNS])
+        if component_id is not None:
+            query = query.where(StockMovement.component_id == component_id)
+        if start is not None:
+            query = query.where(StockMovement.created_at >= start)
+        if end is not None:
+            query = query.where(StockMovement.created_at < end)
+        return query
+
+    @staticmethod
+    def _serialize(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        names = dict(db.session.execute(
+            select(Component.id, Component.name).where(Component.id.in_({row['component_id'] for row in rows}))
+        ).all()) if rows else {}
+        return [{
+            'id': row['id'],
+            'component_id': row['component_id'],
+            'component_name': names.get(row['component_id']),
+            'movement_type': row['movement_type'],
+            'quantity': row['quantity'],
+            'reference': row['reference'],
+            'notes': row['notes'],
+            'created_at': row['created_at'].isoformat()
+        } for row in rows]
+
+    def recent(self, limit: int = 100, component_id: Optional[int] = None, start: Optional[datetime] = None,
+               end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Newest movements first; archived months are read only when the database runs out"""
+        query = self._hot_query(component_id, start, end).order_by(
+            StockMovement.created_at.desc(), StockMovement.id.desc()).limit(limit)
+        rows = [dict(row._mapping) for row in db.session.execute(query)]
+        if len(rows) < limit:
+            for archive in self._archives(start, end, newest_first=True, component_id=component_id):
+                archived = self._read_archive(archive, component_id, start, end)
+                archived.sort(key=lambda row: (row['created_at'], row['id']), reverse=True)
+                rows.extend(archived[:limit - len(rows)])
+                if len(rows) >= limit:
+                    break
+        return self._serialize(rows)
+
+    def iter_rows(self, component_id: Optional[int] = None, start: Optional[datetime] = None,
+                  end: Optional[datetime] = None, batch_size: int = 5000) -> Iterator[List[Dict[str, Any]]]:
+        """Raw ledger rows oldest first, in batches: archived months, then the database"""
+        for archive in self._archives(start, end, newest_first=False, component_id=component_id):
+            rows = self._read_archive(archive, component_id, start, end)  # Written in (created_at, id) order
+            for offset in range(0, len(rows), batch_size):
+                yield rows[offset:offset + batch_size]
+        query = self._hot_query(component_id, start, end).order_by(StockMovement.created_at, StockMovement.id)
+        result = db.session.execute(query.execution_options(yield_per=batch_size))
+        for batch in result.partitions(batch_size):
+            yield [dict(row._mapping) for row in batch]
+
+    def iter_movements(self, component_id: Optional[int] = None, start: Optional[datetime] = None,
+                       end: Optional[datetime] = None, batch_size: int = 5000) -> Iterator[List[Dict[str, Any]]]:
+        """Serialized movements oldest first, in batches (for exports)"""
+        for rows in self.iter_rows(component_id, start, end, batch_size):
+            yield self._serialize(rows)
+
+
+# Global instance
+stock_ledger = StockLedger()
@@ -0,0 +1,380 @@
+"""
+Deterministic synthetic manufacturing data at configurable scale, bulk-loaded with COPY or executemany
+"""
+import io
+import os
+import csv
+import json
+import enum
+import time
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from sqlalchemy import func, select, text
+from models import (db, User, UserRole, WorkCenter, Component, BillOfMaterial, BOMComponent, BOMRevision,
+                    BOMRevisionLine, ManufacturingOrder, OrderStatus, WorkOrder, WorkOrderStatus, StockMovement)
+from password_hashing import password_hasher
+from collection_versions import collection_versions
+from stock_ledger import stock_ledger
+
+
+SEED_USER_EMAIL = 'loadtest{}@example.com'
+SEED_USER_PASSWORD = 'loadtest123'
+MANIFEST_PATH = os.path.join('instance', 'synthetic_data.json')
+BATCH_SIZE = 10000
+
+# Operational tables the generator replaces, children first
+TRUNCATE_ORDER = (StockMovement, WorkOrder, ManufacturingOrder, BOMRevisionLine, BOMRevision, BOMComponent, BillOfMaterial,
+                  Component, WorkCenter)
+
+FIRST_NAMES = ['Alex', 'Sam', 'Priya', 'Chen', 'Maria', 'Omar', 'Lena', 'Ravi', 'Kofi', 'Yuki', 'Ana', 'Jonas']
+LAST_NAMES = ['Patel', 'Garcia', 'Nguyen', 'Smith', 'Okafor', 'Kim', 'Rossi', 'Schmidt', 'Silva', 'Haddad']
+DEPARTMENTS = ['Assembly', 'Machining', 'Quality', 'Logistics', 'Maintenance']
+CENTER_TYPES = ['Assembly Line', 'CNC Mill', 'Lathe', 'Paint Booth', 'Welding Cell', 'Packaging', 'Inspection']
+PART_TYPES = ['Bolt', 'Nut', 'Washer', 'Bracket', 'Panel', 'Shaft', 'Bearing', 'Gear', 'Spring', 'Housing',
+              'Gasket', 'Cable', 'Motor', 'Sensor', 'Board', 'Frame', 'Hinge', 'Valve']
+PRODUCTS = ['Desk', 'Chair', 'Cabinet', 'Shelf', 'Cart', 'Workbench', 'Stool', 'Locker', 'Rack', 'Table']
+SUPPLIERS = ['Acme Supply', 'Northwind Parts', 'Globex Industrial', 'Initech Components', 'Umbrella Metals']
+STEP_NAMES = ['Cutting', 'Machining', 'Assembly', 'Welding', 'Painting', 'Quality Check', 'Packaging']
+PRIORITIES = ['Low', 'Medium', 'Medium', 'High', 'Urgent']
+
+
+class BulkWriter:
+    """Inserts row dicts in batches: COPY on PostgreSQL, executemany everywhere else"""
+
+    def __init__(self, connection, batch_size: int = BATCH_SIZE):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.use_copy = connection.dialect.name == 'postgresql'
+
+    @staticmethod
+    def _copy_value(value: Any) -> Any:
+        if value is None:
+            return '\\N'
+        if isinstance(value, enum.Enum):
+            return value.name  # SQLAlchemy stores enum names
+        if isinstance(value, datetime):
+            return value.isoformat()
+        if isinstance(value, bool):
+            return 't' if value else 'f'
+        return value
+
+    def _copy(self, table, columns: List[str], batch: List[Dict[str, Any]]):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in batch:
+            writer.writerow([self._copy_value(row[column]) for column in columns])
+        buffer.seek(0)
+        cursor = self.connection.connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+        finally:
+            cursor.close()
+
+    def write(self, model, rows: Iterable[Dict[str, Any]]) -> int:
+        table = model.__table__
+        columns = [column.name for column in table.columns]
+        count = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self._flush(table, columns, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            self._flush(table, columns, batch)
+            count += len(batch)
+        return count
+
+    def _flush(self, table, columns, batch):
+        if self.use_copy:
+            self._copy(table, columns, batch)
+        else:
+            self.connection.execute(table.insert(), batch)
+
+
+class SyntheticDataGenerator:
+    """Fills the operational tables with reproducible data: the same seed and anchor date
+    always produce the same rows
+
+    Rows are generated lazily and written in batches, so millions of orders never sit in
+    memory at once. Seeded users (loadtest<N>@example.com) are added to, never replaced.
+    """
+
+    def __init__(self, seed: int = 42, scale: float = 1.0, users: int = 50, work_centers: int = 10,
+                 components: int = 500, boms: int = 200, lines_per_bom: int = 8, orders: int = 10000,
+                 work_orders_per_order: int = 3, movements: int = 50000, anchor: Optional[datetime] = None):
+        def scaled(count):
+            return max(1, int(count * scale))
+        self.seed = seed
+        self.users = scaled(users)
+        self.work_centers = work_centers
+        self.components = scaled(components)
+        self.boms = scaled(boms)
+        self.lines_per_bom = min(lines_per_bom, self.components)
+        self.orders = scaled(orders)
+        self.work_orders_per_order = work_orders_per_order
+        self.movements = scaled(movements)
+        # Dates are spread over the year before the anchor, so period filters find data
+        self.anchor = anchor or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.order_id_width = max(3, len(str(self.orders)))
+
+    def _rng(self, table: str) -> random.Random:
+        # One stream per table: changing one count doesn't reshuffle every other table
+        return random.Random(f"{self.seed}:{table}")
+
+    def _past(self, rng: random.Random, days: int = 365) -> datetime:
+        return self.anchor - timedelta(seconds=rng.randint(0, days * 86400))
+
+    # Row generators
+
+    def _user_rows(self, indexes: List[int], first_id: int, password_hash: str) -> Iterator[Dict[str, Any]]:
+        for offset, index in enumerate(indexes):
+            # Seeded per user so topping up a smaller run yields the same people
+            rng = random.Random(f"{self.seed}:users:{index}")
+            yield {
+                'id': first_id + offset,
+                'email': SEED_USER_EMAIL.format(index),
+                'password_hash': password_hash,
+                'first_name': rng.choice(FIRST_NAMES),
+                'last_name': rng.choice(LAST_NAMES),
+                'phone': f"+1-555-{rng.randint(1000, 9999)}",
+                'department': rng.choice(DEPARTMENTS),
+                'role': UserRole.MANAGER if index % 10 == 0 else UserRole.OPERATOR,
+                'avatar': None,
+                'is_active': True,
+                'last_login': None,
+                'created_at': self._past(rng, 730)
+            }
+
+    def _work_center_rows(self) -> Iterator[Dict[str, Any]]:
+        rng = self._rng('work_centers')
+        for i in range(1, self.work_centers + 1):
+            yield {
+                'id': i,
+                'name': f"{CENTER_TYPES[(i - 1) % len(CENTER_TYPES)]} {(i - 1) // len(CENTER_TYPES) + 1}",
+                'description': None,
+                'cost_per_hour': round(rng.uniform(20, 120), 2),
+                'capacity': rng.randint(1, 4),
+                'efficiency': round(rng.uniform(0.7, 1.0), 2),
+                'is_active': True,
+                'created_at': self._past(rng, 730)
+            }
+
+    def _component_rows(self) -> Iterator[Dict[str, Any]]:
+        rng = self._rng('components')
+        for i in range(1, self.components + 1):
+            yield {
+                'id': i,
+                'name': f"{PART_TYPES[(i - 1) % len(PART_TYPES)]} {i:05d}",
+                'quantity_on_hand': rng.randint(0, 5000),
+                'unit_cost': round(rng.uniform(0.05, 250), 2),
+                'supplier': rng.choice(SUPPLIERS),
+                'reorder_level': rng.choice([10, 25, 50, 100])
+            }
+
+    def _bom_rows(self) -> Iterator[Dict[str, Any]]:
+        rng = self._rng('bills_of_material')
+        for i in range(1, self.boms + 1):
+            yield {
+                'id': i,
+                'name': f"{PRODUCTS[(i - 1) % len(PRODUCTS)]} BOM {i}",
+                'description': f"Bill of materials for {PRODUCTS[(i - 1) % len(PRODUCTS)].lower()} variant {i}",
+                'version': f"1.{rng.randint(0, 9)}",
+                'active': rng.random() > 0.05,
+                'created_at': self._past(rng, 730)
+            }
+
+    def _bom_line_rows(self) -> Iterator[Dict[str, Any]]:
+        rng = self._rng('bom_components')
+        line_id = 0
+        for bom_id in range(1, self.boms + 1):
+            for component_id in rng.sample(range(1, self.components + 1), self.lines_per_bom):
+                line_id += 1
+                yield {
+                    'id': line_id,
+                    'bom_id': bom_id,
+                    'component_id': component_id,
+                    'quantity_required': rng.randint(1, 12),
+                    'notes': None
+                }
+
+    def order_id(self, number: int) -> str:
+        # Fixed width keeps string order equal to numeric order (the create route relies on it)
+        return f"MO-{str(number).zfill(self.order_id_width)}"
+
+    def _order_and_work_order_rows(self, user_ids: List[int]):
+        """Orders and their work orders come from one stream so statuses stay consistent"""
+        rng = self._rng('manufacturing_orders')
+        statuses = [OrderStatus.DONE] * 5 + [OrderStatus.IN_PROGRESS] * 2 + [OrderStatus.PLANNED] * 2 + [OrderStatus.CANCELED]
+        work_order_id = 0
+        orders, work_orders = [], []
+        for number in range(1, self.orders + 1):
+            order_id = self.order_id(number)
+            status = rng.choice(statuses)
+            created_at = self._past(rng)
+            steps = self.work_orders_per_order
+            if status == OrderStatus.DONE:
+                completed_steps = steps
+            elif status == OrderStatus.IN_PROGRESS:
+                completed_steps = rng.randint(0, steps - 1)
+            else:
+                completed_steps = 0
+            step_start = created_at + timedelta(hours=rng.randint(1, 48))
+            order_started = None
+            for sequence in range(1, steps + 1):
+                work_order_id += 1
+                center = rng.randint(1, self.work_centers)
+                duration = rng.randint(15, 480)
+                wo = {
+                    'id': work_order_id, 'name': STEP_NAMES[(sequence - 1) % len(STEP_NAMES)], 'description': None,
+                    'duration_minutes': duration, 'status': WorkOrderStatus.PENDING,
+                    'manufacturing_order_id': order_id, 'work_center_id': center,
+                    'assigned_user_id': None, 'sequence': sequence, 'assigned_to': 'Unassigned',
+                    'started_at': None, 'completed_at': None, 'paused_at': None, 'actual_duration_minutes': None,
+                    'estimated_cost': round(duration / 60 * 60, 2), 'actual_cost': 0.0, 'notes': None,
+                    'issues': None, 'quality_check': False
+                }
+                if sequence <= completed_steps or (status == OrderStatus.IN_PROGRESS and sequence == completed_steps + 1):
+                    wo['assigned_user_id'] = rng.choice(user_ids)
+                    wo['started_at'] = step_start
+                    order_started = order_started or step_start
+                    if sequence <= completed_steps:
+                        actual = max(5, int(duration * rng.uniform(0.7, 1.4)))
+                        wo['status'] = WorkOrderStatus.COMPLETED
+                        wo['completed_at'] = step_start + timedelta(minutes=actual)
+                        wo['actual_duration_minutes'] = actual
+                        wo['actual_cost'] = round(actual / 60 * rng.uniform(20, 120), 2)
+                        wo['quality_check'] = rng.random() > 0.1
+                        step_start = wo['completed_at'] + timedelta(minutes=rng.randint(5, 240))
+                    else:
+                        wo['status'] = WorkOrderStatus.STARTED
+                wo['updated_at'] = wo['completed_at'] or wo['started_at'] or created_at
+                work_orders.append(wo)
+            bom_id = rng.randint(1, self.boms)
+            orders.append({
+                'id': order_id,
+                'product_name': PRODUCTS[number % len(PRODUCTS)],
+                'quantity': rng.randint(1, 200),
+                'deadline': created_at + timedelta(days=rng.randint(3, 60)),
+                'status': status,
+                'bom_id': bom_id,
+                'bom_revision_id': bom_id,  # Each BOM's first revision shares its id (see _write_root_revisions)
+                'priority': rng.choice(PRIORITIES),
+                'notes': None,
+                'started_at': order_started,
+                'completed_at': step_start if status == OrderStatus.DONE else None,
+                'created_at': created_at
+            })
+            if len(orders) >= BATCH_SIZE:
+                yield orders, work_orders
+                orders, work_orders = [], []
+        if orders:
+            yield orders, work_orders
+
+    def _movement_rows(self) -> Iterator[Dict[str, Any]]:
+        rng = self._rng('stock_movements')
+        for i in range(1, self.movements + 1):
+            movement_type = rng.choice(['IN', 'IN', 'OUT', 'OUT', 'OUT', 'ADJUSTMENT'])
+            yield {
+                'id': i,
+                'component_id': rng.randint(1, self.components),
+                'movement_type': movement_type,
+                'quantity': rng.randint(1, 500),
+                'reference': (self.order_id(rng.randint(1, self.orders)) if movement_type == 'OUT'
+                              else f"PO-{rng.randint(1, 99999):05d}"),
+                'notes': None,
+                'created_at': self._past(rng)
+            }
+
+    # Loading
+
+    def _seed_users(self, connection, writer: BulkWriter) -> List[int]:
+        existing = {email for (email,) in connection.execute(
+            select(User.email).where(User.email.like(SEED_USER_EMAIL.format('%'))))}
+        missing = [i for i in range(1, self.users + 1) if SEED_USER_EMAIL.format(i) not in existing]
+        if missing:
+            first_id = (connection.execute(select(func.max(User.id))).scalar() or 0) + 1
+            writer.write(User, self._user_rows(missing, first_id, password_hasher.hash(SEED_USER_PASSWORD)))
+        emails = [SEED_USER_EMAIL.format(i) for i in range(1, self.users + 1)]
+        return [user_id for (user_id,) in connection.execute(
+            select(User.id).where(User.email.in_(emails)).order_by(User.id))]
+
+    def _write_root_revisions(self, connection) -> int:
+        """Revision 1 of every BOM, holding all of its lines, so orders can be pinned to it"""
+        connection.execute(text(
+            "INSERT INTO bom_revisions (id, bom_id, revision_number, version, notes, created_at) "
+            "SELECT id, id, 1, version, 'Initial revision', created_at FROM bills_of_material"))
+        connection.execute(text(
+            "INSERT INTO bom_revision_lines (revision_id, component_id, quantity_required, notes) "
+            "SELECT bom_id, component_id, quantity_required, notes FROM bom_components"))
+        return self.boms
+
+    def _reset_sequences(self, connection):
+        if connection.dialect.name != 'postgresql':
+            return
+        for model in (User, WorkCenter, Component, BillOfMaterial, BOMComponent, BOMRevision, WorkOrder, StockMovement):
+            table = model.__tablename__
+            connection.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE((SELECT MAX(id) FROM {table}), 1))"))
+
+    def run(self, truncate: bool = False, manifest_path: Optional[str] = MANIFEST_PATH) -> Dict[str, int]:
+        """Load the data; refuses to mix with existing orders unless truncate is set"""
+        counts = {}
+        with db.engine.begin() as connection:
+            has_data = connection.execute(select(ManufacturingOrder.id).limit(1)).first() is not None
+            if has_data and not truncate:
+                raise RuntimeError('The database already has manufacturing orders; pass truncate=True to replace them')
+            if connection.dialect.name == 'sqlite':
+                connection.exec_driver_sql('PRAGMA synchronous = OFF')
+            for model in TRUNCATE_ORDER:
+                connection.execute(model.__table__.delete())
+
+            writer = BulkWriter(connection)
+            user_ids = self._seed_users(connection, writer)
+            counts['users'] = len(user_ids)
+            for model, rows in ((WorkCenter, self._work_center_rows()), (Component, self._component_rows()),
+                                (BillOfMaterial, self._bom_rows()), (BOMComponent, self._bom_line_rows())):
+                started = time.perf_counter()
+                counts[model.__tablename__] = writer.write(model, rows)
+                print(f"  {model.__tablename__}: {counts[model.__tablename__]} rows in {time.perf_counter() - started:.1f}s")
+
+            counts['bom_revisions'] = self._write_root_revisions(connection)
+
+            started = time.perf_counter()
+            counts['manufacturing_orders'] = counts['work_orders'] = 0
+            for orders, work_orders in self._order_and_work_order_rows(user_ids):
+                counts['manufacturing_orders'] += writer.write(ManufacturingOrder, orders)
+                counts['work_orders'] += writer.write(WorkOrder, work_orders)
+            print(f"  manufacturing_orders + work_orders: {counts['manufacturing_orders']} + "
+                  f"{counts['work_orders']} rows in {time.perf_counter() - started:.1f}s")
+
+            started = time.perf_counter()
+            # Movements reach back a year, older than the partitions created so far
+            stock_ledger.ensure_partitions(connection, since=self.anchor - timedelta(days=366))
+            counts['stock_movements'] = writer.write(StockMovement, self._movement_rows())
+            print(f"  stock_movements: {counts['stock_movements']} rows in {time.perf_counter() - started:.1f}s")
+
+            self._reset_sequences(connection)
+            # Bulk writes bypass the session, so bump the collection ETags by hand
+            collection_versions.bump(connection, [model.__tablename__ for model in TRUNCATE_ORDER] + ['users'])
+        if manifest_path:
+            self.write_manifest(counts, manifest_path)
+        return counts
+
+    def write_manifest(self, counts: Dict[str, int], path: str = MANIFEST_PATH):
+        """Describe the data for the load-test harness (logins, order id range)"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({
+                'seed': self.seed,
+                'anchor': self.anchor.isoformat(),
+                'counts': counts,
+                'users': [SEED_USER_EMAIL.format(i) for i in range(1, self.users + 1)],
+                'password': SEED_USER_PASSWORD,
+                'orders': self.orders,
+                'order_id_width': self.order_id_width,
+                'components': self.components
+            }, f, indent=2)
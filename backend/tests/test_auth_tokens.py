@@ -0,0 +1,76 @@
+"""
+Refresh token rotation, reuse detection and access token revocation
+"""
+import time
+from datetime import datetime, timedelta
+
+from models import db, RefreshToken
+from auth_tokens import RevocationCache, hash_refresh_token, REFRESH_REUSE_GRACE_SECONDS
+
+
+def _refresh(client, refresh_token):
+    return client.post('/api/auth/refresh', json={'refresh_token': refresh_token})
+
+
+def _can_read(client, token):
+    return client.get('/api/stock', headers={'Authorization': f'Bearer {token}'}).status_code == 200
+
+
+def test_refresh_rotates_the_refresh_token(client, login):
+    session = login(2)
+    response = _refresh(client, session['refresh_token'])
+    assert response.status_code == 200
+    rotated = response.get_json()
+    assert rotated['refresh_token'] != session['refresh_token']
+    assert _can_read(client, rotated['token'])
+
+    # The old refresh token is spent; a retry inside the grace window (two tabs) ends nothing else
+    assert _refresh(client, session['refresh_token']).status_code == 401
+    assert _can_read(client, rotated['token'])
+    assert _refresh(client, rotated['refresh_token']).status_code == 200
+
+
+def test_reusing_a_rotated_refresh_token_ends_every_session(app, client, login):
+    session = login(3)
+    other_device = login(3)
+    rotated = _refresh(client, session['refresh_token']).get_json()
+
+    # The stolen token comes back after the grace window
+    with app.app_context():
+        record = RefreshToken.query.filter_by(token_hash=hash_refresh_token(session['refresh_token'])).one()
+        record.revoked_at = datetime.utcnow() - timedelta(seconds=REFRESH_REUSE_GRACE_SECONDS + 5)
+        db.session.commit()
+    assert _refresh(client, session['refresh_token']).status_code == 401
+
+    assert _refresh(client, rotated['refresh_token']).status_code == 401
+    assert _refresh(client, other_device['refresh_token']).status_code == 401
+    assert not _can_read(client, rotated['token'])
+    assert not _can_read(client, other_device['token'])
+
+    # Logging in again starts a working session
+    assert _can_read(client, login(3)['token'])
+
+
+def test_logout_revokes_the_access_and_refresh_token(client, login):
+    session = login(2)
+    headers = {'Authorization': f"Bearer {session['token']}"}
+    response = client.post('/api/auth/logout', json={'refresh_token': session['refresh_token']}, headers=headers)
+    assert response.status_code == 200
+    assert not _can_read(client, session['token'])
+    assert _refresh(client, session['refresh_token']).status_code == 401
+
+
+def test_revocation_cache_drops_expired_entries():
+    cache = RevocationCache(capacity=10)
+    now = time.time()
+    cache.add_jti('live', now + 60)
+    cache.add_jti('expired', now - 1)
+    cache.add_user(7, not_before=now, expires_at=now + 60)
+    assert cache.is_revoked('live', 1, now)
+    assert not cache.is_revoked('expired', 1, now)
+    assert cache.is_revoked('other', 7, now - 5)
+    assert not cache.is_revoked('other', 7, now + 5)
+
+    cache.purge()
+    assert cache.is_revoked('live', 1, now)
+    assert 'expired' not in cache._jtis
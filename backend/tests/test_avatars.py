@@ -0,0 +1,106 @@
+"""
+Avatar uploads: content checks, size and pixel limits, thumbnails and safe file serving
+"""
+import base64
+import io
+import os
+
+import pytest
+from PIL import Image
+
+import avatars
+from avatars import avatar_store, AvatarError
+
+
+def _png(width=40, height=30, color=(200, 30, 30)):
+    output = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(output, 'PNG')
+    return output.getvalue()
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(avatar_store, 'storage_dir', str(tmp_path))
+    yield tmp_path
+    avatar_store.shutdown()
+
+
+def _upload(client, headers, content, filename='avatar.png'):
+    return client.post('/api/profile/avatar', headers=headers, content_type='multipart/form-data',
+                       data={'avatar': (io.BytesIO(content), filename)})
+
+
+def test_upload_makes_square_webp_thumbnails(client, auth_headers, storage):
+    response = _upload(client, auth_headers, _png())
+    assert response.status_code == 200, response.get_json()
+    url = response.get_json()['avatar_url']
+    assert url.endswith(f'/{avatar_store.default_size}.webp')
+
+    served = client.get(url)
+    assert served.status_code == 200
+    assert 'immutable' in served.headers['Cache-Control']
+    with Image.open(io.BytesIO(served.data)) as image:
+        assert image.format == 'WEBP'
+        assert image.size == (avatar_store.default_size, avatar_store.default_size)
+
+    # The same bytes again share the stored files
+    assert _upload(client, auth_headers, _png(), filename='copy.jpg').get_json()['avatar_url'] == url
+
+
+def test_content_decides_not_the_file_name(client, auth_headers, storage):
+    response = _upload(client, auth_headers, b'<?php system($_GET["c"]); ?>', filename='avatar.png')
+    assert response.status_code == 400
+    assert 'Invalid image' in response.get_json()['message']
+    assert _upload(client, auth_headers, b'', filename='empty.png').status_code == 400
+    # Nothing is left behind in the spool directory
+    assert os.listdir(storage / 'tmp') == []
+
+
+def test_byte_and_pixel_limits(client, auth_headers, storage, monkeypatch):
+    monkeypatch.setattr(avatars, 'AVATAR_MAX_BYTES', 1024)
+    response = _upload(client, auth_headers, _png(400, 400) + b'\0' * 2048)
+    assert response.status_code == 400
+    assert 'smaller than' in response.get_json()['message']
+
+    monkeypatch.setattr(avatars, 'AVATAR_MAX_BYTES', 10 * 1024 * 1024)
+    monkeypatch.setattr(avatars, 'AVATAR_MAX_PIXELS', 100 * 100)
+    # Small file, large canvas: rejected before it is decoded
+    response = _upload(client, auth_headers, _png(2000, 2000, color=(0, 0, 0)))
+    assert response.status_code == 400
+    assert 'too large' in response.get_json()['message']
+
+
+def test_data_urls_are_checked_too(storage):
+    with pytest.raises(AvatarError):
+        avatar_store.save_data_url('data:text/html;base64,' + base64.b64encode(b'<script>').decode())
+    with pytest.raises(AvatarError):
+        avatar_store.save_data_url('data:image/png;base64,not*base64!')
+    with pytest.raises(AvatarError):
+        avatar_store.save_data_url('data:image/png;base64,' + base64.b64encode(b'GIF8 but not really').decode())
+    assert avatar_store.save_data_url('data:image/png;base64,' + base64.b64encode(_png()).decode())
+
+
+def test_only_stored_avatar_files_are_served(client, storage):
+    digest = 'a' * 64
+    assert avatar_store.file_path('../' + digest[3:], '128.webp') is None
+    assert avatar_store.file_path(digest, '../../app.py') is None
+    assert avatar_store.file_path(digest, 'original.php') is None
+    assert client.get(f'/api/profile/avatars/{digest}/128.webp').status_code == 404
+    assert client.get('/api/profile/avatars/..%2F..%2Fapp.py/128.webp').status_code == 404
+
+
+def test_a_hung_worker_is_stopped_and_the_pool_replaced(client, auth_headers, storage, monkeypatch):
+    assert _upload(client, auth_headers, _png(color=(3, 2, 1))).status_code == 200
+    workers = list(avatar_store._pool._processes.values())
+
+    monkeypatch.setattr(avatars, 'AVATAR_PROCESS_TIMEOUT', 0.001)
+    response = _upload(client, auth_headers, _png(color=(1, 2, 3)))
+    assert response.status_code == 400
+    assert 'Could not process' in response.get_json()['message']
+    assert avatar_store._pool is None
+    for worker in workers:
+        worker.join(5)
+        assert not worker.is_alive()
+
+    monkeypatch.setattr(avatars, 'AVATAR_PROCESS_TIMEOUT', 30)
+    assert _upload(client, auth_headers, _png(color=(1, 2, 3))).status_code == 200
@@ -0,0 +1,135 @@
+"""
+Chart sandbox: escapes from the restricted exec environment, limits, and pool recovery
+"""
+import os
+import json
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import chart_sandbox
+from chart_sandbox import ChartSandbox, ChartSandboxError, check_chart_code, _ModuleProxy, _restricted_import
+
+CHART = """
+import plotly.graph_objects as go
+fig = go.Figure(data=go.Bar(x=[row['name'] for row in data], y=[row['value'] for row in data]))
+fig.update_layout(title='Test')
+"""
+
+ESCAPES = [
+    # Reported: modules in the globals carry the real builtins
+    "fig = go.__builtins__['__import__']('os').popen('id').read()",
+    "fig = json.__builtins__",
+    "fig = ().__class__.__base__.__subclasses__()",
+    "fig = __import__('os')",
+    "fig = (lambda: 0).__globals__",
+    "fig = '{0.__class__}'.format(1)",
+    "fig = getattr(go, '__builtins__')",
+    # Generator frames lead back to the worker module's globals without any dunder
+    "def g():\n    yield gen.gi_frame.f_back.f_back.f_globals['os']\ngen = g()\nfig = next(gen)",
+    "from plotly import _version",
+]
+
+
+@pytest.mark.parametrize('code', ESCAPES)
+def test_escapes_are_rejected_before_exec(code):
+    with pytest.raises(ChartSandboxError):
+        check_chart_code(code)
+
+
+def test_plain_chart_code_passes_the_check():
+    check_chart_code(CHART)
+
+
+def test_module_proxy_hides_private_attributes_and_other_modules():
+    proxy = _ModuleProxy(statistics)
+    assert proxy.mean([1, 2, 3]) == 2
+    with pytest.raises(AttributeError):
+        proxy.sys  # statistics imports sys
+    with pytest.raises(AttributeError):
+        proxy.random
+    with pytest.raises(AttributeError):
+        proxy._module
+    with pytest.raises(AttributeError):
+        proxy.mean = None
+
+
+def test_restricted_import_allows_only_whitelisted_modules():
+    with pytest.raises(ImportError):
+        _restricted_import('os')
+    with pytest.raises(ImportError):
+        _restricted_import('plotly', level=1)
+    plotly = _restricted_import('plotly.graph_objects')
+    assert isinstance(plotly, _ModuleProxy)
+    assert isinstance(plotly.graph_objects, _ModuleProxy)
+    # datetime.py imports sys at module level
+    with pytest.raises(AttributeError):
+        _restricted_import('datetime').sys
+
+
+def test_cpu_limit_is_restored_when_the_hard_limit_is_finite():
+    # Run in a child process: lowering the hard limit can't be undone
+    script = (
+        "import resource\n"
+        "from chart_sandbox import _run_chart_code\n"
+        "resource.setrlimit(resource.RLIMIT_CPU, (10000, 10000))\n"
+        "before = resource.getrlimit(resource.RLIMIT_CPU)\n"
+        f"ok, result = _run_chart_code({CHART!r}, [{{'name': 'a', 'value': 1}}], 5)\n"
+        "assert ok, result\n"
+        "assert resource.getrlimit(resource.RLIMIT_CPU) == before\n"
+    )
+    backend_dir = os.path.dirname(chart_sandbox.__file__)
+    completed = subprocess.run([sys.executable, '-c', script], cwd=backend_dir, capture_output=True, text=True)
+    assert completed.returncode == 0, completed.stderr
+
+
+@pytest.fixture(scope='module')
+def sandbox():
+    sandbox = ChartSandbox(workers=1, timeout=1, memory_mb=0)
+    yield sandbox
+    sandbox.shutdown()
+
+
+def test_chart_runs_in_the_pool(sandbox):
+    figure = json.loads(sandbox.run(CHART, [{'name': 'a', 'value': 1}, {'name': 'b', 'value': 2}]))
+    assert figure['data'][0]['type'] == 'bar'
+
+
+@pytest.mark.parametrize('code', ESCAPES[:2] + [
+    "import os\nfig = os.popen('id').read()",
+    "import statistics\nfig = statistics.sys.modules['os']",
+    "import plotly\nfig = plotly.basedatatypes.sys",
+])
+def test_escapes_fail_in_the_worker(sandbox, code):
+    with pytest.raises(ChartSandboxError):
+        sandbox.run(code, [])
+
+
+def test_time_limit(sandbox):
+    with pytest.raises(ChartSandboxError, match='time limit'):
+        sandbox.run("while True:\n    pass", [])
+    # The worker carries on with its next chart
+    assert json.loads(sandbox.run(CHART, [{'name': 'a', 'value': 1}]))
+
+
+def test_other_charts_survive_a_wedged_worker(sandbox):
+    # sum() over a range runs in C, so the in-worker alarm can't interrupt it and the pool is reset
+    results = {}
+
+    def bystander():
+        time.sleep(0.5)
+        try:
+            results['bystander'] = sandbox.run(CHART, [{'name': 'a', 'value': 1}])
+        except ChartSandboxError as e:
+            results['bystander'] = e
+
+    thread = threading.Thread(target=bystander)
+    thread.start()
+    with pytest.raises(ChartSandboxError, match='time limit'):
+        sandbox.run("fig = sum(range(10 ** 12))", [])
+    thread.join()
+    assert isinstance(results['bystander'], str), results['bystander']
@@ -0,0 +1,45 @@
+"""
+Chart templates: axes picked from the result schema, column-wise rendering, titles
+"""
+import base64
+import json
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+
+from chart_templates import chart_template_renderer
+
+
+def _values(trace_values):
+    """Plotly writes numeric arrays as base64 typed arrays"""
+    if isinstance(trace_values, dict):
+        array = np.frombuffer(base64.b64decode(trace_values['bdata']), dtype=trace_values['dtype'])
+        return [None if np.isnan(value) else value for value in array.tolist()]
+    return trace_values
+
+
+def test_line_chart_is_sorted_by_date_with_nulls_last():
+    rows = [{'day': '2025-01-03', 'completed': 1}, {'day': None, 'completed': 2},
+            {'day': '2025-01-01', 'completed': Decimal('3')}, {'day': date(2025, 1, 2), 'completed': None}]
+    figure = json.loads(chart_template_renderer.render('line', rows, 'Completions'))
+    trace = figure['data'][0]
+    assert trace['x'] == ['2025-01-01', '2025-01-02', '2025-01-03', None]
+    assert _values(trace['y']) == [3.0, None, 1.0, 2.0]
+    assert figure['layout']['title']['text'] == 'Completions'
+
+
+def test_bar_chart_uses_the_measure_not_the_id():
+    rows = [{'id': 1, 'name': 'Bolt', 'quantity': 5}, {'id': 2, 'name': None, 'quantity': 7}]
+    figure = json.loads(chart_template_renderer.render('bar', rows))
+    assert [trace['name'] for trace in figure['data']] == ['quantity']
+    assert figure['data'][0]['x'] == ['Bolt', '(none)']
+    assert _values(figure['data'][0]['y']) == [5.0, 7.0]
+    assert figure['layout']['title']['text'] == 'Bar Chart'
+
+
+def test_no_template_for_unusable_results():
+    assert chart_template_renderer.render('bar', [{'name': 'only text'}]) is None
+    assert chart_template_renderer.render('scatter', [{'x': 1, 'label': 'a'}]) is None
+    assert chart_template_renderer.render('heatmap', [{'x': 1, 'y': 2}]) is None
+    assert chart_template_renderer.render('line', []) is None
@@ -0,0 +1,88 @@
+"""
+Email outbox delivery against a local SMTP server: retries, permanent failures, connection reuse
+"""
+import socket
+
+import pytest
+
+pytest.importorskip('aiosmtpd')
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+
+import email_outbox
+from models import db, EmailOutbox
+from email_outbox import EmailOutboxSender, SMTPConnectionPool
+
+
+class ScriptedHandler:
+    """Replies per recipient: refused@ is refused, busy@ gets a 451, rejected@ a 554"""
+
+    def __init__(self):
+        self.delivered = []
+        self.peers = set()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith('refused@'):
+            return '550 No such user'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        self.peers.add(session.peer)
+        recipient = envelope.rcpt_tos[0]
+        if recipient.startswith('busy@'):
+            return '451 Try again later'
+        if recipient.startswith('rejected@'):
+            return '554 Message rejected'
+        self.delivered.append(recipient)
+        return '250 Message accepted for delivery'
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    handler = ScriptedHandler()
+    controller = Controller(handler, hostname='127.0.0.1', port=port, auth_require_tls=False,
+                            authenticator=lambda *args: AuthResult(success=True))
+    controller.start()
+    monkeypatch.setattr(email_outbox, 'SMTP_STARTTLS', False)
+    pool = SMTPConnectionPool(size=1)
+    pool.server, pool.port, pool.user, pool.password = '127.0.0.1', port, 'outbox@example.com', 'secret'
+    yield handler, EmailOutboxSender(threads=0, pool=pool)
+    pool.close_all()
+    controller.stop()
+
+
+def _deliver(sender):
+    batch = sender._claim_batch('test')
+    sender._send_batch(batch)
+    db.session.commit()
+
+
+def test_outbox_delivers_retries_and_gives_up(app, smtp_server):
+    handler, sender = smtp_server
+    with app.app_context():
+        EmailOutbox.query.delete()
+        ids = {address: sender.enqueue(address, 'Code', '<p>123456</p>').id
+               for address in ('ok@example.com', 'busy@example.com', 'rejected@example.com', 'refused@example.com')}
+        _deliver(sender)
+
+        emails = {address: db.session.get(EmailOutbox, email_id) for address, email_id in ids.items()}
+        assert handler.delivered == ['ok@example.com']
+        assert emails['ok@example.com'].status == 'sent'
+        # Temporary 4xx replies are retried later, 5xx replies and refused recipients are not
+        assert (emails['busy@example.com'].status, emails['busy@example.com'].attempts) == ('pending', 1)
+        assert emails['rejected@example.com'].status == 'failed'
+        assert emails['refused@example.com'].status == 'failed'
+        # Finished rows do not keep the one-time password around
+        assert emails['ok@example.com'].html_body == ''
+        assert emails['rejected@example.com'].html_body == ''
+        assert emails['busy@example.com'].html_body == '<p>123456</p>'
+
+        # The next batch goes out over the connection the first one left in the pool
+        sender.enqueue('later@example.com', 'Code', '<p>654321</p>')
+        _deliver(sender)
+        assert handler.delivered == ['ok@example.com', 'later@example.com']
+        assert len(handler.peers) == 1
@@ -0,0 +1,40 @@
+"""
+PDF export queue: jobs that keep killing their worker end up failed instead of requeued forever
+"""
+import uuid
+from datetime import datetime, timedelta
+
+from models import db, ExportJob, User
+from export_jobs import ExportJobQueue, EXPORT_MAX_ATTEMPTS, EXPORT_JOB_TIMEOUT
+
+
+def _job(status, attempts, started_minutes_ago=None):
+    job = ExportJob(id=uuid.uuid4().hex, user_id=User.query.first().id, status=status, attempts=attempts,
+                    payload='{}', created_at=datetime.utcnow() - timedelta(days=1))
+    if started_minutes_ago is not None:
+        job.started_at = datetime.utcnow() - timedelta(minutes=started_minutes_ago)
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+def test_exhausted_jobs_are_failed_not_requeued(app):
+    dead_minutes = EXPORT_JOB_TIMEOUT // 60 + 5
+    with app.app_context():
+        exhausted = _job('queued', EXPORT_MAX_ATTEMPTS)
+        crashed_last = _job('running', EXPORT_MAX_ATTEMPTS, started_minutes_ago=dead_minutes)
+        crashed_once = _job('running', 1, started_minutes_ago=dead_minutes)
+        queue = ExportJobQueue(workers=0)
+
+        # Only the job with attempts left is claimed
+        assert queue._claim_next('test') is None
+        queue._maintain()
+        db.session.expire_all()
+        assert db.session.get(ExportJob, exhausted).status == 'failed'
+        assert db.session.get(ExportJob, crashed_last).status == 'failed'
+        assert db.session.get(ExportJob, crashed_last).error
+        assert db.session.get(ExportJob, crashed_once).status == 'queued'
+
+        assert queue._claim_next('test') == crashed_once
+        job = db.session.get(ExportJob, crashed_once)
+        assert (job.status, job.attempts) == ('running', 2)
@@ -0,0 +1,100 @@
+"""
+Natural keys behind bulk imports: duplicate names over the API, raw XLSX bodies, BOM revisions
+"""
+import io
+
+import openpyxl
+
+from models import Component, BillOfMaterial
+from bom_revisions import bom_revisions
+
+
+def test_duplicate_component_name_is_a_conflict(client, auth_headers):
+    payload = {'name': 'Hinge pin', 'quantity_on_hand': 0, 'unit_cost': 1.5}
+    assert client.post('/api/components', json=payload, headers=auth_headers).status_code == 201
+    response = client.post('/api/components', json=payload, headers=auth_headers)
+    assert response.status_code == 409
+    assert 'already exists' in response.get_json()['message']
+
+
+def test_renaming_onto_another_component_is_a_conflict(app, client, auth_headers):
+    with app.app_context():
+        first, second = Component.query.order_by(Component.id).limit(2).all()
+        first_name, second_id = first.name, second.id
+    response = client.put(f'/api/components/{second_id}', json={'name': first_name}, headers=auth_headers)
+    assert response.status_code == 409
+
+
+def test_duplicate_bom_version_is_a_conflict(app, client, auth_headers):
+    with app.app_context():
+        component_id = Component.query.first().id
+    payload = {'name': 'Door assembly', 'components': [{'component_id': component_id, 'quantity_required': 2}]}
+    assert client.post('/api/boms', json=payload, headers=auth_headers).status_code == 201
+    assert client.post('/api/boms', json=payload, headers=auth_headers).status_code == 409
+    # Another version of the same BOM is fine
+    assert client.post('/api/boms', json={**payload, 'version': '2.0'}, headers=auth_headers).status_code == 201
+
+
+def test_xlsx_import_from_a_raw_body_records_a_revision(app, client, auth_headers):
+    with app.app_context():
+        components = [component.name for component in Component.query.order_by(Component.id).limit(2)]
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(['bom_name', 'bom_version', 'component_name', 'quantity_required'])
+    sheet.append(['Imported frame', '1.0', components[0], 3])
+    sheet.append(['Imported frame', '1.0', components[1], 1])
+    body = io.BytesIO()
+    workbook.save(body)
+
+    def upload(data):
+        # The raw request body can't be seeked; the importer has to spool it first
+        return client.post('/api/import/boms?format=xlsx', data=data, headers=auth_headers,
+                           content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+    response = upload(body.getvalue())
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['inserted'] == 2
+
+    sheet.cell(row=2, column=4, value=5)
+    body = io.BytesIO()
+    workbook.save(body)
+    assert upload(body.getvalue()).get_json()['updated'] == 2
+
+    with app.app_context():
+        bom = BillOfMaterial.query.filter_by(name='Imported frame').one()
+        latest = bom_revisions.latest(bom.id)
+        assert bom.version == '1.0'
+        assert latest.revision_number == 2
+        assert bom_revisions.lines(latest)[Component.query.filter_by(name=components[0]).one().id][0] == 5
+
+
+def test_bom_lines_that_would_make_a_cycle_are_row_errors(app, client, auth_headers):
+    components = {}
+    for name in ('Cycle hub', 'Cycle wheel', 'Cycle spoke'):
+        components[name] = client.post('/api/components', json={'name': name, 'unit_cost': 1.0},
+                                       headers=auth_headers).get_json()['id']
+    for name, builds, uses in (('Cycle hub BOM', 'Cycle hub', 'Cycle spoke'), ('Cycle wheel BOM', 'Cycle wheel', 'Cycle hub')):
+        response = client.post('/api/boms', headers=auth_headers, json={
+            'name': name, 'component_id': components[builds],
+            'components': [{'component_id': components[uses], 'quantity_required': 1}]})
+        assert response.status_code == 201, response.get_json()
+
+    csv_body = ('bom_name,component_name,quantity_required\n'
+                'Cycle hub BOM,Cycle spoke,8\n'
+                'Cycle hub BOM,Cycle wheel,1\n'  # The hub would be built from the wheel it is part of
+                'Spare parts,Cycle spoke,4\n')
+    response = client.post('/api/import/boms', headers=auth_headers, content_type='multipart/form-data',
+                           data={'file': (io.BytesIO(csv_body.encode()), 'lines.csv')})
+    result = response.get_json()
+    assert response.status_code == 200, result
+    assert sorted(error['row'] for error in result['errors']) == [2, 3]
+    assert 'component it builds' in result['errors'][0]['message']
+    assert (result['inserted'], result['updated'], result['imported']) == (1, 0, 1)
+
+    with app.app_context():
+        hub_bom = BillOfMaterial.query.filter_by(name='Cycle hub BOM').one()
+        # The hub BOM keeps the line it had before the import
+        assert [(line.component_id, line.quantity_required) for line in hub_bom.bom_components] == [
+            (components['Cycle spoke'], 1)]
+        assert bom_revisions.latest(hub_bom.id).revision_number == 1
+        assert len(BillOfMaterial.query.filter_by(name='Spare parts').one().bom_components) == 1
@@ -0,0 +1,33 @@
+"""
+Point-in-time stock quantities: snapshots plus the movements committed after them
+"""
+from datetime import datetime, timedelta
+
+from models import db, Component, StockMovement, StockSnapshot, StockSnapshotLine
+from inventory_snapshots import inventory_snapshots
+
+
+def _movement(component_id, quantity, **kwargs):
+    movement = StockMovement(component_id=component_id, movement_type='in', quantity=quantity, **kwargs)
+    db.session.add(movement)
+    db.session.commit()
+    return movement
+
+
+def test_movement_committed_after_a_higher_id_is_replayed(app):
+    with app.app_context():
+        component_id = Component.query.order_by(Component.id).first().id
+        # Two concurrent writers: `late` got the lower id but is still uncommitted when the snapshot is taken
+        late_id = db.session.query(db.func.max(StockMovement.id)).scalar() + 1
+        early = _movement(component_id, 2, id=late_id + 1)
+
+        inventory_snapshots.take()
+        snapshot = StockSnapshot.query.order_by(StockSnapshot.taken_at.desc()).first()
+        assert snapshot.last_movement_id == early.id > late_id
+        on_hand = StockSnapshotLine.query.filter_by(snapshot_id=snapshot.id, component_id=component_id).one()
+
+        _movement(component_id, 5, id=late_id, created_at=snapshot.taken_at - timedelta(seconds=1))
+        quantities, _, info = inventory_snapshots.quantities_at(datetime.utcnow() + timedelta(seconds=1), component_id)
+        # `early` is already in the snapshot; `late` is not, despite its lower id
+        assert quantities[component_id] == on_hand.quantity_on_hand + 5
+        assert info['movements_replayed'] == 1
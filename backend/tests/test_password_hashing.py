@@ -0,0 +1,42 @@
+"""
+Password hashing: upgrading old hashes on login, and a bounded wait for the hashing pool
+"""
+import time
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+import password_hashing
+from models import db, User
+from password_hashing import PasswordHasher, PasswordHasherBusy, password_hasher
+from synthetic_data import SEED_USER_EMAIL, SEED_USER_PASSWORD
+
+
+def test_login_rehashes_a_password_hashed_with_an_older_method(app, client, login):
+    email = SEED_USER_EMAIL.format(1)
+    with app.app_context():
+        user = User.query.filter_by(email=email).one()
+        user.password_hash = generate_password_hash(SEED_USER_PASSWORD, 'pbkdf2:sha256:1000')
+        db.session.commit()
+        assert user.password_needs_rehash()
+
+    login(1)
+    with app.app_context():
+        upgraded = User.query.filter_by(email=email).one().password_hash
+        assert upgraded.startswith(password_hasher.method_prefix + '$')
+    # The upgraded hash still accepts the same password, and is left alone from now on
+    login(1)
+    with app.app_context():
+        assert User.query.filter_by(email=email).one().password_hash == upgraded
+
+
+def test_a_hash_that_takes_too_long_is_busy_not_a_hang(monkeypatch):
+    monkeypatch.setattr(password_hashing, 'PASSWORD_HASH_TIMEOUT', 0.05)
+    hasher = PasswordHasher(workers=1, max_pending=1)
+    with pytest.raises(PasswordHasherBusy):
+        hasher._run(time.sleep, 0.3)
+    # The slot stays taken until the slow hash is really done
+    with pytest.raises(PasswordHasherBusy):
+        hasher._run(time.sleep, 0)
+    time.sleep(0.3)
+    assert hasher._run(len, 'free again') == 10
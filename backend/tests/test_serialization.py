@@ -0,0 +1,26 @@
+"""
+Column-tuple listings encoded with orjson: byte for byte what to_dict() + jsonify returned
+"""
+from flask.json.provider import DefaultJSONProvider
+
+from models import db, BillOfMaterial, BOMComponent, Component, ManufacturingOrder
+from serialization import json_response, manufacturing_order_rows, bom_rows
+
+
+def test_listings_match_the_to_dict_responses(app):
+    with app.app_context():
+        # Lines added against component order, which is the order of the (bom_id, component_id) index
+        bom = BillOfMaterial(name='Serialization check', version='1.0', description='Ünïcode ✓')
+        db.session.add(bom)
+        db.session.flush()
+        for component in Component.query.order_by(Component.id.desc()).limit(3):
+            db.session.add(BOMComponent(bom_id=bom.id, component_id=component.id, quantity_required=3))
+        db.session.commit()
+        db.session.expire_all()
+
+        stdlib = DefaultJSONProvider(app)
+        with app.test_request_context():
+            old = stdlib.response([order.to_dict() for order in ManufacturingOrder.query.all()]).get_data()
+            assert json_response(manufacturing_order_rows()).get_data() == old
+            old = stdlib.response([bom.to_dict() for bom in BillOfMaterial.query.all()]).get_data()
+            assert json_response(bom_rows()).get_data() == old
@@ -0,0 +1,90 @@
+"""
+SQL guard: what AI-generated report queries may and may not read
+"""
+from datetime import date, datetime, time
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from sql_guard import validate_select, SQLGuardError, GuardedQueryExecutor, _convert_batch, _temporal_columns
+
+ALLOWED = [
+    "SELECT id, first_name, last_name FROM users",
+    "SELECT u.first_name, count(w.id) FROM users u JOIN work_orders w ON w.assigned_to = u.id GROUP BY u.first_name",
+    "SELECT c.name, c.quantity_on_hand::text FROM components c",
+    "SELECT CAST(quantity_on_hand AS text) FROM components",
+    "SELECT * FROM components",
+    "WITH recent AS (SELECT id, status FROM manufacturing_orders) SELECT status, count(*) FROM recent GROUP BY status",
+    "SELECT sub FROM (SELECT name AS sub FROM components) s",
+    "SELECT g FROM generate_series(1, 3) g JOIN components c ON c.id = g",
+    "SELECT EXTRACT(YEAR FROM created_at), TRIM(BOTH ' ' FROM name), SUBSTRING(name FROM 1 FOR 3) FROM components",
+    "SELECT id, ARRAY(SELECT name FROM components) FROM work_orders",
+]
+
+REJECTED = [
+    # Whole-row references serialize every column, password_hash and otp included
+    "SELECT u::text FROM users u",
+    "SELECT CAST(users AS text) FROM users",
+    "SELECT users FROM users",
+    "SELECT (u).first_name, u FROM users AS u",
+    "SELECT count(u) FROM users u",
+    "SELECT x.first_name FROM users x WHERE x::text LIKE '%a%'",
+    "SELECT \"u\"::text FROM users u",
+    # Sensitive columns and row serializers
+    "SELECT password_hash FROM users",
+    "SELECT \"otp\" FROM users",
+    "SELECT row_to_json(u) FROM users u",
+    "SELECT * FROM users",
+    "SELECT u.* FROM users u",
+    # Writes, other tables, catalogs, multiple statements
+    "DELETE FROM users",
+    "SELECT id FROM users; DROP TABLE users",
+    "SELECT id FROM export_jobs",
+    "SELECT table_name FROM information_schema.tables",
+    "SELECT pg_sleep(10) FROM users",
+    # Subqueries inside function calls read their tables like any other query
+    "SELECT id, ARRAY(SELECT token_hash FROM refresh_tokens) FROM work_orders",
+    "SELECT id, array(SELECT usename FROM pg_user) FROM work_orders",
+    "SELECT id, COALESCE((SELECT u.email FROM password_resets u), '') FROM work_orders",
+    "SELECT id FROM work_orders WHERE EXISTS(SELECT 1 FROM refresh_tokens)",
+    "SELECT id, upper((SELECT email FROM password_resets LIMIT 1)) FROM work_orders",
+]
+
+
+@pytest.mark.parametrize('sql', ALLOWED)
+def test_allowed(sql):
+    assert validate_select(sql)
+
+
+@pytest.mark.parametrize('sql', REJECTED)
+def test_rejected(sql):
+    with pytest.raises(SQLGuardError):
+        validate_select(sql)
+
+
+def test_temporal_values_are_converted_per_value():
+    batch = [(1, None), (2, datetime(2025, 1, 2, 3, 4))]
+    columns = _temporal_columns(batch, 2)
+    assert columns == {1}
+    # A later batch mixing strings into the same column must not call .isoformat() on them
+    later = [(3, 'n/a'), (4, date(2025, 1, 5)), (5, time(6, 30))]
+    assert _convert_batch(later, ['id', 'at'], columns) == [
+        {'id': 3, 'at': 'n/a'}, {'id': 4, 'at': '2025-01-05'}, {'id': 5, 'at': '06:30:00'}]
+
+
+def test_executor_bounds_rows_and_stays_read_only():
+    engine = create_engine('sqlite://')
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE components (id INTEGER PRIMARY KEY, name TEXT)"))
+        conn.execute(text("INSERT INTO components (name) VALUES " + ', '.join(f"('c{n}')" for n in range(30))))
+    executor = GuardedQueryExecutor(row_limit=10, batch_size=4)
+
+    result = executor.execute(engine, "SELECT id, name FROM components ORDER BY id")
+    assert len(result.rows) == 10 and result.truncated
+    assert result.rows[0] == {'id': 1, 'name': 'c0'}
+
+    with pytest.raises(SQLGuardError):
+        executor.execute(engine, "SELECT c::text FROM components c")
+    # query_only is switched off again for the connection's next user
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO components (name) VALUES ('after')"))
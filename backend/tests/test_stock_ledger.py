@@ -0,0 +1,119 @@
+"""
+Stock ledger: monthly partitions, Parquet archives of old months and reads that fall through to them
+"""
+import os
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import create_engine, text
+
+pytest.importorskip('pyarrow')
+
+import stock_ledger as ledger_module
+from models import db, Component, StockMovement, StockMovementArchive
+from stock_ledger import stock_ledger, StockArchiveError, add_months, partition_name
+
+# Far enough back that no seeded movement is archived with them
+ARCHIVED_YEAR = 2001
+
+
+def _older_than_months(now: datetime) -> int:
+    """Archive everything before February of ARCHIVED_YEAR + 1"""
+    return (now.year - ARCHIVED_YEAR - 1) * 12 + now.month - 2
+
+
+@pytest.fixture
+def archived(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(ledger_module, 'STOCK_ARCHIVE_DIR', str(tmp_path))
+    with app.app_context():
+        first, second = Component.query.order_by(Component.id).limit(2)
+        movements = [StockMovement(component_id=first.id, movement_type='in', quantity=4,
+                                   created_at=datetime(ARCHIVED_YEAR, 1, 10)),
+                     StockMovement(component_id=first.id, movement_type='out', quantity=1,
+                                   created_at=datetime(ARCHIVED_YEAR, 1, 20)),
+                     StockMovement(component_id=second.id, movement_type='in', quantity=9,
+                                   created_at=datetime(ARCHIVED_YEAR, 3, 5))]
+        db.session.add_all(movements)
+        db.session.commit()
+        ids = [movement.id for movement in movements]
+        entries = stock_ledger.archive(older_than_months=_older_than_months(datetime.utcnow()))
+        yield {'entries': entries, 'first': first.id, 'second': second.id, 'dir': tmp_path, 'ids': ids}
+        # The files go with tmp_path
+        StockMovementArchive.query.delete()
+        db.session.commit()
+
+
+def test_archive_moves_old_months_out_of_the_database(app, archived):
+    assert [(entry['month'], entry['rows']) for entry in archived['entries']] == [
+        (f'{ARCHIVED_YEAR}-01', 2), (f'{ARCHIVED_YEAR}-03', 1)]
+    with app.app_context():
+        assert StockMovement.query.filter(StockMovement.id.in_(archived['ids'])).count() == 0
+        january = StockMovementArchive.query.filter_by(month=date(ARCHIVED_YEAR, 1, 1)).one()
+        assert (january.row_count, january.component_ids) == (2, [archived['first']])
+        assert os.path.exists(archived['dir'] / january.path)
+
+
+def test_reads_fall_through_to_matching_archives_only(app, archived):
+    with app.app_context():
+        rows = stock_ledger.recent(limit=5, component_id=archived['first'], end=datetime(ARCHIVED_YEAR, 12, 1))
+        assert [(row['movement_type'], row['quantity']) for row in rows] == [('out', 1), ('in', 4)]
+        oldest_first = [row['id'] for rows in stock_ledger.iter_rows(component_id=archived['first'])
+                        for row in rows][:2]
+        assert oldest_first == archived['ids'][:2]
+
+        # The January file holds no rows for the second component, so it is never opened
+        january = StockMovementArchive.query.filter_by(month=date(ARCHIVED_YEAR, 1, 1)).one()
+        os.remove(archived['dir'] / january.path)
+        rows = stock_ledger.recent(limit=5, component_id=archived['second'], end=datetime(ARCHIVED_YEAR, 12, 1))
+        assert [row['quantity'] for row in rows] == [9]
+
+
+def test_a_month_that_changed_while_archived_is_not_deleted(app):
+    with app.app_context():
+        component_id = Component.query.order_by(Component.id).first().id
+        movement = StockMovement(component_id=component_id, movement_type='in', quantity=1,
+                                 created_at=datetime(ARCHIVED_YEAR - 1, 6, 1))
+        db.session.add(movement)
+        db.session.commit()
+        stats = {'row_count': 2, 'min_id': movement.id, 'max_id': movement.id}
+        with pytest.raises(StockArchiveError):
+            with db.engine.begin() as connection:
+                stock_ledger._remove_month(connection, date(ARCHIVED_YEAR - 1, 6, 1), stats, partitioned=False)
+        # The failed check rolled the delete back
+        assert db.session.get(StockMovement, movement.id) is not None
+        db.session.delete(movement)
+        db.session.commit()
+
+
+def test_partitions_are_postgresql_only(app):
+    assert partition_name(date(2025, 3, 1)) == 'stock_movements_p202503'
+    assert add_months(date(2025, 11, 1), 3) == date(2026, 2, 1)
+    with app.app_context():
+        assert stock_ledger.ensure_partitions() == []
+
+
+@pytest.mark.skipif(not os.getenv('TEST_POSTGRES_URL'), reason='TEST_POSTGRES_URL (an empty PostgreSQL database) not set')
+def test_new_partitions_take_over_rows_from_the_default_partition():
+    engine = create_engine(os.environ['TEST_POSTGRES_URL'])
+    this_month = date.today().replace(day=1)
+    next_month = add_months(this_month, 1)
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            connection.execute(text(
+                "CREATE TABLE stock_movements (id SERIAL, component_id INTEGER NOT NULL, "
+                "movement_type VARCHAR(20) NOT NULL, quantity INTEGER NOT NULL, reference VARCHAR(50), notes TEXT, "
+                "created_at TIMESTAMP NOT NULL, PRIMARY KEY (id, created_at)) PARTITION BY RANGE (created_at)"))
+            connection.execute(text("CREATE TABLE stock_movements_default PARTITION OF stock_movements DEFAULT"))
+            connection.execute(text("INSERT INTO stock_movements (component_id, movement_type, quantity, created_at) "
+                                    "VALUES (1, 'in', 5, :at)"), {'at': datetime(next_month.year, next_month.month, 2)})
+
+            created = stock_ledger.ensure_partitions(connection, months_ahead=1)
+            assert created == [partition_name(this_month), partition_name(next_month)]
+            assert stock_ledger.partitions(connection) == [this_month, next_month]
+            # The early row now lives in its month's partition
+            assert connection.execute(text(f"SELECT count(*) FROM {partition_name(next_month)}")).scalar() == 1
+            assert connection.execute(text("SELECT count(*) FROM stock_movements_default")).scalar() == 0
+            assert stock_ledger.ensure_partitions(connection, months_ahead=1) == []
+        finally:
+            transaction.rollback()
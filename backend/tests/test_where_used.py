@@ -0,0 +1,98 @@
+"""
+Where-used: orders pinned to older revisions, lock-free cost caching, and costs in the BOM JSON
+"""
+import itertools
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, Component, BillOfMaterial, BOMComponent, ManufacturingOrder
+from bom_revisions import bom_revisions
+from serialization import bom_rows
+from where_used import where_used
+
+
+_assemblies = itertools.count(1)
+
+
+@pytest.fixture
+def assembly(app):
+    """Frame (BOM) <- Wheel (sub-assembly BOM) <- Spoke; the frame also uses a Bolt"""
+    suffix = next(_assemblies)
+    with app.app_context():
+        spoke, bolt, wheel = (Component(name=f'WU{suffix} {name}', unit_cost=cost) for name, cost in
+                              (('spoke', 2.0), ('bolt', 0.5), ('wheel', 99.0)))
+        db.session.add_all([spoke, bolt, wheel])
+        db.session.flush()
+        wheel_bom = BillOfMaterial(name=f'WU{suffix} wheel', component_id=wheel.id,
+                                   bom_components=[BOMComponent(component_id=spoke.id, quantity_required=10)])
+        frame_bom = BillOfMaterial(name=f'WU{suffix} frame', bom_components=[
+            BOMComponent(component_id=wheel.id, quantity_required=2),
+            BOMComponent(component_id=bolt.id, quantity_required=4)])
+        db.session.add_all([wheel_bom, frame_bom])
+        db.session.flush()
+        bom_revisions.ensure_current(wheel_bom)
+        bom_revisions.ensure_current(frame_bom)
+        db.session.commit()
+        return {'suffix': suffix, 'spoke': spoke.id, 'bolt': bolt.id, 'wheel': wheel.id,
+                'wheel_bom': wheel_bom.id, 'frame_bom': frame_bom.id}
+
+
+def test_costs_roll_up_through_sub_assemblies_in_the_bom_json(app, assembly):
+    with app.app_context():
+        frame = db.session.get(BillOfMaterial, assembly['frame_bom'])
+        # 2 wheels of 10 spokes at 2.0, plus 4 bolts at 0.5 - not the wheel's own unit cost
+        assert frame.to_dict()['total_cost'] == 42.0
+        rows = {row['id']: row for row in bom_rows()}
+        assert rows[assembly['frame_bom']]['total_cost'] == 42.0
+        assert rows[assembly['wheel_bom']]['total_cost'] == 20.0
+
+
+def test_a_cost_computed_during_a_price_change_is_not_cached(app, assembly, monkeypatch):
+    with app.app_context():
+        where_used.invalidate(db.session.connection(), bom_ids=[assembly['frame_bom']])
+        producers = where_used.producers
+
+        def price_changes_meanwhile(component_ids):
+            # Another transaction reprices a spoke after this one read the BOM's generation
+            where_used.invalidate(db.session.connection(), component_ids=[assembly['spoke']])
+            return producers(component_ids)
+
+        monkeypatch.setattr(where_used, 'producers', price_changes_meanwhile)
+        assert where_used.cache_costs([assembly['frame_bom']]) == 0
+        assert db.session.get(BillOfMaterial, assembly['frame_bom']).cost_cache is None
+
+        monkeypatch.setattr(where_used, 'producers', producers)
+        # Reading a cost never stores it
+        assert where_used.rolled_up_costs([assembly['frame_bom']])[assembly['frame_bom']] == 42.0
+        db.session.expire_all()
+        assert db.session.get(BillOfMaterial, assembly['frame_bom']).cost_cache is None
+        assert where_used.cache_costs([assembly['frame_bom']]) == 2  # The wheel sub-assembly too
+        db.session.expire_all()
+        assert db.session.get(BillOfMaterial, assembly['frame_bom']).cost_cache == 42.0
+        db.session.commit()
+
+
+def test_orders_pinned_to_a_revision_that_still_uses_the_component(app, assembly):
+    with app.app_context():
+        frame = db.session.get(BillOfMaterial, assembly['frame_bom'])
+        pinned_id, unpinned_id = f"MO-WU{assembly['suffix']}-1", f"MO-WU{assembly['suffix']}-2"
+        order = ManufacturingOrder(id=pinned_id, product_name='Frame', quantity=3, bill_of_material=frame,
+                                   deadline=datetime(2030, 1, 1))
+        db.session.add(order)
+        bom_revisions.for_order(order)
+        # The frame no longer uses bolts, but the order was pinned before the change
+        bom_revisions.create(frame, changes=[{'component_id': assembly['bolt'], 'remove': True}])
+        unpinned = ManufacturingOrder(id=unpinned_id, product_name='Frame', quantity=5, bill_of_material=frame,
+                                      deadline=datetime(2030, 1, 1) + timedelta(days=1))
+        db.session.add(unpinned)
+        db.session.commit()
+
+        report = where_used.report(db.session.get(Component, assembly['bolt']))
+        assert report['boms'] == []
+        assert [(order['id'], order['required_quantity']) for order in report['open_orders']] == [(pinned_id, 12)]
+
+        # Spokes reach both orders through the wheel sub-assembly
+        report = where_used.report(db.session.get(Component, assembly['spoke']))
+        assert {order['id']: order['required_quantity'] for order in report['open_orders']} == {
+            pinned_id: 60, unpinned_id: 100}
@@ -0,0 +1,313 @@
+"""
+Where-used queries over multi-level BOMs and exact invalidation of cached BOM costs
+"""
+import os
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+from sqlalchemy import event, inspect, select, update, func, or_
+from sqlalchemy.orm import Session
+from read_replicas import use_primary
+from models import (db, Component, BillOfMaterial, BOMComponent, BOMRevision, BOMRevisionLine, ManufacturingOrder,
+                    OrderStatus)
+from bom_revisions import bom_revisions
+
+
+# Where-used tuning (see example.env)
+WHERE_USED_MAX_DEPTH = int(os.getenv('WHERE_USED_MAX_DEPTH', '20'))  # Sub-assembly levels an API query follows
+
+OPEN_ORDER_STATUSES = (OrderStatus.PLANNED, OrderStatus.IN_PROGRESS)
+
+# bom_id -> {'level': 1 for direct use, 'lines': {component_id: quantity_required}, 'produces': component_id}
+Explosion = Dict[int, Dict[str, Any]]
+
+
+class WhereUsedError(ValueError):
+    pass
+
+
+class WhereUsedIndex:
+    """Answers "which BOMs and open orders does component X affect" from the reverse index
+
+    bom_components is indexed by component, so each level of a where-used query is one
+    indexed lookup; a BOM whose component_id is set builds that component, and the BOMs
+    using it are the next level up. BOM costs are cached in bills_of_material.cost_cache
+    with sub-assemblies costed through their newest active BOM. A flush that changes a
+    unit cost, a BOM line or which component a BOM builds clears the cache of exactly the
+    BOMs the same where-used walk reaches; everything else keeps its cached cost.
+
+    Reading costs never writes: missing ones are computed for the response only, and
+    cache_costs() stores them as a separate step (after a BOM write, or `flask cache-bom-costs`).
+    Clearing also bumps cost_generation, and a computed cost is stored only if the generation
+    is still the one read before computing (compare-and-set), so a cost computed from prices
+    that changed meanwhile is never cached and no row is locked for reading.
+    """
+
+    def __init__(self):
+        self._installed = False
+
+    def init_app(self, app):
+        if self._installed:
+            return
+        event.listen(Session, 'after_flush', self._after_flush)
+        self._installed = True
+
+    def explode(self, component_ids: Iterable[int], max_depth: Optional[int] = None, connection=None) -> Explosion:
+        """Every BOM using the components, directly or through sub-assemblies (one query per level)"""
+        executor = connection if connection is not None else db.session
+        reached = set(component_ids)
+        frontier, level, boms = set(reached), 1, {}
+        while frontier and (max_depth is None or level <= max_depth):
+            rows = executor.execute(
+                select(BOMComponent.bom_id, BOMComponent.component_id, BOMComponent.quantity_required,
+                       BillOfMaterial.component_id)
+                .join(BillOfMaterial, BOMComponent.bom_id == BillOfMaterial.id)
+                .where(BOMComponent.component_id.in_(frontier)))
+            frontier = set()
+            for bom_id, component_id, quantity, produces in rows:
+                entry = boms.setdefault(bom_id, {'level': level, 'lines': {}, 'produces': produces})
+                entry['lines'][component_id] = quantity
+                # The same component is never walked twice, which also ends cycles
+                if produces is not None and produces not in reached:
+                    reached.add(produces)
+                    frontier.add(produces)
+            level += 1
+        return boms
+
+    def invalidate(self, connection, component_ids: Iterable[int] = (), bom_ids: Iterable[int] = ()) -> Set[int]:
+        """Clear the cached cost of every BOM that depends on these components' prices or these BOMs' lines"""
+        component_ids, bom_ids = set(component_ids), set(bom_ids)
+        if bom_ids:
+            # BOMs building sub-assemblies pass the change on to the BOMs using them
+            component_ids.update(connection.execute(
+                select(BillOfMaterial.component_id)
+                .where(BillOfMaterial.id.in_(bom_ids), BillOfMaterial.component_id.isnot(None))).scalars())
+        affected = bom_ids | set(self.explode(component_ids, connection=connection)) if component_ids else bom_ids
+        if affected:
+            # Bumped even when nothing is cached yet: a cost being computed right now is stale
+            table = BillOfMaterial.__table__
+            connection.execute(update(table).where(table.c.id.in_(affected))
+                               .values(cost_cache=None, cost_generation=table.c.cost_generation + 1))
+        return affected
+
+    def _after_flush(self, session, flush_context):
+        component_ids, bom_ids = set(), set()
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, Component):
+                if obj in session.dirty and inspect(obj).attrs.unit_cost.history.has_changes():
+                    component_ids.add(obj.id)
+            elif isinstance(obj, BOMComponent):
+                if obj not in session.dirty or session.is_modified(obj, include_collections=False):
+                    bom_ids.add(obj.bom_id)
+            elif isinstance(obj, BillOfMaterial):
+                attrs = inspect(obj).attrs
+                if obj in session.dirty and not (attrs.component_id.history.has_changes()
+                                                 or attrs.active.history.has_changes()):
+                    continue
+                # Another BOM may now build the component (or stop building it): its users change cost
+                component_ids.update(value for value in (obj.component_id, *attrs.component_id.history.deleted)
+                                     if value is not None)
+                if obj not in session.deleted:
+                    bom_ids.add(obj.id)
+        if component_ids or bom_ids:
+            self.invalidate(session.connection(), component_ids, bom_ids)
+
+    def check_cycles(self, bom: BillOfMaterial):
+        """Refuse a BOM that uses the component it builds, directly or through its sub-assemblies"""
+        if bom.component_id is None:
+            return
+        db.session.flush()
+        if bom.id in self.explode([bom.component_id]):
+            raise WhereUsedError(f"BOM '{bom.name}' would use the component it builds")
+
+    def producers(self, component_ids: Iterable[int]) -> Dict[int, int]:
+        """component_id -> the newest active BOM that builds it"""
+        component_ids = list(component_ids)
+        if not component_ids:
+            return {}
+        return {component_id: bom_id for component_id, bom_id in db.session.execute(
+            select(BillOfMaterial.component_id, func.max(BillOfMaterial.id))
+            .where(BillOfMaterial.component_id.in_(component_ids), BillOfMaterial.active.isnot(False))
+            .group_by(BillOfMaterial.component_id))}
+
+    def rolled_up_costs(self, bom_ids: Iterable[int]) -> Dict[int, float]:
+        """Multi-level cost per BOM, from the cache or computed; nothing is written (see cache_costs)"""
+        return self._costs(bom_ids)[0]
+
+    def cache_costs(self, bom_ids: Optional[Iterable[int]] = None) -> int:
+        """Compute and store the missing costs of bom_ids (default: every uncached BOM); returns how many were stored"""
+        use_primary(db.session)
+        if bom_ids is None:
+            bom_ids = db.session.execute(
+                select(BillOfMaterial.id).where(BillOfMaterial.cost_cache.is_(None))).scalars().all()
+        _, computed = self._costs(bom_ids)
+        # Not cached if a price or line changed since the generation was read; the next run recomputes
+        table = BillOfMaterial.__table__
+        stored = 0
+        for bom_id, (total, generation) in computed.items():
+            stored += db.session.connection().execute(
+                update(table).where(table.c.id == bom_id, table.c.cost_generation == generation)
+                .values(cost_cache=total)).rowcount
+        return stored
+
+    def _costs(self, bom_ids: Iterable[int]) -> Tuple[Dict[int, float], Dict[int, Tuple[float, int]]]:
+        """Costs of bom_ids, and {bom_id: (cost, generation)} for the ones computed here, sub-assemblies included"""
+        bom_ids = list(bom_ids)
+        costs: Dict[int, float] = dict(db.session.execute(
+            select(BillOfMaterial.id, BillOfMaterial.cost_cache)
+            .where(BillOfMaterial.id.in_(bom_ids), BillOfMaterial.cost_cache.isnot(None))).all()) if bom_ids else {}
+        computed: Dict[int, Tuple[float, int]] = {}
+        for bom_id in bom_ids:
+            self._rolled_up_cost(bom_id, costs, computed, frozenset())
+        return {bom_id: costs[bom_id] for bom_id in bom_ids}, computed
+
+    def _rolled_up_cost(self, bom_id: int, costs: Dict[int, float], computed: Dict[int, Tuple[float, int]],
+                        stack: frozenset) -> float:
+        if bom_id in costs:
+            return costs[bom_id]
+        cached, generation = db.session.execute(
+            select(BillOfMaterial.cost_cache, BillOfMaterial.cost_generation).where(BillOfMaterial.id == bom_id)).one()
+        if cached is not None:
+            costs[bom_id] = cached
+            return cached
+
+        lines = db.session.execute(
+            select(BOMComponent.component_id, BOMComponent.quantity_required, Component.unit_cost)
+            .join(Component, BOMComponent.component_id == Component.id)
+            .where(BOMComponent.bom_id == bom_id)).all()
+        producers = self.producers(component_id for component_id, _, _ in lines)
+        stack = stack | {bom_id}
+        total = 0.0
+        for component_id, quantity, unit_cost in lines:
+            sub_bom = producers.get(component_id)
+            if sub_bom is not None and sub_bom not in stack:
+                total += quantity * self._rolled_up_cost(sub_bom, costs, computed, stack)
+            else:
+                total += quantity * (unit_cost or 0)
+        costs[bom_id] = total
+        computed[bom_id] = (total, generation)
+        return total
+
+    @staticmethod
+    def _makers(boms: Explosion) -> Dict[int, int]:
+        """Sub-assembly component_id -> the newest of these BOMs that builds it"""
+        makers: Dict[int, int] = {}
+        for bom_id, entry in boms.items():
+            if entry['produces'] is not None:
+                makers[entry['produces']] = max(makers.get(entry['produces'], 0), bom_id)
+        return makers
+
+    def _per_unit(self, boms: Explosion, component_ids: Set[int]) -> Dict[int, float]:
+        """Quantity of the components in one unit of each BOM's output, through sub-assemblies"""
+        makers = self._makers(boms)
+        per_unit: Dict[int, float] = {}
+
+        def need(bom_id: int, stack: frozenset) -> float:
+            if bom_id not in per_unit:
+                stack = stack | {bom_id}
+                per_unit[bom_id] = self._line_need(boms[bom_id]['lines'], component_ids, makers,
+                                                   lambda sub_bom: need(sub_bom, stack), stack)
+            return per_unit[bom_id]
+
+        for bom_id in boms:
+            need(bom_id, frozenset())
+        return per_unit
+
+    @staticmethod
+    def _line_need(lines: Dict[int, int], component_ids: Set[int], makers: Dict[int, int], need, stack) -> float:
+        total = 0.0
+        for component_id, quantity in lines.items():
+            if component_id in component_ids:
+                total += quantity
+            elif component_id in makers and makers[component_id] not in stack:
+                total += quantity * need(makers[component_id])
+        return total
+
+    def open_orders(self, boms: Explosion, component_ids: Set[int], per_unit: Dict[int, float]) -> list:
+        """Open orders whose pinned revision still uses the components, with what they need
+
+        An order uses the lines of the revision it is pinned to, which may include components
+        the BOM's current lines have dropped since. Revisions are stored as deltas, so a
+        revision using a component has that component on a delta line of its BOM; those BOMs'
+        orders are candidates too. Unpinned orders use the BOM's current lines.
+        """
+        makers = self._makers(boms)
+        revised_boms = (select(BOMRevision.bom_id)
+                        .join(BOMRevisionLine, BOMRevisionLine.revision_id == BOMRevision.id)
+                        .where(BOMRevisionLine.component_id.in_(component_ids | set(makers))))
+        orders = (ManufacturingOrder.query
+                  .filter(or_(ManufacturingOrder.bom_id.in_(list(boms)), ManufacturingOrder.bom_id.in_(revised_boms)),
+                          ManufacturingOrder.status.in_(OPEN_ORDER_STATUSES))
+                  .order_by(ManufacturingOrder.deadline).all())
+        revisions = {revision.id: revision for revision in BOMRevision.query.filter(
+            BOMRevision.id.in_({order.bom_revision_id for order in orders if order.bom_revision_id}))}
+
+        result = []
+        for order in orders:
+            revision = revisions.get(order.bom_revision_id)
+            if revision is None:
+                if order.bom_id not in boms:
+                    continue
+                lines = boms[order.bom_id]['lines']
+            else:
+                # What the order will actually consume, which may differ from the BOM's current lines
+                lines = {component_id: line[0] for component_id, line in bom_revisions.lines(revision).items()}
+            need = self._line_need(lines, component_ids, makers, lambda sub_bom: per_unit.get(sub_bom, 0),
+                                   frozenset({order.bom_id}))
+            if not need:
+                continue
+            result.append({
+                'id': order.id,
+                'product_name': order.product_name,
+                'status': order.status.value,
+                'bom_id': order.bom_id,
+                'bom_revision_id': order.bom_revision_id,
+                'quantity': order.quantity,
+                'deadline': order.deadline.isoformat(),
+                'required_quantity': order.quantity * need
+            })
+        return result
+
+    def report(self, component: Component, max_depth: int = WHERE_USED_MAX_DEPTH,
+               include_orders: bool = True) -> Dict[str, Any]:
+        """Where a component is used, what those BOMs cost, and what open orders still need of it"""
+        component_ids = {component.id}
+        boms = self.explode(component_ids, max_depth=max_depth)
+        per_unit = self._per_unit(boms, component_ids)
+        costs = self.rolled_up_costs(boms)
+        details = {bom.id: bom for bom in BillOfMaterial.query.filter(BillOfMaterial.id.in_(list(boms)))}
+        named = {entry['produces'] for entry in boms.values() if entry['produces'] is not None}
+        named.update(line_component_id for entry in boms.values() for line_component_id in entry['lines'])
+        names = dict(db.session.execute(select(Component.id, Component.name).where(Component.id.in_(named))).all())
+
+        result = {
+            'component_id': component.id,
+            'component_name': component.name,
+            'quantity_on_hand': component.quantity_on_hand,
+            'unit_cost': component.unit_cost,
+            'max_depth': max_depth,
+            'boms': [{
+                'bom_id': bom_id,
+                'bom_name': details[bom_id].name,
+                'version': details[bom_id].version,
+                'active': details[bom_id].active,
+                'level': entry['level'],
+                'produces_component_id': entry['produces'],
+                'produces_component_name': names.get(entry['produces']),
+                'uses': [{'component_id': line_component_id, 'component_name': names.get(line_component_id),
+                          'quantity_required': quantity} for line_component_id, quantity in sorted(entry['lines'].items())],
+                'quantity_per_unit': per_unit[bom_id],
+                'rolled_up_cost': costs[bom_id]
+            } for bom_id, entry in sorted(boms.items(), key=lambda item: (item[1]['level'], item[0]))]
+        }
+        if include_orders:
+            orders = self.open_orders(boms, component_ids, per_unit)
+            demand = sum(order['required_quantity'] for order in orders)
+            result.update({
+                'open_orders': orders,
+                'open_order_demand': demand,
+                'shortfall': max(demand - component.quantity_on_hand, 0)
+            })
+        return result
+
+
+# Global instance
+where_used = WhereUsedIndex()
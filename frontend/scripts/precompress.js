@@ -0,0 +1,48 @@
+// Writes .gz and .br (and .zst where Node supports it) copies of the built assets, so the
+// web server can send them as-is instead of compressing on every request.
+import { readdirSync, readFileSync, statSync, writeFileSync } from 'node:fs'
+import { join, extname } from 'node:path'
+import zlib from 'node:zlib'
+
+const DIST = new URL('../dist/', import.meta.url).pathname
+const EXTENSIONS = new Set(['.html', '.js', '.css', '.json', '.svg', '.txt', '.map', '.wasm'])
+const MIN_BYTES = 1024
+
+const encoders = {
+  '.gz': (data) => zlib.gzipSync(data, { level: 9 }),
+  '.br': (data) => zlib.brotliCompressSync(data, {
+    params: {
+      [zlib.constants.BROTLI_PARAM_QUALITY]: 11,
+      [zlib.constants.BROTLI_PARAM_SIZE_HINT]: data.length,
+    },
+  }),
+}
+if (zlib.zstdCompressSync) {
+  encoders['.zst'] = (data) => zlib.zstdCompressSync(data, {
+    params: { [zlib.constants.ZSTD_c_compressionLevel]: 19 },
+  })
+}
+
+const walk = (dir) => readdirSync(dir).flatMap((name) => {
+  const path = join(dir, name)
+  return statSync(path).isDirectory() ? walk(path) : [path]
+})
+
+let original = 0
+let compressed = 0
+for (const path of walk(DIST)) {
+  if (!EXTENSIONS.has(extname(path))) continue
+  const data = readFileSync(path)
+  if (data.length < MIN_BYTES) continue
+  for (const [suffix, encode] of Object.entries(encoders)) {
+    const output = encode(data)
+    if (output.length < data.length) {
+      writeFileSync(path + suffix, output)
+    }
+    if (suffix === '.br') {
+      original += data.length
+      compressed += Math.min(output.length, data.length)
+    }
+  }
+}
+console.log(`Precompressed ${(original / 1024).toFixed(0)} KB of assets (brotli: ${(compressed / 1024).toFixed(0)} KB)`)
@@ -38,7 +38,7 @@ import {
   Code as CodeIcon
 } from '@mui/icons-material'
 import Plot from 'react-plotly.js'
-import api from '../services/api'
+import api, { aiChatAPI } from '../services/api'
 import { useAuth } from '../contexts/AuthContext'
 
 function AIReportChat() {
@@ -50,6 +50,7 @@ function AIReportChat() {
   const [error, setError] = useState('')
   const [suggestions, setSuggestions] = useState([])
   const [showSuggestions, setShowSuggestions] = useState(true)
+  const [historyBefore, setHistoryBefore] = useState(null)
   const messagesEndRef = useRef(null)
 
   const scrollToBottom = () => {
@@ -71,8 +72,49 @@ function AIReportChat() {
         timestamp: new Date().toISOString()
       }
     ])
+    loadHistory()
   }, [user])
 
+  // Turn a stored history turn back into the user/AI message pair shown in the chat
+  const turnToMessages = (turn) => [
+    {
+      id: `turn-${turn.id}-user`,
+      type: 'user',
+      content: turn.query,
+      timestamp: turn.created_at
+    },
+    {
+      id: `turn-${turn.id}-ai`,
+      type: 'ai',
+      turnId: turn.id,
+      content: turn.success
+        ? turn.explanation
+        : '❌ Sorry, I encountered an error processing your request. Please try again or rephrase your question.',
+      success: turn.success,
+      error: turn.error,
+      sql_query: turn.sql_query,
+      chart_type: turn.chart_type,
+      data: turn.data,
+      truncated: turn.truncated,
+      notice: turn.notice,
+      chart_json: turn.chart_json,
+      timestamp: turn.created_at
+    }
+  ]
+
+  const loadHistory = async (before) => {
+    try {
+      const response = await aiChatAPI.getHistory(before ? { before } : {})
+      const olderMessages = response.data.history.flatMap(turnToMessages)
+      // Older pages go between the welcome message and what is already loaded
+      setMessages(prev => [prev[0], ...olderMessages, ...prev.slice(1)].filter(Boolean))
+      setHistoryBefore(response.data.next_before)
+      if (olderMessages.length > 0) setShowSuggestions(false)
+    } catch (err) {
+      console.error('Failed to load chat history:', err)
+    }
+  }
+
   const loadSuggestions = async () => {
     try {
       const response = await api.get('/profile/ai-suggestions')
@@ -98,38 +140,70 @@ function AIReportChat() {
     setError('')
     setShowSuggestions(false)
 
-    try {
-      const response = await api.post('/profile/ai-chat', {
-        query: inputMessage,
-        time_period: timePeriod
-      })
+    const aiMessageId = Date.now() + 1
+    const updateAIMessage = (changes) => {
+      setMessages(prev => prev.map(m => m.id === aiMessageId ? { ...m, ...changes } : m))
+    }
 
-      const aiResponse = {
-        id: Date.now() + 1,
+    try {
+      // Add the AI message up front and fill it in as each stage streams in
+      setMessages(prev => [...prev, {
+        id: aiMessageId,
         type: 'ai',
-        content: response.data.explanation,
-        data: response.data.data,
-        chart_json: response.data.chart_json,
-        chart_type: response.data.chart_type,
-        sql_query: response.data.sql_query,
-        generated_code: response.data.generated_code,
-        success: response.data.success,
+        content: '',
+        streaming: true,
         timestamp: new Date().toISOString()
-      }
+      }])
+
+      let streamError = null
+      await aiChatAPI.stream({ query: inputMessage, time_period: timePeriod }, (event) => {
+        setLoading(false)
+        switch (event.event) {
+          case 'explanation_delta':
+            setMessages(prev => prev.map(m => m.id === aiMessageId ? { ...m, content: m.content + event.text } : m))
+            break
+          case 'explanation':
+            updateAIMessage({ content: event.text })
+            break
+          case 'sql':
+            updateAIMessage({ sql_query: event.sql_query, chart_type: event.chart_type })
+            break
+          case 'data':
+            updateAIMessage({ data: event.data, truncated: event.truncated, notice: event.notice })
+            break
+          case 'chart':
+            updateAIMessage({ chart_json: event.chart_json, generated_code: event.generated_code })
+            break
+          case 'done':
+            updateAIMessage({ success: event.success, streaming: false, turnId: event.turn_id })
+            break
+          case 'error':
+            streamError = event.error
+            updateAIMessage({ turnId: event.turn_id })
+            break
+          default:
+            break
+        }
+      })
 
-      setMessages(prev => [...prev, aiResponse])
+      if (streamError) {
+        updateAIMessage({
+          content: '❌ Sorry, I encountered an error processing your request. Please try again or rephrase your question.',
+          success: false,
+          error: streamError,
+          streaming: false
+        })
+        setError(streamError)
+      }
 
     } catch (err) {
       console.error('AI chat error:', err)
-      const errorResponse = {
-        id: Date.now() + 1,
-        type: 'ai',
+      updateAIMessage({
         content: '❌ Sorry, I encountered an error processing your request. Please try again or rephrase your question.',
         success: false,
         error: err.response?.data?.error || err.message,
-        timestamp: new Date().toISOString()
-      }
-      setMessages(prev => [...prev, errorResponse])
+        streaming: false
+      })
       setError(err.response?.data?.error || 'Failed to process query')
     } finally {
       setLoading(false)
@@ -164,13 +238,30 @@ function AIReportChat() {
     try {
       setLoading(true)
       
-      const response = await api.post('/profile/ai-chat/export-pdf', {
+      // Export saved turns by ID so charts and result rows aren't uploaded again. An answer that
+      // wasn't saved (or failed) has no turn ID; then the chat is sent as shown so nothing is left out
+      const answers = messages.slice(1).filter(m => m.type === 'ai' && m.content)
+      const allSaved = answers.length > 0 && answers.every(m => m.turnId)
+      const { data } = await aiChatAPI.exportPDF(allSaved ? {
+        turn_ids: answers.map(m => m.turnId),
+        time_period: timePeriod
+      } : {
         messages: messages.filter(m => m.type !== 'ai' || m.content), // Filter out empty messages
         time_period: timePeriod
-      }, {
-        responseType: 'blob'
       })
       
+      // The PDF is built in the background; poll until it is ready
+      let job = data.job
+      while (job.status === 'queued' || job.status === 'running') {
+        await new Promise(resolve => setTimeout(resolve, 1000))
+        job = (await aiChatAPI.getExport(job.id)).data.job
+      }
+      if (job.status !== 'completed') {
+        throw new Error(job.error || 'Export failed')
+      }
+      
+      const response = await aiChatAPI.downloadExport(job.id)
+      
       // Create download link
       const blob = new Blob([response.data], { type: 'application/pdf' })
       const url = URL.createObjectURL(blob)
@@ -192,6 +283,9 @@ function AIReportChat() {
 
   const renderMessage = (message) => {
     const isUser = message.type === 'user'
+
+    // Keep showing the loading indicator until the first streamed text arrives
+    if (message.streaming && !message.content) return null
     
     return (
       <Box
@@ -237,6 +331,12 @@ function AIReportChat() {
               </Alert>
             )}
             
+            {message.notice && (
+              <Alert severity={message.truncated ? 'info' : 'warning'} sx={{ mt: 1 }} size="small">
+                {message.notice}
+              </Alert>
+            )}
+            
             {/* Render chart if available */}
             {message.chart_json && message.success !== false && (
               <Box mt={2}>
@@ -380,6 +480,13 @@ function AIReportChat() {
       {/* Chat Messages */}
       <Card sx={{ flexGrow: 1, display: 'flex', flexDirection: 'column', mb: 2 }}>
         <CardContent sx={{ flexGrow: 1, overflow: 'auto', maxHeight: 500 }}>
+          {historyBefore && (
+            <Box display="flex" justifyContent="center" mb={2}>
+              <Button size="small" onClick={() => loadHistory(historyBefore)}>
+                Load earlier messages
+              </Button>
+            </Box>
+          )}
           {messages.map(renderMessage)}
           
           {loading && (
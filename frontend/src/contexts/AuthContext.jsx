@@ -1,6 +1,6 @@
 import { createContext, useContext, useReducer, useEffect } from 'react'
 import { useNavigate, useLocation } from 'react-router-dom'
-import { authAPI } from '../services/api'
+import { authAPI, clearResponseCache } from '../services/api'
 
 const AuthContext = createContext({
   user: null,
@@ -73,6 +73,7 @@ export const AuthProvider = ({ children }) => {
       } catch (error) {
         console.error('❌ Error restoring user session:', error)
         localStorage.removeItem('token')
+        localStorage.removeItem('refresh_token')
         localStorage.removeItem('user')
         dispatch({ type: 'SET_LOADING', payload: false })
       }
@@ -86,10 +87,11 @@ export const AuthProvider = ({ children }) => {
       dispatch({ type: 'SET_LOADING', payload: true })
       
       const response = await authAPI.login(credentials)
-      const { token, user } = response.data
+      const { token, refresh_token, user } = response.data
       
       // Store in localStorage
       localStorage.setItem('token', token)
+      localStorage.setItem('refresh_token', refresh_token)
       localStorage.setItem('user', JSON.stringify(user))
       
       dispatch({
@@ -127,8 +129,15 @@ export const AuthProvider = ({ children }) => {
   }
 
   const logout = () => {
+    // Revoke the session server side; clearing local state doesn't wait for it
+    const token = localStorage.getItem('token')
+    if (token) {
+      authAPI.logout({ refresh_token: localStorage.getItem('refresh_token') }, token).catch(() => {})
+    }
     localStorage.removeItem('token')
+    localStorage.removeItem('refresh_token')
     localStorage.removeItem('user')
+    clearResponseCache()
     dispatch({ type: 'LOGOUT' })
   }
 
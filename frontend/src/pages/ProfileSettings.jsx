@@ -49,7 +49,7 @@ import {
   SmartToy as AIIcon,
 } from '@mui/icons-material'
 import { useAuth } from '../contexts/AuthContext'
-import api from '../services/api'
+import api, { profileAPI, assetUrl, avatarSrcSet } from '../services/api'
 import ProfileReports from '../components/ProfileReports'
 import AIReportChat from '../components/AIReportChat'
 
@@ -89,6 +89,7 @@ function ProfileSettings() {
     role: '',
     avatar: null
   })
+  const [avatarFile, setAvatarFile] = useState(null)
   
   // Password form state
   const [passwordForm, setPasswordForm] = useState({
@@ -163,14 +164,12 @@ function ProfileSettings() {
   const handleAvatarChange = (event) => {
     const file = event.target.files[0]
     if (file) {
-      const reader = new FileReader()
-      reader.onloadend = () => {
-        setProfile(prev => ({
-          ...prev,
-          avatar: reader.result
-        }))
-      }
-      reader.readAsDataURL(file)
+      // Preview locally; the file itself is uploaded as multipart on save
+      setAvatarFile(file)
+      setProfile(prev => ({
+        ...prev,
+        avatar: URL.createObjectURL(file)
+      }))
     }
   }
 
@@ -181,7 +180,12 @@ function ProfileSettings() {
     setSuccess('')
 
     try {
-      const response = await api.put('/profile', profile)
+      if (avatarFile) {
+        await profileAPI.uploadAvatar(avatarFile)
+        setAvatarFile(null)
+      }
+      const { avatar, ...fields } = profile
+      const response = await api.put('/profile', fields)
       updateUser(response.data)
       setSuccess('Profile updated successfully!')
       
@@ -274,7 +278,8 @@ function ProfileSettings() {
                 <CardContent sx={{ textAlign: 'center' }}>
                   <Box sx={{ position: 'relative', display: 'inline-block', mb: 2 }}>
                     <Avatar
-                      src={profile.avatar}
+                      src={assetUrl(profile.avatar)}
+                      srcSet={avatarSrcSet(profile.avatar)}
                       sx={{ 
                         width: 120, 
                         height: 120, 
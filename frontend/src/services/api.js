@@ -4,27 +4,119 @@ const API_BASE_URL = window.location.hostname === 'localhost'
   ? 'http://localhost:8000/api' 
   : `${window.location.protocol}//${window.location.hostname}:8000/api`
 
+// Backend paths outside the API (e.g. stored avatar URLs) resolve against the same origin
+const BACKEND_ORIGIN = API_BASE_URL.replace(/\/api$/, '')
+export const assetUrl = (path) => (path && path.startsWith('/') ? `${BACKEND_ORIGIN}${path}` : path)
+
+// Avatars are stored as WebP thumbnails at fixed sizes; offer the next size up for high-DPI screens
+export const avatarSrcSet = (path) => {
+  const match = path && path.match(/\/(\d+)\.webp$/)
+  if (!match) return undefined
+  const larger = path.replace(/\/\d+\.webp$/, `/${Number(match[1]) * 2}.webp`)
+  return `${assetUrl(path)} 1x, ${assetUrl(larger)} 2x`
+}
+
 const api = axios.create({
   baseURL: API_BASE_URL,
 })
 
+// Collection endpoints answer with weak ETags: keep the last body per URL and revalidate
+// with If-None-Match, so an unchanged collection comes back as an empty 304
+const CONDITIONAL_PATHS = ['/stock', '/boms', '/manufacturing-orders', '/workcenters']
+const etagCache = new Map()
+
+export const clearResponseCache = () => etagCache.clear()
+
+// After a write the backend names a time until which reads should skip its read replica;
+// sending it back keeps this user's next reads consistent whichever server worker answers
+const PRIMARY_UNTIL_HEADER = 'x-primary-until'
+let primaryUntil = 0
+
+const cacheKey = (config) => {
+  const params = new URLSearchParams(config.params || {}).toString()
+  return params ? `${config.url}?${params}` : config.url
+}
+
+const isConditional = (config) =>
+  (config.method || 'get').toLowerCase() === 'get' && CONDITIONAL_PATHS.includes(config.url)
+
 // Add auth token to requests
 api.interceptors.request.use((config) => {
   const token = localStorage.getItem('token')
   if (token) {
     config.headers.Authorization = `Bearer ${token}`
   }
+  if (Date.now() / 1000 < primaryUntil) {
+    config.headers['X-Primary-Until'] = primaryUntil
+  }
+  if (isConditional(config)) {
+    const cached = etagCache.get(cacheKey(config))
+    if (cached) {
+      config.headers['If-None-Match'] = cached.etag
+    }
+    config.validateStatus = (status) => (status >= 200 && status < 300) || status === 304
+  }
   return config
 })
 
+const clearSession = () => {
+  clearResponseCache()
+  localStorage.removeItem('token')
+  localStorage.removeItem('refresh_token')
+  localStorage.removeItem('user')
+  window.location.reload()
+}
+
+// Access tokens are short-lived: renew with the refresh token, sharing one request between callers
+let refreshPromise = null
+export const refreshAccessToken = () => {
+  if (!refreshPromise) {
+    const refreshToken = localStorage.getItem('refresh_token')
+    refreshPromise = (refreshToken
+      ? axios.post(`${API_BASE_URL}/auth/refresh`, { refresh_token: refreshToken }).then(({ data }) => {
+          localStorage.setItem('token', data.token)
+          localStorage.setItem('refresh_token', data.refresh_token)
+          return data.token
+        })
+      : Promise.reject(new Error('No refresh token'))
+    ).finally(() => {
+      refreshPromise = null
+    })
+  }
+  return refreshPromise
+}
+
 // Handle auth errors
 api.interceptors.response.use(
-  (response) => response,
-  (error) => {
+  (response) => {
+    const until = Number(response.headers[PRIMARY_UNTIL_HEADER])
+    if (until > primaryUntil) primaryUntil = until
+    if (!isConditional(response.config)) return response
+    const key = cacheKey(response.config)
+    if (response.status === 304 && etagCache.has(key)) {
+      return { ...response, status: 200, data: etagCache.get(key).data }
+    }
+    const etag = response.headers.etag
+    if (response.status === 200 && etag) {
+      etagCache.set(key, { etag, data: response.data })
+    }
+    return response
+  },
+  async (error) => {
+    const request = error.config
     if (error.response?.status === 401) {
-      localStorage.removeItem('token')
-      localStorage.removeItem('user')
-      window.location.reload()
+      // Retry once with a renewed access token (not for the auth endpoints themselves)
+      if (request && !request._retried && !request.url.startsWith('/auth/')) {
+        request._retried = true
+        try {
+          const token = await refreshAccessToken()
+          request.headers.Authorization = `Bearer ${token}`
+          return api(request)
+        } catch (refreshError) {
+          console.error('Session refresh failed:', refreshError)
+        }
+      }
+      clearSession()
     }
     return Promise.reject(error)
   }
@@ -36,6 +128,7 @@ export const authAPI = {
   forgotPassword: (data) => api.post('/auth/forgot-password', data),
   verifyOTP: (data) => api.post('/auth/verify-otp', data),
   resetPassword: (data) => api.post('/auth/reset-password', data),
+  logout: (data, token) => api.post('/auth/logout', data, { headers: { Authorization: `Bearer ${token}` } }),
 }
 
 export const manufacturingOrdersAPI = {
@@ -56,6 +149,10 @@ export const stockAPI = {
   getAll: () => api.get('/stock'),
 }
 
+export const workCentersAPI = {
+  getAll: () => api.get('/workcenters'),
+}
+
 export const componentsAPI = {
   create: (data) => api.post('/components', data),
   update: (id, data) => api.put(`/components/${id}`, data),
@@ -73,4 +170,71 @@ export const dashboardAPI = {
   getSummary: () => api.get('/dashboard/summary'),
 }
 
+// POST a request and read a newline-delimited JSON stream, calling onEvent per line
+export const streamNDJSON = async (url, body, onEvent) => {
+  const post = (token) => fetch(`${API_BASE_URL}${url}`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      ...(token ? { Authorization: `Bearer ${token}` } : {}),
+    },
+    body: JSON.stringify(body),
+  })
+
+  let response = await post(localStorage.getItem('token'))
+
+  if (response.status === 401) {
+    try {
+      response = await post(await refreshAccessToken())
+    } catch (refreshError) {
+      console.error('Session refresh failed:', refreshError)
+    }
+    if (response.status === 401) {
+      clearSession()
+    }
+  }
+
+  if (!response.ok || !response.body) {
+    const error = new Error(`Request failed with status ${response.status}`)
+    error.response = { status: response.status }
+    throw error
+  }
+
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+
+    let newline
+    while ((newline = buffer.indexOf('\n')) !== -1) {
+      const line = buffer.slice(0, newline).trim()
+      buffer = buffer.slice(newline + 1)
+      if (line) onEvent(JSON.parse(line))
+    }
+  }
+
+  if (buffer.trim()) onEvent(JSON.parse(buffer))
+}
+
+export const profileAPI = {
+  uploadAvatar: (file) => {
+    const form = new FormData()
+    form.append('avatar', file)
+    return api.post('/profile/avatar', form)
+  },
+}
+
+export const aiChatAPI = {
+  query: (data) => api.post('/profile/ai-chat', data),
+  stream: (data, onEvent) => streamNDJSON('/profile/ai-chat/stream', data, onEvent),
+  getHistory: (params) => api.get('/profile/ai-chat/history', { params }),
+  exportPDF: (data) => api.post('/profile/ai-chat/export-pdf', data),
+  getExport: (jobId) => api.get(`/profile/ai-chat/exports/${jobId}`),
+  downloadExport: (jobId) => api.get(`/profile/ai-chat/exports/${jobId}/download`, { responseType: 'blob' }),
+}
+
 export default api
\ No newline at end of file